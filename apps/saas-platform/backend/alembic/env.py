@@ -33,6 +33,8 @@ from app.models.comment import Comment, CommentAttachment
 from app.models.drawback_act import DrawbackAct, DrawbackCredit
 from app.models.product import Product, ProductCategory
 from app.models.warehouse import Warehouse, InventoryItem, StockMovement
+from app.models.company_kpi_rollup import CompanyKPIRollup
+from app.models.ocr_job import OCRJob
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,106 @@
+"""Add company_kpi_rollups table
+
+Revision ID: add_company_kpi_rollups
+Revises: add_new_models
+Create Date: 2026-10-18 09:00:00.000000
+
+A tabela é populada com os dados existentes na própria migração; para
+reconstruí-la depois: python scripts/rebuild_kpi_rollups.py
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_company_kpi_rollups'
+down_revision: Union[str, None] = 'add_new_models'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Contadores de cada tabela de origem (SQL), como em app/services/kpi_rollup_service.py.
+# Os status são gravados pelo nome do membro do enum.
+ROLLUP_SOURCES = {
+    'import_processes': {
+        'imports_total': "COUNT(id)",
+        'imports_active': "SUM(CASE WHEN status IN ('pending', 'in_progress') THEN 1 ELSE 0 END)",
+        'imports_completed': "SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END)",
+    },
+    'export_processes': {
+        'exports_total': "COUNT(id)",
+        'exports_active': "SUM(CASE WHEN status IN ('pending', 'in_progress', 'shipped') THEN 1 ELSE 0 END)",
+    },
+    'compliance_checks': {
+        'checks_total': "COUNT(id)",
+        'checks_compliant': "SUM(CASE WHEN status = 'compliant' THEN 1 ELSE 0 END)",
+        'checks_non_compliant': "SUM(CASE WHEN status = 'non_compliant' THEN 1 ELSE 0 END)",
+        'checks_pending': "SUM(CASE WHEN status = 'pending' THEN 1 ELSE 0 END)",
+        'checks_critical': "SUM(CASE WHEN status = 'non_compliant' AND required THEN 1 ELSE 0 END)",
+    },
+    'payments': {
+        'payments_total': "COUNT(id)",
+        'payments_pending': "SUM(CASE WHEN status = 'pending' THEN 1 ELSE 0 END)",
+        'payments_amount': "COALESCE(SUM(amount), 0)",
+    },
+}
+ROLLUP_METRICS = [name for metrics in ROLLUP_SOURCES.values() for name in metrics]
+
+
+def upgrade() -> None:
+    # Create company_kpi_rollups table
+    op.create_table(
+        'company_kpi_rollups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('company_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('imports_total', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('imports_active', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('imports_completed', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('exports_total', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('exports_active', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('checks_total', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('checks_compliant', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('checks_non_compliant', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('checks_pending', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('checks_critical', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('payments_total', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('payments_pending', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('payments_amount', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['company_id'], ['companies.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('company_id', 'day', name='uq_company_kpi_rollups_company_day')
+    )
+    op.create_index(op.f('ix_company_kpi_rollups_id'), 'company_kpi_rollups', ['id'], unique=False)
+    backfill_rollups(op.get_bind())
+
+
+def backfill_rollups(bind) -> None:
+    """Popula o rollup com um INSERT ... SELECT ... GROUP BY (empresa, dia) das tabelas de origem"""
+    inspector = sa.inspect(bind)
+    selects = []
+    for table, metrics in ROLLUP_SOURCES.items():
+        if not inspector.has_table(table):
+            continue
+        columns = ", ".join(f"{metrics.get(name, '0')} AS {name}" for name in ROLLUP_METRICS)
+        # Registros sem created_at contam no dia atual, como nos eventos do rollup
+        selects.append(
+            f"SELECT company_id, date(COALESCE(created_at, CURRENT_TIMESTAMP)) AS day, {columns} "
+            f"FROM {table} GROUP BY company_id, date(COALESCE(created_at, CURRENT_TIMESTAMP))"
+        )
+    if not selects:
+        return
+    metric_columns = ", ".join(ROLLUP_METRICS)
+    totals = ", ".join(f"SUM({name})" for name in ROLLUP_METRICS)
+    bind.execute(sa.text(
+        f"INSERT INTO company_kpi_rollups (company_id, day, {metric_columns}, updated_at) "
+        f"SELECT company_id, day, {totals}, CURRENT_TIMESTAMP "
+        f"FROM ({' UNION ALL '.join(selects)}) AS sources "
+        f"GROUP BY company_id, day"
+    ))
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_company_kpi_rollups_id'), table_name='company_kpi_rollups')
+    op.drop_table('company_kpi_rollups')
@@ -0,0 +1,32 @@
+"""Add companies.tier
+
+Revision ID: add_company_tier
+Revises: add_user_token_version
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_company_tier'
+down_revision: Union[str, None] = 'add_user_token_version'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Mesmo tipo de Company.tier (Enum(CompanyTier)): no PostgreSQL, o tipo companytier
+company_tier = sa.Enum('trial', 'standard', 'enterprise', name='companytier')
+
+
+def upgrade() -> None:
+    company_tier.create(op.get_bind(), checkfirst=True)
+    op.add_column('companies', sa.Column('tier', company_tier, nullable=True, server_default='standard'))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('companies') as batch_op:
+        batch_op.drop_column('tier')
+    company_tier.drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,66 @@
+"""Add stored_files, ocr_results and import_documents.content_sha256
+
+Revision ID: add_document_store
+Revises: add_company_tier
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_document_store'
+down_revision: Union[str, None] = 'add_company_tier'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Create stored_files table
+    op.create_table(
+        'stored_files',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('ref_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('last_referenced_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('sha256')
+    )
+
+    # Create ocr_results table
+    op.create_table(
+        'ocr_results',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('engine_version', sa.String(), nullable=False),
+        sa.Column('language', sa.String(), nullable=False),
+        sa.Column('text', sa.Text(), nullable=True),
+        sa.Column('confidence', sa.Float(), nullable=True),
+        sa.Column('method', sa.String(), nullable=True),
+        sa.Column('document_type', sa.String(), nullable=True),
+        sa.Column('classification_confidence', sa.Float(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['sha256'], ['stored_files.sha256'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('sha256', 'engine_version', 'language', name='uq_ocr_results_sha256_engine_language')
+    )
+    op.create_index(op.f('ix_ocr_results_id'), 'ocr_results', ['id'], unique=False)
+
+    with op.batch_alter_table('import_documents') as batch_op:
+        batch_op.add_column(sa.Column('content_sha256', sa.String(length=64), nullable=True))
+        batch_op.create_foreign_key(
+            'fk_import_documents_content_sha256', 'stored_files', ['content_sha256'], ['sha256']
+        )
+        batch_op.create_index('ix_import_documents_content_sha256', ['content_sha256'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('import_documents') as batch_op:
+        batch_op.drop_index('ix_import_documents_content_sha256')
+        batch_op.drop_constraint('fk_import_documents_content_sha256', type_='foreignkey')
+        batch_op.drop_column('content_sha256')
+    op.drop_index(op.f('ix_ocr_results_id'), table_name='ocr_results')
+    op.drop_table('ocr_results')
+    op.drop_table('stored_files')
@@ -0,0 +1,28 @@
+"""Add ocr_jobs.batch_id
+
+Revision ID: add_ocr_job_batch_id
+Revises: add_upload_sessions
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_ocr_job_batch_id'
+down_revision: Union[str, None] = 'add_upload_sessions'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('ocr_jobs', sa.Column('batch_id', sa.String(length=32), nullable=True))
+    op.create_index(op.f('ix_ocr_jobs_batch_id'), 'ocr_jobs', ['batch_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_ocr_jobs_batch_id'), table_name='ocr_jobs')
+    with op.batch_alter_table('ocr_jobs') as batch_op:
+        batch_op.drop_column('batch_id')
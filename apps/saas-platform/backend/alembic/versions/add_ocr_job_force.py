@@ -0,0 +1,26 @@
+"""Add ocr_jobs.force
+
+Revision ID: add_ocr_job_force
+Revises: add_ocr_job_batch_id
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_ocr_job_force'
+down_revision: Union[str, None] = 'add_ocr_job_batch_id'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('ocr_jobs', sa.Column('force', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('ocr_jobs') as batch_op:
+        batch_op.drop_column('force')
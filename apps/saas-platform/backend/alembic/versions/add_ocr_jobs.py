@@ -0,0 +1,45 @@
+"""Add ocr_jobs table
+
+Revision ID: add_ocr_jobs
+Revises: add_company_kpi_rollups
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_ocr_jobs'
+down_revision: Union[str, None] = 'add_company_kpi_rollups'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Create ocr_jobs table
+    op.create_table(
+        'ocr_jobs',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('document_id', sa.Integer(), nullable=False),
+        sa.Column('company_id', sa.Integer(), nullable=False),
+        sa.Column('language', sa.String(), nullable=True),
+        sa.Column('status', sa.String(), nullable=False),  # Enum stored as String
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['document_id'], ['import_documents.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['company_id'], ['companies.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_ocr_jobs_document_id'), 'ocr_jobs', ['document_id'], unique=False)
+    op.create_index(op.f('ix_ocr_jobs_status'), 'ocr_jobs', ['status'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_ocr_jobs_status'), table_name='ocr_jobs')
+    op.drop_index(op.f('ix_ocr_jobs_document_id'), table_name='ocr_jobs')
+    op.drop_table('ocr_jobs')
@@ -0,0 +1,63 @@
+"""Add tenant-scoped composite indexes
+
+Revision ID: add_tenant_indexes
+Revises: add_ocr_jobs
+Create Date: 2026-10-18 13:00:00.000000
+
+Índices compostos começando por company_id, na ordem dos filtros/ordenações
+das rotas (ex: company_id + status, company_id + created_at). No PostgreSQL
+são criados com CREATE INDEX CONCURRENTLY, sem bloquear escritas nas tabelas.
+
+Para medir o efeito com volume de produção:
+    python scripts/benchmark_tenant_indexes.py
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_tenant_indexes'
+down_revision: Union[str, None] = 'add_ocr_jobs'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (tabela, nome do índice, colunas)
+INDEXES = [
+    ('import_processes', 'ix_import_processes_company_status', ['company_id', 'status']),
+    ('import_processes', 'ix_import_processes_company_created_at', ['company_id', 'created_at']),
+    ('export_processes', 'ix_export_processes_company_status', ['company_id', 'status']),
+    ('export_processes', 'ix_export_processes_company_created_at', ['company_id', 'created_at']),
+    ('tracking_events', 'ix_tracking_events_company_shipment_timestamp', ['company_id', 'shipment_id', 'timestamp']),
+    ('tracking_events', 'ix_tracking_events_company_timestamp', ['company_id', 'timestamp']),
+    ('containers', 'ix_containers_company_status', ['company_id', 'status']),
+    ('containers', 'ix_containers_company_estimated_arrival', ['company_id', 'estimated_arrival']),
+    ('payments', 'ix_payments_company_status', ['company_id', 'status']),
+    ('payments', 'ix_payments_company_due_date', ['company_id', 'due_date']),
+    ('approvals', 'ix_approvals_company_status', ['company_id', 'status']),
+    ('compliance_checks', 'ix_compliance_checks_company_status', ['company_id', 'status']),
+    ('compliance_checks', 'ix_compliance_checks_company_created_at', ['company_id', 'created_at']),
+    ('tasks', 'ix_tasks_company_status_due_date', ['company_id', 'status', 'due_date']),
+    ('tasks', 'ix_tasks_company_due_date', ['company_id', 'due_date']),
+    ('products', 'ix_products_company_created_at', ['company_id', 'created_at']),
+    ('warehouses', 'ix_warehouses_company_created_at', ['company_id', 'created_at']),
+    ('stock_movements', 'ix_stock_movements_warehouse_movement_date', ['warehouse_id', 'movement_date']),
+    ('import_documents', 'ix_import_documents_company_process', ['company_id', 'import_process_id']),
+    ('import_documents', 'ix_import_documents_company_expiry_date', ['company_id', 'expiry_date']),
+    ('comments', 'ix_comments_company_import_process_created_at', ['company_id', 'import_process_id', 'created_at']),
+    ('comments', 'ix_comments_company_export_process_created_at', ['company_id', 'export_process_id', 'created_at']),
+    ('drawback_acts', 'ix_drawback_acts_company_created_at', ['company_id', 'created_at']),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY não pode rodar dentro de uma transação
+    with op.get_context().autocommit_block():
+        for table, name, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table, name, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,52 @@
+"""Add upload_sessions table
+
+Revision ID: add_upload_sessions
+Revises: add_document_store
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_upload_sessions'
+down_revision: Union[str, None] = 'add_document_store'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Create upload_sessions table
+    op.create_table(
+        'upload_sessions',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('file_name', sa.String(), nullable=False),
+        sa.Column('mime_type', sa.String(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('part_size', sa.Integer(), nullable=False),
+        sa.Column('company_id', sa.Integer(), nullable=False),
+        sa.Column('uploaded_by', sa.Integer(), nullable=False),
+        sa.Column('import_process_id', sa.Integer(), nullable=True),
+        sa.Column('document_type', sa.String(), nullable=True),
+        sa.Column('language', sa.String(), nullable=True),
+        sa.Column('status', sa.String(), nullable=False),  # Enum stored as String
+        sa.Column('document_id', sa.Integer(), nullable=True),
+        sa.Column('job_id', sa.String(length=32), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['company_id'], ['companies.id'], ),
+        sa.ForeignKeyConstraint(['uploaded_by'], ['users.id'], ),
+        sa.ForeignKeyConstraint(['import_process_id'], ['import_processes.id'], ),
+        sa.ForeignKeyConstraint(['document_id'], ['import_documents.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_upload_sessions_company_id'), 'upload_sessions', ['company_id'], unique=False)
+    op.create_index(op.f('ix_upload_sessions_expires_at'), 'upload_sessions', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_upload_sessions_expires_at'), table_name='upload_sessions')
+    op.drop_index(op.f('ix_upload_sessions_company_id'), table_name='upload_sessions')
+    op.drop_table('upload_sessions')
@@ -0,0 +1,63 @@
+"""
+Admin API - Diagnóstico de desempenho (apenas administradores)
+"""
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import PlainTextResponse
+from app.core.exceptions import NotFoundError
+from app.core.loop_monitor import loop_monitor
+from app.core.profiling import profile_store
+from app.core.security import require_admin_role
+from app.core.slow_queries import slow_query_log
+from app.models import User
+
+router = APIRouter()
+
+
+@router.get("/slow-queries")
+async def get_slow_queries(
+    limit: int = Query(50, ge=1, le=500),
+    current_user: User = Depends(require_admin_role)
+):
+    """
+    Consultas lentas recentes e agregadas por SQL normalizado, com o plano de execução
+    """
+    return slow_query_log.snapshot(limit)
+
+
+@router.get("/event-loop")
+async def get_event_loop_blocks(current_user: User = Depends(require_admin_role)):
+    """
+    Atraso do event loop e bloqueios por rota, com a pilha do código que bloqueou
+    """
+    return loop_monitor.snapshot()
+
+
+@router.get("/profiles")
+async def list_profiles(current_user: User = Depends(require_admin_role)):
+    """
+    Perfis de requisições enviadas com o header X-Profile: 1 (mais recentes primeiro)
+    """
+    return profile_store.list()
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    format: str = Query("json", pattern="^(json|text|folded)$"),
+    current_user: User = Depends(require_admin_role)
+):
+    """
+    Perfil de uma requisição: resumo com as funções mais amostradas (json),
+    relatório em texto (text) ou pilhas no formato folded para flame graph (folded)
+    """
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise NotFoundError("Perfil", profile_id)
+    if format == "folded":
+        return PlainTextResponse(
+            profile.folded(),
+            headers={"Content-Disposition": f'attachment; filename="profile-{profile.id}.folded"'}
+        )
+    if format == "text":
+        return PlainTextResponse(profile.report())
+    return {**profile.summary(), "functions": profile.functions()}
@@ -1,5 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
 from app.models import User
 from pydantic import BaseModel, EmailStr
@@ -22,21 +24,33 @@ class UserSchema(BaseModel):
     
     class Config:
         from_attributes = True
-from app.core.security import authenticate_user, create_access_token, get_current_user
-from app.core.database import get_db
+from app.core.security import create_access_token, get_current_user, principal_snapshot
+from app.core.password_hashing import login_slot, verify_password_async
+from app.core.database import get_db, get_async_db
 from datetime import datetime
 
 router = APIRouter()
 
 @router.post("/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
-    if not user:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Credenciais inválidas")
-    access_token = create_access_token({"sub": str(user.id), "company_id": user.company_id, "role": user.role})
-    user.last_login = datetime.utcnow()
-    db.commit()
-    return {"access_token": access_token, "token_type": "bearer", "user": user}
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    # Rota async: a verificação da senha roda no executor de hash, não no threadpool das rotas
+    async with login_slot():
+        user = (await db.execute(select(User).where(User.email == form_data.username))).scalars().first()
+        if user is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Credenciais inválidas")
+        valid, new_hash = await verify_password_async(form_data.password, user.hashed_password)
+        if not valid:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Credenciais inválidas")
+        if new_hash:
+            # UPDATE direto: a troca de esquema/custo não é troca de senha e não deve
+            # incrementar token_version (o que derrubaria as outras sessões)
+            await db.execute(update(User).where(User.id == user.id).values(hashed_password=new_hash))
+        access_token = create_access_token({
+            "sub": str(user.id), "company_id": user.company_id, "role": user.role, "ver": user.token_version
+        })
+        user.last_login = datetime.utcnow()
+        await db.commit()
+    return {"access_token": access_token, "token_type": "bearer", "user": principal_snapshot(user)}
 
 @router.get("/me", response_model=UserSchema)
 def get_current_user_info(current_user: User = Depends(get_current_user)):
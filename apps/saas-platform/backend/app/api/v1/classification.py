@@ -2,11 +2,11 @@
 Classification API - Determinação Automática de Classificação (NCM)
 """
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, and_
 from typing import Optional
-from app.core.database import get_db
-from app.core.security import get_current_user
+from app.core.database import get_async_db
+from app.core.security import get_current_user_async
 from app.models import User, Product, ImportProcess, ExportProcess
 from pydantic import BaseModel
 from decimal import Decimal
@@ -35,8 +35,8 @@ class ClassificationUpdate(BaseModel):
 @router.post("/classify", response_model=ClassificationResponse)
 async def classify_product(
     request: ClassificationRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Classificar produto automaticamente (NCM)"""
     # Mock de classificação automática
@@ -68,18 +68,18 @@ async def classify_product(
 @router.post("/products/{product_id}/classify", response_model=ClassificationResponse)
 async def classify_existing_product(
     product_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Classificar produto existente no catálogo"""
     company_id = current_user.company_id
     
-    product = db.query(Product).filter(
+    product = await db.scalar(select(Product).where(
         and_(
             Product.id == product_id,
             Product.company_id == company_id
         )
-    ).first()
+    ).limit(1))
     
     if not product:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
@@ -98,35 +98,35 @@ async def classify_existing_product(
     product.ncm = classification.ncm
     product.ncm_confidence = Decimal(str(classification.confidence))
     
-    db.commit()
+    await db.commit()
     
     return classification
 
 @router.post("/processes/import/{process_id}/classify")
 async def classify_import_process(
     process_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Classificar processo de importação"""
     company_id = current_user.company_id
     
-    process = db.query(ImportProcess).filter(
+    process = await db.scalar(select(ImportProcess).where(
         and_(
             ImportProcess.id == process_id,
             ImportProcess.company_id == company_id
         )
-    ).first()
+    ).limit(1))
     
     if not process:
         raise HTTPException(status_code=404, detail="Processo de importação não encontrado")
     
     # Se processo tem produto associado, usar dados do produto
     if process.product_id:
-        product = db.query(Product).filter(Product.id == process.product_id).first()
+        product = await db.scalar(select(Product).where(Product.id == process.product_id).limit(1))
         if product and product.ncm:
             process.ncm = product.ncm
-            db.commit()
+            await db.commit()
             return {
                 "message": "NCM aplicado do catálogo de produtos",
                 "ncm": product.ncm,
@@ -144,7 +144,7 @@ async def classify_import_process(
     
     # Aplicar classificação ao processo
     process.ncm = classification.ncm
-    db.commit()
+    await db.commit()
     
     return {
         "message": "Processo classificado com sucesso",
@@ -155,28 +155,28 @@ async def classify_import_process(
 @router.post("/processes/export/{process_id}/classify")
 async def classify_export_process(
     process_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Classificar processo de exportação"""
     company_id = current_user.company_id
     
-    process = db.query(ExportProcess).filter(
+    process = await db.scalar(select(ExportProcess).where(
         and_(
             ExportProcess.id == process_id,
             ExportProcess.company_id == company_id
         )
-    ).first()
+    ).limit(1))
     
     if not process:
         raise HTTPException(status_code=404, detail="Processo de exportação não encontrado")
     
     # Se processo tem produto associado, usar dados do produto
     if process.product_id:
-        product = db.query(Product).filter(Product.id == process.product_id).first()
+        product = await db.scalar(select(Product).where(Product.id == process.product_id).limit(1))
         if product and product.ncm:
             process.ncm = product.ncm
-            db.commit()
+            await db.commit()
             return {
                 "message": "NCM aplicado do catálogo de produtos",
                 "ncm": product.ncm,
@@ -194,7 +194,7 @@ async def classify_export_process(
     
     # Aplicar classificação ao processo
     process.ncm = classification.ncm
-    db.commit()
+    await db.commit()
     
     return {
         "message": "Processo classificado com sucesso",
@@ -205,8 +205,8 @@ async def classify_export_process(
 @router.get("/ncm/{ncm_code}/info")
 async def get_ncm_info(
     ncm_code: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Obter informações sobre um código NCM"""
     # Mock - em produção, buscar em base de dados oficial
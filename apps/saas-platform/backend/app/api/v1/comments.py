@@ -2,7 +2,7 @@
 API para comentários e colaboração em processos
 """
 from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from typing import List, Optional
 from datetime import datetime
 import json
@@ -66,6 +66,23 @@ except AttributeError:
     # Pydantic v1 não tem model_rebuild, mas funciona sem ele
     pass
 
+def _comment_response_dict(comment: Comment, attachments_by_comment: dict) -> dict:
+    """Campos de CommentResponse de um comentário (respostas preenchidas por quem chama)"""
+    author = comment.created_by_user
+    return {
+        "id": comment.id,
+        "text": comment.text,
+        "mentions": json.loads(comment.mentions) if comment.mentions else None,
+        "created_by": comment.created_by,
+        "created_by_name": author.name if author else "Usuário",
+        "created_by_role": author.role.value if author and author.role else None,
+        "parent_comment_id": comment.parent_comment_id,
+        "attachments": attachments_by_comment.get(comment.id, []),
+        "replies": [],
+        "created_at": comment.created_at,
+        "updated_at": comment.updated_at
+    }
+
 @router.get("/processes/{process_id}/comments", response_model=List[CommentResponse])
 def get_process_comments(
     process_id: str,
@@ -90,7 +107,7 @@ def get_process_comments(
         ).first()
         
         if import_process:
-            comments = db.query(Comment).filter(
+            comments = db.query(Comment).options(selectinload(Comment.created_by_user)).filter(
                 Comment.import_process_id == process_id_int,
                 Comment.company_id == current_user.company_id,
                 Comment.deleted == False,
@@ -108,64 +125,38 @@ def get_process_comments(
                     resource="Process"
                 )
             
-            comments = db.query(Comment).filter(
+            comments = db.query(Comment).options(selectinload(Comment.created_by_user)).filter(
                 Comment.export_process_id == process_id_int,
                 Comment.company_id == current_user.company_id,
                 Comment.deleted == False,
                 Comment.parent_comment_id == None
             ).order_by(Comment.created_at.desc()).limit(limit).all()
         
+        # Anexos, respostas e autores carregados em lote (uma consulta cada, não por comentário)
+        replies_by_parent = {}
+        if include_replies and comments:
+            replies = db.query(Comment).options(selectinload(Comment.created_by_user)).filter(
+                Comment.parent_comment_id.in_([comment.id for comment in comments]),
+                Comment.deleted == False
+            ).order_by(Comment.created_at.asc()).all()
+            for reply in replies:
+                replies_by_parent.setdefault(reply.parent_comment_id, []).append(reply)
+        
+        comment_ids = [comment.id for comment in comments]
+        comment_ids += [reply.id for replies in replies_by_parent.values() for reply in replies]
+        attachments_by_comment = {}
+        if comment_ids:
+            for attachment in db.query(CommentAttachment).filter(CommentAttachment.comment_id.in_(comment_ids)).all():
+                attachments_by_comment.setdefault(attachment.comment_id, []).append(attachment)
+        
         # Converter para response
         result = []
         for comment in comments:
-            comment_dict = {
-                "id": comment.id,
-                "text": comment.text,
-                "mentions": json.loads(comment.mentions) if comment.mentions else None,
-                "created_by": comment.created_by,
-                "created_by_name": comment.created_by_user.name if comment.created_by_user else "Usuário",
-                "created_by_role": comment.created_by_user.role.value if comment.created_by_user and comment.created_by_user.role else None,
-                "parent_comment_id": comment.parent_comment_id,
-                "attachments": [
-                    AttachmentResponse.model_validate(att) 
-                    for att in db.query(CommentAttachment).filter(
-                        CommentAttachment.comment_id == comment.id
-                    ).all()
-                ],
-                "replies": [],
-                "created_at": comment.created_at,
-                "updated_at": comment.updated_at
-            }
-            
-            # Buscar replies se solicitado
-            if include_replies:
-                replies = db.query(Comment).filter(
-                    Comment.parent_comment_id == comment.id,
-                    Comment.deleted == False
-                ).order_by(Comment.created_at.asc()).all()
-                
-                comment_dict["replies"] = [
-                    {
-                        "id": reply.id,
-                        "text": reply.text,
-                        "mentions": json.loads(reply.mentions) if reply.mentions else None,
-                        "created_by": reply.created_by,
-                        "created_by_name": reply.created_by_user.name if reply.created_by_user else "Usuário",
-                        "created_by_role": reply.created_by_user.role.value if reply.created_by_user and reply.created_by_user.role else None,
-                        "parent_comment_id": reply.parent_comment_id,
-                        "attachments": [
-                            AttachmentResponse.model_validate(att) 
-                            for att in db.query(CommentAttachment).filter(
-                                CommentAttachment.comment_id == reply.id
-                            ).all()
-                        ],
-                        "replies": [],
-                        "created_at": reply.created_at,
-                        "updated_at": reply.updated_at
-                    }
-                    for reply in replies
-                ]
-            
+            comment_dict = _comment_response_dict(comment, attachments_by_comment)
+            comment_dict["replies"] = [
+                _comment_response_dict(reply, attachments_by_comment)
+                for reply in replies_by_parent.get(comment.id, [])
+            ]
             result.append(CommentResponse(**comment_dict))
         
         return result
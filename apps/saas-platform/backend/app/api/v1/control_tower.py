@@ -2,12 +2,14 @@
 Control Tower API - Visão única de toda a supply chain
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, and_
 from typing import List, Optional
 from datetime import datetime, timedelta
-from app.core.database import get_db
-from app.core.security import get_current_user
+from app.core.database import get_async_db
+from app.core.security import get_current_user_async
+from app.core.cache import cached_response, invalidate_on_write
+from app.services.control_tower_service import ControlTowerAggregator
 from app.models import (
     User, Company, ImportProcess, ExportProcess, Container,
     TrackingEvent, ComplianceCheck, Payment, Approval,
@@ -17,6 +19,14 @@ from pydantic import BaseModel
 
 router = APIRouter()
 
+# Respostas cacheadas por empresa; invalidadas quando os modelos abaixo são gravados
+CACHE_NAMESPACE = "control-tower"
+invalidate_on_write(
+    CACHE_NAMESPACE,
+    ImportProcess, ExportProcess, Container, TrackingEvent,
+    ComplianceCheck, Payment, Approval, Warehouse
+)
+
 # Schemas
 class ControlTowerSummary(BaseModel):
     """Resumo geral do Control Tower"""
@@ -52,66 +62,10 @@ class ControlTowerDashboard(BaseModel):
     financial_summary: dict
     logistics_summary: dict
 
-@router.get("/summary", response_model=ControlTowerSummary)
-async def get_control_tower_summary(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    """Obter resumo geral do Control Tower"""
-    company_id = current_user.company_id
-    
-    # Total de processos
-    total_imports = db.query(ImportProcess).filter(
-        ImportProcess.company_id == company_id
-    ).count()
-    total_exports = db.query(ExportProcess).filter(
-        ExportProcess.company_id == company_id
-    ).count()
-    total_processes = total_imports + total_exports
-    
-    # Processos ativos
-    active_imports = db.query(ImportProcess).filter(
-        and_(
-            ImportProcess.company_id == company_id,
-            ImportProcess.status.in_(["pending", "in_progress"])
-        )
-    ).count()
-    active_exports = db.query(ExportProcess).filter(
-        and_(
-            ExportProcess.company_id == company_id,
-            ExportProcess.status.in_(["pending", "in_progress", "shipped"])
-        )
-    ).count()
-    active_processes = active_imports + active_exports
-    
-    # Aprovações pendentes
-    pending_approvals = db.query(Approval).filter(
-        and_(
-            Approval.company_id == company_id,
-            Approval.status == "pending"
-        )
-    ).count()
-    
-    # Alertas críticos (compliance não-compliant)
-    critical_alerts = db.query(ComplianceCheck).filter(
-        and_(
-            ComplianceCheck.company_id == company_id,
-            ComplianceCheck.status == "non-compliant",
-            ComplianceCheck.required == True
-        )
-    ).count()
-    
-    # Taxa de compliance
-    total_checks = db.query(ComplianceCheck).filter(
-        ComplianceCheck.company_id == company_id
-    ).count()
-    compliant_checks = db.query(ComplianceCheck).filter(
-        and_(
-            ComplianceCheck.company_id == company_id,
-            ComplianceCheck.status == "compliant"
-        )
-    ).count()
-    compliance_rate = (compliant_checks / total_checks * 100) if total_checks > 0 else 100.0
+def _build_summary(counters: dict) -> ControlTowerSummary:
+    """Monta o resumo do Control Tower a partir dos contadores agregados"""
+    total_checks = counters["checks_total"]
+    compliance_rate = (counters["checks_compliant"] / total_checks * 100) if total_checks > 0 else 100.0
     
     # Taxa de entrega no prazo (simplificado)
     on_time_delivery_rate = 95.0  # Mock - calcular baseado em dados reais
@@ -121,69 +75,66 @@ async def get_control_tower_summary(
     currency = "USD"
     
     return ControlTowerSummary(
-        total_processes=total_processes,
-        active_processes=active_processes,
-        pending_approvals=pending_approvals,
-        critical_alerts=critical_alerts,
+        total_processes=counters["imports_total"] + counters["exports_total"],
+        active_processes=counters["imports_active"] + counters["exports_active"],
+        pending_approvals=counters["approvals_pending"],
+        critical_alerts=counters["checks_critical"],
         compliance_rate=round(compliance_rate, 2),
         on_time_delivery_rate=on_time_delivery_rate,
         total_value=total_value,
         currency=currency
     )
 
+def _build_status_summaries(counts: List[tuple]) -> List[ProcessStatusSummary]:
+    """Converte pares (status, count) em resumos com percentual"""
+    total = sum(count for _, count in counts)
+    return [ProcessStatusSummary(
+        status=status,
+        count=count,
+        percentage=round((count / total * 100) if total > 0 else 0, 2)
+    ) for status, count in counts]
+
+@router.get("/summary", response_model=ControlTowerSummary)
+@cached_response(CACHE_NAMESPACE, ttl=30)
+async def get_control_tower_summary(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """Obter resumo geral do Control Tower"""
+    counters = await db.run_sync(lambda session: ControlTowerAggregator(session).get_counters(current_user.company_id))
+    return _build_summary(counters)
+
 @router.get("/dashboard", response_model=ControlTowerDashboard)
+@cached_response(CACHE_NAMESPACE, ttl=30)
 async def get_control_tower_dashboard(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Obter dashboard completo do Control Tower"""
     company_id = current_user.company_id
     
-    # Resumo geral
-    summary = await get_control_tower_summary(db, current_user)
-    
-    # Status de importações
-    import_statuses = []
-    import_counts = db.query(
-        ImportProcess.status,
-        func.count(ImportProcess.id).label('count')
-    ).filter(
-        ImportProcess.company_id == company_id
-    ).group_by(ImportProcess.status).all()
-    
-    total_imports = sum(count for _, count in import_counts)
-    for status, count in import_counts:
-        import_statuses.append(ProcessStatusSummary(
-            status=status,
-            count=count,
-            percentage=round((count / total_imports * 100) if total_imports > 0 else 0, 2)
-        ))
-    
-    # Status de exportações
-    export_statuses = []
-    export_counts = db.query(
-        ExportProcess.status,
-        func.count(ExportProcess.id).label('count')
-    ).filter(
-        ExportProcess.company_id == company_id
-    ).group_by(ExportProcess.status).all()
+    # Contadores e distribuição por status (2 consultas agregadas)
+    # O agregador é síncrono; run_sync o executa sobre a conexão assíncrona
+    def aggregate(session):
+        aggregator = ControlTowerAggregator(session)
+        return aggregator.get_counters(company_id), aggregator.get_status_breakdown(company_id)
+
+    counters, breakdown = await db.run_sync(aggregate)
     
-    total_exports = sum(count for _, count in export_counts)
-    for status, count in export_counts:
-        export_statuses.append(ProcessStatusSummary(
-            status=status,
-            count=count,
-            percentage=round((count / total_exports * 100) if total_exports > 0 else 0, 2)
-        ))
+    summary = _build_summary(counters)
+    import_statuses = _build_status_summaries(breakdown["import"])
+    export_statuses = _build_status_summaries(breakdown["export"])
     
     # Alertas críticos
-    critical_checks = db.query(ComplianceCheck).filter(
-        and_(
-            ComplianceCheck.company_id == company_id,
-            ComplianceCheck.status == "non-compliant",
-            ComplianceCheck.required == True
-        )
-    ).limit(10).all()
+    critical_checks = (await db.scalars(
+        select(ComplianceCheck).where(
+            and_(
+                ComplianceCheck.company_id == company_id,
+                ComplianceCheck.status == "non-compliant",
+                ComplianceCheck.required == True
+            )
+        ).limit(10)
+    )).all()
     
     critical_alerts = [AlertSummary(
         type="critical",
@@ -197,9 +148,11 @@ async def get_control_tower_dashboard(
     )]
     
     # Eventos recentes
-    recent_events = db.query(TrackingEvent).filter(
-        TrackingEvent.company_id == company_id
-    ).order_by(TrackingEvent.timestamp.desc()).limit(10).all()
+    recent_events = (await db.scalars(
+        select(TrackingEvent).where(
+            TrackingEvent.company_id == company_id
+        ).order_by(TrackingEvent.timestamp.desc()).limit(10)
+    )).all()
     
     recent_events_list = [{
         "id": event.id,
@@ -212,56 +165,23 @@ async def get_control_tower_dashboard(
     
     # Overview de compliance
     compliance_overview = {
-        "total": db.query(ComplianceCheck).filter(
-            ComplianceCheck.company_id == company_id
-        ).count(),
-        "compliant": db.query(ComplianceCheck).filter(
-            and_(
-                ComplianceCheck.company_id == company_id,
-                ComplianceCheck.status == "compliant"
-            )
-        ).count(),
-        "non_compliant": db.query(ComplianceCheck).filter(
-            and_(
-                ComplianceCheck.company_id == company_id,
-                ComplianceCheck.status == "non-compliant"
-            )
-        ).count(),
-        "pending": db.query(ComplianceCheck).filter(
-            and_(
-                ComplianceCheck.company_id == company_id,
-                ComplianceCheck.status == "pending"
-            )
-        ).count()
+        "total": counters["checks_total"],
+        "compliant": counters["checks_compliant"],
+        "non_compliant": counters["checks_non_compliant"],
+        "pending": counters["checks_pending"]
     }
     
     # Resumo financeiro
     financial_summary = {
-        "total_payments": db.query(Payment).filter(
-            Payment.company_id == company_id
-        ).count(),
-        "pending_payments": db.query(Payment).filter(
-            and_(
-                Payment.company_id == company_id,
-                Payment.status == "pending"
-            )
-        ).count()
+        "total_payments": counters["payments_total"],
+        "pending_payments": counters["payments_pending"]
     }
     
     # Resumo logístico
     logistics_summary = {
-        "total_containers": db.query(Container).filter(
-            Container.company_id == company_id
-        ).count(),
-        "in_transit": db.query(Container).filter(
-            and_(
-                Container.company_id == company_id,
-                Container.status == "in_transit"
-            )
-        ).count(),
-        "total_warehouses": db.query(Warehouse).filter(
-            Warehouse.company_id == company_id
-        ).count()
+        "total_containers": counters["containers_total"],
+        "in_transit": counters["containers_in_transit"],
+        "total_warehouses": counters["warehouses_total"]
     }
     
     return ControlTowerDashboard(
@@ -276,9 +196,10 @@ async def get_control_tower_dashboard(
     )
 
 @router.get("/processes/all")
+@cached_response(CACHE_NAMESPACE, ttl=30)
 async def get_all_processes(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async),
     status: Optional[str] = None,
     limit: int = Query(50, le=100)
 ):
@@ -286,22 +207,22 @@ async def get_all_processes(
     company_id = current_user.company_id
     
     # Importações
-    import_query = db.query(ImportProcess).filter(
+    import_query = select(ImportProcess).where(
         ImportProcess.company_id == company_id
     )
     if status:
-        import_query = import_query.filter(ImportProcess.status == status)
+        import_query = import_query.where(ImportProcess.status == status)
     
-    imports = import_query.limit(limit).all()
+    imports = (await db.scalars(import_query.limit(limit))).all()
     
     # Exportações
-    export_query = db.query(ExportProcess).filter(
+    export_query = select(ExportProcess).where(
         ExportProcess.company_id == company_id
     )
     if status:
-        export_query = export_query.filter(ExportProcess.status == status)
+        export_query = export_query.where(ExportProcess.status == status)
     
-    exports = export_query.limit(limit).all()
+    exports = (await db.scalars(export_query.limit(limit))).all()
     
     processes = []
     for imp in imports:
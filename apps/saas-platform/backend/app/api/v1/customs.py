@@ -2,12 +2,12 @@
 Advanced Customs API - Módulo de Alfândega Avançado
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, and_
 from typing import List, Optional
 from datetime import datetime
-from app.core.database import get_db
-from app.core.security import get_current_user
+from app.core.database import get_async_db
+from app.core.security import get_current_user_async
 from app.models import (
     User, Company, ImportProcess, ExportProcess, ImportDocument,
     ComplianceCheck, ComplianceStatus
@@ -47,19 +47,19 @@ class SiscomexIntegration(BaseModel):
 async def get_customs_status(
     process_id: int,
     process_type: str = Query(..., description="Tipo: 'import' ou 'export'"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Obter status de desembaraço de um processo"""
     company_id = current_user.company_id
     
     if process_type == "import":
-        process = db.query(ImportProcess).filter(
+        process = await db.scalar(select(ImportProcess).where(
             and_(
                 ImportProcess.id == process_id,
                 ImportProcess.company_id == company_id
             )
-        ).first()
+        ).limit(1))
         if not process:
             raise HTTPException(status_code=404, detail="Processo de importação não encontrado")
         
@@ -82,12 +82,12 @@ async def get_customs_status(
         )
     
     elif process_type == "export":
-        process = db.query(ExportProcess).filter(
+        process = await db.scalar(select(ExportProcess).where(
             and_(
                 ExportProcess.id == process_id,
                 ExportProcess.company_id == company_id
             )
-        ).first()
+        ).limit(1))
         if not process:
             raise HTTPException(status_code=404, detail="Processo de exportação não encontrado")
         
@@ -114,19 +114,19 @@ async def get_customs_status(
 async def validate_customs_documents(
     process_id: int,
     process_type: str = Query(..., description="Tipo: 'import' ou 'export'"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Validar documentos aduaneiros de um processo"""
     company_id = current_user.company_id
     
     if process_type == "import":
-        process = db.query(ImportProcess).filter(
+        process = await db.scalar(select(ImportProcess).where(
             and_(
                 ImportProcess.id == process_id,
                 ImportProcess.company_id == company_id
             )
-        ).first()
+        ).limit(1))
         if not process:
             raise HTTPException(status_code=404, detail="Processo de importação não encontrado")
         
@@ -140,12 +140,12 @@ async def validate_customs_documents(
         ]
         
     elif process_type == "export":
-        process = db.query(ExportProcess).filter(
+        process = await db.scalar(select(ExportProcess).where(
             and_(
                 ExportProcess.id == process_id,
                 ExportProcess.company_id == company_id
             )
-        ).first()
+        ).limit(1))
         if not process:
             raise HTTPException(status_code=404, detail="Processo de exportação não encontrado")
         
@@ -161,20 +161,20 @@ async def validate_customs_documents(
         raise HTTPException(status_code=400, detail="Tipo de processo inválido")
     
     # Verificar documentos existentes
-    documents = db.query(ImportDocument).filter(
+    documents = (await db.scalars(select(ImportDocument).where(
         ImportDocument.import_process_id == process_id
-    ).all()
+    ))).all()
     
     existing_doc_types = [doc.document_type for doc in documents]
     missing_docs = [doc for doc in required_docs if doc not in existing_doc_types]
     
     # Verificar compliance
-    compliance_checks = db.query(ComplianceCheck).filter(
+    compliance_checks = (await db.scalars(select(ComplianceCheck).where(
         and_(
             ComplianceCheck.import_process_id == process_id if process_type == "import" else False,
             ComplianceCheck.export_process_id == process_id if process_type == "export" else False
         )
-    ).all()
+    ))).all()
     
     errors = []
     warnings = []
@@ -203,8 +203,8 @@ async def validate_customs_documents(
 async def submit_to_customs(
     process_id: int,
     process_type: str = Query(..., description="Tipo: 'import' ou 'export'"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Submeter processo para desembaraço aduaneiro"""
     company_id = current_user.company_id
@@ -219,18 +219,18 @@ async def submit_to_customs(
         )
     
     if process_type == "import":
-        process = db.query(ImportProcess).filter(
+        process = await db.scalar(select(ImportProcess).where(
             and_(
                 ImportProcess.id == process_id,
                 ImportProcess.company_id == company_id
             )
-        ).first()
+        ).limit(1))
         if not process:
             raise HTTPException(status_code=404, detail="Processo de importação não encontrado")
         
         # Atualizar status
         process.status = "in_progress"
-        db.commit()
+        await db.commit()
         
         return {
             "message": "Processo submetido para desembaraço com sucesso",
@@ -239,18 +239,18 @@ async def submit_to_customs(
         }
     
     elif process_type == "export":
-        process = db.query(ExportProcess).filter(
+        process = await db.scalar(select(ExportProcess).where(
             and_(
                 ExportProcess.id == process_id,
                 ExportProcess.company_id == company_id
             )
-        ).first()
+        ).limit(1))
         if not process:
             raise HTTPException(status_code=404, detail="Processo de exportação não encontrado")
         
         # Atualizar status
         process.status = "in_progress"
-        db.commit()
+        await db.commit()
         
         return {
             "message": "Processo submetido para desembaraço com sucesso",
@@ -263,8 +263,8 @@ async def submit_to_customs(
 @router.get("/siscomex/{duimp_number}", response_model=SiscomexIntegration)
 async def get_siscomex_status(
     duimp_number: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Obter status do Siscomex para uma DUIMP"""
     # Mock de integração com Siscomex
@@ -287,19 +287,19 @@ async def get_siscomex_status(
 async def sync_siscomex(
     process_id: int,
     process_type: str = Query(..., description="Tipo: 'import' ou 'export'"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Sincronizar status com Siscomex"""
     company_id = current_user.company_id
     
     if process_type == "import":
-        process = db.query(ImportProcess).filter(
+        process = await db.scalar(select(ImportProcess).where(
             and_(
                 ImportProcess.id == process_id,
                 ImportProcess.company_id == company_id
             )
-        ).first()
+        ).limit(1))
         if not process:
             raise HTTPException(status_code=404, detail="Processo de importação não encontrado")
         
@@ -3,20 +3,33 @@ API para dashboard inteligente com KPIs preditivos e alertas
 """
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_
+from sqlalchemy import func, and_, or_, select
 from typing import List, Optional
 from datetime import datetime, timedelta
 from pydantic import BaseModel
 from app.models import (
     User, ImportProcess, ExportProcess, Payment, Container,
-    ComplianceCheck, ComplianceStatus, TrackingEvent, ImportDocument
+    ComplianceCheck, ComplianceStatus, TrackingEvent, ImportDocument,
+    CompanyKPIRollup
 )
 from app.core.security import get_current_user
 from app.core.database import get_db
 from app.core.logging_config import logger
+from app.core.cache import cached_response, invalidate_on_write
+from app.services.kpi_service import KPIEngine
+from app.services.kpi_rollup_service import rollup_totals
+from app.services.timeseries_service import TimeSeriesAggregator, add_months, bucket_start
 
 router = APIRouter()
 
+# Respostas cacheadas por empresa; invalidadas quando os modelos abaixo são gravados
+CACHE_NAMESPACE = "dashboard"
+invalidate_on_write(
+    CACHE_NAMESPACE,
+    ImportProcess, ExportProcess, Payment, Container,
+    ComplianceCheck, TrackingEvent, ImportDocument
+)
+
 # Schemas Pydantic
 class PredictiveKPI(BaseModel):
     id: str
@@ -45,6 +58,7 @@ class PerformanceDataPoint(BaseModel):
     custos: float
 
 @router.get("/predictive-kpis", response_model=List[PredictiveKPI])
+@cached_response(CACHE_NAMESPACE, ttl=60)
 def get_predictive_kpis(
     timeframe: str = Query("30days", pattern="^(7days|30days|90days)$"),
     db: Session = Depends(get_db),
@@ -68,13 +82,13 @@ def get_predictive_kpis(
     
     period_end = datetime.utcnow()
     
+    # Totais do período a partir do rollup diário (uma consulta)
+    totals = db.execute(
+        select(rollup_totals(current_user.company_id, start=period_start.date()))
+    ).mappings().one()
+    
     # 1. Processos Concluídos
-    completed_processes = db.query(func.count(ImportProcess.id)).filter(
-        ImportProcess.company_id == current_user.company_id,
-        ImportProcess.status == "completed",
-        ImportProcess.created_at >= period_start,
-        ImportProcess.created_at <= period_end
-    ).scalar() or 0
+    completed_processes = int(totals["imports_completed"])
     
     # Calcular média mensal
     months_in_period = (period_end - period_start).days / 30
@@ -97,27 +111,31 @@ def get_predictive_kpis(
     )
     
     # 2. Tempo Médio de Desembaraço
-    # Buscar processos com desembaraço concluído
-    cleared_processes = db.query(ImportProcess).filter(
-        ImportProcess.company_id == current_user.company_id,
-        ImportProcess.customs_clearance_date.isnot(None),
-        ImportProcess.created_at >= period_start
-    ).all()
-    
-    if cleared_processes:
-        avg_clearance_days = sum(
-            (p.customs_clearance_date - p.created_at).days 
-            for p in cleared_processes 
-            if p.customs_clearance_date
-        ) / len(cleared_processes)
+    # Média e percentis calculados no banco, sem carregar os processos
+    clearance = KPIEngine(db).duration_stats(
+        ImportProcess.created_at,
+        ImportProcess.customs_clearance_date,
+        [
+            ImportProcess.company_id == current_user.company_id,
+            ImportProcess.created_at >= period_start
+        ]
+    )
+    
+    if clearance["count"] > 0:
+        avg_clearance_days = clearance["avg"]
         
         # Previsão: redução de 15% (otimização)
         predicted_days = max(1, int(avg_clearance_days * 0.85))
         confidence_days = 75.0
+        clearance_insight = (
+            f"Mediana de {clearance['p50']:.0f} dia(s) e p90 de {clearance['p90']:.0f} dia(s) "
+            f"em {clearance['count']} processo(s). Melhoria esperada devido à otimização de processos"
+        )
     else:
         avg_clearance_days = 12
         predicted_days = 10
         confidence_days = 75.0
+        clearance_insight = "Melhoria esperada devido à otimização de processos"
     
     kpi_desembaraco = PredictiveKPI(
         id="kpi-2",
@@ -127,15 +145,12 @@ def get_predictive_kpis(
         trend="down",
         confidence=confidence_days,
         timeframe="Próximas 2 semanas",
-        insight="Melhoria esperada devido à otimização de processos",
+        insight=clearance_insight,
         action="/import/processes?status=desembaraco"
     )
     
     # 3. Custos Operacionais
-    total_payments = db.query(func.sum(Payment.amount)).filter(
-        Payment.company_id == current_user.company_id,
-        Payment.created_at >= period_start
-    ).scalar() or 0
+    total_payments = float(totals["payments_amount"])
     
     avg_monthly_cost = total_payments / months_in_period if months_in_period > 0 else 0
     
@@ -156,16 +171,8 @@ def get_predictive_kpis(
     )
     
     # 4. Taxa de Compliance
-    total_checks = db.query(func.count(ComplianceCheck.id)).filter(
-        ComplianceCheck.company_id == current_user.company_id,
-        ComplianceCheck.created_at >= period_start
-    ).scalar() or 0
-    
-    compliant_checks = db.query(func.count(ComplianceCheck.id)).filter(
-        ComplianceCheck.company_id == current_user.company_id,
-        ComplianceCheck.status == ComplianceStatus.compliant,
-        ComplianceCheck.created_at >= period_start
-    ).scalar() or 0
+    total_checks = int(totals["checks_total"])
+    compliant_checks = int(totals["checks_compliant"])
     
     current_compliance = (compliant_checks / total_checks * 100) if total_checks > 0 else 94
     predicted_compliance = min(100, current_compliance + 2)  # Melhoria de 2%
@@ -186,6 +193,7 @@ def get_predictive_kpis(
     return [kpi_processos, kpi_desembaraco, kpi_custos, kpi_compliance]
 
 @router.get("/proactive-alerts", response_model=List[ProactiveAlert])
+@cached_response(CACHE_NAMESPACE, ttl=60)
 def get_proactive_alerts(
     limit: int = Query(10, ge=1, le=50),
     db: Session = Depends(get_db),
@@ -273,60 +281,59 @@ def get_proactive_alerts(
     return alerts[:limit]
 
 @router.get("/performance-data", response_model=List[PerformanceDataPoint])
+@cached_response(CACHE_NAMESPACE, ttl=60)
 def get_performance_data(
     months: int = Query(6, ge=1, le=12),
+    granularity: str = Query("month", pattern="^(week|month|quarter)$"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Obter dados de performance para gráficos
+    
+    A janela cobre os últimos `months` meses, agrupados por semana, mês ou trimestre.
+    Lê do rollup diário, então o número de consultas não depende da janela.
     """
     logger.info(f"Buscando dados de performance para usuário {current_user.id}")
     
-    data_points = []
-    now = datetime.utcnow()
+    aggregator = TimeSeriesAggregator(db)
+    today = datetime.utcnow().date()
+    window_start = bucket_start(add_months(today.replace(day=1), -(months - 1)), granularity)
+    buckets = aggregator.buckets(window_start, today, granularity)
     
-    for i in range(months - 1, -1, -1):
-        month_start = (now - timedelta(days=30 * i)).replace(day=1, hour=0, minute=0, second=0)
-        month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-        
-        # Processos do mês
-        processos = db.query(func.count(ImportProcess.id)).filter(
-            ImportProcess.company_id == current_user.company_id,
-            ImportProcess.created_at >= month_start,
-            ImportProcess.created_at <= month_end
-        ).scalar() or 0
-        
-        # Compliance do mês
-        total_checks = db.query(func.count(ComplianceCheck.id)).filter(
-            ComplianceCheck.company_id == current_user.company_id,
-            ComplianceCheck.created_at >= month_start,
-            ComplianceCheck.created_at <= month_end
-        ).scalar() or 0
-        
-        compliant_checks = db.query(func.count(ComplianceCheck.id)).filter(
-            ComplianceCheck.company_id == current_user.company_id,
-            ComplianceCheck.status == ComplianceStatus.compliant,
-            ComplianceCheck.created_at >= month_start,
-            ComplianceCheck.created_at <= month_end
-        ).scalar() or 0
-        
-        compliance_rate = (compliant_checks / total_checks * 100) if total_checks > 0 else 92
+    # Processos, compliance e custos por período: um GROUP BY sobre o rollup diário
+    series = aggregator.aggregate(
+        CompanyKPIRollup.day,
+        {
+            "processos": func.sum(CompanyKPIRollup.imports_total),
+            "checks_total": func.sum(CompanyKPIRollup.checks_total),
+            "checks_compliant": func.sum(CompanyKPIRollup.checks_compliant),
+            "custos": func.sum(CompanyKPIRollup.payments_amount)
+        },
+        [CompanyKPIRollup.company_id == current_user.company_id],
+        window_start,
+        granularity
+    )
+    
+    data_points = []
+    for bucket, point in zip(
+        buckets,
+        aggregator.zero_fill(buckets, series, ["processos", "checks_total", "checks_compliant", "custos"])
+    ):
+        compliance_rate = (point["checks_compliant"] / point["checks_total"] * 100) if point["checks_total"] > 0 else 92
         
-        # Custos do mês
-        custos = db.query(func.sum(Payment.amount)).filter(
-            Payment.company_id == current_user.company_id,
-            Payment.created_at >= month_start,
-            Payment.created_at <= month_end
-        ).scalar() or 0
+        if granularity == "week":
+            label = bucket.strftime("%d/%m")
+        elif granularity == "quarter":
+            label = f"T{(bucket.month - 1) // 3 + 1}/{bucket.strftime('%y')}"
+        else:
+            label = bucket.strftime("%b")
         
-        month_name = month_start.strftime("%b")
         data_points.append(PerformanceDataPoint(
-            month=month_name,
-            processos=processos,
+            month=label,
+            processos=int(point["processos"]),
             compliance=round(compliance_rate, 1),
-            custos=float(custos) if custos else 0.0
+            custos=float(point["custos"]) if point["custos"] else 0.0
         ))
     
     return data_points
-
@@ -2,20 +2,30 @@
 API para gestão de documentos com OCR e upload múltiplo
 """
 
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Response, Body
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Response, Body, Request
 from fastapi.responses import FileResponse, StreamingResponse
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from pydantic import BaseModel
-from app.models import User, ImportDocument, ImportProcess, DocumentStatus
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
+from typing import Callable, List, Optional
+from pydantic import BaseModel, Field
+from app.models import (
+    User, ImportDocument, ImportProcess, DocumentStatus, OCRJob, OCRJobStatus,
+    UploadSession, UploadSessionStatus
+)
 from app.schemas import ImportDocument as ImportDocumentSchema, ImportDocumentCreate
-from app.core.security import get_current_user
-from app.core.database import get_db
-from app.core.exceptions import NotFoundError, BusinessLogicError
+from app.core.security import get_current_user, get_current_user_async
+from app.core.database import get_db, get_async_db
+from app.core.exceptions import NotFoundError, BusinessLogicError, ConflictError
 from app.core.logging_config import logger
-from app.services.ocr_service import get_ocr_service
-from datetime import datetime
+from starlette.concurrency import run_in_threadpool
+from app.services.document_store import FileTooLargeError, StoredObject, document_store
+from app.services.ocr_queue import enqueue_ocr_job, enqueue_ocr_jobs
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 import tempfile
+import threading
+import uuid
 import os
 from pathlib import Path
 import shutil
@@ -38,20 +48,144 @@ ALLOWED_TYPES = {
     'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': ['.xlsx'],
 }
 
+# Assinatura (magic bytes) do início do arquivo por tipo; DOCX/XLSX são ZIP, DOC/XLS são OLE2
+OLE2_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+ZIP_SIGNATURE = b'PK\x03\x04'
+FILE_SIGNATURES = {
+    'application/pdf': [b'%PDF-'],
+    'image/png': [b'\x89PNG\r\n\x1a\n'],
+    'image/jpeg': [b'\xff\xd8\xff'],
+    'image/jpg': [b'\xff\xd8\xff'],
+    'application/msword': [OLE2_SIGNATURE],
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document': [ZIP_SIGNATURE],
+    'application/vnd.ms-excel': [OLE2_SIGNATURE],
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': [ZIP_SIGNATURE],
+}
+# O cabeçalho %PDF- pode vir depois de alguns bytes (tolerado pelos leitores de PDF)
+PDF_SIGNATURE_WINDOW = 1024
+
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
 
+# Arquivos do upload múltiplo gravados ao mesmo tempo (por processo)
+UPLOAD_BATCH_WORKERS = int(os.getenv("UPLOAD_BATCH_WORKERS", 4))
+
+# Uploads em partes (retomáveis), para arquivos grandes em conexões instáveis
+CHUNKED_UPLOAD_MAX_SIZE = int(os.getenv("CHUNKED_UPLOAD_MAX_SIZE", 1024 * 1024 * 1024))  # 1GB
+CHUNKED_UPLOAD_PART_SIZE = int(os.getenv("CHUNKED_UPLOAD_PART_SIZE", 8 * 1024 * 1024))  # 8MB
+# Uploads não concluídos nesse prazo são descartados (horas)
+CHUNKED_UPLOAD_TTL_HOURS = float(os.getenv("CHUNKED_UPLOAD_TTL_HOURS", 24))
+
+
+def check_signature(content_type: str) -> Callable[[bytes], None]:
+    """Validação do início do arquivo: o conteúdo precisa ser do tipo declarado"""
+    def validate(header: bytes):
+        signatures = FILE_SIGNATURES.get(content_type, [])
+        if content_type == 'application/pdf':
+            matches = signatures[0] in header[:PDF_SIGNATURE_WINDOW]
+        else:
+            matches = any(header.startswith(signature) for signature in signatures)
+        if not matches:
+            raise BusinessLogicError(detail=f"O conteúdo do arquivo não corresponde ao tipo {content_type}")
+    return validate
+
+
+def store_upload(file: UploadFile) -> StoredObject:
+    """
+    Grava o arquivo enviado no armazenamento por SHA-256
+
+    O conteúdo é lido em blocos (sem carregar o arquivo inteiro em memória): a
+    assinatura do tipo é conferida no primeiro bloco e a leitura para assim que
+    passa de MAX_FILE_SIZE.
+    """
+    try:
+        return document_store.save(file.file, max_size=MAX_FILE_SIZE, validate=check_signature(file.content_type))
+    except FileTooLargeError:
+        raise BusinessLogicError(
+            detail=f"Arquivo muito grande: mais de {MAX_FILE_SIZE} bytes. Tamanho máximo: {MAX_FILE_SIZE} bytes (50MB)"
+        )
+    except OSError as e:
+        logger.error(f"Erro ao salvar arquivo: {e}")
+        raise BusinessLogicError(detail=f"Erro ao salvar arquivo: {str(e)}")
+
+
+def new_document(
+    db: Session, stored: StoredObject, file_name: str, mime_type: str, current_user: User, **fields
+) -> ImportDocument:
+    """Documento apontando para o conteúdo armazenado (conta mais uma referência)"""
+    document_store.acquire(db, stored)
+    document = ImportDocument(
+        file_name=file_name,
+        file_path=str(stored.path),
+        file_size=stored.size,
+        mime_type=mime_type,
+        content_sha256=stored.sha256,
+        company_id=current_user.company_id,
+        uploaded_by=current_user.id,
+        **fields
+    )
+    db.add(document)
+    return document
+
+
+def ocr_job_response(job: OCRJob) -> dict:
+    return {
+        "job_id": job.id,
+        "document_id": job.document_id,
+        "status": job.status,
+        "status_url": f"/api/v1/documents/jobs/{job.id}",
+    }
+
+
+def ocr_job_status(job: OCRJob) -> dict:
+    """Status do job; concluído, inclui o resultado gravado no documento"""
+    response = ocr_job_response(job)
+    response.update({
+        "attempts": job.attempts,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    })
+    if job.status == OCRJobStatus.completed:
+        document = job.document
+        response["result"] = {
+            "document_type": document.document_type,
+            "ocr_confidence": document.ocr_confidence or 0,
+            "ocr_method": document.ocr_method or "none",
+            "classification_confidence": document.classification_confidence or 0,
+            "text_length": len(document.extracted_text or ""),
+        }
+    return response
+
+
+_batch_executor: Optional[ThreadPoolExecutor] = None
+_batch_executor_lock = threading.Lock()
+
 
-@router.post("/upload", response_model=ImportDocumentSchema)
-async def upload_document(
+def _get_batch_executor() -> ThreadPoolExecutor:
+    """Threads que gravam os arquivos do upload múltiplo (compartilhadas entre requisições)"""
+    global _batch_executor
+    with _batch_executor_lock:
+        if _batch_executor is None:
+            _batch_executor = ThreadPoolExecutor(max_workers=UPLOAD_BATCH_WORKERS, thread_name_prefix="upload-batch")
+        return _batch_executor
+
+
+@router.post("/upload", status_code=202)
+def upload_document(
     file: UploadFile = File(...),
     import_process_id: Optional[int] = None,
     document_type: Optional[str] = None,
+    language: Optional[str] = 'pt',
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
-    Upload de documento único com processamento OCR automático
+    Upload de documento único
     Suporta: PDF, PNG, JPEG, DOC, DOCX, XLS, XLSX
+
+    O arquivo é salvo e o OCR/classificação roda em segundo plano: a resposta
+    (202) traz o ID do job, acompanhado em GET /documents/jobs/{job_id}.
     """
     logger.info(f"Upload de documento: {file.filename} pelo usuário {current_user.id}")
     
@@ -61,70 +195,6 @@ async def upload_document(
             detail=f"Tipo de arquivo não suportado: {file.content_type}. Tipos permitidos: PDF, PNG, JPEG, DOC, DOCX, XLS, XLSX"
         )
     
-    # Ler arquivo
-    file_bytes = await file.read()
-    
-    # Validar tamanho
-    if len(file_bytes) > MAX_FILE_SIZE:
-        raise BusinessLogicError(
-            detail=f"Arquivo muito grande: {len(file_bytes)} bytes. Tamanho máximo: {MAX_FILE_SIZE} bytes (50MB)"
-        )
-    
-    # Processar com OCR
-    ocr_service = get_ocr_service()
-    try:
-        file_extension = Path(file.filename).suffix.lower()
-        file_type = 'pdf' if file_extension == '.pdf' else 'image'
-        
-        ocr_result = ocr_service.extract_text_from_bytes(
-            file_bytes=file_bytes,
-            file_type=file_type,
-            language='pt'  # TODO: Detectar idioma automaticamente
-        )
-        
-        # Classificar documento
-        classification = ocr_service.classify_document(ocr_result['text'])
-        
-        logger.info(f"OCR concluído: {len(ocr_result['text'])} caracteres, confiança: {ocr_result.get('confidence', 0):.2%}")
-        logger.info(f"Documento classificado como: {classification['document_type']} (confiança: {classification['confidence']:.2%})")
-        
-    except Exception as e:
-        logger.error(f"Erro no OCR: {e}")
-        ocr_result = {
-            'text': '',
-            'confidence': 0,
-            'method': 'none',
-            'error': str(e)
-        }
-        classification = {'document_type': 'other', 'confidence': 0}
-    
-    # Salvar arquivo no sistema de arquivos
-    file_extension = Path(file.filename).suffix.lower()
-    file_name = f"{current_user.company_id}_{datetime.utcnow().timestamp()}_{file.filename}"
-    file_path = UPLOAD_DIR / file_name
-    
-    try:
-        with open(file_path, "wb") as f:
-            f.write(file_bytes)
-    except Exception as e:
-        logger.error(f"Erro ao salvar arquivo: {e}")
-        raise BusinessLogicError(detail=f"Erro ao salvar arquivo: {str(e)}")
-    
-    # Criar registro do documento
-    document_data = {
-        'file_name': file.filename,
-        'file_path': str(file_path),
-        'file_size': len(file_bytes),
-        'mime_type': file.content_type,
-        'extracted_text': ocr_result.get('text', ''),
-        'ocr_confidence': ocr_result.get('confidence', 0),
-        'ocr_method': ocr_result.get('method', 'none'),
-        'document_type': classification.get('document_type', document_type or 'other'),
-        'classification_confidence': classification.get('confidence', 0),
-        'company_id': current_user.company_id,
-        'uploaded_by': current_user.id,
-    }
-    
     if import_process_id:
         # Verificar se processo existe
         process = db.query(ImportProcess).filter(
@@ -133,42 +203,54 @@ async def upload_document(
         ).first()
         
         if not process:
-            # Deletar arquivo se processo não existe
-            if file_path.exists():
-                file_path.unlink()
-            raise NotFoundError(
-                detail=f"Processo de importação não encontrado: {import_process_id}",
-                resource="Import Process"
-            )
-        
-        document_data['import_process_id'] = import_process_id
+            raise NotFoundError("Processo de importação", import_process_id)
+    
+    # Salvar arquivo no armazenamento (um arquivo por conteúdo)
+    stored = store_upload(file)
+    
+    # Criar registro do documento; texto e classificação são preenchidos pelo job de OCR
+    document_fields = {'document_type': document_type or 'other'}
+    if import_process_id:
+        document_fields['import_process_id'] = import_process_id
     
     try:
-        document = ImportDocument(**document_data)
-        db.add(document)
-        db.commit()
-        db.refresh(document)
-        
-        logger.info(f"Documento salvo: ID {document.id}")
-        return document
-        
+        document = new_document(db, stored, file.filename, file.content_type, current_user, **document_fields)
+        job = enqueue_ocr_job(db, document, language=language)
     except Exception as e:
         db.rollback()
-        # Deletar arquivo em caso de erro
-        if file_path.exists():
-            file_path.unlink()
+        # O arquivo fica sem referências e é apagado pela varredura (se nenhum outro documento o usar)
+        document_store.abandon(db, stored)
         logger.error(f"Erro ao salvar documento: {e}")
         raise BusinessLogicError(detail=f"Erro ao salvar documento: {str(e)}")
+    
+    logger.info(f"Documento salvo: ID {document.id}, job de OCR {job.id}")
+    return ocr_job_response(job)
+
+def _store_batch_file(file: UploadFile) -> StoredObject:
+    """Validação e gravação de um arquivo do upload múltiplo (executado em paralelo)"""
+    if file.content_type not in ALLOWED_TYPES:
+        raise BusinessLogicError(detail=f"Tipo não suportado: {file.content_type}")
+    try:
+        return document_store.save(file.file, max_size=MAX_FILE_SIZE, validate=check_signature(file.content_type))
+    except FileTooLargeError:
+        raise BusinessLogicError(detail=f"Arquivo muito grande: mais de {MAX_FILE_SIZE} bytes")
+
 
-@router.post("/upload/multiple")
-async def upload_multiple_documents(
+@router.post("/upload/multiple", status_code=202)
+def upload_multiple_documents(
     files: List[UploadFile] = File(...),
     import_process_id: Optional[int] = None,
+    language: Optional[str] = 'pt',
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Upload múltiplo de documentos
+    
+    Os arquivos são validados e gravados em paralelo (até UPLOAD_BATCH_WORKERS
+    por vez); os documentos e jobs de OCR do lote são criados em um único
+    commit e processados pelo pool de OCR. O progresso de cada arquivo é
+    acompanhado em GET /documents/batches/{batch_id}.
     """
     logger.info(f"Upload múltiplo: {len(files)} arquivos pelo usuário {current_user.id}")
     
@@ -177,102 +259,374 @@ async def upload_multiple_documents(
             detail="Máximo de 10 arquivos por upload"
         )
     
-    uploaded_documents = []
-    errors = []
+    if import_process_id:
+        process = db.query(ImportProcess).filter(
+            ImportProcess.id == import_process_id,
+            ImportProcess.company_id == current_user.company_id
+        ).first()
+        if not process:
+            raise NotFoundError("Processo de importação", import_process_id)
     
-    for file in files:
+    # Gravar os arquivos em paralelo (leitura, hash e escrita em disco)
+    futures = [_get_batch_executor().submit(_store_batch_file, file) for file in files]
+    stored_files = []
+    errors = []
+    for file, future in zip(files, futures):
         try:
-            # Validar tipo
-            if file.content_type not in ALLOWED_TYPES:
-                errors.append({
-                    "file": file.filename,
-                    "error": f"Tipo não suportado: {file.content_type}"
-                })
-                continue
-            
-            # Ler arquivo
-            file_bytes = await file.read()
-            
-            # Validar tamanho
-            if len(file_bytes) > MAX_FILE_SIZE:
-                errors.append({
-                    "file": file.filename,
-                    "error": f"Arquivo muito grande: {len(file_bytes)} bytes"
-                })
-                continue
-            
-            # Salvar arquivo
-            file_extension = Path(file.filename).suffix.lower()
-            file_name = f"{current_user.company_id}_{datetime.utcnow().timestamp()}_{file.filename}"
-            file_path = UPLOAD_DIR / file_name
-            
-            with open(file_path, "wb") as f:
-                f.write(file_bytes)
-            
-            # Processar OCR (apenas para PDF e imagens)
-            ocr_result = {'text': '', 'confidence': 0, 'method': 'none'}
-            classification = {'document_type': 'other', 'confidence': 0}
-            
-            if file.content_type in ['application/pdf', 'image/png', 'image/jpeg', 'image/jpg']:
-                try:
-                    ocr_service = get_ocr_service()
-                    file_type = 'pdf' if file_extension == '.pdf' else 'image'
-                    ocr_result = ocr_service.extract_text_from_bytes(
-                        file_bytes=file_bytes,
-                        file_type=file_type,
-                        language='pt'
-                    )
-                    classification = ocr_service.classify_document(ocr_result['text'])
-                except Exception as e:
-                    logger.warning(f"Erro no OCR para {file.filename}: {e}")
-            
-            # Criar documento
-            document_data = {
-                'file_name': file.filename,
-                'file_path': str(file_path),
-                'file_size': len(file_bytes),
-                'mime_type': file.content_type,
-                'extracted_text': ocr_result.get('text', ''),
-                'ocr_confidence': ocr_result.get('confidence', 0),
-                'ocr_method': ocr_result.get('method', 'none'),
-                'document_type': classification.get('document_type', 'other'),
-                'classification_confidence': classification.get('confidence', 0),
-                'company_id': current_user.company_id,
-                'uploaded_by': current_user.id,
-            }
-            
-            if import_process_id:
-                document_data['import_process_id'] = import_process_id
-            
-            document = ImportDocument(**document_data)
-            db.add(document)
-            db.commit()
-            db.refresh(document)
-            
-            uploaded_documents.append(document)
-            
+            stored_files.append((file, future.result()))
+        except BusinessLogicError as e:
+            errors.append({"file": file.filename, "error": e.detail})
         except Exception as e:
             logger.error(f"Erro ao fazer upload de {file.filename}: {e}")
-            errors.append({
-                "file": file.filename,
-                "error": str(e)
-            })
+            errors.append({"file": file.filename, "error": str(e)})
+    
+    # Documentos e jobs do lote em um único commit
+    batch_id = uuid.uuid4().hex
+    documents = []
+    jobs = []
+    if stored_files:
+        document_fields = {'document_type': 'other'}
+        if import_process_id:
+            document_fields['import_process_id'] = import_process_id
+        try:
+            documents = [
+                new_document(db, stored, file.filename, file.content_type, current_user, **document_fields)
+                for file, stored in stored_files
+            ]
+            jobs = enqueue_ocr_jobs(db, documents, language=language, batch_id=batch_id)
+        except Exception as e:
+            db.rollback()
+            for _, stored in stored_files:
+                document_store.abandon(db, stored)
+            logger.error(f"Erro ao salvar documentos do upload múltiplo: {e}")
+            errors.extend({"file": file.filename, "error": str(e)} for file, _ in stored_files)
+            documents = []
     
+    logger.info(f"Upload múltiplo {batch_id}: {len(documents)} documentos, {len(errors)} erros")
     return {
-        "uploaded": len(uploaded_documents),
+        "batch_id": batch_id if documents else None,
+        "status_url": f"/api/v1/documents/batches/{batch_id}" if documents else None,
+        "uploaded": len(documents),
         "errors": len(errors),
-        "uploaded_documents": [doc.id for doc in uploaded_documents],
+        "uploaded_documents": [doc.id for doc in documents],
+        "jobs": [{"document_id": job.document_id, "job_id": job.id, "status": job.status} for job in jobs],
         "errors_details": errors
     }
 
+
+@router.get("/batches/{batch_id}")
+async def get_upload_batch(
+    batch_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """
+    Progresso de um upload múltiplo: status e resultado de cada arquivo
+    """
+    jobs = (await db.scalars(select(OCRJob).options(joinedload(OCRJob.document)).where(
+        OCRJob.batch_id == batch_id,
+        OCRJob.company_id == current_user.company_id
+    ).order_by(OCRJob.document_id))).all()
+    
+    if not jobs:
+        raise NotFoundError("Lote de upload", batch_id)
+    
+    counts = {status.value: 0 for status in OCRJobStatus}
+    for job in jobs:
+        counts[job.status.value] += 1
+    finished = counts[OCRJobStatus.completed.value] + counts[OCRJobStatus.failed.value]
+    if finished < len(jobs):
+        status = "processing"
+    elif counts[OCRJobStatus.failed.value]:
+        status = "completed_with_errors"
+    else:
+        status = "completed"
+    
+    return {
+        "batch_id": batch_id,
+        "status": status,
+        "total": len(jobs),
+        "progress": round(finished / len(jobs), 3),
+        **counts,
+        "files": [
+            {"file_name": job.document.file_name, **ocr_job_status(job)}
+            for job in jobs
+        ],
+    }
+
+
+class ChunkedUploadRequest(BaseModel):
+    file_name: str
+    content_type: str
+    size: int = Field(..., gt=0)
+    # Obrigatório já no início: o documento só é criado depois de todas as partes
+    import_process_id: int
+    document_type: Optional[str] = None
+    language: Optional[str] = 'pt'
+
+
+def upload_session_response(upload: UploadSession) -> dict:
+    receiving = upload.status == UploadSessionStatus.open
+    received = document_store.received_parts(upload.id) if receiving else []
+    base_url = f"/api/v1/documents/uploads/{upload.id}"
+    return {
+        "upload_id": upload.id,
+        "file_name": upload.file_name,
+        "size": upload.size,
+        "part_size": upload.part_size,
+        "parts": upload.parts,
+        "status": upload.status,
+        "received_parts": received,
+        "missing_parts": sorted(set(range(1, upload.parts + 1)) - set(received)) if receiving else [],
+        "part_url": f"{base_url}/parts/{{part_number}}",
+        "complete_url": f"{base_url}/complete",
+        "expires_at": upload.expires_at,
+        "document_id": upload.document_id,
+        "job_id": upload.job_id,
+    }
+
+
+def expire_upload_sessions(db: Session) -> int:
+    """Descarta os uploads em partes vencidos e as partes em disco"""
+    expired = db.scalars(select(UploadSession.id).where(UploadSession.expires_at < datetime.utcnow())).all()
+    if not expired:
+        return 0
+    db.execute(delete(UploadSession).where(UploadSession.id.in_(expired)))
+    db.commit()
+    for upload_id in expired:
+        document_store.discard_upload(upload_id)
+    logger.info(f"{len(expired)} uploads em partes vencidos descartados")
+    return len(expired)
+
+
+def get_upload_session(db: Session, upload_id: str, current_user: User) -> UploadSession:
+    upload = db.query(UploadSession).filter(
+        UploadSession.id == upload_id,
+        UploadSession.company_id == current_user.company_id,
+        UploadSession.expires_at >= datetime.utcnow()
+    ).first()
+    if not upload:
+        raise NotFoundError("Upload", upload_id)
+    return upload
+
+
+def _set_upload_status(db: Session, upload_id: str, status: UploadSessionStatus, current: UploadSessionStatus) -> bool:
+    """Muda o status só se ainda for `current` (reserva entre requisições e processos)"""
+    changed = db.execute(
+        update(UploadSession)
+        .where(UploadSession.id == upload_id, UploadSession.status == current)
+        .values(status=status)
+    ).rowcount
+    db.commit()
+    return bool(changed)
+
+
+def _read_header(path: Path) -> bytes:
+    with open(path, "rb") as f:
+        return f.read(PDF_SIGNATURE_WINDOW)
+
+
+@router.post("/uploads", status_code=201)
+def create_chunked_upload(
+    request: ChunkedUploadRequest = Body(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Inicia um upload em partes (arquivos grandes, retomável)
+    
+    1. POST /documents/uploads: retorna upload_id, part_size e o número de partes
+    2. PUT /documents/uploads/{upload_id}/parts/{n}: corpo binário com a parte n
+       (todas com part_size bytes, exceto a última), em qualquer ordem; uma parte
+       que falhou é simplesmente reenviada
+    3. GET /documents/uploads/{upload_id}: partes recebidas e faltando (para retomar)
+    4. POST /documents/uploads/{upload_id}/complete: junta as partes, cria o
+       documento e enfileira o OCR (202, como /upload)
+    
+    Uploads não concluídos em CHUNKED_UPLOAD_TTL_HOURS são descartados.
+    """
+    if request.content_type not in ALLOWED_TYPES:
+        raise BusinessLogicError(
+            detail=f"Tipo de arquivo não suportado: {request.content_type}. Tipos permitidos: PDF, PNG, JPEG, DOC, DOCX, XLS, XLSX"
+        )
+    if request.size > CHUNKED_UPLOAD_MAX_SIZE:
+        raise BusinessLogicError(
+            detail=f"Arquivo muito grande: {request.size} bytes. Tamanho máximo: {CHUNKED_UPLOAD_MAX_SIZE} bytes"
+        )
+    process = db.query(ImportProcess).filter(
+        ImportProcess.id == request.import_process_id,
+        ImportProcess.company_id == current_user.company_id
+    ).first()
+    if not process:
+        raise NotFoundError("Processo de importação", request.import_process_id)
+    
+    expire_upload_sessions(db)
+    upload = UploadSession(
+        file_name=request.file_name,
+        mime_type=request.content_type,
+        size=request.size,
+        part_size=CHUNKED_UPLOAD_PART_SIZE,
+        company_id=current_user.company_id,
+        uploaded_by=current_user.id,
+        import_process_id=request.import_process_id,
+        document_type=request.document_type,
+        language=request.language,
+        expires_at=datetime.utcnow() + timedelta(hours=CHUNKED_UPLOAD_TTL_HOURS)
+    )
+    db.add(upload)
+    db.commit()
+    db.refresh(upload)
+    
+    logger.info(
+        f"Upload em partes {upload.id} iniciado: {request.file_name}, {request.size} bytes "
+        f"em {upload.parts} partes, pelo usuário {current_user.id}"
+    )
+    return upload_session_response(upload)
+
+
+@router.get("/uploads/{upload_id}")
+def get_chunked_upload(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Status de um upload em partes (partes recebidas e faltando)
+    """
+    return upload_session_response(get_upload_session(db, upload_id, current_user))
+
+
+@router.put("/uploads/{upload_id}/parts/{part_number}")
+async def put_chunked_upload_part(
+    upload_id: str,
+    part_number: int,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """
+    Envio de uma parte (corpo binário)
+    
+    A parte é gravada em disco à medida que chega, sem ficar inteira em
+    memória; o envio é interrompido se passar do tamanho esperado. A primeira
+    parte tem a assinatura do tipo declarado conferida.
+    """
+    upload = await db.scalar(select(UploadSession).where(
+        UploadSession.id == upload_id,
+        UploadSession.company_id == current_user.company_id,
+        UploadSession.expires_at >= datetime.utcnow()
+    ))
+    if upload is None:
+        raise NotFoundError("Upload", upload_id)
+    if upload.status != UploadSessionStatus.open:
+        raise ConflictError(detail=f"Upload {upload_id} já concluído")
+    if not 1 <= part_number <= upload.parts:
+        raise BusinessLogicError(detail=f"Parte inválida: {part_number}. O upload tem {upload.parts} partes")
+    
+    expected = upload.part_length(part_number)
+    try:
+        part = await document_store.write_part(upload.id, part_number, request.stream(), max_size=expected)
+    except FileTooLargeError:
+        raise BusinessLogicError(detail=f"Parte {part_number} maior que {expected} bytes")
+    
+    try:
+        if part.size != expected:
+            raise BusinessLogicError(detail=f"Parte {part_number} incompleta: {part.size} de {expected} bytes")
+        if part_number == 1:
+            check_signature(upload.mime_type)(await run_in_threadpool(_read_header, part.path))
+    except BusinessLogicError:
+        await run_in_threadpool(part.path.unlink)
+        raise
+    # Operações no disco (os.replace, listdir) fora do event loop
+    await run_in_threadpool(document_store.accept_part, part, upload.id, part_number)
+    
+    return {
+        "upload_id": upload.id,
+        "part_number": part_number,
+        "size": part.size,
+        "sha256": part.sha256,
+        "received_parts": await run_in_threadpool(document_store.received_parts, upload.id),
+    }
+
+
+@router.post("/uploads/{upload_id}/complete", status_code=202)
+def complete_chunked_upload(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Conclui um upload em partes: cria o documento e enfileira o OCR
+    
+    Repetir a chamada depois da conclusão retorna o mesmo job.
+    """
+    upload = get_upload_session(db, upload_id, current_user)
+    if upload.status == UploadSessionStatus.completed:
+        return ocr_job_response(db.get(OCRJob, upload.job_id))
+    
+    missing = sorted(set(range(1, upload.parts + 1)) - set(document_store.received_parts(upload.id)))
+    if missing:
+        raise BusinessLogicError(detail=f"Partes faltando: {', '.join(map(str, missing[:20]))}")
+    if not _set_upload_status(db, upload.id, UploadSessionStatus.completing, UploadSessionStatus.open):
+        raise ConflictError(detail=f"Upload {upload_id} já está sendo concluído")
+    
+    try:
+        stored = document_store.save_parts(upload.id, upload.parts, validate=check_signature(upload.mime_type))
+    except Exception as e:
+        _set_upload_status(db, upload.id, UploadSessionStatus.open, UploadSessionStatus.completing)
+        logger.error(f"Erro ao juntar as partes do upload {upload.id}: {e}")
+        if isinstance(e, BusinessLogicError):
+            raise
+        raise BusinessLogicError(detail=f"Erro ao salvar arquivo: {str(e)}")
+    
+    try:
+        document = new_document(
+            db, stored, upload.file_name, upload.mime_type, current_user,
+            document_type=upload.document_type or 'other',
+            import_process_id=upload.import_process_id
+        )
+        job = enqueue_ocr_job(db, document, language=upload.language or 'pt')
+        upload.status = UploadSessionStatus.completed
+        upload.document_id = document.id
+        upload.job_id = job.id
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        document_store.abandon(db, stored)
+        _set_upload_status(db, upload.id, UploadSessionStatus.open, UploadSessionStatus.completing)
+        logger.error(f"Erro ao salvar documento do upload {upload.id}: {e}")
+        raise BusinessLogicError(detail=f"Erro ao salvar documento: {str(e)}")
+    
+    document_store.discard_upload(upload.id)
+    logger.info(f"Upload em partes {upload.id} concluído: documento {document.id}, job de OCR {job.id}")
+    return ocr_job_response(job)
+
+
+@router.delete("/uploads/{upload_id}")
+def abort_chunked_upload(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Cancela um upload em partes e apaga as partes recebidas
+    """
+    upload = get_upload_session(db, upload_id, current_user)
+    if upload.status == UploadSessionStatus.completing:
+        raise ConflictError(detail=f"Upload {upload_id} está sendo concluído")
+    db.delete(upload)
+    db.commit()
+    document_store.discard_upload(upload_id)
+    return {"message": "Upload cancelado"}
+
 class BulkApproveDocumentsRequest(BaseModel):
     document_ids: List[int]
 
 @router.post("/bulk-approve")
 async def bulk_approve_documents(
     request: BulkApproveDocumentsRequest = Body(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """
     Aprovar múltiplos documentos
@@ -285,10 +639,10 @@ async def bulk_approve_documents(
     
     for doc_id in document_ids:
         try:
-            document = db.query(ImportDocument).filter(
+            document = await db.scalar(select(ImportDocument).where(
                 ImportDocument.id == doc_id,
                 ImportDocument.company_id == current_user.company_id
-            ).first()
+            ).limit(1))
             
             if not document:
                 errors.append({
@@ -313,10 +667,10 @@ async def bulk_approve_documents(
             })
     
     try:
-        db.commit()
+        await db.commit()
         logger.info(f"Bulk approve de documentos concluído: {len(approved)} aprovados, {len(errors)} erros")
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise BusinessLogicError(detail=f"Erro ao aprovar documentos: {str(e)}")
     
     return {
@@ -326,15 +680,18 @@ async def bulk_approve_documents(
     }
 
 
-@router.post("/{document_id}/reprocess-ocr")
-async def reprocess_ocr(
+@router.post("/{document_id}/reprocess-ocr", status_code=202)
+def reprocess_ocr(
     document_id: int,
     language: Optional[str] = 'pt',
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
-    Reprocessar OCR de um documento existente
+    Reprocessar OCR de um documento existente (em segundo plano)
+    
+    O OCR roda de novo mesmo com resultado guardado para o conteúdo, que é
+    substituído pelo novo.
     """
     document = db.query(ImportDocument).filter(
         ImportDocument.id == document_id,
@@ -344,29 +701,49 @@ async def reprocess_ocr(
     if not document:
         raise NotFoundError("Documento", document_id)
     
-    # TODO: Recuperar arquivo original e reprocessar
-    # Por enquanto, retorna documento atualizado
-    logger.info(f"Reprocessamento OCR solicitado para documento {document_id}")
+    if not document.file_path or not Path(document.file_path).exists():
+        raise NotFoundError("Arquivo do documento", document_id)
     
-    return {
-        "message": "Reprocessamento OCR iniciado",
-        "document_id": document_id
-    }
+    job = enqueue_ocr_job(db, document, language=language, force=True)
+    logger.info(f"Reprocessamento OCR solicitado para documento {document_id}: job {job.id}")
+    
+    return ocr_job_response(job)
+
+
+@router.get("/jobs/{job_id}")
+async def get_ocr_job(
+    job_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """
+    Status de um job de OCR
+    Concluído, inclui o resultado gravado no documento
+    """
+    job = await db.scalar(select(OCRJob).options(joinedload(OCRJob.document)).where(
+        OCRJob.id == job_id,
+        OCRJob.company_id == current_user.company_id
+    ).limit(1))
+    
+    if not job:
+        raise NotFoundError("Job de OCR", job_id)
+    
+    return ocr_job_status(job)
 
 
 @router.get("/{document_id}/text")
 async def get_document_text(
     document_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """
     Obter texto extraído de um documento
     """
-    document = db.query(ImportDocument).filter(
+    document = await db.scalar(select(ImportDocument).where(
         ImportDocument.id == document_id,
         ImportDocument.company_id == current_user.company_id
-    ).first()
+    ).limit(1))
     
     if not document:
         raise NotFoundError(
@@ -385,18 +762,18 @@ async def get_document_text(
 @router.get("/{document_id}/download")
 async def download_document(
     document_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """
     Download de documento
     """
     logger.info(f"Download de documento: {document_id} pelo usuário {current_user.id}")
     
-    document = db.query(ImportDocument).filter(
+    document = await db.scalar(select(ImportDocument).where(
         ImportDocument.id == document_id,
         ImportDocument.company_id == current_user.company_id
-    ).first()
+    ).limit(1))
     
     if not document:
         raise NotFoundError(
@@ -417,7 +794,7 @@ async def download_document(
     )
 
 @router.delete("/{document_id}")
-async def delete_document(
+def delete_document(
     document_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -438,18 +815,30 @@ async def delete_document(
             resource="Document"
         )
     
-    # Deletar arquivo do sistema de arquivos
-    if document.file_path and Path(document.file_path).exists():
-        try:
-            Path(document.file_path).unlink()
-            logger.info(f"Arquivo deletado: {document.file_path}")
-        except Exception as e:
-            logger.warning(f"Erro ao deletar arquivo {document.file_path}: {e}")
+    sha256 = document.content_sha256
+    if sha256 is None:
+        # Documentos anteriores ao armazenamento por SHA-256: um arquivo por documento
+        if document.file_path and Path(document.file_path).exists():
+            try:
+                Path(document.file_path).unlink()
+                logger.info(f"Arquivo deletado: {document.file_path}")
+            except Exception as e:
+                logger.warning(f"Erro ao deletar arquivo {document.file_path}: {e}")
     
     # Deletar registro do banco
     db.delete(document)
+    if sha256 is not None:
+        db.flush()
+        document_store.release(db, sha256)
     db.commit()
     
+    # O arquivo só é apagado pela varredura, depois de DOCUMENT_STORE_GRACE_SECONDS sem referências
+    if sha256 is not None:
+        try:
+            document_store.sweep(db)
+        except Exception as e:
+            logger.warning(f"Erro na varredura do armazenamento de documentos: {e}")
+    
     logger.info(f"Documento deletado: ID {document_id}")
     return {"message": "Documento deletado com sucesso"}
 
@@ -2,12 +2,12 @@
 Drawback API - Gestão de Drawback
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, and_, or_, func
 from typing import List, Optional
 from datetime import datetime
-from app.core.database import get_db
-from app.core.security import get_current_user
+from app.core.database import get_async_db
+from app.core.security import get_current_user_async
 from app.models import (
     User, Company, ImportProcess, ExportProcess,
     DrawbackAct, DrawbackCredit, DrawbackActStatus, DrawbackActType
@@ -76,60 +76,60 @@ class DrawbackCreditResponse(BaseModel):
 
 @router.get("/acts", response_model=List[DrawbackActResponse])
 async def list_drawback_acts(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async),
     status: Optional[DrawbackActStatus] = None,
     act_type: Optional[DrawbackActType] = None
 ):
     """Listar atos de drawback"""
     company_id = current_user.company_id
     
-    query = db.query(DrawbackAct).filter(
+    query = select(DrawbackAct).where(
         DrawbackAct.company_id == company_id
     )
     
     if status:
-        query = query.filter(DrawbackAct.status == status)
+        query = query.where(DrawbackAct.status == status)
     if act_type:
-        query = query.filter(DrawbackAct.act_type == act_type)
+        query = query.where(DrawbackAct.act_type == act_type)
     
-    acts = query.order_by(DrawbackAct.created_at.desc()).all()
+    acts = (await db.scalars(query.order_by(DrawbackAct.created_at.desc()))).all()
     return acts
 
 @router.post("/acts", response_model=DrawbackActResponse)
 async def create_drawback_act(
     act_data: DrawbackActCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Criar novo ato de drawback"""
     company_id = current_user.company_id
     
     # Validar processos
     if act_data.import_process_id:
-        process = db.query(ImportProcess).filter(
+        process = await db.scalar(select(ImportProcess).where(
             and_(
                 ImportProcess.id == act_data.import_process_id,
                 ImportProcess.company_id == company_id
             )
-        ).first()
+        ).limit(1))
         if not process:
             raise HTTPException(status_code=404, detail="Processo de importação não encontrado")
     
     if act_data.export_process_id:
-        process = db.query(ExportProcess).filter(
+        process = await db.scalar(select(ExportProcess).where(
             and_(
                 ExportProcess.id == act_data.export_process_id,
                 ExportProcess.company_id == company_id
             )
-        ).first()
+        ).limit(1))
         if not process:
             raise HTTPException(status_code=404, detail="Processo de exportação não encontrado")
     
     # Gerar número do ato
-    act_count = db.query(DrawbackAct).filter(
+    act_count = await db.scalar(select(func.count()).select_from(DrawbackAct).where(
         DrawbackAct.company_id == company_id
-    ).count()
+    ))
     act_number = f"DB-{company_id}-{act_count + 1:06d}"
     
     # Criar ato
@@ -149,26 +149,26 @@ async def create_drawback_act(
     )
     
     db.add(new_act)
-    db.commit()
-    db.refresh(new_act)
+    await db.commit()
+    await db.refresh(new_act)
     
     return DrawbackActResponse.from_orm(new_act)
 
 @router.get("/acts/{act_id}", response_model=DrawbackActResponse)
 async def get_drawback_act(
     act_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Obter detalhes de um ato de drawback"""
     company_id = current_user.company_id
     
-    act = db.query(DrawbackAct).filter(
+    act = await db.scalar(select(DrawbackAct).where(
         and_(
             DrawbackAct.id == act_id,
             DrawbackAct.company_id == company_id
         )
-    ).first()
+    ).limit(1))
     
     if not act:
         raise HTTPException(status_code=404, detail="Ato de drawback não encontrado")
@@ -179,18 +179,18 @@ async def get_drawback_act(
 async def update_drawback_act(
     act_id: int,
     act_data: DrawbackActUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Atualizar ato de drawback"""
     company_id = current_user.company_id
     
-    act = db.query(DrawbackAct).filter(
+    act = await db.scalar(select(DrawbackAct).where(
         and_(
             DrawbackAct.id == act_id,
             DrawbackAct.company_id == company_id
         )
-    ).first()
+    ).limit(1))
     
     if not act:
         raise HTTPException(status_code=404, detail="Ato de drawback não encontrado")
@@ -214,26 +214,26 @@ async def update_drawback_act(
     if act_data.rejection_reason is not None:
         act.rejection_reason = act_data.rejection_reason
     
-    db.commit()
-    db.refresh(act)
+    await db.commit()
+    await db.refresh(act)
     
     return DrawbackActResponse.from_orm(act)
 
 @router.post("/acts/{act_id}/submit")
 async def submit_drawback_act(
     act_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Submeter ato de drawback para aprovação"""
     company_id = current_user.company_id
     
-    act = db.query(DrawbackAct).filter(
+    act = await db.scalar(select(DrawbackAct).where(
         and_(
             DrawbackAct.id == act_id,
             DrawbackAct.company_id == company_id
         )
-    ).first()
+    ).limit(1))
     
     if not act:
         raise HTTPException(status_code=404, detail="Ato de drawback não encontrado")
@@ -244,25 +244,25 @@ async def submit_drawback_act(
     act.status = DrawbackActStatus.submitted
     act.submitted_at = datetime.utcnow()
     
-    db.commit()
+    await db.commit()
     
     return {"message": "Ato submetido com sucesso", "act_id": act_id}
 
 @router.post("/acts/{act_id}/approve")
 async def approve_drawback_act(
     act_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Aprovar ato de drawback e gerar créditos"""
     company_id = current_user.company_id
     
-    act = db.query(DrawbackAct).filter(
+    act = await db.scalar(select(DrawbackAct).where(
         and_(
             DrawbackAct.id == act_id,
             DrawbackAct.company_id == company_id
         )
-    ).first()
+    ).limit(1))
     
     if not act:
         raise HTTPException(status_code=404, detail="Ato de drawback não encontrado")
@@ -276,9 +276,9 @@ async def approve_drawback_act(
     act.approved_by = current_user.id
     
     # Gerar crédito
-    credit_count = db.query(DrawbackCredit).filter(
+    credit_count = await db.scalar(select(func.count()).select_from(DrawbackCredit).where(
         DrawbackCredit.company_id == company_id
-    ).count()
+    ))
     credit_number = f"DC-{company_id}-{credit_count + 1:06d}"
     
     new_credit = DrawbackCredit(
@@ -296,7 +296,7 @@ async def approve_drawback_act(
     )
     
     db.add(new_credit)
-    db.commit()
+    await db.commit()
     
     return {
         "message": "Ato aprovado e crédito gerado com sucesso",
@@ -307,38 +307,38 @@ async def approve_drawback_act(
 
 @router.get("/credits", response_model=List[DrawbackCreditResponse])
 async def list_drawback_credits(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async),
     is_active: Optional[bool] = None
 ):
     """Listar créditos de drawback"""
     company_id = current_user.company_id
     
-    query = db.query(DrawbackCredit).filter(
+    query = select(DrawbackCredit).where(
         DrawbackCredit.company_id == company_id
     )
     
     if is_active is not None:
-        query = query.filter(DrawbackCredit.is_active == is_active)
+        query = query.where(DrawbackCredit.is_active == is_active)
     
-    credits = query.order_by(DrawbackCredit.generated_at.desc()).all()
+    credits = (await db.scalars(query.order_by(DrawbackCredit.generated_at.desc()))).all()
     return credits
 
 @router.get("/credits/{credit_id}", response_model=DrawbackCreditResponse)
 async def get_drawback_credit(
     credit_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Obter detalhes de um crédito de drawback"""
     company_id = current_user.company_id
     
-    credit = db.query(DrawbackCredit).filter(
+    credit = await db.scalar(select(DrawbackCredit).where(
         and_(
             DrawbackCredit.id == credit_id,
             DrawbackCredit.company_id == company_id
         )
-    ).first()
+    ).limit(1))
     
     if not credit:
         raise HTTPException(status_code=404, detail="Crédito de drawback não encontrado")
@@ -2,12 +2,12 @@
 Products API - Catálogo de Produtos
 """
 from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, and_, or_, func
 from typing import List, Optional
 from datetime import datetime
-from app.core.database import get_db
-from app.core.security import get_current_user
+from app.core.database import get_async_db
+from app.core.security import get_current_user_async
 from app.models import (
     User, Company, Supplier, Product, ProductCategory
 )
@@ -96,8 +96,8 @@ class ProductCategoryResponse(BaseModel):
 
 @router.get("/", response_model=List[ProductResponse])
 async def list_products(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async),
     search: Optional[str] = None,
     category: Optional[str] = None,
     supplier_id: Optional[int] = None,
@@ -108,12 +108,12 @@ async def list_products(
     """Listar produtos do catálogo"""
     company_id = current_user.company_id
     
-    query = db.query(Product).filter(
+    query = select(Product).where(
         Product.company_id == company_id
     )
     
     if search:
-        query = query.filter(
+        query = query.where(
             or_(
                 Product.name.ilike(f"%{search}%"),
                 Product.code.ilike(f"%{search}%"),
@@ -122,45 +122,45 @@ async def list_products(
         )
     
     if category:
-        query = query.filter(Product.category == category)
+        query = query.where(Product.category == category)
     
     if supplier_id:
-        query = query.filter(Product.supplier_id == supplier_id)
+        query = query.where(Product.supplier_id == supplier_id)
     
     if is_active is not None:
-        query = query.filter(Product.is_active == is_active)
+        query = query.where(Product.is_active == is_active)
     
-    products = query.order_by(Product.created_at.desc()).offset(offset).limit(limit).all()
+    products = (await db.scalars(query.order_by(Product.created_at.desc()).offset(offset).limit(limit))).all()
     return products
 
 @router.post("/", response_model=ProductResponse)
 async def create_product(
     product_data: ProductCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Criar novo produto no catálogo"""
     company_id = current_user.company_id
     
     # Verificar se código já existe
-    existing = db.query(Product).filter(
+    existing = await db.scalar(select(Product).where(
         and_(
             Product.code == product_data.code,
             Product.company_id == company_id
         )
-    ).first()
+    ).limit(1))
     
     if existing:
         raise HTTPException(status_code=400, detail="Código de produto já existe")
     
     # Validar fornecedor se fornecido
     if product_data.supplier_id:
-        supplier = db.query(Supplier).filter(
+        supplier = await db.scalar(select(Supplier).where(
             and_(
                 Supplier.id == product_data.supplier_id,
                 Supplier.company_id == company_id
             )
-        ).first()
+        ).limit(1))
         if not supplier:
             raise HTTPException(status_code=404, detail="Fornecedor não encontrado")
     
@@ -185,26 +185,26 @@ async def create_product(
     )
     
     db.add(new_product)
-    db.commit()
-    db.refresh(new_product)
+    await db.commit()
+    await db.refresh(new_product)
     
     return ProductResponse.from_orm(new_product)
 
 @router.get("/{product_id}", response_model=ProductResponse)
 async def get_product(
     product_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Obter detalhes de um produto"""
     company_id = current_user.company_id
     
-    product = db.query(Product).filter(
+    product = await db.scalar(select(Product).where(
         and_(
             Product.id == product_id,
             Product.company_id == company_id
         )
-    ).first()
+    ).limit(1))
     
     if not product:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
@@ -215,18 +215,18 @@ async def get_product(
 async def update_product(
     product_id: int,
     product_data: ProductUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Atualizar produto"""
     company_id = current_user.company_id
     
-    product = db.query(Product).filter(
+    product = await db.scalar(select(Product).where(
         and_(
             Product.id == product_id,
             Product.company_id == company_id
         )
-    ).first()
+    ).limit(1))
     
     if not product:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
@@ -259,50 +259,50 @@ async def update_product(
     if product_data.metadata is not None:
         product.extra_data = product_data.metadata
     
-    db.commit()
-    db.refresh(product)
+    await db.commit()
+    await db.refresh(product)
     
     return ProductResponse.from_orm(product)
 
 @router.delete("/{product_id}")
 async def delete_product(
     product_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Desativar produto (soft delete)"""
     company_id = current_user.company_id
     
-    product = db.query(Product).filter(
+    product = await db.scalar(select(Product).where(
         and_(
             Product.id == product_id,
             Product.company_id == company_id
         )
-    ).first()
+    ).limit(1))
     
     if not product:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
     
     product.is_active = False
-    db.commit()
+    await db.commit()
     
     return {"message": "Produto desativado com sucesso"}
 
 @router.post("/{product_id}/classify")
 async def classify_product(
     product_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Classificar produto automaticamente (NCM)"""
     company_id = current_user.company_id
     
-    product = db.query(Product).filter(
+    product = await db.scalar(select(Product).where(
         and_(
             Product.id == product_id,
             Product.company_id == company_id
         )
-    ).first()
+    ).limit(1))
     
     if not product:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
@@ -315,8 +315,8 @@ async def classify_product(
     product.ncm = suggested_ncm
     product.ncm_confidence = confidence
     
-    db.commit()
-    db.refresh(product)
+    await db.commit()
+    await db.refresh(product)
     
     return {
         "message": "Produto classificado com sucesso",
@@ -326,33 +326,33 @@ async def classify_product(
 
 @router.get("/categories/", response_model=List[ProductCategoryResponse])
 async def list_categories(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Listar categorias de produtos"""
     # Categorias globais (company_id = None) e da empresa
-    categories = db.query(ProductCategory).filter(
+    categories = (await db.scalars(select(ProductCategory).where(
         or_(
             ProductCategory.company_id == current_user.company_id,
             ProductCategory.company_id.is_(None)
         )
-    ).all()
+    ))).all()
     
     return categories
 
 @router.post("/categories/", response_model=ProductCategoryResponse)
 async def create_category(
     category_data: ProductCategoryCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Criar nova categoria de produtos"""
     company_id = current_user.company_id
     
     # Verificar se nome já existe
-    existing = db.query(ProductCategory).filter(
+    existing = await db.scalar(select(ProductCategory).where(
         ProductCategory.name == category_data.name
-    ).first()
+    ).limit(1))
     
     if existing:
         raise HTTPException(status_code=400, detail="Categoria já existe")
@@ -365,16 +365,16 @@ async def create_category(
     )
     
     db.add(new_category)
-    db.commit()
-    db.refresh(new_category)
+    await db.commit()
+    await db.refresh(new_category)
     
     return ProductCategoryResponse.from_orm(new_category)
 
 @router.post("/import-csv")
 async def import_products_csv(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """
     Importar produtos via CSV
@@ -424,10 +424,10 @@ async def import_products_csv(
                 continue
             
             # Verificar se produto já existe
-            existing = db.query(Product).filter(
+            existing = await db.scalar(select(Product).where(
                 Product.code == row['code'],
                 Product.company_id == current_user.company_id
-            ).first()
+            ).limit(1))
             
             if existing:
                 skipped.append({
@@ -456,10 +456,10 @@ async def import_products_csv(
             
             # Validar supplier_id se fornecido
             if product_data['supplier_id']:
-                supplier = db.query(Supplier).filter(
+                supplier = await db.scalar(select(Supplier).where(
                     Supplier.id == product_data['supplier_id'],
                     Supplier.company_id == current_user.company_id
-                ).first()
+                ).limit(1))
                 if not supplier:
                     errors.append({
                         "row": row_num,
@@ -471,7 +471,7 @@ async def import_products_csv(
             # Criar produto
             new_product = Product(**product_data)
             db.add(new_product)
-            db.flush()  # Para obter o ID sem commit
+            await db.flush()  # Para obter o ID sem commit
             
             imported.append({
                 "row": row_num,
@@ -495,10 +495,10 @@ async def import_products_csv(
     
     # Commit todas as importações
     try:
-        db.commit()
+        await db.commit()
         logger.info(f"Importação CSV concluída: {len(imported)} importados, {len(errors)} erros, {len(skipped)} ignorados")
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise BusinessLogicError(detail=f"Erro ao salvar produtos: {str(e)}")
     
     return {
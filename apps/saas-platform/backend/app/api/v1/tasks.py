@@ -2,12 +2,12 @@
 Tasks API - Task Management
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, and_, or_
 from typing import List, Optional
 from datetime import datetime, timedelta
-from app.core.database import get_db
-from app.core.security import get_current_user
+from app.core.database import get_async_db
+from app.core.security import get_current_user_async
 from app.models import (
     User, Company, Task, TaskStatus, TaskPriority, TaskType, ImportProcess
 )
@@ -67,35 +67,35 @@ class TaskResponse(BaseModel):
 @router.post("/", response_model=TaskResponse)
 async def create_task(
     task_data: TaskCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Criar nova tarefa"""
     logger.info(f"Usuário {current_user.id} criando tarefa: {task_data.title}")
     
     # Validar import_process_id ou export_process_id se fornecido
     if task_data.import_process_id:
-        process = db.query(ImportProcess).filter(
+        process = await db.scalar(select(ImportProcess).where(
             ImportProcess.id == task_data.import_process_id,
             ImportProcess.company_id == current_user.company_id
-        ).first()
+        ).limit(1))
         if not process:
             raise NotFoundError("Processo de Importação", task_data.import_process_id)
     if task_data.export_process_id:
         from app.models import ExportProcess
-        process = db.query(ExportProcess).filter(
+        process = await db.scalar(select(ExportProcess).where(
             ExportProcess.id == task_data.export_process_id,
             ExportProcess.company_id == current_user.company_id
-        ).first()
+        ).limit(1))
         if not process:
             raise NotFoundError("Processo de Exportação", task_data.export_process_id)
     
     # Validar assigned_to se fornecido
     if task_data.assigned_to:
-        assigned_user = db.query(User).filter(
+        assigned_user = await db.scalar(select(User).where(
             User.id == task_data.assigned_to,
             User.company_id == current_user.company_id
-        ).first()
+        ).limit(1))
         if not assigned_user:
             raise NotFoundError("Usuário", task_data.assigned_to)
     
@@ -107,13 +107,13 @@ async def create_task(
         )
         
         db.add(new_task)
-        db.commit()
-        db.refresh(new_task)
+        await db.commit()
+        await db.refresh(new_task)
         
         logger.info(f"Tarefa criada com sucesso: ID {new_task.id}")
         return TaskResponse.from_orm(new_task)
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Erro ao criar tarefa: {e}")
         raise BusinessLogicError(detail=f"Erro ao criar tarefa: {str(e)}")
 
@@ -128,25 +128,25 @@ async def list_tasks(
     export_process_id: Optional[int] = None,
     pending_only: bool = Query(False, description="Listar apenas tarefas pendentes"),
     overdue_only: bool = Query(False, description="Listar apenas tarefas atrasadas"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Listar tarefas com filtros"""
-    query = db.query(Task).filter(
+    query = select(Task).where(
         Task.company_id == current_user.company_id
     )
     
     if status:
-        query = query.filter(Task.status == status)
+        query = query.where(Task.status == status)
     
     if priority:
-        query = query.filter(Task.priority == priority)
+        query = query.where(Task.priority == priority)
     
     if assigned_to:
-        query = query.filter(Task.assigned_to == assigned_to)
+        query = query.where(Task.assigned_to == assigned_to)
     elif assigned_to is None and current_user.role != "admin":
         # Se não especificado, mostrar apenas tarefas do usuário ou não atribuídas
-        query = query.filter(
+        query = query.where(
             or_(
                 Task.assigned_to == current_user.id,
                 Task.assigned_to.is_(None)
@@ -154,23 +154,23 @@ async def list_tasks(
         )
     
     if import_process_id:
-        query = query.filter(Task.import_process_id == import_process_id)
+        query = query.where(Task.import_process_id == import_process_id)
     if export_process_id:
-        query = query.filter(Task.export_process_id == export_process_id)
+        query = query.where(Task.export_process_id == export_process_id)
     
     if pending_only:
-        query = query.filter(Task.status == TaskStatus.pending)
+        query = query.where(Task.status == TaskStatus.pending)
     
     if overdue_only:
         now = datetime.utcnow()
-        query = query.filter(
+        query = query.where(
             and_(
                 Task.due_date < now,
                 Task.status != TaskStatus.completed
             )
         )
     
-    tasks = query.order_by(Task.due_date.asc()).offset(skip).limit(limit).all()
+    tasks = (await db.scalars(query.order_by(Task.due_date.asc()).offset(skip).limit(limit))).all()
     
     # Marcar tarefas atrasadas
     now = datetime.utcnow()
@@ -183,12 +183,12 @@ async def list_tasks(
 @router.get("/pending", response_model=List[TaskResponse])
 async def list_pending_tasks(
     limit: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Listar tarefas pendentes"""
     now = datetime.utcnow()
-    tasks = db.query(Task).filter(
+    tasks = (await db.scalars(select(Task).where(
         Task.company_id == current_user.company_id,
         Task.status == TaskStatus.pending,
         or_(
@@ -199,7 +199,7 @@ async def list_pending_tasks(
         Task.is_urgent.desc(),
         Task.priority.desc(),
         Task.due_date.asc()
-    ).limit(limit).all()
+    ).limit(limit))).all()
     
     # Marcar tarefas atrasadas
     for task in tasks:
@@ -211,30 +211,30 @@ async def list_pending_tasks(
 @router.get("/overdue", response_model=List[TaskResponse])
 async def list_overdue_tasks(
     limit: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Listar tarefas atrasadas"""
     now = datetime.utcnow()
-    tasks = db.query(Task).filter(
+    tasks = (await db.scalars(select(Task).where(
         Task.company_id == current_user.company_id,
         Task.due_date < now,
         Task.status != TaskStatus.completed
-    ).order_by(Task.due_date.asc()).limit(limit).all()
+    ).order_by(Task.due_date.asc()).limit(limit))).all()
     
     return [TaskResponse.from_orm(task) for task in tasks]
 
 @router.get("/{task_id}", response_model=TaskResponse)
 async def get_task(
     task_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Obter detalhes de uma tarefa"""
-    task = db.query(Task).filter(
+    task = await db.scalar(select(Task).where(
         Task.id == task_id,
         Task.company_id == current_user.company_id
-    ).first()
+    ).limit(1))
     
     if not task:
         raise NotFoundError("Tarefa", task_id)
@@ -245,14 +245,14 @@ async def get_task(
 async def update_task(
     task_id: int,
     task_update: TaskUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Atualizar tarefa"""
-    task = db.query(Task).filter(
+    task = await db.scalar(select(Task).where(
         Task.id == task_id,
         Task.company_id == current_user.company_id
-    ).first()
+    ).limit(1))
     
     if not task:
         raise NotFoundError("Tarefa", task_id)
@@ -271,8 +271,8 @@ async def update_task(
     
     task.updated_at = datetime.utcnow()
     
-    db.commit()
-    db.refresh(task)
+    await db.commit()
+    await db.refresh(task)
     
     logger.info(f"Tarefa {task_id} atualizada pelo usuário {current_user.id}")
     return TaskResponse.from_orm(task)
@@ -280,20 +280,20 @@ async def update_task(
 @router.delete("/{task_id}")
 async def delete_task(
     task_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Excluir tarefa"""
-    task = db.query(Task).filter(
+    task = await db.scalar(select(Task).where(
         Task.id == task_id,
         Task.company_id == current_user.company_id
-    ).first()
+    ).limit(1))
     
     if not task:
         raise NotFoundError("Tarefa", task_id)
     
-    db.delete(task)
-    db.commit()
+    await db.delete(task)
+    await db.commit()
     
     logger.info(f"Tarefa {task_id} excluída pelo usuário {current_user.id}")
     return {"message": "Tarefa excluída com sucesso"}
@@ -301,14 +301,14 @@ async def delete_task(
 @router.post("/{task_id}/complete")
 async def complete_task(
     task_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Marcar tarefa como concluída"""
-    task = db.query(Task).filter(
+    task = await db.scalar(select(Task).where(
         Task.id == task_id,
         Task.company_id == current_user.company_id
-    ).first()
+    ).limit(1))
     
     if not task:
         raise NotFoundError("Tarefa", task_id)
@@ -317,8 +317,8 @@ async def complete_task(
     task.completed_at = datetime.utcnow()
     task.updated_at = datetime.utcnow()
     
-    db.commit()
-    db.refresh(task)
+    await db.commit()
+    await db.refresh(task)
     
     logger.info(f"Tarefa {task_id} marcada como concluída pelo usuário {current_user.id}")
     return TaskResponse.from_orm(task)
@@ -2,12 +2,12 @@
 Warehouse Management API
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, and_, func
 from typing import List, Optional
 from datetime import datetime
-from app.core.database import get_db
-from app.core.security import get_current_user
+from app.core.database import get_async_db
+from app.core.security import get_current_user_async
 from app.models import (
     User, Company, Warehouse, InventoryItem, StockMovement,
     WarehouseStatus, StockMovementType, Product, ImportProcess, ExportProcess
@@ -122,36 +122,36 @@ class StockMovementResponse(BaseModel):
 
 @router.get("/", response_model=List[WarehouseResponse])
 async def list_warehouses(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async),
     status: Optional[WarehouseStatus] = None
 ):
     """Listar armazéns"""
     company_id = current_user.company_id
     
-    query = db.query(Warehouse).filter(
+    query = select(Warehouse).where(
         Warehouse.company_id == company_id
     )
     
     if status:
-        query = query.filter(Warehouse.status == status)
+        query = query.where(Warehouse.status == status)
     
-    warehouses = query.order_by(Warehouse.created_at.desc()).all()
+    warehouses = (await db.scalars(query.order_by(Warehouse.created_at.desc()))).all()
     return warehouses
 
 @router.post("/", response_model=WarehouseResponse)
 async def create_warehouse(
     warehouse_data: WarehouseCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Criar novo armazém"""
     company_id = current_user.company_id
     
     # Verificar se código já existe
-    existing = db.query(Warehouse).filter(
+    existing = await db.scalar(select(Warehouse).where(
         Warehouse.code == warehouse_data.code
-    ).first()
+    ).limit(1))
     
     if existing:
         raise HTTPException(status_code=400, detail="Código de armazém já existe")
@@ -174,26 +174,26 @@ async def create_warehouse(
     )
     
     db.add(new_warehouse)
-    db.commit()
-    db.refresh(new_warehouse)
+    await db.commit()
+    await db.refresh(new_warehouse)
     
     return WarehouseResponse.from_orm(new_warehouse)
 
 @router.get("/{warehouse_id}", response_model=WarehouseResponse)
 async def get_warehouse(
     warehouse_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Obter detalhes de um armazém"""
     company_id = current_user.company_id
     
-    warehouse = db.query(Warehouse).filter(
+    warehouse = await db.scalar(select(Warehouse).where(
         and_(
             Warehouse.id == warehouse_id,
             Warehouse.company_id == company_id
         )
-    ).first()
+    ).limit(1))
     
     if not warehouse:
         raise HTTPException(status_code=404, detail="Armazém não encontrado")
@@ -203,28 +203,28 @@ async def get_warehouse(
 @router.get("/{warehouse_id}/inventory", response_model=List[InventoryItemResponse])
 async def get_warehouse_inventory(
     warehouse_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Obter inventário de um armazém"""
     company_id = current_user.company_id
     
-    warehouse = db.query(Warehouse).filter(
+    warehouse = await db.scalar(select(Warehouse).where(
         and_(
             Warehouse.id == warehouse_id,
             Warehouse.company_id == company_id
         )
-    ).first()
+    ).limit(1))
     
     if not warehouse:
         raise HTTPException(status_code=404, detail="Armazém não encontrado")
     
-    items = db.query(InventoryItem).filter(
+    items = (await db.scalars(select(InventoryItem).where(
         and_(
             InventoryItem.warehouse_id == warehouse_id,
             InventoryItem.is_available == True
         )
-    ).all()
+    ))).all()
     
     return items
 
@@ -232,40 +232,40 @@ async def get_warehouse_inventory(
 async def add_inventory_item(
     warehouse_id: int,
     item_data: InventoryItemCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Adicionar item ao inventário"""
     company_id = current_user.company_id
     
-    warehouse = db.query(Warehouse).filter(
+    warehouse = await db.scalar(select(Warehouse).where(
         and_(
             Warehouse.id == warehouse_id,
             Warehouse.company_id == company_id
         )
-    ).first()
+    ).limit(1))
     
     if not warehouse:
         raise HTTPException(status_code=404, detail="Armazém não encontrado")
     
     # Validar processos se fornecidos
     if item_data.import_process_id:
-        process = db.query(ImportProcess).filter(
+        process = await db.scalar(select(ImportProcess).where(
             and_(
                 ImportProcess.id == item_data.import_process_id,
                 ImportProcess.company_id == company_id
             )
-        ).first()
+        ).limit(1))
         if not process:
             raise HTTPException(status_code=404, detail="Processo de importação não encontrado")
     
     if item_data.export_process_id:
-        process = db.query(ExportProcess).filter(
+        process = await db.scalar(select(ExportProcess).where(
             and_(
                 ExportProcess.id == item_data.export_process_id,
                 ExportProcess.company_id == company_id
             )
-        ).first()
+        ).limit(1))
         if not process:
             raise HTTPException(status_code=404, detail="Processo de exportação não encontrado")
     
@@ -288,8 +288,8 @@ async def add_inventory_item(
     # Atualizar capacidade utilizada
     warehouse.used_capacity = (warehouse.used_capacity or Decimal(0)) + item_data.quantity
     
-    db.commit()
-    db.refresh(new_item)
+    await db.commit()
+    await db.refresh(new_item)
     
     return new_item
 
@@ -297,27 +297,27 @@ async def add_inventory_item(
 async def create_stock_movement(
     warehouse_id: int,
     movement_data: StockMovementCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Criar movimentação de estoque"""
     company_id = current_user.company_id
     
-    warehouse = db.query(Warehouse).filter(
+    warehouse = await db.scalar(select(Warehouse).where(
         and_(
             Warehouse.id == warehouse_id,
             Warehouse.company_id == company_id
         )
-    ).first()
+    ).limit(1))
     
     if not warehouse:
         raise HTTPException(status_code=404, detail="Armazém não encontrado")
     
     # Validar item de inventário se fornecido
     if movement_data.inventory_item_id:
-        item = db.query(InventoryItem).filter(
+        item = await db.scalar(select(InventoryItem).where(
             InventoryItem.id == movement_data.inventory_item_id
-        ).first()
+        ).limit(1))
         if not item:
             raise HTTPException(status_code=404, detail="Item de inventário não encontrado")
         
@@ -345,39 +345,39 @@ async def create_stock_movement(
     )
     
     db.add(new_movement)
-    db.commit()
-    db.refresh(new_movement)
+    await db.commit()
+    await db.refresh(new_movement)
     
     return new_movement
 
 @router.get("/{warehouse_id}/movements", response_model=List[StockMovementResponse])
 async def get_warehouse_movements(
     warehouse_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async),
     movement_type: Optional[StockMovementType] = None,
     limit: int = Query(50, le=100)
 ):
     """Obter movimentações de um armazém"""
     company_id = current_user.company_id
     
-    warehouse = db.query(Warehouse).filter(
+    warehouse = await db.scalar(select(Warehouse).where(
         and_(
             Warehouse.id == warehouse_id,
             Warehouse.company_id == company_id
         )
-    ).first()
+    ).limit(1))
     
     if not warehouse:
         raise HTTPException(status_code=404, detail="Armazém não encontrado")
     
-    query = db.query(StockMovement).filter(
+    query = select(StockMovement).where(
         StockMovement.warehouse_id == warehouse_id
     )
     
     if movement_type:
-        query = query.filter(StockMovement.movement_type == movement_type)
+        query = query.where(StockMovement.movement_type == movement_type)
     
-    movements = query.order_by(StockMovement.movement_date.desc()).limit(limit).all()
+    movements = (await db.scalars(query.order_by(StockMovement.movement_date.desc()).limit(limit))).all()
     return movements
 
@@ -1,145 +1,1237 @@
 """
 Configuração de cache com Redis
+Inclui cache de respostas por empresa (tenant) com invalidação por tags,
+em dois níveis: LRU em memória do processo (L1) na frente do Redis (L2).
+Sem Redis, o L1 funciona sozinho.
 """
 
 import json
-from typing import Any, Optional
+import math
+import time
+import uuid
+import random
+import asyncio
+import hashlib
+import inspect
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
 from functools import wraps
-from redis import Redis
-from redis.exceptions import ConnectionError as RedisConnectionError
 import os
 from loguru import logger
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+try:
+    from redis import Redis
+    from redis.asyncio import Redis as AsyncRedis, ConnectionPool as AsyncConnectionPool
+    from redis.asyncio.retry import Retry as AsyncRetry
+    from redis.backoff import NoBackoff
+    from redis.exceptions import ConnectionError as RedisConnectionError
+    from redis.retry import Retry
+    REDIS_AVAILABLE = True
+except ImportError:
+    Redis = None
+    AsyncRedis = None
+    AsyncConnectionPool = None
+    RedisConnectionError = ConnectionError
+    REDIS_AVAILABLE = False
+    logger.warning("redis não instalado. Execute: pip install redis (cache apenas em memória)")
 
 # Configuração Redis
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 REDIS_DB = int(os.getenv("REDIS_DB", 0))
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", None)
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 1))
+# Circuit breaker: falhas seguidas até abrir e backoff (segundos) até nova tentativa
+REDIS_BREAKER_THRESHOLD = int(os.getenv("REDIS_BREAKER_THRESHOLD", 3))
+REDIS_BACKOFF_BASE = float(os.getenv("REDIS_BACKOFF_BASE", 1))
+REDIS_BACKOFF_MAX = float(os.getenv("REDIS_BACKOFF_MAX", 60))
+
+# Cache de respostas
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+LOCAL_CACHE_MAX_ENTRIES = int(os.getenv("LOCAL_CACHE_MAX_ENTRIES", 1024))
+# TTL máximo no L1 quando há Redis: limita por quanto tempo outro worker
+# pode servir uma entrada já invalidada no Redis
+LOCAL_CACHE_TTL = float(os.getenv("LOCAL_CACHE_TTL", 5))
+# Lease entre workers (SET NX): duração e tempo máximo de espera por quem recalcula
+CACHE_LEASE_TTL = float(os.getenv("CACHE_LEASE_TTL", 10))
+CACHE_LEASE_WAIT = float(os.getenv("CACHE_LEASE_WAIT", 3))
+CACHE_LEASE_POLL = float(os.getenv("CACHE_LEASE_POLL", 0.05))
+# Refresh antecipado probabilístico (XFetch); 0 desativa
+CACHE_EARLY_REFRESH_BETA = float(os.getenv("CACHE_EARLY_REFRESH_BETA", 1))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker para o Redis
+
+    Fechado: as chamadas seguem normalmente. Após `failure_threshold` falhas
+    seguidas (ou uma falha de conexão) abre e bloqueia chamadas durante o
+    backoff, que dobra a cada nova abertura até `max_backoff`. Vencido o
+    backoff, fica meio-aberto e libera uma única tentativa: sucesso fecha o
+    circuito, falha o reabre. Quem recebe a tentativa e não chega a usar o
+    Redis a devolve com `release_trial`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = REDIS_BREAKER_THRESHOLD,
+        base_backoff: float = REDIS_BACKOFF_BASE,
+        max_backoff: float = REDIS_BACKOFF_MAX
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._backoff = base_backoff
+        self._open_until = 0.0
+        self._trial_in_flight = False
+        self._trial_owner = None
+
+    @property
+    def state(self) -> str:
+        if self._failures < self.failure_threshold:
+            return "closed"
+        if time.monotonic() < self._open_until:
+            return "open"
+        return "half-open"
+
+    def allow_request(self) -> bool:
+        """Indica se uma chamada ao Redis pode ser feita agora"""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "open" or self._trial_in_flight:
+                return False
+            # Meio-aberto: apenas uma tentativa por vez
+            self._trial_in_flight = True
+            self._trial_owner = _caller()
+            return True
+
+    def release_trial(self):
+        """Devolve a tentativa do meio-aberto se ela é do chamador e não houve resultado"""
+        with self._lock:
+            if self._trial_in_flight and self._trial_owner == _caller():
+                self._trial_in_flight = False
+                self._trial_owner = None
+
+    def record_success(self):
+        with self._lock:
+            if self._failures >= self.failure_threshold:
+                logger.info(f"Circuit breaker {self.name} fechado")
+            self._failures = 0
+            self._backoff = self.base_backoff
+            self._trial_in_flight = False
+
+    def record_failure(self, trip: bool = False):
+        """
+        Registra uma falha
+
+        Args:
+            trip: Abre o circuito imediatamente (ex: falha ao conectar)
+        """
+        with self._lock:
+            self._failures = max(self._failures + 1, self.failure_threshold if trip else 0)
+            self._trial_in_flight = False
+            if self._failures >= self.failure_threshold:
+                self._open_until = time.monotonic() + self._backoff
+                logger.warning(f"Circuit breaker {self.name} aberto por {self._backoff:.0f}s")
+                self._backoff = min(self._backoff * 2, self.max_backoff)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "failures": self._failures,
+            "retry_in": round(max(0.0, self._open_until - time.monotonic()), 1),
+        }
+
+
+def _caller():
+    """Thread e task atuais (dono da tentativa do circuit breaker meio-aberto)"""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return threading.get_ident(), task
+
 
-# Cliente Redis global
+# Clientes Redis globais
 redis_client: Optional[Redis] = None
+redis_breaker = CircuitBreaker("redis")
+
+async_redis_client: Optional[AsyncRedis] = None
+_async_redis_loop: Optional[asyncio.AbstractEventLoop] = None
+async_redis_breaker = CircuitBreaker("redis-async")
 
 
 def get_redis() -> Optional[Redis]:
     """
     Obtém cliente Redis (singleton)
-    Retorna None se Redis não estiver disponível (modo degradado)
+    Retorna None se Redis não estiver disponível (modo degradado); novas
+    tentativas de conexão respeitam o backoff do circuit breaker
     """
     global redis_client
-    
+
+    if not REDIS_AVAILABLE:
+        return None
+
+    if not redis_breaker.allow_request():
+        return None
+
     if redis_client is None:
         try:
-            redis_client = Redis(
+            client = Redis(
                 host=REDIS_HOST,
                 port=REDIS_PORT,
                 db=REDIS_DB,
                 password=REDIS_PASSWORD,
                 decode_responses=True,
-                socket_connect_timeout=2
+                socket_connect_timeout=2,
+                socket_timeout=REDIS_SOCKET_TIMEOUT,
+                # Sem retentativas no cliente: o circuit breaker controla o backoff
+                retry=Retry(NoBackoff(), 0)
             )
             # Testar conexão
-            redis_client.ping()
+            client.ping()
+            redis_client = client
+            redis_breaker.record_success()
             logger.info(f"Redis conectado em {REDIS_HOST}:{REDIS_PORT}")
         except (RedisConnectionError, Exception) as e:
             logger.warning(f"Redis não disponível: {e}. Modo degradado (sem cache)")
-            redis_client = None
-    
+            redis_breaker.record_failure(trip=True)
+
     return redis_client
 
 
+async def get_async_redis() -> Optional[AsyncRedis]:
+    """
+    Obtém cliente Redis assíncrono (redis.asyncio) com pool de conexões
+
+    Para uso em rotas async: as operações não bloqueiam o event loop.
+    Retorna None se o Redis não estiver disponível ou se o circuit breaker
+    estiver aberto.
+    """
+    global async_redis_client, _async_redis_loop
+
+    if not REDIS_AVAILABLE:
+        return None
+
+    if not async_redis_breaker.allow_request():
+        return None
+
+    # O pool fica preso ao event loop em que foi criado
+    loop = asyncio.get_running_loop()
+    if async_redis_client is not None and _async_redis_loop is not loop:
+        async_redis_client = None
+
+    if async_redis_client is None:
+        try:
+            pool = AsyncConnectionPool(
+                host=REDIS_HOST,
+                port=REDIS_PORT,
+                db=REDIS_DB,
+                password=REDIS_PASSWORD,
+                decode_responses=True,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                socket_connect_timeout=2,
+                socket_timeout=REDIS_SOCKET_TIMEOUT,
+                retry=AsyncRetry(NoBackoff(), 0)
+            )
+            client = AsyncRedis(connection_pool=pool)
+            await client.ping()
+            async_redis_client = client
+            _async_redis_loop = loop
+            async_redis_breaker.record_success()
+            logger.info(f"Redis (async) conectado em {REDIS_HOST}:{REDIS_PORT}")
+        except (RedisConnectionError, Exception) as e:
+            logger.warning(f"Redis (async) não disponível: {e}. Modo degradado (sem cache)")
+            async_redis_breaker.record_failure(trip=True)
+
+    return async_redis_client
+
+
 def cache_key(prefix: str, *args, **kwargs) -> str:
     """
     Gera chave de cache padronizada
-    
+
     Args:
         prefix: Prefixo da chave
         *args, **kwargs: Argumentos para incluir na chave
-    
+
     Returns:
         Chave de cache formatada
     """
     key_parts = [prefix]
-    
+
     if args:
         key_parts.extend(str(arg) for arg in args)
-    
+
     if kwargs:
         sorted_kwargs = sorted(kwargs.items())
         key_parts.extend(f"{k}:{v}" for k, v in sorted_kwargs)
-    
+
     return ":".join(key_parts)
 
 
+def tag_key(tag: str) -> str:
+    """Chave do conjunto Redis que guarda as chaves associadas a uma tag"""
+    return f"cache:tag:{tag}"
+
+
+def company_tag(company_id: int, namespace: str) -> str:
+    """Tag que agrupa as respostas cacheadas de uma empresa em um namespace"""
+    return f"company:{company_id}:{namespace}"
+
+
+def lease_key(key: str) -> str:
+    """Chave do lease (SET NX) de quem está recalculando uma entrada"""
+    return f"cache:lease:{key}"
+
+
+# Libera o lease apenas se ainda pertence a quem o adquiriu
+RELEASE_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class CacheStats:
+    """Contadores de uso do cache (hits, misses, escritas, invalidações e erros)"""
+
+    FIELDS = ("hits", "misses", "sets", "invalidations", "errors", "coalesced", "early_refreshes")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def incr(self, backend: str, field: str, amount: int = 1):
+        with self._lock:
+            counters = self._counters.setdefault(backend, dict.fromkeys(self.FIELDS, 0))
+            counters[field] += amount
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            backends = {name: dict(values) for name, values in self._counters.items()}
+        totals = dict.fromkeys(self.FIELDS, 0)
+        for values in backends.values():
+            for field in self.FIELDS:
+                totals[field] += values[field]
+        lookups = totals["hits"] + totals["misses"]
+        totals["hit_rate"] = round(totals["hits"] / lookups, 4) if lookups else 0.0
+        return {"totals": totals, "backends": backends}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+cache_stats = CacheStats()
+
+
+class CacheEntry(NamedTuple):
+    """
+    Valor cacheado com os metadados do refresh antecipado
+
+    delta: tempo (segundos) que o valor levou para ser calculado
+    expires_at: expiração lógica (epoch)
+    """
+    value: Any
+    delta: float
+    expires_at: float
+
+    def should_refresh(self, beta: float = CACHE_EARLY_REFRESH_BETA) -> bool:
+        """
+        XFetch: decide recalcular antes da expiração com probabilidade crescente
+        à medida que ela se aproxima (e maior para valores caros de calcular),
+        espalhando os recálculos de chaves quentes no tempo
+        """
+        now = time.time()
+        if now >= self.expires_at:
+            return True
+        if beta <= 0 or self.delta <= 0:
+            return False
+        return now - self.delta * beta * math.log(1.0 - random.random()) >= self.expires_at
+
+    def remaining(self) -> float:
+        return self.expires_at - time.time()
+
+    def encode(self) -> str:
+        return json.dumps({"value": self.value, "delta": self.delta, "expires_at": self.expires_at})
+
+    @classmethod
+    def decode(cls, raw: str) -> "CacheEntry":
+        data = json.loads(raw)
+        return cls(data["value"], data["delta"], data["expires_at"])
+
+
+class LocalCacheBackend:
+    """
+    Cache LRU em memória do processo
+
+    É o L1 na frente do Redis e o único nível quando o Redis não está disponível.
+    Mantém TTL por chave, índice de tags e um limite de entradas; ao encher,
+    remove as expiradas e depois as menos usadas recentemente.
+    """
+
+    name = "local"
+
+    def __init__(self, max_entries: int = LOCAL_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float, tags: Iterable[str] = ()):
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                self._evict()
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        removed = 0
+        with self._lock:
+            for tag in tags:
+                for key in self._tags.pop(tag, set()):
+                    if self._entries.pop(key, None) is not None:
+                        removed += 1
+        return removed
+
+    def delete_pattern(self, pattern: str) -> int:
+        import fnmatch
+        with self._lock:
+            keys = [key for key in self._entries if fnmatch.fnmatchcase(key, pattern)]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def acquire_lease(self, key: str, ttl: float) -> Optional[str]:
+        # Dentro do processo o single-flight já garante um único recálculo
+        return "local"
+
+    def release_lease(self, key: str, token: str):
+        pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def _evict(self):
+        """Remove entradas expiradas; se ainda estiver cheio, remove as menos usadas"""
+        now = time.monotonic()
+        for key in [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]:
+            del self._entries[key]
+        while len(self._entries) >= self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class RedisCacheBackend:
+    """
+    Cache no Redis com índice de tags em conjuntos (SADD/SMEMBERS)
+    A invalidação nunca usa KEYS: remove apenas as chaves registradas na tag
+    """
+
+    name = "redis"
+    breaker = redis_breaker
+
+    def __init__(self, client: Redis):
+        self.client = client
+
+    def get(self, key: str) -> Optional[str]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: str, ttl: float, tags: Iterable[str] = ()):
+        ttl = max(1, math.ceil(ttl))
+        pipe = self.client.pipeline()
+        pipe.set(key, value, ex=ttl)
+        for tag in tags:
+            pipe.sadd(tag_key(tag), key)
+            # A tag expira junto com a entrada mais longa registrada nela
+            pipe.expire(tag_key(tag), ttl)
+        pipe.execute()
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        removed = 0
+        for tag in tags:
+            keys = self.client.smembers(tag_key(tag))
+            pipe = self.client.pipeline()
+            if keys:
+                pipe.delete(*keys)
+            pipe.delete(tag_key(tag))
+            result = pipe.execute()
+            if keys:
+                removed += result[0]
+        return removed
+
+    def delete_pattern(self, pattern: str, batch_size: int = 500) -> int:
+        removed = 0
+        batch: List[str] = []
+        for key in self.client.scan_iter(match=pattern, count=batch_size):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                removed += self.client.delete(*batch)
+                batch = []
+        if batch:
+            removed += self.client.delete(*batch)
+        return removed
+
+    def acquire_lease(self, key: str, ttl: float) -> Optional[str]:
+        """SET NX com expiração: retorna o token se este worker deve recalcular"""
+        token = uuid.uuid4().hex
+        if self.client.set(lease_key(key), token, nx=True, px=int(ttl * 1000)):
+            return token
+        return None
+
+    def release_lease(self, key: str, token: str):
+        self.client.eval(RELEASE_LEASE_SCRIPT, 1, lease_key(key), token)
+
+
+class AsyncRedisCacheBackend:
+    """Mesmo formato de chaves, tags e leases do RedisCacheBackend, sobre redis.asyncio"""
+
+    name = "redis"
+    breaker = async_redis_breaker
+
+    def __init__(self, client: AsyncRedis):
+        self.client = client
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: str, ttl: float, tags: Iterable[str] = ()):
+        ttl = max(1, math.ceil(ttl))
+        pipe = self.client.pipeline()
+        pipe.set(key, value, ex=ttl)
+        for tag in tags:
+            pipe.sadd(tag_key(tag), key)
+            pipe.expire(tag_key(tag), ttl)
+        await pipe.execute()
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> int:
+        removed = 0
+        for tag in tags:
+            keys = await self.client.smembers(tag_key(tag))
+            pipe = self.client.pipeline()
+            if keys:
+                pipe.delete(*keys)
+            pipe.delete(tag_key(tag))
+            result = await pipe.execute()
+            if keys:
+                removed += result[0]
+        return removed
+
+    async def delete_pattern(self, pattern: str, batch_size: int = 500) -> int:
+        removed = 0
+        batch: List[str] = []
+        async for key in self.client.scan_iter(match=pattern, count=batch_size):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                removed += await self.client.delete(*batch)
+                batch = []
+        if batch:
+            removed += await self.client.delete(*batch)
+        return removed
+
+    async def acquire_lease(self, key: str, ttl: float) -> Optional[str]:
+        token = uuid.uuid4().hex
+        if await self.client.set(lease_key(key), token, nx=True, px=int(ttl * 1000)):
+            return token
+        return None
+
+    async def release_lease(self, key: str, token: str):
+        await self.client.eval(RELEASE_LEASE_SCRIPT, 1, lease_key(key), token)
+
+
+local_cache = LocalCacheBackend()
+
+
+def get_cache_backend():
+    """Backend de cache compartilhado: Redis quando disponível, senão memória do processo"""
+    client = get_redis()
+    if client is not None:
+        return RedisCacheBackend(client)
+    return local_cache
+
+
+async def get_async_cache_backend():
+    """Backend de cache para rotas async: Redis assíncrono quando disponível, senão memória do processo"""
+    client = await get_async_redis()
+    if client is not None:
+        return AsyncRedisCacheBackend(client)
+    return local_cache
+
+
+async def _maybe_await(value):
+    """Permite usar o backend em memória (sync) e o Redis assíncrono no mesmo caminho"""
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+
+def _release_trial(backend):
+    """Devolve a tentativa do circuit breaker que o backend obteve e não usou"""
+    breaker = getattr(backend, "breaker", None)
+    if breaker is not None:
+        breaker.release_trial()
+
+
+def _record_outcome(backend, ok: bool):
+    """Alimenta o circuit breaker do backend (o cache em memória não possui)"""
+    breaker = getattr(backend, "breaker", None)
+    if breaker is None:
+        return
+    if ok:
+        breaker.record_success()
+    else:
+        breaker.record_failure()
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Estatísticas de hits/misses do cache e estado dos circuit breakers"""
+    stats = cache_stats.snapshot()
+    stats["backend"] = "redis" if redis_client is not None or async_redis_client is not None else "local"
+    stats["circuit_breakers"] = {
+        "sync": redis_breaker.snapshot(),
+        "async": async_redis_breaker.snapshot(),
+    }
+    return stats
+
+
+class SingleFlight:
+    """
+    Um recálculo por chave dentro do processo (threads do threadpool)
+
+    Quem chega enquanto a chave está sendo recalculada espera e reaproveita
+    o resultado; com `blocking=False` desiste imediatamente (ex: quando já
+    possui um valor ainda válido para servir).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks: Dict[str, List[Any]] = {}
+
+    @contextmanager
+    def lock(self, key: str, blocking: bool = True):
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        acquired = entry[0].acquire(blocking)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                entry[0].release()
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+
+class AsyncSingleFlight:
+    """Equivalente de SingleFlight para corrotinas no event loop"""
+
+    def __init__(self):
+        self._locks: Dict[str, List[Any]] = {}
+
+    @asynccontextmanager
+    async def lock(self, key: str, blocking: bool = True):
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        acquired = False
+        try:
+            if blocking or not entry[0].locked():
+                await entry[0].acquire()
+                acquired = True
+            yield acquired
+        finally:
+            if acquired:
+                entry[0].release()
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+
+single_flight = SingleFlight()
+async_single_flight = AsyncSingleFlight()
+
+
 def cached(ttl: int = 300, key_prefix: str = None):
     """
-    Decorator para cachear resultado de função
-    
+    Decorator para cachear resultado de função async
+
+    Usa o cliente Redis assíncrono, então uma lentidão do Redis não bloqueia
+    o event loop. Sem Redis, executa a função normalmente.
+
     Args:
         ttl: Time to live em segundos (padrão: 5 minutos)
         key_prefix: Prefixo para chave de cache
-    
+
     Usage:
         @cached(ttl=600, key_prefix="exchange_rate")
-        def get_exchange_rate(currency: str):
+        async def get_exchange_rate(currency: str):
             ...
     """
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            redis = get_redis()
-            
+            redis = await get_async_redis()
+
             # Se Redis não disponível, executa função normalmente
             if redis is None:
                 return await func(*args, **kwargs)
-            
+
             # Gerar chave de cache
             prefix = key_prefix or f"{func.__module__}:{func.__name__}"
             cache_key_str = cache_key(prefix, *args, **kwargs)
-            
+
             # Tentar obter do cache
             try:
-                cached_value = redis.get(cache_key_str)
+                cached_value = await redis.get(cache_key_str)
+                async_redis_breaker.record_success()
                 if cached_value:
                     logger.debug(f"Cache hit: {cache_key_str}")
                     return json.loads(cached_value)
             except Exception as e:
+                async_redis_breaker.record_failure()
                 logger.warning(f"Erro ao ler cache: {e}")
-            
+
             # Executar função e cachear resultado
             logger.debug(f"Cache miss: {cache_key_str}")
             result = await func(*args, **kwargs)
-            
+
             try:
-                redis.setex(
+                await redis.set(
                     cache_key_str,
-                    ttl,
-                    json.dumps(result, default=str)
+                    json.dumps(result, default=str),
+                    ex=ttl
                 )
             except Exception as e:
+                async_redis_breaker.record_failure()
                 logger.warning(f"Erro ao escrever cache: {e}")
-            
+
             return result
-        
+
         return wrapper
     return decorator
 
 
+def _response_cache_key(namespace: str, func: Callable, company_id: int, kwargs: Dict[str, Any]) -> str:
+    """Chave de cache de resposta: namespace, empresa, endpoint e parâmetros de consulta"""
+    params = {
+        name: value for name, value in kwargs.items()
+        if name != "current_user" and not isinstance(value, (Session, AsyncSession))
+    }
+    digest = hashlib.sha1(
+        json.dumps(jsonable_encoder(params), sort_keys=True, default=str).encode()
+    ).hexdigest()[:16]
+    return cache_key("cache", namespace, company_id, func.__name__, digest)
+
+
+def _local_ttl(backend, ttl: float) -> float:
+    """TTL no L1: completo sem Redis; limitado por LOCAL_CACHE_TTL com Redis"""
+    return ttl if backend is local_cache else min(ttl, LOCAL_CACHE_TTL)
+
+
+def _read_local(key: str) -> Optional[CacheEntry]:
+    raw = local_cache.get(key)
+    return CacheEntry.decode(raw) if raw is not None else None
+
+
+def _promote(backend, key: str, raw: Optional[str], tags: List[str]) -> Optional[CacheEntry]:
+    """Decodifica uma entrada lida do L2 e a copia para o L1"""
+    if raw is None:
+        return None
+    entry = CacheEntry.decode(raw)
+    remaining = entry.remaining()
+    if remaining > 0:
+        local_cache.set(key, raw, _local_ttl(backend, remaining), tags)
+    return entry
+
+
+def _count_lookup(backend, entry: Optional[CacheEntry]):
+    cache_stats.incr(backend.name, "hits" if entry is not None else "misses")
+
+
+def _operation_failed(backend, error: Exception, action: str):
+    _record_outcome(backend, False)
+    cache_stats.incr(backend.name, "errors")
+    logger.warning(f"Erro ao {action} cache: {error}")
+
+
+def _build_entry(result: Any, delta: float, ttl: float) -> CacheEntry:
+    return CacheEntry(jsonable_encoder(result), delta, time.time() + ttl)
+
+
+def _cache_lookup(backend, key: str, tags: List[str]) -> Optional[CacheEntry]:
+    """Busca no L1 e, em caso de miss, no L2"""
+    entry = _read_local(key)
+    if entry is not None or backend is local_cache:
+        _count_lookup(local_cache, entry)
+        return entry
+    try:
+        raw = backend.get(key)
+    except Exception as e:
+        _operation_failed(backend, e, "ler")
+        return None
+    _record_outcome(backend, True)
+    entry = _promote(backend, key, raw, tags)
+    _count_lookup(backend, entry)
+    return entry
+
+
+def _cache_store(backend, key: str, entry: CacheEntry, ttl: float, tags: List[str]):
+    raw = entry.encode()
+    local_cache.set(key, raw, _local_ttl(backend, ttl), tags)
+    if backend is not local_cache:
+        try:
+            backend.set(key, raw, ttl, tags)
+            _record_outcome(backend, True)
+        except Exception as e:
+            _operation_failed(backend, e, "escrever")
+            return
+    cache_stats.incr(backend.name, "sets")
+
+
+def _acquire_lease(backend, key: str) -> Optional[str]:
+    try:
+        return backend.acquire_lease(key, CACHE_LEASE_TTL)
+    except Exception as e:
+        # Sem lease (Redis com erro): recalcula localmente
+        _operation_failed(backend, e, "obter lease do")
+        return "local"
+
+
+def _release_lease(backend, key: str, token: str):
+    try:
+        backend.release_lease(key, token)
+    except Exception as e:
+        _operation_failed(backend, e, "liberar lease do")
+
+
+def _wait_for_entry(backend, key: str, tags: List[str]) -> Optional[CacheEntry]:
+    """Aguarda outro worker (dono do lease) gravar a entrada no Redis"""
+    deadline = time.monotonic() + CACHE_LEASE_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(CACHE_LEASE_POLL)
+        try:
+            entry = _promote(backend, key, backend.get(key), tags)
+        except Exception as e:
+            _operation_failed(backend, e, "ler")
+            return None
+        if entry is not None:
+            return entry
+    return None
+
+
+def get_or_compute(key: str, ttl: float, tags: List[str], compute: Callable[[], Any]) -> Any:
+    """
+    Lê do cache em dois níveis ou calcula o valor, com proteção contra stampede
+
+    - Hit válido: retorna direto do L1 (ou do Redis, copiando para o L1).
+    - Miss: um único thread por chave recalcula (single-flight); entre
+      workers, apenas o dono do lease SET NX recalcula e os demais aguardam
+      o valor aparecer no Redis (até CACHE_LEASE_WAIT, depois recalculam).
+    - Refresh antecipado: quem sorteia o refresh recalcula enquanto os
+      demais continuam servindo o valor atual, sem esperar.
+
+    Args:
+        key: Chave de cache
+        ttl: Time to live em segundos
+        tags: Tags de invalidação da entrada
+        compute: Função que calcula o valor (resultado serializável por jsonable_encoder)
+    """
+    # Hit válido no L1 não usa o Redis (nem a tentativa do circuit breaker meio-aberto)
+    entry = _read_local(key)
+    if entry is not None and not entry.should_refresh():
+        _count_lookup(local_cache, entry)
+        return entry.value
+    backend = get_cache_backend()
+    try:
+        return _get_or_compute(backend, key, ttl, tags, compute)
+    finally:
+        _release_trial(backend)
+
+
+def _get_or_compute(backend, key: str, ttl: float, tags: List[str], compute: Callable[[], Any]) -> Any:
+    entry = _cache_lookup(backend, key, tags)
+    if entry is not None and not entry.should_refresh():
+        return entry.value
+
+    with single_flight.lock(key, blocking=entry is None) as acquired:
+        if not acquired:
+            # Outro thread já está recalculando: serve o valor atual
+            cache_stats.incr(backend.name, "coalesced")
+            return entry.value
+        if entry is None:
+            # Outro thread pode ter gravado enquanto este esperava
+            fresh = _read_local(key)
+            if fresh is not None:
+                cache_stats.incr(backend.name, "coalesced")
+                return fresh.value
+
+        token = _acquire_lease(backend, key)
+        if token is None:
+            if entry is not None:
+                # Outro worker está fazendo o refresh antecipado
+                return entry.value
+            waited = _wait_for_entry(backend, key, tags)
+            if waited is not None:
+                cache_stats.incr(backend.name, "coalesced")
+                return waited.value
+        elif entry is not None:
+            cache_stats.incr(backend.name, "early_refreshes")
+
+        try:
+            started = time.monotonic()
+            result = compute()
+            _cache_store(backend, key, _build_entry(result, time.monotonic() - started, ttl), ttl, tags)
+        finally:
+            if token not in (None, "local"):
+                _release_lease(backend, key, token)
+        return result
+
+
+async def _cache_lookup_async(backend, key: str, tags: List[str]) -> Optional[CacheEntry]:
+    entry = _read_local(key)
+    if entry is not None or backend is local_cache:
+        _count_lookup(local_cache, entry)
+        return entry
+    try:
+        raw = await backend.get(key)
+    except Exception as e:
+        _operation_failed(backend, e, "ler")
+        return None
+    _record_outcome(backend, True)
+    entry = _promote(backend, key, raw, tags)
+    _count_lookup(backend, entry)
+    return entry
+
+
+async def _cache_store_async(backend, key: str, entry: CacheEntry, ttl: float, tags: List[str]):
+    raw = entry.encode()
+    local_cache.set(key, raw, _local_ttl(backend, ttl), tags)
+    if backend is not local_cache:
+        try:
+            await backend.set(key, raw, ttl, tags)
+            _record_outcome(backend, True)
+        except Exception as e:
+            _operation_failed(backend, e, "escrever")
+            return
+    cache_stats.incr(backend.name, "sets")
+
+
+async def _acquire_lease_async(backend, key: str) -> Optional[str]:
+    try:
+        return await _maybe_await(backend.acquire_lease(key, CACHE_LEASE_TTL))
+    except Exception as e:
+        _operation_failed(backend, e, "obter lease do")
+        return "local"
+
+
+async def _wait_for_entry_async(backend, key: str, tags: List[str]) -> Optional[CacheEntry]:
+    deadline = time.monotonic() + CACHE_LEASE_WAIT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(CACHE_LEASE_POLL)
+        try:
+            entry = _promote(backend, key, await backend.get(key), tags)
+        except Exception as e:
+            _operation_failed(backend, e, "ler")
+            return None
+        if entry is not None:
+            return entry
+    return None
+
+
+async def get_or_compute_async(key: str, ttl: float, tags: List[str], compute: Callable[[], Any]) -> Any:
+    """
+    Variante assíncrona de `get_or_compute`
+
+    Args:
+        key: Chave de cache
+        ttl: Time to live em segundos
+        tags: Tags de invalidação da entrada
+        compute: Função sem argumentos que retorna uma corrotina com o valor
+    """
+    entry = _read_local(key)
+    if entry is not None and not entry.should_refresh():
+        _count_lookup(local_cache, entry)
+        return entry.value
+    backend = await get_async_cache_backend()
+    try:
+        return await _get_or_compute_async(backend, key, ttl, tags, compute)
+    finally:
+        _release_trial(backend)
+
+
+async def _get_or_compute_async(backend, key: str, ttl: float, tags: List[str], compute: Callable[[], Any]) -> Any:
+    entry = await _cache_lookup_async(backend, key, tags)
+    if entry is not None and not entry.should_refresh():
+        return entry.value
+
+    async with async_single_flight.lock(key, blocking=entry is None) as acquired:
+        if not acquired:
+            cache_stats.incr(backend.name, "coalesced")
+            return entry.value
+        if entry is None:
+            fresh = _read_local(key)
+            if fresh is not None:
+                cache_stats.incr(backend.name, "coalesced")
+                return fresh.value
+
+        token = await _acquire_lease_async(backend, key)
+        if token is None:
+            if entry is not None:
+                return entry.value
+            waited = await _wait_for_entry_async(backend, key, tags)
+            if waited is not None:
+                cache_stats.incr(backend.name, "coalesced")
+                return waited.value
+        elif entry is not None:
+            cache_stats.incr(backend.name, "early_refreshes")
+
+        try:
+            started = time.monotonic()
+            result = await compute()
+            await _cache_store_async(backend, key, _build_entry(result, time.monotonic() - started, ttl), ttl, tags)
+        finally:
+            if token not in (None, "local"):
+                try:
+                    await backend.release_lease(key, token)
+                except Exception as e:
+                    _operation_failed(backend, e, "liberar lease do")
+        return result
+
+
+def cached_response(namespace: str, ttl: int = 60):
+    """
+    Decorator para cachear respostas de endpoints GET por empresa
+
+    A chave inclui company_id do usuário autenticado e os parâmetros de consulta;
+    a entrada é associada à tag da empresa no namespace, invalidada quando os
+    modelos registrados com `invalidate_on_write` são gravados.
+    Endpoints async usam o cliente Redis assíncrono; endpoints sync continuam
+    no threadpool com o cliente síncrono. Ver `get_or_compute` para os níveis
+    de cache e a proteção contra stampede.
+
+    Args:
+        namespace: Namespace das respostas (ex: "dashboard", "control-tower")
+        ttl: Time to live em segundos
+
+    Usage:
+        @router.get("/summary")
+        @cached_response("control-tower", ttl=30)
+        async def get_summary(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+            ...
+    """
+    def decorator(func):
+        def prepare(kwargs):
+            current_user = kwargs.get("current_user")
+            if not CACHE_ENABLED or current_user is None:
+                return None, None
+            company_id = current_user.company_id
+            key = _response_cache_key(namespace, func, company_id, kwargs)
+            return key, [company_tag(company_id, namespace)]
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                key, tags = prepare(kwargs)
+                if key is None:
+                    return await func(*args, **kwargs)
+                return await get_or_compute_async(key, ttl, tags, lambda: func(*args, **kwargs))
+            return async_wrapper
+
+        @wraps(func)
+        def sync_wrapper(*args, **kwargs):
+            key, tags = prepare(kwargs)
+            if key is None:
+                return func(*args, **kwargs)
+            return get_or_compute(key, ttl, tags, lambda: func(*args, **kwargs))
+        return sync_wrapper
+    return decorator
+
+
+def invalidate_tags(tags: Iterable[str]) -> int:
+    """
+    Invalida todas as entradas associadas às tags (L1 e Redis)
+
+    Args:
+        tags: Tags a invalidar (ex: company_tag(1, "dashboard"))
+
+    Returns:
+        Número de chaves removidas
+    """
+    tags = list(tags)
+    if not tags:
+        return 0
+    removed = local_cache.invalidate_tags(tags)
+    backend = get_cache_backend()
+    if backend is not local_cache:
+        try:
+            removed = backend.invalidate_tags(tags)
+        except Exception as e:
+            _operation_failed(backend, e, "invalidar")
+            return removed
+    return _invalidated(backend, tags, removed)
+
+
+async def invalidate_tags_async(tags: Iterable[str]) -> int:
+    """Variante assíncrona de `invalidate_tags`, para uso em rotas async"""
+    tags = list(tags)
+    if not tags:
+        return 0
+    removed = local_cache.invalidate_tags(tags)
+    backend = await get_async_cache_backend()
+    if backend is not local_cache:
+        try:
+            removed = await backend.invalidate_tags(tags)
+        except Exception as e:
+            _operation_failed(backend, e, "invalidar")
+            return removed
+    return _invalidated(backend, tags, removed)
+
+
+# Invalidações disparadas no event loop e ainda em andamento (referência forte até terminarem)
+_pending_invalidations: Set[asyncio.Task] = set()
+
+
+def invalidate_tags_after_commit(tags: Iterable[str]):
+    """
+    Invalida tags a partir de um hook after_commit
+
+    Quando o commit acontece no event loop (AsyncSession ou Session usada em
+    rota async), o L1 é limpo na hora e o Redis é invalidado por uma task com
+    o cliente assíncrono, sem bloquear o loop. Fora do loop (rotas síncronas,
+    workers) usa `invalidate_tags`.
+    """
+    tags = list(tags)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        invalidate_tags(tags)
+        return
+    local_cache.invalidate_tags(tags)
+    task = loop.create_task(invalidate_tags_async(tags))
+    _pending_invalidations.add(task)
+    task.add_done_callback(_pending_invalidations.discard)
+
+
+def _invalidated(backend, tags: List[str], removed: int) -> int:
+    _record_outcome(backend, True)
+    cache_stats.incr(backend.name, "invalidations", len(tags))
+    if removed:
+        logger.debug(f"Cache invalidado: {removed} chaves ({', '.join(tags)})")
+    return removed
+
+
+# Registro de invalidação: modelo -> namespaces de resposta afetados
+_invalidation_registry: Dict[type, Set[str]] = {}
+
+
+def invalidate_on_write(namespace: str, *models: type):
+    """
+    Registra modelos cujas gravações invalidam as respostas de um namespace
+
+    As tags são coletadas durante o flush (pelo company_id dos objetos gravados)
+    e invalidadas apenas após o commit, para nunca repovoar o cache com dados
+    de uma transação ainda aberta.
+
+    Args:
+        namespace: Namespace de respostas (o mesmo de `cached_response`)
+        *models: Modelos SQLAlchemy com coluna company_id
+    """
+    for model in models:
+        _invalidation_registry.setdefault(model, set()).add(namespace)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_invalidation_tags(session, flush_context):
+    if not _invalidation_registry:
+        return
+    tags = session.info.setdefault("cache_invalidation_tags", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        namespaces = _invalidation_registry.get(type(obj))
+        company_id = getattr(obj, "company_id", None)
+        if namespaces and company_id is not None:
+            tags.update(company_tag(company_id, namespace) for namespace in namespaces)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    tags = session.info.pop("cache_invalidation_tags", None)
+    if tags:
+        invalidate_tags_after_commit(tags)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidation_tags(session):
+    session.info.pop("cache_invalidation_tags", None)
+
+
 def invalidate_cache(pattern: str):
     """
     Invalida cache por padrão
-    
+
+    Usa SCAN em lotes (não bloqueia o Redis como KEYS).
+
     Args:
         pattern: Padrão de chaves a invalidar (ex: "exchange_rate:*")
     """
-    redis = get_redis()
-    if redis is None:
-        return
-    
+    removed = local_cache.delete_pattern(pattern)
+    backend = get_cache_backend()
     try:
-        keys = redis.keys(pattern)
-        if keys:
-            redis.delete(*keys)
-            logger.info(f"Cache invalidado: {len(keys)} chaves removidas")
+        if backend is not local_cache:
+            removed = backend.delete_pattern(pattern)
+        _record_outcome(backend, True)
+        if removed:
+            logger.info(f"Cache invalidado: {removed} chaves removidas")
     except Exception as e:
+        _record_outcome(backend, False)
         logger.warning(f"Erro ao invalidar cache: {e}")
 
+
+async def invalidate_cache_async(pattern: str):
+    """
+    Variante assíncrona de `invalidate_cache` (SCAN pelo cliente redis.asyncio)
+
+    Args:
+        pattern: Padrão de chaves a invalidar (ex: "exchange_rate:*")
+    """
+    removed = local_cache.delete_pattern(pattern)
+    backend = await get_async_cache_backend()
+    try:
+        if backend is not local_cache:
+            removed = await backend.delete_pattern(pattern)
+        _record_outcome(backend, True)
+        if removed:
+            logger.info(f"Cache invalidado: {removed} chaves removidas")
+    except Exception as e:
+        _record_outcome(backend, False)
+        logger.warning(f"Erro ao invalidar cache: {e}")
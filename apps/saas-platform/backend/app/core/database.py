@@ -1,19 +1,180 @@
-from sqlalchemy import create_engine
+import asyncio
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from starlette.concurrency import run_in_threadpool
+from app.core.db_metrics import InstrumentedAsyncQueuePool, InstrumentedQueuePool, instrument_engine
+from app.core.slow_queries import install_slow_query_log
 import os
 
 # Caminho relativo ao diretório raiz do projeto
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 DATABASE_PATH = os.path.join(BASE_DIR, "data", "databases", "kue_marketing.db")
 DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{DATABASE_PATH}")
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {})
+# Pool de conexões
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+# Recicla conexões antes que o servidor/proxy as derrube por inatividade (segundos; -1 desativa)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Tempo máximo de uma consulta no PostgreSQL (ms; 0 desativa)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 30000))
+
+# SQLite: WAL permite leituras concorrentes com uma escrita em andamento
+SQLITE_WAL = os.getenv("SQLITE_WAL", "true").lower() == "true"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", 20000))
+
+def pool_options() -> dict:
+    """Parâmetros de pool comuns aos engines síncrono e assíncrono"""
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+def sync_connect_args() -> dict:
+    if IS_SQLITE:
+        return {"check_same_thread": False}
+    if DB_STATEMENT_TIMEOUT_MS > 0:
+        return {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return {}
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """PRAGMAs aplicados a cada nova conexão SQLite"""
+    cursor = dbapi_connection.cursor()
+    try:
+        if SQLITE_WAL:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            # Em WAL, NORMAL é seguro contra corrupção e evita um fsync por commit
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
+
+def configure_engine(sync_engine, explain_engine=None):
+    """PRAGMAs do SQLite, instrumentação de métricas e log de consultas lentas"""
+    if sync_engine.dialect.name == "sqlite":
+        event.listen(sync_engine, "connect", apply_sqlite_pragmas)
+    instrument_engine(sync_engine)
+    install_slow_query_log(sync_engine, explain_engine)
+
+engine = create_engine(
+    DATABASE_URL,
+    connect_args=sync_connect_args(),
+    poolclass=InstrumentedQueuePool,
+    **pool_options()
+)
+configure_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+def pool_capacity(pool) -> int:
+    """Número máximo de conexões simultâneas do pool (0 = sem limite)"""
+    if isinstance(pool, QueuePool):
+        overflow = pool._max_overflow
+        return 0 if overflow < 0 else pool.size() + overflow
+    return 0
+
+# Sessões síncronas simultâneas: no máximo uma por conexão do pool
+DB_MAX_CONCURRENT_SESSIONS = int(os.getenv("DB_MAX_CONCURRENT_SESSIONS", pool_capacity(engine.pool)))
+
+_session_slots = None
+_session_slots_loop = None
+
+def _get_session_slots():
+    global _session_slots, _session_slots_loop
+    loop = asyncio.get_running_loop()
+    if _session_slots is None or _session_slots_loop is not loop:
+        _session_slots = asyncio.Semaphore(DB_MAX_CONCURRENT_SESSIONS)
+        _session_slots_loop = loop
+    return _session_slots
+
+async def get_db():
+    # Rotas sync usam a sessão em várias etapas do threadpool (dependências, rota,
+    # serialização) com a conexão presa entre elas. Se mais requisições disputarem
+    # conexões do que o pool comporta, todas as threads podem ficar esperando
+    # conexões presas em requisições que esperam thread. A requisição aguarda
+    # no event loop por uma vaga antes de abrir a sessão, então o checkout nunca espera.
+    # O close (rollback e devolução da conexão ao pool: I/O no PostgreSQL) roda no threadpool.
+    if DB_MAX_CONCURRENT_SESSIONS <= 0:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            await run_in_threadpool(db.close)
+        return
+
+    async with _get_session_slots():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            await run_in_threadpool(db.close)
+
+
+# Camada assíncrona (AsyncEngine/AsyncSession) para rotas async:
+# aiosqlite no SQLite e asyncpg no PostgreSQL
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+def async_database_url(database_url: str):
+    """
+    Converte a URL síncrona para o driver assíncrono equivalente
+
+    O asyncpg não aceita o parâmetro sslmode da libpq (comum nas URLs do Render);
+    ele é removido da URL e devolvido como connect_args.
+
+    Returns:
+        Tupla (url, connect_args)
+    """
+    url = make_url(database_url)
+    connect_args = {}
+    drivername = ASYNC_DRIVERS.get(url.drivername, url.drivername)
+    url = url.set(drivername=drivername)
+    if drivername == "postgresql+asyncpg" and "sslmode" in url.query:
+        sslmode = url.query["sslmode"]
+        url = url.difference_update_query(["sslmode"])
+        if sslmode not in ("disable", "allow", "prefer"):
+            connect_args["ssl"] = "require"
+    return url, connect_args
+
+async_engine = None
+AsyncSessionLocal = async_sessionmaker(class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+def get_async_engine():
+    """AsyncEngine criado sob demanda (o driver só é importado no primeiro uso)"""
+    global async_engine
+    if async_engine is None:
+        url, connect_args = async_database_url(DATABASE_URL)
+        if url.get_backend_name() == "postgresql" and DB_STATEMENT_TIMEOUT_MS > 0:
+            connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+        async_engine = create_async_engine(
+            url,
+            connect_args=connect_args,
+            poolclass=InstrumentedAsyncQueuePool,
+            **pool_options()
+        )
+        # EXPLAIN das consultas lentas pelo engine síncrono (o driver async exige o event loop)
+        configure_engine(async_engine.sync_engine, engine)
+        AsyncSessionLocal.configure(bind=async_engine)
+    return async_engine
+
+async def get_async_db():
+    get_async_engine()
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close() 
\ No newline at end of file
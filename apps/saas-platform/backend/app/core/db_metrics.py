@@ -0,0 +1,252 @@
+"""
+Métricas do banco de dados
+Espera e contagem de checkouts do pool de conexões, tempo de consultas por rota
+e detecção de N+1 (o mesmo SQL repetido várias vezes em uma requisição)
+"""
+
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from loguru import logger
+import os
+
+# Checkouts mais lentos que isso geram um aviso no log (ms)
+DB_CHECKOUT_WARN_MS = float(os.getenv("DB_CHECKOUT_WARN_MS", 500))
+# Execuções do mesmo SQL em uma requisição a partir das quais ela é marcada como N+1
+DB_N_PLUS_ONE_THRESHOLD = int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", 5))
+# Headers X-DB-* com consultas e tempo de banco em cada resposta (depuração)
+DB_DEBUG_HEADERS = os.getenv("DB_DEBUG_HEADERS", os.getenv("DEBUG", "false")).lower() == "true"
+
+
+class TimingStats:
+    """Contagem, soma e máximo de uma duração (em segundos)"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 2),
+            "avg_ms": round(self.total / self.count * 1000, 2) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 2),
+        }
+
+
+class DBMetrics:
+    """Agregador (thread-safe) das métricas de pool e de consultas"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.checkout_wait = TimingStats()
+            self.checkout_timeouts = 0
+            self.routes: Dict[str, Dict[str, Any]] = {}
+
+    def record_checkout_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.checkout_timeouts += 1
+            else:
+                self.checkout_wait.add(seconds)
+
+    def record_checkout(self):
+        with self._lock:
+            self.checkouts += 1
+
+    def record_request(self, route: str, queries: int, query_time: float, n_plus_one: bool = False):
+        with self._lock:
+            stats = self.routes.setdefault(
+                route, {"requests": 0, "queries": 0, "n_plus_one": 0, "query_time": TimingStats()}
+            )
+            stats["requests"] += 1
+            stats["queries"] += queries
+            stats["n_plus_one"] += int(n_plus_one)
+            stats["query_time"].add(query_time)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkout_timeouts": self.checkout_timeouts,
+                "checkout_wait": self.checkout_wait.snapshot(),
+                "routes": {
+                    route: {
+                        "requests": stats["requests"],
+                        "queries": stats["queries"],
+                        "queries_per_request": round(stats["queries"] / stats["requests"], 2),
+                        "n_plus_one_requests": stats["n_plus_one"],
+                        "query_time": stats["query_time"].snapshot(),
+                    }
+                    for route, stats in sorted(self.routes.items())
+                },
+            }
+
+
+db_metrics = DBMetrics()
+
+
+class _TimedCheckout:
+    """Mede quanto tempo o checkout de uma conexão esperou pelo pool"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            db_metrics.record_checkout_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        waited = time.perf_counter() - started
+        db_metrics.record_checkout_wait(waited)
+        if waited * 1000 >= DB_CHECKOUT_WARN_MS:
+            logger.warning(f"Checkout de conexão esperou {waited * 1000:.0f}ms (pool: {self.status()})")
+        return connection
+
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    """QueuePool com medição da espera no checkout"""
+
+
+class InstrumentedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool com medição da espera no checkout"""
+
+
+class QueryCapture:
+    """Consultas executadas em um trecho (uma requisição ou um bloco de teste)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.time = 0.0
+        self.statements: Counter = Counter()
+
+    def record(self, statement: str, seconds: float):
+        with self._lock:
+            self.queries += 1
+            self.time += seconds
+            self.statements[statement] += 1
+
+    @property
+    def max_repeated(self) -> int:
+        with self._lock:
+            return max(self.statements.values(), default=0)
+
+    def repeated(self, threshold: Optional[int] = None) -> List[Tuple[str, int]]:
+        """SQLs executados pelo menos `threshold` vezes (padrão: DB_N_PLUS_ONE_THRESHOLD)"""
+        if threshold is None:
+            threshold = DB_N_PLUS_ONE_THRESHOLD
+        with self._lock:
+            return [(sql, count) for sql, count in self.statements.most_common() if count >= threshold]
+
+    def report(self, limit: int = 10) -> str:
+        with self._lock:
+            lines = [f"{self.queries} consultas em {self.time * 1000:.1f}ms"]
+            for statement, count in self.statements.most_common(limit):
+                lines.append(f"  {count}x {_compact(statement)}")
+            return "\n".join(lines)
+
+
+def _compact(statement: str, length: int = 200) -> str:
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= length else statement[:length] + "..."
+
+
+# Consultas da requisição atual (definido por app.core.metrics.RequestMetricsMiddleware)
+_request_queries: ContextVar[Optional[QueryCapture]] = ContextVar("request_queries", default=None)
+
+# Capturas ativas de capture_queries() (todas as threads)
+_captures: List[QueryCapture] = []
+_captures_lock = threading.Lock()
+
+
+@contextmanager
+def capture_queries():
+    """
+    Captura as consultas de todas as threads enquanto o bloco executa
+
+    Usado nos testes para verificar o orçamento de consultas de uma rota
+    (o TestClient executa a requisição em outra thread).
+    """
+    capture = QueryCapture()
+    with _captures_lock:
+        _captures.append(capture)
+    try:
+        yield capture
+    finally:
+        with _captures_lock:
+            _captures.remove(capture)
+
+
+def report_n_plus_one(route: str, capture: QueryCapture) -> bool:
+    """Registra no log os SQLs repetidos de uma requisição; retorna se houve N+1"""
+    repeated = capture.repeated()
+    if not repeated:
+        return False
+    statement, count = repeated[0]
+    logger.warning(
+        f"Possível N+1 em {route}: SQL executado {count}x "
+        f"({capture.queries} consultas no total): {_compact(statement)}"
+    )
+    return True
+
+
+def instrument_engine(engine):
+    """
+    Registra os eventos de métricas em um Engine (ou no sync_engine de um AsyncEngine)
+
+    Conta checkouts e registra cada consulta (SQL e tempo) na requisição atual
+    e nas capturas ativas.
+    """
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        db_metrics.record_checkout()
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._query_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_query_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        current = _request_queries.get()
+        if current is not None:
+            current.record(statement, elapsed)
+        if _captures:
+            with _captures_lock:
+                captures = list(_captures)
+            for capture in captures:
+                capture.record(statement, elapsed)
+
+
+def get_pool_status(engine) -> Dict[str, Any]:
+    """Situação atual do pool (conexões em uso, livres e overflow)"""
+    pool = engine.pool
+    status = {"class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        })
+    return status
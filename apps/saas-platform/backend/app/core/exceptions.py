@@ -105,3 +105,16 @@ class ExternalServiceError(DasfabriException):
             error_code="EXTERNAL_SERVICE_ERROR"
         )
 
+
+
+class ServiceUnavailableError(DasfabriException):
+    """Serviço temporariamente sobrecarregado"""
+    
+    def __init__(self, detail: str = "Serviço temporariamente indisponível", retry_after: Optional[int] = None):
+        headers = {"Retry-After": str(retry_after)} if retry_after else None
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail,
+            error_code="SERVICE_UNAVAILABLE",
+            headers=headers
+        )
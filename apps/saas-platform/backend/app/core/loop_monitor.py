@@ -0,0 +1,228 @@
+"""
+Monitor de atraso (lag) do event loop
+
+Uma task de heartbeat dorme EVENT_LOOP_LAG_INTERVAL segundos e mede quanto
+acordou atrasada: esse atraso é o tempo em que o loop ficou ocupado com código
+síncrono (SQLAlchemy síncrono, smtplib, OCR...) dentro de rotas `async def`.
+
+Uma thread de vigia percebe quando o heartbeat passa de EVENT_LOOP_BLOCK_MS sem
+rodar e captura a pilha da thread do loop naquele momento (o código que está
+bloqueando) e a rota da task em execução. Os bloqueios são agregados por rota
+e pela linha do código da aplicação mais interna na pilha; o lag atual e o
+máximo vão para /metrics.
+"""
+
+import asyncio
+import hashlib
+import os
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime
+from typing import Any, Dict, Optional
+from loguru import logger
+from app.core.metrics import Counter, Gauge, Histogram, metrics_registry, task_route
+
+EVENT_LOOP_MONITOR = os.getenv("EVENT_LOOP_MONITOR", "true").lower() == "true"
+# Intervalo do heartbeat (segundos)
+EVENT_LOOP_LAG_INTERVAL = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", 0.05))
+# Bloqueio a partir do qual a pilha é capturada (ms)
+EVENT_LOOP_BLOCK_MS = float(os.getenv("EVENT_LOOP_BLOCK_MS", 100))
+
+# Quadros guardados por pilha e pilhas distintas guardadas por rota
+STACK_DEPTH = 25
+STACKS_PER_ROUTE = 5
+# Rótulo dos bloqueios fora de requisições (tasks de fundo, startup)
+BACKGROUND_ROUTE = "background"
+
+# Código da aplicação: o quadro mais interno dentro dele é o "culpado" do bloqueio
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+LIBRARY_DIRS = ("site-packages", "dist-packages")
+
+BLOCK_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+event_loop_lag_seconds = metrics_registry.register(Gauge(
+    "event_loop_lag_seconds", "Atraso do último heartbeat do event loop"
+))
+event_loop_lag_max_seconds = metrics_registry.register(Gauge(
+    "event_loop_lag_max_seconds", "Maior atraso do event loop desde o início do processo"
+))
+event_loop_blocks_total = metrics_registry.register(Counter(
+    "event_loop_blocks_total", "Bloqueios do event loop acima do limite", ("route",)
+))
+event_loop_block_duration_seconds = metrics_registry.register(Histogram(
+    "event_loop_block_duration_seconds", "Duração dos bloqueios do event loop", ("route",), buckets=BLOCK_BUCKETS
+))
+
+
+def _is_app_frame(frame: traceback.FrameSummary) -> bool:
+    filename = os.path.abspath(frame.filename)
+    return filename.startswith(APP_ROOT) and not any(part in filename for part in LIBRARY_DIRS)
+
+
+class EventLoopMonitor:
+    """Heartbeat no event loop e vigia em thread própria (um loop por vez)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._last_beat = 0.0
+        self._beat = 0
+        # Captura do bloqueio em andamento, concluída quando o heartbeat volta
+        self._pending: Optional[Dict[str, Any]] = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.last_lag = 0.0
+            self.max_lag = 0.0
+            self.blocks = 0
+            self.routes: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._heartbeat_task is not None and not self._heartbeat_task.done()
+
+    def start(self):
+        """Inicia o monitor no event loop atual (chamar de dentro do loop)"""
+        loop = asyncio.get_running_loop()
+        if self.running and self._loop is loop:
+            return
+        self.stop()
+        self._loop = loop
+        self._loop_thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        with self._lock:
+            self._last_beat = time.perf_counter()
+            self._pending = None
+        self._heartbeat_task = loop.create_task(self._heartbeat(), name="event-loop-heartbeat")
+        self._watchdog = threading.Thread(target=self._watch, args=(self._stop,), name="event-loop-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(
+            f"Monitor do event loop iniciado (heartbeat {EVENT_LOOP_LAG_INTERVAL * 1000:.0f}ms, "
+            f"bloqueio >= {EVENT_LOOP_BLOCK_MS:.0f}ms)"
+        )
+
+    def stop(self):
+        self._stop.set()
+        if self._heartbeat_task is not None:
+            if not self._loop.is_closed():
+                self._loop.call_soon_threadsafe(self._heartbeat_task.cancel)
+            self._heartbeat_task = None
+        self._watchdog = None
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.perf_counter() + EVENT_LOOP_LAG_INTERVAL
+            await asyncio.sleep(EVENT_LOOP_LAG_INTERVAL)
+            now = time.perf_counter()
+            self._on_beat(now, max(now - expected, 0.0))
+
+    def _on_beat(self, now: float, lag: float):
+        event_loop_lag_seconds.set((), lag)
+        with self._lock:
+            self._last_beat = now
+            self._beat += 1
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            max_lag = self.max_lag
+            pending, self._pending = self._pending, None
+        event_loop_lag_max_seconds.set((), max_lag)
+        if pending is not None:
+            self._record_block(pending, lag)
+
+    def _watch(self, stop: threading.Event):
+        threshold = EVENT_LOOP_BLOCK_MS / 1000
+        while not stop.wait(min(EVENT_LOOP_LAG_INTERVAL, threshold / 2)):
+            with self._lock:
+                blocked = time.perf_counter() - self._last_beat - EVENT_LOOP_LAG_INTERVAL
+                if blocked < threshold or self._pending is not None:
+                    continue
+                beat = self._beat
+            capture = self._capture()
+            with self._lock:
+                if self._beat == beat and self._pending is None:
+                    self._pending = capture
+
+    def _capture(self) -> Dict[str, Any]:
+        """Pilha da thread do loop e rota da task em execução (lidas da thread de vigia)"""
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = traceback.extract_stack(frame, limit=STACK_DEPTH) if frame is not None else []
+        task = asyncio.current_task(self._loop)
+        culprit = next((f for f in reversed(stack) if _is_app_frame(f)), stack[-1] if stack else None)
+        return {
+            "route": task_route(task) or BACKGROUND_ROUTE,
+            "task": task.get_coro().__qualname__ if task is not None else None,
+            "culprit": f"{culprit.filename}:{culprit.lineno} in {culprit.name}" if culprit else None,
+            "stack": [line.rstrip() for line in traceback.format_list(stack)],
+        }
+
+    def _record_block(self, capture: Dict[str, Any], lag: float):
+        route = capture["route"]
+        lag_ms = round(lag * 1000, 1)
+        event_loop_blocks_total.inc((route,))
+        event_loop_block_duration_seconds.observe((route,), lag)
+        signature = hashlib.sha1("".join(capture["stack"]).encode()).hexdigest()[:12]
+        with self._lock:
+            self.blocks += 1
+            stats = self.routes.get(route)
+            if stats is None:
+                stats = self.routes[route] = {"blocks": 0, "total_ms": 0.0, "max_ms": 0.0, "stacks": {}}
+            stats["blocks"] += 1
+            stats["total_ms"] += lag_ms
+            stats["max_ms"] = max(stats["max_ms"], lag_ms)
+            stacks = stats["stacks"]
+            entry = stacks.get(signature)
+            if entry is None and len(stacks) >= STACKS_PER_ROUTE:
+                # Mantém as pilhas mais frequentes
+                rarest = min(stacks, key=lambda key: stacks[key]["count"])
+                del stacks[rarest]
+            if entry is None:
+                entry = stacks[signature] = {"count": 0, "max_ms": 0.0, "task": capture["task"],
+                                             "culprit": capture["culprit"], "stack": capture["stack"]}
+            entry["count"] += 1
+            entry["max_ms"] = max(entry["max_ms"], lag_ms)
+            entry["last_seen"] = datetime.utcnow().isoformat()
+        logger.warning(f"Event loop bloqueado por {lag_ms:.0f}ms em {route}: {capture['culprit']}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            routes = {
+                route: {
+                    "blocks": stats["blocks"],
+                    "total_ms": round(stats["total_ms"], 1),
+                    "max_ms": stats["max_ms"],
+                    "stacks": sorted(
+                        (dict(entry, signature=signature) for signature, entry in stats["stacks"].items()),
+                        key=lambda entry: entry["count"], reverse=True
+                    ),
+                }
+                for route, stats in self.routes.items()
+            }
+            return {
+                "running": self.running,
+                "interval_ms": EVENT_LOOP_LAG_INTERVAL * 1000,
+                "threshold_ms": EVENT_LOOP_BLOCK_MS,
+                "lag_ms": round(self.last_lag * 1000, 2),
+                "max_lag_ms": round(self.max_lag * 1000, 2),
+                "blocks": self.blocks,
+                "routes": dict(sorted(routes.items(), key=lambda item: item[1]["total_ms"], reverse=True)),
+            }
+
+
+loop_monitor = EventLoopMonitor()
+
+
+def start_loop_monitor():
+    """Inicia o monitor no loop da aplicação (evento de startup)"""
+    if EVENT_LOOP_MONITOR:
+        loop_monitor.start()
+
+
+def stop_loop_monitor():
+    loop_monitor.stop()
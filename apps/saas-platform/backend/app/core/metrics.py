@@ -0,0 +1,317 @@
+"""
+Métricas HTTP no formato de exposição do Prometheus
+
+Histograma de latência, contagem por status e requisições em andamento,
+rotuladas pelo template da rota (ex: /api/v1/tracking/{shipment_id}) e pelo
+plano da empresa (tier). Expostas em /metrics; cada resposta leva um header
+Server-Timing com o tempo de banco separado do tempo total.
+
+As métricas são do processo: com vários workers, cada um expõe as suas.
+"""
+
+import os
+import hmac
+import asyncio
+import ipaddress
+import time
+import threading
+import weakref
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from fastapi import HTTPException, Request, status
+from starlette.datastructures import MutableHeaders
+from app.core.db_metrics import DB_DEBUG_HEADERS, QueryCapture, _request_queries, db_metrics, report_n_plus_one
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Limites dos buckets de latência (segundos)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Rótulos das requisições sem rota (404) e sem usuário autenticado
+UNMATCHED_ROUTE = "unmatched"
+ANONYMOUS_TIER = "anonymous"
+
+INF_BUCKET = 'le="+Inf"'
+
+# Token (Bearer) exigido em /metrics; sem ele, apenas requisições de loopback
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") or None
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_samples(items))
+        return lines
+
+    def _render_samples(self, items) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in items
+        ]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, labels: Tuple[str, ...] = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, labels: Tuple[str, ...] = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels: Tuple[str, ...] = (), amount: float = 1):
+        self.inc(labels, -amount)
+
+    def set(self, labels: Tuple[str, ...] = (), value: float = 0):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def _render_samples(self, items) -> List[str]:
+        lines = []
+        for labels, (counts, total, count) in items:
+            for bound, bucket_count in zip(self.buckets, counts):
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, INF_BUCKET)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Conjunto de métricas renderizado em /metrics"""
+
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        for metric in self.metrics:
+            metric.reset()
+
+
+metrics_registry = MetricsRegistry()
+
+http_requests_total = metrics_registry.register(Counter(
+    "http_requests_total", "Requisições HTTP concluídas", ("method", "route", "status", "tier")
+))
+http_request_duration_seconds = metrics_registry.register(Histogram(
+    "http_request_duration_seconds", "Latência das requisições HTTP", ("method", "route", "tier")
+))
+http_request_db_duration_seconds = metrics_registry.register(Histogram(
+    "http_request_db_duration_seconds", "Tempo de banco por requisição HTTP", ("method", "route", "tier")
+))
+http_requests_in_flight = metrics_registry.register(Gauge(
+    "http_requests_in_flight", "Requisições HTTP em andamento", ("method",)
+))
+
+# Dados da requisição atual: método, scope ASGI e os preenchidos pelas dependências (ex: plano)
+_request_labels: ContextVar[Optional[Dict[str, Any]]] = ContextVar("request_labels", default=None)
+# Os mesmos dados por task, para quem observa o event loop de outra thread (loop_monitor)
+_task_requests: "weakref.WeakKeyDictionary[asyncio.Task, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+
+
+def set_request_principal(user_id: int, role: Optional[str], tier: Optional[str]):
+    """Registra o usuário autenticado (id, role e plano da empresa) na requisição atual"""
+    current = _request_labels.get()
+    if current is None:
+        return
+    current["user_id"] = user_id
+    current["role"] = role
+    if tier:
+        current["tier"] = tier
+
+
+def current_principal() -> Tuple[Optional[int], Optional[str]]:
+    """Id e role do usuário autenticado na requisição atual (None antes da autenticação)"""
+    current = _request_labels.get() or {}
+    return current.get("user_id"), current.get("role")
+
+
+def route_label(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+def _describe(labels: Optional[Dict[str, Any]]) -> Optional[str]:
+    if labels is None:
+        return None
+    return f"{labels['method']} {route_label(labels['scope'])}"
+
+
+def current_route() -> Optional[str]:
+    """Método e template da rota da requisição em andamento (None fora de requisições)"""
+    return _describe(_request_labels.get())
+
+
+def task_route(task: Optional[asyncio.Task]) -> Optional[str]:
+    """Método e template da rota atendida por uma task (None se não for de requisição)"""
+    if task is None:
+        return None
+    return _describe(_task_requests.get(task))
+
+
+def server_timing(db_seconds: float, total_seconds: float) -> str:
+    db_ms = db_seconds * 1000
+    total_ms = total_seconds * 1000
+    return (
+        f'db;dur={db_ms:.1f};desc="Banco", '
+        f'app;dur={max(total_ms - db_ms, 0):.1f};desc="App", '
+        f"total;dur={total_ms:.1f}"
+    )
+
+
+def _is_loopback(host: Optional[str]) -> bool:
+    try:
+        return host is not None and ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def require_metrics_access(request: Request):
+    """
+    Restringe /metrics ao coletor interno
+
+    Com METRICS_TOKEN, exige `Authorization: Bearer <token>`; sem ele, aceita
+    apenas conexões de loopback (ex: Prometheus/agent no mesmo host).
+    """
+    if METRICS_TOKEN is not None:
+        authorization = request.headers.get("Authorization", "")
+        if hmac.compare_digest(authorization.encode(), f"Bearer {METRICS_TOKEN}".encode()):
+            return
+    elif _is_loopback(request.client.host if request.client else None):
+        return
+    raise HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="Acesso negado. Métricas disponíveis apenas para o coletor interno."
+    )
+
+
+class RequestMetricsMiddleware:
+    """
+    Middleware ASGI de métricas por requisição
+
+    Mede latência e tempo de banco (consultas contadas por db_metrics),
+    adiciona o header Server-Timing (e X-DB-* com DB_DEBUG_HEADERS), acumula
+    as consultas por rota de /health/db e registra no log SQLs repetidos (N+1).
+    O template da rota só é conhecido depois do roteamento, então os rótulos
+    são lidos do scope no fim da requisição.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        queries = QueryCapture()
+        method = scope["method"]
+        labels = {"tier": ANONYMOUS_TIER, "method": method, "scope": scope}
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", server_timing(queries.time, time.perf_counter() - started))
+                if DB_DEBUG_HEADERS:
+                    headers.append("X-DB-Queries", str(queries.queries))
+                    headers.append("X-DB-Time-Ms", f"{queries.time * 1000:.1f}")
+                    headers.append("X-DB-Max-Repeated", str(queries.max_repeated))
+            await send(message)
+
+        queries_token = _request_queries.set(queries)
+        labels_token = _request_labels.set(labels)
+        task = asyncio.current_task()
+        if task is not None:
+            _task_requests[task] = labels
+        http_requests_in_flight.inc((method,))
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_requests_in_flight.dec((method,))
+            _request_queries.reset(queries_token)
+            _request_labels.reset(labels_token)
+            if task is not None:
+                _task_requests.pop(task, None)
+
+            route = route_label(scope)
+            tier = labels["tier"]
+            http_requests_total.inc((method, route, str(status_code), tier))
+            http_request_duration_seconds.observe((method, route, tier), elapsed)
+            http_request_db_duration_seconds.observe((method, route, tier), queries.time)
+            if route != UNMATCHED_ROUTE and queries.queries:
+                route_key = f"{method} {route}"
+                n_plus_one = report_n_plus_one(route_key, queries)
+                db_metrics.record_request(route_key, queries.queries, queries.time, n_plus_one)
@@ -0,0 +1,237 @@
+"""
+Hash e verificação de senhas fora do threadpool da API
+
+Cada verificação bcrypt custa ~100-300ms de CPU. No login elas rodam em um
+executor próprio (PASSWORD_HASH_WORKERS threads; o bcrypt libera o GIL) com
+fila limitada, e os logins simultâneos têm um limite próprio: um pico de
+logins espera ou recebe 503, sem ocupar as threads das rotas de dados.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+from passlib.context import CryptContext
+from passlib.registry import get_crypt_handler
+from loguru import logger
+from app.core.db_metrics import TimingStats
+from app.core.exceptions import ServiceUnavailableError
+import os
+
+# Esquema dos hashes novos (ex: bcrypt, pbkdf2_sha256, argon2 com argon2-cffi instalado)
+PASSWORD_HASH_SCHEME = os.getenv("PASSWORD_HASH_SCHEME", "bcrypt")
+# Custo do esquema (bcrypt: log2 das iterações; pbkdf2: iterações; argon2: time_cost).
+# Sem a variável, usa o padrão do passlib para o esquema (bcrypt 12, pbkdf2_sha256 29000, argon2 2)
+PASSWORD_HASH_ROUNDS = int(os.environ["PASSWORD_HASH_ROUNDS"]) if os.getenv("PASSWORD_HASH_ROUNDS") else None
+
+# Threads do executor e verificações aguardando além delas
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", 32))
+
+# Logins processados ao mesmo tempo e quanto um login excedente espera por vaga (segundos)
+LOGIN_MAX_CONCURRENCY = int(os.getenv("LOGIN_MAX_CONCURRENCY", 16))
+LOGIN_QUEUE_TIMEOUT = float(os.getenv("LOGIN_QUEUE_TIMEOUT", 5))
+# Retry-After das respostas 503 (segundos)
+LOGIN_RETRY_AFTER = int(os.getenv("LOGIN_RETRY_AFTER", 2))
+
+# Esquemas aceitos na verificação: hashes antigos continuam válidos e são
+# refeitos no próximo login (deprecated="auto"), assim como hashes do esquema
+# atual com outro custo (min_rounds = max_rounds = custo configurado)
+LEGACY_SCHEMES = ("bcrypt",)
+
+
+def build_password_context(scheme: str = PASSWORD_HASH_SCHEME, rounds: Optional[int] = PASSWORD_HASH_ROUNDS) -> CryptContext:
+    """
+    Contexto de hash com o esquema e o custo fixados
+
+    Args:
+        scheme: Esquema dos hashes novos
+        rounds: Custo na unidade do esquema; None usa o padrão do passlib para ele
+            (um único valor não serve para todos: 12 é bom para bcrypt, mas
+            seriam 12 iterações de PBKDF2 ou time_cost 12 no argon2)
+    """
+    schemes = [scheme] + [legacy for legacy in LEGACY_SCHEMES if legacy != scheme]
+    if rounds is None:
+        rounds = getattr(get_crypt_handler(scheme), "default_rounds", None)
+    options = {}
+    if rounds is not None:
+        options = {
+            f"{scheme}__default_rounds": rounds,
+            f"{scheme}__min_rounds": rounds,
+            f"{scheme}__max_rounds": rounds,
+        }
+    return CryptContext(schemes=schemes, default=scheme, deprecated="auto", **options)
+
+
+pwd_context = build_password_context()
+
+
+class PasswordHashMetrics:
+    """Contadores do executor de hash e do limite de logins (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.submitted = 0
+            self.rejected = 0
+            self.in_flight = 0
+            self.rehashed = 0
+            self.queue_wait = TimingStats()
+            self.hash_time = TimingStats()
+            self.logins = 0
+            self.logins_rejected = 0
+            self.login_wait = TimingStats()
+
+    def incr(self, field: str, amount: int = 1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + amount)
+
+    def add_time(self, field: str, seconds: float):
+        with self._lock:
+            getattr(self, field).add(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "scheme": PASSWORD_HASH_SCHEME,
+                "rounds": PASSWORD_HASH_ROUNDS,
+                "executor": {
+                    "workers": PASSWORD_HASH_WORKERS,
+                    "max_queue": PASSWORD_HASH_MAX_QUEUE,
+                    "submitted": self.submitted,
+                    "rejected": self.rejected,
+                    "in_flight": self.in_flight,
+                    "queue_wait": self.queue_wait.snapshot(),
+                    "hash_time": self.hash_time.snapshot(),
+                },
+                "login": {
+                    "max_concurrency": LOGIN_MAX_CONCURRENCY,
+                    "requests": self.logins,
+                    "rejected": self.logins_rejected,
+                    "wait": self.login_wait.snapshot(),
+                    "rehashed": self.rehashed,
+                },
+            }
+
+
+password_hash_metrics = PasswordHashMetrics()
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# Semáforos por event loop (o TestClient cria um loop por requisição)
+_hash_slots = None
+_login_slots = None
+_slots_loop = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+        return _executor
+
+
+def _get_slots():
+    global _hash_slots, _login_slots, _slots_loop
+    loop = asyncio.get_running_loop()
+    if _slots_loop is not loop:
+        _hash_slots = asyncio.Semaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_QUEUE)
+        _login_slots = asyncio.Semaphore(LOGIN_MAX_CONCURRENCY)
+        _slots_loop = loop
+    return _hash_slots, _login_slots
+
+
+def _unavailable(detail: str) -> ServiceUnavailableError:
+    return ServiceUnavailableError(detail, retry_after=LOGIN_RETRY_AFTER)
+
+
+async def run_in_hash_executor(func: Callable, *args):
+    """
+    Executa uma função de hash no executor dedicado
+
+    Se as threads e a fila estiverem ocupadas, falha na hora com 503 em vez
+    de acumular trabalho que o cliente provavelmente já desistiu de esperar.
+    """
+    hash_slots, _ = _get_slots()
+    if hash_slots.locked():
+        password_hash_metrics.incr("rejected")
+        logger.warning("Fila de verificação de senhas cheia; requisição recusada")
+        raise _unavailable("Serviço de autenticação sobrecarregado. Tente novamente em instantes.")
+
+    submitted = time.perf_counter()
+
+    def timed():
+        started = time.perf_counter()
+        password_hash_metrics.add_time("queue_wait", started - submitted)
+        try:
+            return func(*args)
+        finally:
+            password_hash_metrics.add_time("hash_time", time.perf_counter() - started)
+
+    async with hash_slots:
+        password_hash_metrics.incr("submitted")
+        password_hash_metrics.incr("in_flight")
+        try:
+            return await asyncio.get_running_loop().run_in_executor(_get_executor(), timed)
+        finally:
+            password_hash_metrics.incr("in_flight", -1)
+
+
+def _verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    try:
+        return pwd_context.verify_and_update(password, hashed_password)
+    except (ValueError, TypeError):
+        # Hash vazio ou de esquema desconhecido
+        return False, None
+
+
+async def verify_password_async(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verifica a senha no executor dedicado
+
+    Returns:
+        Tupla (válida, novo hash); o novo hash é retornado quando o hash atual
+        usa um esquema antigo ou outro custo e deve ser regravado
+    """
+    valid, new_hash = await run_in_hash_executor(_verify_and_update, password, hashed_password)
+    if new_hash:
+        password_hash_metrics.incr("rehashed")
+    return valid, new_hash
+
+
+async def hash_password_async(password: str) -> str:
+    return await run_in_hash_executor(pwd_context.hash, password)
+
+
+@asynccontextmanager
+async def login_slot():
+    """Limita os logins simultâneos; quem não consegue vaga em LOGIN_QUEUE_TIMEOUT recebe 503"""
+    _, login_slots = _get_slots()
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(login_slots.acquire(), LOGIN_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        password_hash_metrics.incr("logins_rejected")
+        logger.warning("Limite de logins simultâneos atingido; requisição recusada")
+        raise _unavailable("Muitos logins simultâneos. Tente novamente em instantes.")
+    password_hash_metrics.add_time("login_wait", time.perf_counter() - started)
+    password_hash_metrics.incr("logins")
+    try:
+        yield
+    finally:
+        login_slots.release()
+
+
+def shutdown_hash_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
@@ -0,0 +1,304 @@
+"""
+Profiling sob demanda de requisições (administradores)
+
+Uma requisição com o header `X-Profile: 1` e token de administrador passa por
+um profiler de amostragem: uma thread lê a pilha das threads que atendem a
+requisição a cada REQUEST_PROFILING_INTERVAL segundos. São amostradas a thread
+do event loop enquanto a task da requisição está rodando e as threads do
+threadpool que executam o endpoint síncrono; o tempo em await (banco
+assíncrono, I/O) aparece como "(aguardando)". Cada amostra vale o tempo desde a
+anterior: código que segura o GIL atrasa a amostragem, mas não some do perfil.
+
+Os perfis ficam em memória (os últimos REQUEST_PROFILING_KEEP do processo) e
+são baixados em /api/v1/admin/profiles/{id}, como relatório em texto ou no
+formato "folded" (uma pilha por linha) lido por flamegraph.pl e speedscope.
+
+A amostragem só começa para um token válido com papel de administrador (uma
+troca de papel revoga os tokens antigos). O usuário só é conhecido depois da
+autenticação da rota: o perfil só é guardado (e o header X-Profile-Id só é
+enviado) se o usuário autenticado também for administrador.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from loguru import logger
+from app.core.loop_monitor import APP_ROOT, LIBRARY_DIRS
+from app.core.metrics import current_principal, route_label
+from app.core.security import token_role
+from app.models import UserRole
+
+REQUEST_PROFILING = os.getenv("REQUEST_PROFILING", "true").lower() == "true"
+# Intervalo entre amostras (segundos)
+REQUEST_PROFILING_INTERVAL = float(os.getenv("REQUEST_PROFILING_INTERVAL", 0.002))
+# A amostragem para depois desse tempo (a requisição segue normalmente)
+REQUEST_PROFILING_MAX_SECONDS = float(os.getenv("REQUEST_PROFILING_MAX_SECONDS", 60))
+# Perfis guardados e requisições amostradas ao mesmo tempo
+REQUEST_PROFILING_KEEP = int(os.getenv("REQUEST_PROFILING_KEEP", 20))
+REQUEST_PROFILING_MAX_CONCURRENT = int(os.getenv("REQUEST_PROFILING_MAX_CONCURRENT", 2))
+
+PROFILE_HEADER = b"x-profile"
+WAITING_FRAME = "(aguardando)"
+MAX_STACK_DEPTH = 200
+
+
+@lru_cache(maxsize=4096)
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    for marker in LIBRARY_DIRS:
+        index = filename.find(marker)
+        if index >= 0:
+            filename = filename[index + len(marker) + 1:]
+            break
+    else:
+        if filename.startswith(APP_ROOT):
+            filename = os.path.relpath(filename, APP_ROOT)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _stack(frame) -> Tuple[str, ...]:
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return tuple(reversed(labels))
+
+
+def _runs(frame, code) -> bool:
+    while frame is not None:
+        if frame.f_code is code:
+            return True
+        frame = frame.f_back
+    return False
+
+
+class RequestProfile:
+    """Amostras de pilha de uma requisição, coletadas por uma thread própria"""
+
+    def __init__(self, scope):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.user_id: Optional[int] = None
+        self.status_code: Optional[int] = None
+        self.started_at = datetime.utcnow()
+        self.duration = 0.0
+        # Pilha -> segundos atribuídos
+        self.samples: Counter = Counter()
+        self.ticks = 0
+        self.sampled = 0.0
+        self._scope = scope
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._task = asyncio.current_task()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"profile-{self.id}", daemon=True)
+        self._started = 0.0
+
+    @property
+    def route(self) -> str:
+        return route_label(self._scope)
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        """Encerra a amostragem sem esperar a thread (ver `join`)"""
+        self.duration = time.perf_counter() - self._started
+        self._stop.set()
+
+    def join(self):
+        """Espera a última amostra em andamento (bloqueia: fora do event loop)"""
+        self._thread.join()
+
+    def _run(self):
+        deadline = time.monotonic() + REQUEST_PROFILING_MAX_SECONDS
+        last = time.perf_counter()
+        while not self._stop.wait(REQUEST_PROFILING_INTERVAL) and time.monotonic() < deadline:
+            now = time.perf_counter()
+            self._sample(now - last)
+            last = now
+
+    def _sample(self, weight: float):
+        frames = sys._current_frames()
+        stacks = []
+        if asyncio.current_task(self._loop) is self._task and self._loop_thread in frames:
+            stacks.append(_stack(frames[self._loop_thread]))
+        # Endpoints síncronos rodam no threadpool (conhecido só depois do roteamento)
+        endpoint = getattr(self._scope.get("endpoint"), "__code__", None)
+        if endpoint is not None:
+            me = threading.get_ident()
+            for ident, frame in frames.items():
+                if ident not in (me, self._loop_thread) and _runs(frame, endpoint):
+                    stacks.append(_stack(frame))
+        for stack in stacks or [(WAITING_FRAME,)]:
+            self.samples[stack] += weight
+        self.ticks += 1
+        self.sampled += weight
+
+    def folded(self) -> str:
+        """Formato "folded": quadros separados por ';' e o tempo em microssegundos"""
+        return "".join(
+            f"{';'.join(stack)} {round(seconds * 1_000_000)}\n" for stack, seconds in self.samples.most_common()
+        )
+
+    def functions(self, limit: int = 30) -> Dict[str, List[Dict[str, Any]]]:
+        """Funções com mais tempo: próprio (no topo da pilha) e inclusivo"""
+        own, inclusive = Counter(), Counter()
+        for stack, seconds in self.samples.items():
+            own[stack[-1]] += seconds
+            for label in set(stack):
+                inclusive[label] += seconds
+        sampled = self.sampled or 1
+
+        def rows(counter):
+            # Com threads em paralelo a soma pode passar de 100%
+            return [
+                {"function": label, "ms": round(seconds * 1000, 2), "percent": round(seconds * 100 / sampled, 1)}
+                for label, seconds in counter.most_common(limit)
+            ]
+
+        return {"own": rows(own), "inclusive": rows(inclusive)}
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status_code": self.status_code,
+            "user_id": self.user_id,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration * 1000, 1),
+            "interval_ms": REQUEST_PROFILING_INTERVAL * 1000,
+            "samples": self.ticks,
+        }
+
+    def report(self, limit: int = 30) -> str:
+        summary = self.summary()
+        lines = [
+            f"{self.method} {self.path} ({summary['route']}) -> {self.status_code}",
+            f"duração {summary['duration_ms']}ms, {self.ticks} amostras a cada {summary['interval_ms']:g}ms",
+        ]
+        functions = self.functions(limit)
+        for title, key in (("Tempo próprio", "own"), ("Tempo inclusivo", "inclusive")):
+            lines.append("")
+            lines.append(f"{title}:")
+            lines.extend(f"{row['percent']:>6.1f}% {row['ms']:>9.1f}ms  {row['function']}" for row in functions[key])
+        return "\n".join(lines) + "\n"
+
+
+class ProfileStore:
+    """Últimos perfis do processo (thread-safe)"""
+
+    def __init__(self, keep: int = REQUEST_PROFILING_KEEP):
+        self._lock = threading.Lock()
+        self._keep = keep
+        self._profiles: "OrderedDict[str, RequestProfile]" = OrderedDict()
+
+    def add(self, profile: RequestProfile):
+        with self._lock:
+            self._profiles[profile.id] = profile
+            while len(self._profiles) > self._keep:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[RequestProfile]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            profiles = list(self._profiles.values())
+        return [profile.summary() for profile in reversed(profiles)]
+
+    def clear(self):
+        with self._lock:
+            self._profiles.clear()
+
+
+profile_store = ProfileStore()
+
+
+def _wants_profile(scope) -> bool:
+    headers = dict(scope.get("headers") or [])
+    if headers.get(PROFILE_HEADER, b"").lower() not in (b"1", b"true"):
+        return False
+    scheme, _, token = headers.get(b"authorization", b"").decode("latin-1").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    return _is_admin(token_role(token))
+
+
+def _is_admin(role: Optional[str]) -> bool:
+    return role == UserRole.admin.value
+
+
+class RequestProfilingMiddleware:
+    """
+    Middleware ASGI que amostra requisições com `X-Profile: 1`
+
+    Deve ficar dentro do RequestMetricsMiddleware, que guarda o usuário
+    autenticado da requisição (current_principal).
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._lock = threading.Lock()
+        self._active = 0
+
+    def _acquire(self) -> bool:
+        with self._lock:
+            if self._active >= REQUEST_PROFILING_MAX_CONCURRENT:
+                return False
+            self._active += 1
+            return True
+
+    def _release(self):
+        with self._lock:
+            self._active -= 1
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not REQUEST_PROFILING or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        if not self._acquire():
+            logger.warning(f"Profiling ignorado em {scope['method']} {scope['path']}: limite de perfis simultâneos")
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope)
+
+        async def send_with_profile(message):
+            if message["type"] == "http.response.start":
+                profile.status_code = message["status"]
+                if _is_admin(current_principal()[1]):
+                    MutableHeaders(scope=message).append("X-Profile-Id", profile.id)
+            await send(message)
+
+        profile.start()
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            profile.stop()
+            try:
+                await run_in_threadpool(profile.join)
+            finally:
+                self._release()
+            user_id, role = current_principal()
+            if _is_admin(role):
+                profile.user_id = user_id
+                profile_store.add(profile)
+                logger.info(
+                    f"Perfil {profile.id} de {profile.method} {profile.path}: "
+                    f"{profile.duration * 1000:.0f}ms, {profile.ticks} amostras"
+                )
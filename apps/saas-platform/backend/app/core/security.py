@@ -1,16 +1,34 @@
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
 from fastapi import Depends, HTTPException, status
+from fastapi.encoders import jsonable_encoder
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
+from sqlalchemy import event, inspect as sa_inspect, select
 from sqlalchemy.orm import Session
-from app.models import User, UserRole
-from app.core.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core import cache
+from app.models import Company, User, UserRole, UserStatus
+from app.core.database import get_db, get_async_db
+from app.core.password_hashing import pwd_context
+from app.core.metrics import set_request_principal
 import os
 
 SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey")
 ALGORITHM = "HS256"
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Tempo que o usuário autenticado fica em cache (segundos; 0 consulta o banco a cada requisição)
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", 300))
+
+# Colunas do usuário guardadas no cache (nunca o hash da senha)
+PRINCIPAL_FIELDS = (
+    "id", "name", "email", "role", "department", "status", "company_id",
+    "token_version", "last_login", "created_at", "updated_at"
+)
+PRINCIPAL_DATETIME_FIELDS = ("last_login", "created_at", "updated_at")
+# Alterações que incrementam token_version e revogam os tokens já emitidos
+TOKEN_VERSION_FIELDS = ("role", "status", "company_id", "hashed_password")
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
 def verify_password(plain_password, hashed_password):
@@ -35,23 +53,206 @@ def create_access_token(data: dict):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _decode_token(token: str) -> Tuple[int, int, Optional[int]]:
+    """
+    Retorna (id do usuário, versão do token, empresa)
+
+    Tokens sem "ver" são da versão 0; a empresa do token só é usada como tag
+    de invalidação (uma troca de empresa já muda a versão).
+    """
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("sub")
+        user_id = payload.get("sub")
         if user_id is None:
-            raise credentials_exception
+            raise _credentials_exception()
+        company_id = payload.get("company_id")
+        return int(user_id), int(payload.get("ver", 0)), int(company_id) if company_id is not None else None
+    except (JWTError, ValueError, TypeError):
+        raise _credentials_exception()
+
+def token_role(token: str) -> Optional[str]:
+    """
+    Papel gravado no token (None se o token for inválido ou não tiver papel)
+
+    Não consulta o banco: uma troca de papel incrementa token_version, então o
+    papel de um token ainda aceito pelas rotas é o atual.
+    """
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
-        raise credentials_exception
-    user = db.query(User).filter(User.id == user_id).first()
+        return None
+    role = payload.get("role")
+    if payload.get("sub") is None or not isinstance(role, str):
+        return None
+    return role
+
+def principal_cache_key(user_id: int, token_version: int) -> str:
+    return cache.cache_key("principal", user_id, token_version)
+
+def principal_tag(user_id: int) -> str:
+    """Tag das entradas de cache de um usuário (todas as versões de token)"""
+    return f"user:{user_id}:principal"
+
+def _principal_tags(user_id: int, company_id: Optional[int]):
+    tags = [principal_tag(user_id)]
+    if company_id is not None:
+        # Alterações da empresa (ex: plano) também invalidam os usuários dela
+        tags.append(cache.company_tag(company_id, "principal"))
+    return tags
+
+def _principal_query(user_id: int):
+    """Usuário e plano da empresa (rótulo das métricas) em uma consulta"""
+    return (
+        select(User, Company.tier)
+        .outerjoin(Company, Company.id == User.company_id)
+        .where(User.id == user_id)
+    )
+
+def _tier_value(tier) -> Optional[str]:
+    return tier.value if tier is not None else None
+
+def _role_value(role) -> Optional[str]:
+    return role.value if isinstance(role, UserRole) else role
+
+def _principal_enabled() -> bool:
+    return cache.CACHE_ENABLED and PRINCIPAL_CACHE_TTL > 0
+
+def principal_snapshot(user: Optional[User]) -> Optional[Dict[str, Any]]:
+    """Colunas do usuário serializáveis em JSON, sem o hash da senha"""
     if user is None:
-        raise credentials_exception
-    return user
+        return None
+    return jsonable_encoder({field: getattr(user, field) for field in PRINCIPAL_FIELDS})
+
+def _cached_principal(row) -> Optional[Dict[str, Any]]:
+    """Valor guardado no cache: colunas do usuário e plano da empresa"""
+    if row is None:
+        return None
+    user, tier = row
+    return {**principal_snapshot(user), "tenant_tier": _tier_value(tier)}
+
+def _principal_from_snapshot(snapshot: Dict[str, Any]) -> User:
+    """
+    Reconstrói o usuário a partir do cache
+
+    O objeto não pertence a nenhuma sessão: as rotas usam apenas as colunas
+    (id, company_id, role...), nunca os relacionamentos.
+    """
+    values = {field: snapshot.get(field) for field in PRINCIPAL_FIELDS}
+    for field in PRINCIPAL_DATETIME_FIELDS:
+        if values.get(field):
+            values[field] = datetime.fromisoformat(values[field])
+    if values.get("role"):
+        values["role"] = UserRole(values["role"])
+    if values.get("status"):
+        values["status"] = UserStatus(values["status"])
+    return User(**values)
+
+def _check_principal(user_id: Optional[int], token_version: Optional[int], user_status, version: int):
+    """Rejeita usuários removidos, desativados ou com token de versão anterior"""
+    if user_id is None or token_version != version:
+        raise _credentials_exception()
+    if user_status is not None and user_status != UserStatus.active:
+        raise _credentials_exception()
+
+def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+    """
+    Usuário autenticado pelo token
+
+    Com cache, o usuário vem do cache em dois níveis (ver `cache.get_or_compute`)
+    em vez de uma consulta por requisição; as entradas são invalidadas no commit
+    de qualquer alteração do usuário ou da empresa.
+    """
+    user_id, version, company_id = _decode_token(token)
+    if not _principal_enabled():
+        row = db.execute(_principal_query(user_id)).first()
+        if row is None:
+            raise _credentials_exception()
+        user, tier = row
+        _check_principal(user.id, user.token_version, user.status, version)
+        set_request_principal(user.id, _role_value(user.role), _tier_value(tier))
+        return user
+
+    snapshot = cache.get_or_compute(
+        principal_cache_key(user_id, version),
+        PRINCIPAL_CACHE_TTL,
+        _principal_tags(user_id, company_id),
+        lambda: _cached_principal(db.execute(_principal_query(user_id)).first())
+    )
+    if snapshot is None:
+        raise _credentials_exception()
+    _check_principal(snapshot["id"], snapshot["token_version"], snapshot["status"], version)
+    set_request_principal(snapshot["id"], snapshot["role"], snapshot.get("tenant_tier"))
+    return _principal_from_snapshot(snapshot)
+
+async def get_current_user_async(db: AsyncSession = Depends(get_async_db), token: str = Depends(oauth2_scheme)):
+    """
+    Equivalente de get_current_user para rotas que usam get_async_db
+
+    Usa a mesma AsyncSession da rota, sem ocupar uma conexão do pool síncrono
+    (nem uma thread do threadpool) durante a requisição.
+    """
+    user_id, version, company_id = _decode_token(token)
+    if not _principal_enabled():
+        row = (await db.execute(_principal_query(user_id))).first()
+        if row is None:
+            raise _credentials_exception()
+        user, tier = row
+        _check_principal(user.id, user.token_version, user.status, version)
+        set_request_principal(user.id, _role_value(user.role), _tier_value(tier))
+        return user
+
+    async def load():
+        return _cached_principal((await db.execute(_principal_query(user_id))).first())
+
+    snapshot = await cache.get_or_compute_async(
+        principal_cache_key(user_id, version),
+        PRINCIPAL_CACHE_TTL,
+        _principal_tags(user_id, company_id),
+        load
+    )
+    if snapshot is None:
+        raise _credentials_exception()
+    _check_principal(snapshot["id"], snapshot["token_version"], snapshot["status"], version)
+    set_request_principal(snapshot["id"], snapshot["role"], snapshot.get("tenant_tier"))
+    return _principal_from_snapshot(snapshot)
+
+def invalidate_principal(user_id: int) -> int:
+    """Remove o usuário do cache (para alterações fora do ORM, ex: UPDATE em massa)"""
+    return cache.invalidate_tags([principal_tag(user_id)])
+
+@event.listens_for(User, "before_update")
+def _bump_token_version(mapper, connection, target):
+    state = sa_inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in TOKEN_VERSION_FIELDS):
+        target.token_version = (target.token_version or 0) + 1
+
+@event.listens_for(Session, "after_flush")
+def _collect_principal_tags(session, flush_context):
+    tags = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, User) and obj.id is not None:
+            tags.add(principal_tag(obj.id))
+        elif isinstance(obj, Company) and obj.id is not None:
+            tags.add(cache.company_tag(obj.id, "principal"))
+    if tags:
+        session.info.setdefault("principal_invalidation_tags", set()).update(tags)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_principals_after_commit(session):
+    tags = session.info.pop("principal_invalidation_tags", None)
+    if tags:
+        cache.invalidate_tags_after_commit(tags)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_principal_tags(session):
+    session.info.pop("principal_invalidation_tags", None)
 
 # Funções de autorização para verificar roles e permissões
 def require_admin_role(current_user: User = Depends(get_current_user)):
@@ -0,0 +1,242 @@
+"""
+Registro de consultas lentas
+Consultas acima de DB_SLOW_QUERY_MS são guardadas em um buffer circular com o
+SQL normalizado, o formato dos parâmetros (tipos, nunca os valores), a rota que
+as executou e a duração, junto com o plano de execução (EXPLAIN no PostgreSQL,
+EXPLAIN QUERY PLAN no SQLite).
+
+Os planos são obtidos em uma thread própria, com conexão própria, para não
+atrasar ainda mais a requisição lenta: no máximo uma vez por SQL normalizado a
+cada DB_SLOW_QUERY_EXPLAIN_INTERVAL segundos, para uma amostra das ocorrências.
+"""
+
+import hashlib
+import queue
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import event
+from loguru import logger
+from app.core.metrics import current_route
+import os
+
+# Duração a partir da qual a consulta é registrada (ms; 0 desativa)
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 200))
+# Ocorrências mantidas no buffer circular
+DB_SLOW_QUERY_BUFFER = int(os.getenv("DB_SLOW_QUERY_BUFFER", 200))
+DB_SLOW_QUERY_EXPLAIN = os.getenv("DB_SLOW_QUERY_EXPLAIN", "true").lower() == "true"
+# Fração das ocorrências elegíveis que disparam o EXPLAIN
+DB_SLOW_QUERY_EXPLAIN_SAMPLE = float(os.getenv("DB_SLOW_QUERY_EXPLAIN_SAMPLE", 1))
+# Intervalo mínimo entre dois EXPLAINs do mesmo SQL normalizado (segundos)
+DB_SLOW_QUERY_EXPLAIN_INTERVAL = float(os.getenv("DB_SLOW_QUERY_EXPLAIN_INTERVAL", 600))
+
+# EXPLAINs aguardando a thread; além disso são descartados
+EXPLAIN_QUEUE_SIZE = 100
+# Só consultas de leitura recebem EXPLAIN
+EXPLAINABLE = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+
+_PLACEHOLDER = r"(?:\?|%s|%\(\w+\)s|\$\d+|:\w+)"
+_IN_LIST = re.compile(r"\(\s*" + _PLACEHOLDER + r"(?:\s*,\s*" + _PLACEHOLDER + r")+\s*\)")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+
+
+def normalize_sql(statement: str) -> str:
+    """SQL sem literais, com listas IN colapsadas e espaços normalizados"""
+    sql = _STRING_LITERAL.sub("?", statement)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    sql = _IN_LIST.sub("(...)", sql)
+    return " ".join(sql.split())
+
+
+def fingerprint(normalized_sql: str) -> str:
+    return hashlib.sha1(normalized_sql.encode()).hexdigest()[:16]
+
+
+def _shape(value) -> str:
+    if value is None:
+        return "None"
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return f"{type(value).__name__}[{len(value)}]"
+    if isinstance(value, (str, bytes)):
+        return f"{type(value).__name__}({len(value)})"
+    return type(value).__name__
+
+
+def parameter_shapes(parameters, executemany: bool = False):
+    """Tipos (e tamanhos) dos parâmetros, sem os valores"""
+    if executemany:
+        rows = list(parameters or [])
+        return {"rows": len(rows), "row": parameter_shapes(rows[0]) if rows else None}
+    if isinstance(parameters, dict):
+        return {name: _shape(value) for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [_shape(value) for value in parameters]
+    return None
+
+
+def explain(engine, statement: str, parameters) -> List[str]:
+    """Plano de execução de uma consulta (sem executá-la)"""
+    dialect = engine.dialect.name
+    prefix = "EXPLAIN QUERY PLAN " if dialect == "sqlite" else "EXPLAIN "
+    with engine.connect() as conn:
+        rows = conn.execution_options(slow_query_log=False).exec_driver_sql(prefix + statement, parameters).fetchall()
+    if dialect == "sqlite":
+        # (id, parent, notused, detail): indenta pela profundidade no plano
+        depth = {0: -1}
+        lines = []
+        for row in rows:
+            depth[row[0]] = depth.get(row[1], -1) + 1
+            lines.append("  " * depth[row[0]] + str(row[-1]))
+        return lines
+    return [str(row[0]) for row in rows]
+
+
+class SlowQueryLog:
+    """Buffer circular de consultas lentas e planos por SQL normalizado (thread-safe)"""
+
+    def __init__(self, max_entries: int = DB_SLOW_QUERY_BUFFER):
+        self._lock = threading.Lock()
+        self._entries = deque(maxlen=max_entries)
+        self._statements: Dict[str, Dict[str, Any]] = {}
+        self._queue: "queue.Queue" = queue.Queue(maxsize=EXPLAIN_QUEUE_SIZE)
+        self._worker: Optional[threading.Thread] = None
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+            self._statements = {}
+
+    def record(self, statement: str, parameters, executemany: bool, seconds: float, explain_engine=None):
+        normalized = normalize_sql(statement)
+        key = fingerprint(normalized)
+        duration_ms = round(seconds * 1000, 2)
+        route = current_route()
+        with self._lock:
+            self._entries.append({
+                "fingerprint": key,
+                "sql": normalized,
+                "parameters": parameter_shapes(parameters, executemany),
+                "route": route,
+                "duration_ms": duration_ms,
+                "at": datetime.utcnow().isoformat(),
+            })
+            stats = self._statements.get(key)
+            if stats is None:
+                stats = self._statements[key] = {
+                    "fingerprint": key, "sql": normalized, "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                    "routes": [], "plan": None, "plan_error": None, "explained_at": None, "_explain_requested": None,
+                }
+            stats["count"] += 1
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+            if route and route not in stats["routes"]:
+                stats["routes"].append(route)
+            should_explain = (
+                DB_SLOW_QUERY_EXPLAIN
+                and explain_engine is not None
+                and not executemany
+                and EXPLAINABLE.match(statement)
+                and (
+                    # None: nunca pedido (o relógio monotônico pode começar perto de zero)
+                    stats["_explain_requested"] is None
+                    or time.monotonic() - stats["_explain_requested"] >= DB_SLOW_QUERY_EXPLAIN_INTERVAL
+                )
+                and random.random() < DB_SLOW_QUERY_EXPLAIN_SAMPLE
+            )
+            if should_explain:
+                stats["_explain_requested"] = time.monotonic()
+        logger.warning(f"Consulta lenta ({duration_ms:.0f}ms) em {route or 'fora de requisição'}: {normalized[:200]}")
+        if should_explain:
+            self._submit_explain(key, explain_engine, statement, parameters)
+
+    def _submit_explain(self, key: str, engine, statement: str, parameters):
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((key, engine, statement, parameters))
+        except queue.Full:
+            with self._lock:
+                # Libera o SQL para uma próxima tentativa
+                self._statements[key]["_explain_requested"] = None
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="slow-query-explain", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            key, engine, statement, parameters = self._queue.get()
+            try:
+                plan, error = explain(engine, statement, parameters), None
+            except Exception as e:
+                plan, error = None, str(e)
+                logger.warning(f"Erro ao obter o plano da consulta lenta {key}: {e}")
+            finally:
+                self._queue.task_done()
+            with self._lock:
+                stats = self._statements.get(key)
+                if stats is not None:
+                    stats["plan"] = plan
+                    stats["plan_error"] = error
+                    stats["explained_at"] = datetime.utcnow().isoformat()
+
+    def flush(self, timeout: float = 5) -> bool:
+        """Aguarda os EXPLAINs pendentes; retorna se a fila esvaziou"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not self._queue.unfinished_tasks
+
+    def snapshot(self, limit: int = 50) -> Dict[str, Any]:
+        with self._lock:
+            statements = [
+                {
+                    **{name: value for name, value in stats.items() if not name.startswith("_")},
+                    "total_ms": round(stats["total_ms"], 2),
+                    "avg_ms": round(stats["total_ms"] / stats["count"], 2),
+                }
+                for stats in self._statements.values()
+            ]
+            recent = list(self._entries)[-limit:][::-1]
+        statements.sort(key=lambda stats: stats["total_ms"], reverse=True)
+        return {
+            "threshold_ms": DB_SLOW_QUERY_MS,
+            "recent": recent,
+            "statements": statements[:limit],
+        }
+
+
+slow_query_log = SlowQueryLog()
+
+
+def install_slow_query_log(engine, explain_engine=None):
+    """
+    Registra o log de consultas lentas em um Engine (ou no sync_engine de um AsyncEngine)
+
+    Args:
+        engine: Engine instrumentado
+        explain_engine: Engine síncrono usado nos EXPLAINs (padrão: o próprio);
+            para um AsyncEngine, o engine síncrono do mesmo banco
+    """
+    explain_engine = explain_engine or engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._slow_query_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_slow_query_started", None)
+        if started is None or DB_SLOW_QUERY_MS <= 0:
+            return
+        elapsed = time.perf_counter() - started
+        if elapsed * 1000 < DB_SLOW_QUERY_MS or not context.execution_options.get("slow_query_log", True):
+            return
+        slow_query_log.record(statement, parameters, executemany, elapsed, explain_engine)
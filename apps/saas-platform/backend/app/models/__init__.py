@@ -3,7 +3,7 @@ from sqlalchemy.orm import declarative_base
 Base = declarative_base()
 
 # Import existing models
-from .company import Company, CompanyStatus
+from .company import Company, CompanyStatus, CompanyTier
 from .user import User, UserRole, UserStatus
 from .access_request import AccessRequest, AccessRequestStatus
 
@@ -29,12 +29,16 @@ from .product import Product, ProductCategory
 from .warehouse import Warehouse, InventoryItem, StockMovement, WarehouseStatus, StockMovementType
 from .task import Task, TaskStatus, TaskPriority, TaskType
 from .dashboard_config import UserDashboardConfig
+from .company_kpi_rollup import CompanyKPIRollup
+from .ocr_job import OCRJob, OCRJobStatus
+from .stored_file import StoredFile, OCRResult
+from .upload_session import UploadSession, UploadSessionStatus
 
 # Import all enums for easy access
 __all__ = [
     'Base',
     # Core models
-    'Company', 'CompanyStatus',
+    'Company', 'CompanyStatus', 'CompanyTier',
     'User', 'UserRole', 'UserStatus',
     'AccessRequest', 'AccessRequestStatus',
     # Import models
@@ -71,5 +75,12 @@ __all__ = [
     # Task models
     'Task', 'TaskStatus', 'TaskPriority', 'TaskType',
     # Dashboard config models
-    'UserDashboardConfig'
-] 
\ No newline at end of file
+    'UserDashboardConfig',
+    # KPI rollup models
+    'CompanyKPIRollup',
+    # OCR job models
+    'OCRJob', 'OCRJobStatus',
+    # Document store models
+    'StoredFile', 'OCRResult',
+    'UploadSession', 'UploadSessionStatus'
+]
\ No newline at end of file
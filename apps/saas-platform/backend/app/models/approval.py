@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from . import Base
@@ -13,6 +13,9 @@ class ApprovalStatus(str, enum.Enum):
 
 class Approval(Base):
     __tablename__ = 'approvals'
+    __table_args__ = (
+        Index('ix_approvals_company_status', 'company_id', 'status'),
+    )
     id = Column(Integer, primary_key=True, index=True)
     
     # Approval Information
@@ -1,7 +1,7 @@
 """
 Modelo para comentários e colaboração em processos
 """
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from . import Base
@@ -9,6 +9,10 @@ from . import Base
 class Comment(Base):
     """Comentário em um processo de importação/exportação"""
     __tablename__ = 'comments'
+    __table_args__ = (
+        Index('ix_comments_company_import_process_created_at', 'company_id', 'import_process_id', 'created_at'),
+        Index('ix_comments_company_export_process_created_at', 'company_id', 'export_process_id', 'created_at'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     
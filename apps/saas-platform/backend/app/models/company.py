@@ -9,6 +9,11 @@ class CompanyStatus(str, enum.Enum):
     inactive = "inactive"
     suspended = "suspended"
 
+class CompanyTier(str, enum.Enum):
+    trial = "trial"
+    standard = "standard"
+    enterprise = "enterprise"
+
 class Company(Base):
     __tablename__ = 'companies'
     id = Column(Integer, primary_key=True, index=True)
@@ -24,6 +29,7 @@ class Company(Base):
     type = Column(String)  # trading, importer, exporter, etc.
     segment = Column(String)  # industry segment
     status = Column(Enum(CompanyStatus), default=CompanyStatus.active)
+    tier = Column(Enum(CompanyTier), default=CompanyTier.standard, server_default=CompanyTier.standard.value)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -0,0 +1,44 @@
+"""
+Modelo para rollup diário de KPIs por empresa
+Mantido incrementalmente por eventos do SQLAlchemy (ver app/services/kpi_rollup_service.py)
+"""
+from sqlalchemy import Column, Integer, Date, DateTime, ForeignKey, Float, UniqueConstraint
+from datetime import datetime
+from . import Base
+
+class CompanyKPIRollup(Base):
+    """Contadores agregados por empresa e dia de criação dos registros"""
+    __tablename__ = 'company_kpi_rollups'
+    __table_args__ = (
+        UniqueConstraint('company_id', 'day', name='uq_company_kpi_rollups_company_day'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # Chave do rollup
+    company_id = Column(Integer, ForeignKey('companies.id'), nullable=False)
+    day = Column(Date, nullable=False)
+
+    # Processos de importação
+    imports_total = Column(Integer, nullable=False, default=0)
+    imports_active = Column(Integer, nullable=False, default=0)
+    imports_completed = Column(Integer, nullable=False, default=0)
+
+    # Processos de exportação
+    exports_total = Column(Integer, nullable=False, default=0)
+    exports_active = Column(Integer, nullable=False, default=0)
+
+    # Compliance
+    checks_total = Column(Integer, nullable=False, default=0)
+    checks_compliant = Column(Integer, nullable=False, default=0)
+    checks_non_compliant = Column(Integer, nullable=False, default=0)
+    checks_pending = Column(Integer, nullable=False, default=0)
+    checks_critical = Column(Integer, nullable=False, default=0)
+
+    # Pagamentos
+    payments_total = Column(Integer, nullable=False, default=0)
+    payments_pending = Column(Integer, nullable=False, default=0)
+    payments_amount = Column(Float, nullable=False, default=0.0)
+
+    # Timestamps
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
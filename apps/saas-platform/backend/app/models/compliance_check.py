@@ -1,7 +1,7 @@
 """
 Modelo para verificações de compliance
 """
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Text, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Text, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from . import Base
@@ -25,6 +25,10 @@ class ComplianceStatus(str, enum.Enum):
 class ComplianceCheck(Base):
     """Verificação de compliance para um processo"""
     __tablename__ = 'compliance_checks'
+    __table_args__ = (
+        Index('ix_compliance_checks_company_status', 'company_id', 'status'),
+        Index('ix_compliance_checks_company_created_at', 'company_id', 'created_at'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Float, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Float, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from . import Base
@@ -21,6 +21,10 @@ class ContainerType(str, enum.Enum):
 
 class Container(Base):
     __tablename__ = 'containers'
+    __table_args__ = (
+        Index('ix_containers_company_status', 'company_id', 'status'),
+        Index('ix_containers_company_estimated_arrival', 'company_id', 'estimated_arrival'),
+    )
     id = Column(Integer, primary_key=True, index=True)
     
     # Container Information
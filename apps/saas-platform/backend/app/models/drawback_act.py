@@ -1,7 +1,7 @@
 """
 Modelo para gestão de Drawback
 """
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Numeric, Text, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Numeric, Text, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from . import Base
@@ -24,6 +24,9 @@ class DrawbackActType(str, enum.Enum):
 class DrawbackAct(Base):
     """Ato de Drawback"""
     __tablename__ = 'drawback_acts'
+    __table_args__ = (
+        Index('ix_drawback_acts_company_created_at', 'company_id', 'created_at'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     
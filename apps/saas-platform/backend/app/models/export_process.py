@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Float, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Float, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from . import Base
@@ -19,6 +19,10 @@ class ExportType(str, enum.Enum):
 
 class ExportProcess(Base):
     __tablename__ = 'export_processes'
+    __table_args__ = (
+        Index('ix_export_processes_company_status', 'company_id', 'status'),
+        Index('ix_export_processes_company_created_at', 'company_id', 'created_at'),
+    )
     id = Column(Integer, primary_key=True, index=True)
     
     # Basic Information
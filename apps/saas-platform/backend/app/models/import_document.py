@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Text, Float
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Text, Float, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from . import Base
@@ -25,6 +25,10 @@ class DocumentStatus(str, enum.Enum):
 
 class ImportDocument(Base):
     __tablename__ = 'import_documents'
+    __table_args__ = (
+        Index('ix_import_documents_company_process', 'company_id', 'import_process_id'),
+        Index('ix_import_documents_company_expiry_date', 'company_id', 'expiry_date'),
+    )
     id = Column(Integer, primary_key=True, index=True)
     
     # Document Information
@@ -38,6 +42,8 @@ class ImportDocument(Base):
     file_path = Column(String)
     file_size = Column(Integer)  # in bytes
     mime_type = Column(String)
+    # Conteúdo no armazenamento por SHA-256 (None em documentos enviados antes dele)
+    content_sha256 = Column(String(64), ForeignKey('stored_files.sha256'), index=True)
     
     # Status and Tracking
     status = Column(Enum(DocumentStatus), default=DocumentStatus.pending)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Float, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Float, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from . import Base
@@ -36,6 +36,10 @@ class Incoterm(str, enum.Enum):
 
 class ImportProcess(Base):
     __tablename__ = 'import_processes'
+    __table_args__ = (
+        Index('ix_import_processes_company_status', 'company_id', 'status'),
+        Index('ix_import_processes_company_created_at', 'company_id', 'created_at'),
+    )
     id = Column(Integer, primary_key=True, index=True)
     
     # Basic Information
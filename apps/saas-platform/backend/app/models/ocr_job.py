@@ -0,0 +1,44 @@
+"""
+Modelo para jobs de OCR em segundo plano
+A própria tabela serve de fila quando o Redis não está disponível (ver app/services/ocr_queue.py)
+"""
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, ForeignKey, Enum, Text
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from . import Base
+import enum
+import uuid
+
+class OCRJobStatus(str, enum.Enum):
+    queued = "queued"
+    processing = "processing"
+    completed = "completed"
+    failed = "failed"
+
+class OCRJob(Base):
+    """Processamento de OCR e classificação de um documento enviado"""
+    __tablename__ = 'ocr_jobs'
+
+    id = Column(String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+
+    # Documento processado
+    document_id = Column(Integer, ForeignKey('import_documents.id', ondelete='CASCADE'), nullable=False, index=True)
+    company_id = Column(Integer, ForeignKey('companies.id'), nullable=False)
+    language = Column(String, default='pt')
+    # Lote do upload múltiplo (None nos uploads individuais)
+    batch_id = Column(String(32), index=True)
+    # Reprocessamento: ignora o resultado guardado do conteúdo e o substitui
+    force = Column(Boolean, nullable=False, default=False)
+
+    # Status e tentativas
+    status = Column(Enum(OCRJobStatus), nullable=False, default=OCRJobStatus.queued, index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+
+    # Timestamps
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    # Relationships
+    document = relationship("ImportDocument")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Float, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Float, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from . import Base
@@ -22,6 +22,10 @@ class PaymentType(str, enum.Enum):
 
 class Payment(Base):
     __tablename__ = 'payments'
+    __table_args__ = (
+        Index('ix_payments_company_status', 'company_id', 'status'),
+        Index('ix_payments_company_due_date', 'company_id', 'due_date'),
+    )
     id = Column(Integer, primary_key=True, index=True)
     
     # Payment Information
@@ -1,7 +1,7 @@
 """
 Modelo para Catálogo de Produtos
 """
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Numeric, Text, Boolean, JSON
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Numeric, Text, Boolean, JSON, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from . import Base
@@ -9,6 +9,9 @@ from . import Base
 class Product(Base):
     """Produto no catálogo"""
     __tablename__ = 'products'
+    __table_args__ = (
+        Index('ix_products_company_created_at', 'company_id', 'created_at'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     
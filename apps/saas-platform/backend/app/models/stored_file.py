@@ -0,0 +1,44 @@
+"""
+Modelos do armazenamento de documentos endereçado por conteúdo
+Cada arquivo é guardado uma vez, pelo SHA-256, e compartilhado pelos documentos
+com o mesmo conteúdo (ver app/services/document_store.py)
+"""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, Text, UniqueConstraint
+from datetime import datetime
+from . import Base
+
+class StoredFile(Base):
+    """Conteúdo armazenado e quantos documentos o referenciam"""
+    __tablename__ = 'stored_files'
+
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(Integer, nullable=False)  # in bytes
+    ref_count = Column(Integer, nullable=False, default=0)
+
+    # Timestamps
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_referenced_at = Column(DateTime, default=datetime.utcnow)
+
+class OCRResult(Base):
+    """Resultado de OCR e classificação de um conteúdo, por versão dos engines e idioma"""
+    __tablename__ = 'ocr_results'
+    __table_args__ = (
+        UniqueConstraint('sha256', 'engine_version', 'language', name='uq_ocr_results_sha256_engine_language'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # Chave do cache
+    sha256 = Column(String(64), ForeignKey('stored_files.sha256', ondelete='CASCADE'), nullable=False)
+    engine_version = Column(String, nullable=False)
+    language = Column(String, nullable=False)
+
+    # Resultado
+    text = Column(Text)
+    confidence = Column(Float)
+    method = Column(String)
+    document_type = Column(String)  # Tipo retornado por OCRService.classify_document
+    classification_confidence = Column(Float)
+
+    # Timestamps
+    created_at = Column(DateTime, default=datetime.utcnow)
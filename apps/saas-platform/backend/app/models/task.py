@@ -1,7 +1,7 @@
 """
 Modelo para Task Management
 """
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Text, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Text, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from . import Base
@@ -32,6 +32,10 @@ class TaskType(str, enum.Enum):
 class Task(Base):
     """Tarefa do sistema"""
     __tablename__ = 'tasks'
+    __table_args__ = (
+        Index('ix_tasks_company_status_due_date', 'company_id', 'status', 'due_date'),
+        Index('ix_tasks_company_due_date', 'company_id', 'due_date'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     
@@ -1,7 +1,7 @@
 """
 Modelo para eventos de rastreamento de embarques
 """
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Float, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Float, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from . import Base
@@ -19,6 +19,10 @@ class TrackingEventStatus(str, enum.Enum):
 class TrackingEvent(Base):
     """Evento de rastreamento de embarque/container"""
     __tablename__ = 'tracking_events'
+    __table_args__ = (
+        Index('ix_tracking_events_company_shipment_timestamp', 'company_id', 'shipment_id', 'timestamp'),
+        Index('ix_tracking_events_company_timestamp', 'company_id', 'timestamp'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     
@@ -0,0 +1,52 @@
+"""
+Modelo para uploads em partes (retomáveis)
+As partes ficam em disco até a conclusão (ver app/services/document_store.py)
+"""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum
+from datetime import datetime
+from . import Base
+import enum
+import uuid
+
+class UploadSessionStatus(str, enum.Enum):
+    open = "open"
+    completing = "completing"
+    completed = "completed"
+
+class UploadSession(Base):
+    """Upload de um arquivo grande enviado em partes de tamanho fixo"""
+    __tablename__ = 'upload_sessions'
+
+    id = Column(String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+
+    # Arquivo
+    file_name = Column(String, nullable=False)
+    mime_type = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)  # in bytes
+    part_size = Column(Integer, nullable=False)  # in bytes (a última parte pode ser menor)
+
+    # Documento a criar na conclusão
+    company_id = Column(Integer, ForeignKey('companies.id'), nullable=False, index=True)
+    uploaded_by = Column(Integer, ForeignKey('users.id'), nullable=False)
+    import_process_id = Column(Integer, ForeignKey('import_processes.id'))
+    document_type = Column(String)
+    language = Column(String, default='pt')
+
+    # Status e resultado
+    status = Column(Enum(UploadSessionStatus), nullable=False, default=UploadSessionStatus.open)
+    document_id = Column(Integer, ForeignKey('import_documents.id', ondelete='SET NULL'))
+    job_id = Column(String(32))
+
+    # Timestamps
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    @property
+    def parts(self) -> int:
+        return max(1, -(-self.size // self.part_size))
+
+    def part_length(self, part_number: int) -> int:
+        """Tamanho esperado da parte (numeradas a partir de 1)"""
+        if part_number == self.parts:
+            return self.size - self.part_size * (self.parts - 1)
+        return self.part_size
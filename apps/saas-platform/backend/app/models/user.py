@@ -25,6 +25,8 @@ class User(Base):
     department = Column(String)
     status = Column(Enum(UserStatus), default=UserStatus.active)
     company_id = Column(Integer, ForeignKey('companies.id'), nullable=False)
+    # Incrementado quando role, status, empresa ou senha mudam: revoga os tokens emitidos antes
+    token_version = Column(Integer, nullable=False, default=0, server_default='0')
     last_login = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
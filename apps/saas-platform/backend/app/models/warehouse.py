@@ -1,7 +1,7 @@
 """
 Modelo para Warehouse Management
 """
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Numeric, Text, Boolean, Enum
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Numeric, Text, Boolean, Enum, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from . import Base
@@ -24,6 +24,9 @@ class StockMovementType(str, enum.Enum):
 class Warehouse(Base):
     """Armazém"""
     __tablename__ = 'warehouses'
+    __table_args__ = (
+        Index('ix_warehouses_company_created_at', 'company_id', 'created_at'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     
@@ -102,6 +105,9 @@ class InventoryItem(Base):
 class StockMovement(Base):
     """Movimentação de estoque"""
     __tablename__ = 'stock_movements'
+    __table_args__ = (
+        Index('ix_stock_movements_warehouse_movement_date', 'warehouse_id', 'movement_date'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     
@@ -0,0 +1,94 @@
+"""
+Serviço de agregação do Control Tower
+Calcula todos os contadores por empresa com agregados condicionais (SUM(CASE ...))
+em poucas consultas, em vez de um COUNT por indicador
+"""
+
+from typing import Dict, List, Tuple
+from sqlalchemy import select, func, cast, literal, true, union_all, String
+from sqlalchemy.orm import Session
+from app.models import (
+    ImportProcess, ExportProcess, Approval, ApprovalStatus,
+    Container, ContainerStatus, Warehouse
+)
+from app.services.kpi_rollup_service import count_if, rollup_totals
+
+
+class ControlTowerAggregator:
+    """
+    Agregador de indicadores do Control Tower
+
+    Processos, compliance e pagamentos vêm do rollup diário (company_kpi_rollups);
+    aprovações, containers e armazéns são resumidos diretamente. Cada fonte é uma
+    subconsulta de linha única e todas são combinadas em um único SELECT, de modo
+    que os contadores da empresa custam um round-trip ao banco.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_counters(self, company_id: int) -> Dict[str, int]:
+        """
+        Obtém todos os contadores da empresa em uma única consulta
+
+        Args:
+            company_id: ID da empresa
+
+        Returns:
+            Dict com os contadores do rollup (ver ROLLUP_METRICS) e de
+            aprovações e logística
+        """
+        rollups = rollup_totals(company_id)
+
+        approvals = select(
+            count_if(Approval.status == ApprovalStatus.pending).label("approvals_pending"),
+        ).where(Approval.company_id == company_id).subquery()
+
+        containers = select(
+            func.count(Container.id).label("containers_total"),
+            count_if(Container.status == ContainerStatus.in_transit).label("containers_in_transit"),
+        ).where(Container.company_id == company_id).subquery()
+
+        warehouses = select(
+            func.count(Warehouse.id).label("warehouses_total"),
+        ).where(Warehouse.company_id == company_id).subquery()
+
+        # Cada subconsulta retorna exatamente uma linha: o produto cartesiano
+        # explícito (JOIN ... ON true) apenas as coloca lado a lado
+        subqueries = [rollups, approvals, containers, warehouses]
+        from_clause = subqueries[0]
+        for subquery in subqueries[1:]:
+            from_clause = from_clause.join(subquery, true())
+
+        row = self.db.execute(
+            select(*subqueries).select_from(from_clause)
+        ).mappings().one()
+
+        return {key: (value or 0) for key, value in row.items()}
+
+    def get_status_breakdown(self, company_id: int) -> Dict[str, List[Tuple[str, int]]]:
+        """
+        Obtém a distribuição por status de importações e exportações em uma única consulta
+
+        Args:
+            company_id: ID da empresa
+
+        Returns:
+            Dict {"import": [(status, count), ...], "export": [(status, count), ...]}
+        """
+        import_counts = select(
+            literal("import").label("kind"),
+            cast(ImportProcess.status, String).label("status"),
+            func.count(ImportProcess.id).label("count"),
+        ).where(ImportProcess.company_id == company_id).group_by(ImportProcess.status)
+
+        export_counts = select(
+            literal("export").label("kind"),
+            cast(ExportProcess.status, String).label("status"),
+            func.count(ExportProcess.id).label("count"),
+        ).where(ExportProcess.company_id == company_id).group_by(ExportProcess.status)
+
+        breakdown: Dict[str, List[Tuple[str, int]]] = {"import": [], "export": []}
+        for kind, status, count in self.db.execute(union_all(import_counts, export_counts)):
+            breakdown[kind].append((status, count))
+        return breakdown
@@ -0,0 +1,383 @@
+"""
+Armazenamento de documentos endereçado por conteúdo (SHA-256)
+
+O upload é lido em blocos, com o hash calculado durante a leitura, para um
+arquivo temporário; no fim ele é movido para DOCUMENT_STORE_DIR/ab/cd/<sha256>.
+O mesmo conteúdo enviado de novo (por qualquer empresa ou processo da API) usa
+o arquivo já existente: a tabela stored_files conta quantos ImportDocument
+apontam para cada conteúdo. O arquivo não é apagado junto com o último
+documento (um upload do mesmo conteúdo pode tê-lo acabado de gravar, sem ainda
+ter feito o commit da sua referência): sweep() apaga os conteúdos que estão sem
+referências há mais de DOCUMENT_STORE_GRACE_SECONDS.
+
+O resultado do OCR e da classificação fica em ocr_results, por (sha256, versão
+dos engines, idioma): um documento repetido é concluído sem passar pelo OCR.
+
+Arquivos grandes podem chegar em partes (uploads retomáveis): cada parte é
+gravada em DOCUMENT_STORE_DIR/uploads/<id>/ e, na conclusão, as partes são lidas
+em sequência pelo mesmo save(), que calcula o hash do arquivo inteiro.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, AsyncIterator, BinaryIO, Callable, Dict, List, NamedTuple, Optional
+from starlette.concurrency import run_in_threadpool
+from loguru import logger
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from app.models import StoredFile, OCRResult
+from app.services.ocr_service import ocr_engine_version
+
+DOCUMENT_STORE_DIR = os.getenv("DOCUMENT_STORE_DIR", "uploads/objects")
+# Tamanho dos blocos lidos do upload (bytes)
+DOCUMENT_STORE_CHUNK_SIZE = int(os.getenv("DOCUMENT_STORE_CHUNK_SIZE", 1024 * 1024))
+# Conteúdo sem referências é mantido por esse tempo antes de ser apagado (segundos);
+# deve ser maior que o tempo entre gravar o arquivo e o commit de um upload
+DOCUMENT_STORE_GRACE_SECONDS = float(os.getenv("DOCUMENT_STORE_GRACE_SECONDS", 3600))
+# Conteúdos examinados por chamada de sweep()
+DOCUMENT_STORE_SWEEP_BATCH = 100
+
+
+class FileTooLargeError(Exception):
+    """O conteúdo passou do tamanho máximo (a leitura é interrompida)"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        super().__init__(f"Arquivo maior que {max_size} bytes")
+
+
+class _PartsReader:
+    """Leitura sequencial de arquivos de partes, como um único arquivo aberto"""
+
+    def __init__(self, paths: List[Path]):
+        self._paths = list(paths)
+        self._current: Optional[BinaryIO] = None
+
+    def read(self, size: int) -> bytes:
+        while True:
+            if self._current is None:
+                if not self._paths:
+                    return b""
+                self._current = open(self._paths.pop(0), "rb")
+            chunk = self._current.read(size)
+            if chunk:
+                return chunk
+            self.close()
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+
+
+class StoredObject(NamedTuple):
+    sha256: str
+    size: int
+    path: Path
+
+
+def _upsert_dialect(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        return sqlite_insert
+    if dialect == "postgresql":
+        return postgresql_insert
+    return None
+
+
+class DocumentStore:
+    """Arquivos por SHA-256 em disco, com contagem de referências no banco"""
+
+    def __init__(self, root: str = None):
+        self.root = Path(root or DOCUMENT_STORE_DIR)
+
+    def path_for(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256[2:4] / sha256
+
+    def save(
+        self,
+        stream: BinaryIO,
+        max_size: Optional[int] = None,
+        validate: Optional[Callable[[bytes], None]] = None,
+    ) -> StoredObject:
+        """
+        Grava o conteúdo de um arquivo aberto, calculando o SHA-256 durante a leitura
+
+        O conteúdo é gravado em um temporário e movido (os.replace, atômico)
+        para o caminho do hash: leitores nunca veem um arquivo incompleto e
+        dois uploads simultâneos do mesmo conteúdo gravam o mesmo arquivo.
+
+        Args:
+            stream: Arquivo aberto (lido em blocos de DOCUMENT_STORE_CHUNK_SIZE)
+            max_size: A leitura é interrompida ao passar desse tamanho
+            validate: Chamada com o primeiro bloco (ex: assinatura do tipo);
+                uma exceção interrompe a leitura e descarta o temporário
+
+        Raises:
+            FileTooLargeError: o conteúdo passou de max_size bytes
+        """
+        tmp_dir = self.root / "tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        with tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False) as tmp:
+            try:
+                while True:
+                    chunk = stream.read(DOCUMENT_STORE_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if size == 0 and validate is not None:
+                        validate(chunk)
+                    size += len(chunk)
+                    if max_size is not None and size > max_size:
+                        raise FileTooLargeError(max_size)
+                    digest.update(chunk)
+                    tmp.write(chunk)
+            except BaseException:
+                tmp.close()
+                os.unlink(tmp.name)
+                raise
+
+        sha256 = digest.hexdigest()
+        path = self.path_for(sha256)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp.name, path)
+        return StoredObject(sha256, size, path)
+
+    def acquire(self, db: Session, stored: StoredObject):
+        """Registra mais um documento apontando para o conteúdo (sem commit)"""
+        self._add_references(db, stored, 1)
+
+    def abandon(self, db: Session, stored: StoredObject):
+        """
+        Registra um conteúdo gravado cujo documento não foi criado (com commit)
+
+        Chamado depois do rollback de um upload: o arquivo fica sem referências
+        e é apagado por sweep(), como o de um documento removido.
+        """
+        self._add_references(db, stored, 0)
+        db.commit()
+
+    def _add_references(self, db: Session, stored: StoredObject, count: int):
+        now = datetime.utcnow()
+        table = StoredFile.__table__
+        dialect_insert = _upsert_dialect(db)
+        if dialect_insert is not None:
+            statement = dialect_insert(table).values(
+                sha256=stored.sha256, size=stored.size, ref_count=count, created_at=now, last_referenced_at=now
+            )
+            db.execute(statement.on_conflict_do_update(
+                index_elements=[table.c.sha256],
+                set_={"ref_count": table.c.ref_count + count, "last_referenced_at": now}
+            ))
+            return
+
+        # Outros dialetos: UPDATE e, se nenhuma linha existir, INSERT
+        result = db.execute(
+            update(table)
+            .where(table.c.sha256 == stored.sha256)
+            .values(ref_count=table.c.ref_count + count, last_referenced_at=now)
+        )
+        if result.rowcount == 0:
+            db.execute(insert(table).values(
+                sha256=stored.sha256, size=stored.size, ref_count=count, created_at=now, last_referenced_at=now
+            ))
+
+    def release(self, db: Session, sha256: str) -> bool:
+        """
+        Remove uma referência ao conteúdo (sem commit)
+
+        O registro, os resultados de OCR guardados e o arquivo continuam até
+        sweep(): um reenvio do conteúdo nesse meio tempo os reaproveita.
+
+        Returns:
+            True se o conteúdo ficou sem referências
+        """
+        table = StoredFile.__table__
+        db.execute(
+            update(table)
+            .where(table.c.sha256 == sha256)
+            .values(ref_count=table.c.ref_count - 1, last_referenced_at=datetime.utcnow())
+        )
+        return db.execute(
+            select(table.c.sha256).where(table.c.sha256 == sha256, table.c.ref_count <= 0)
+        ).first() is not None
+
+    def sweep(self, db: Session, grace: Optional[float] = None, limit: int = DOCUMENT_STORE_SWEEP_BATCH) -> int:
+        """
+        Apaga os conteúdos sem referências há mais de `grace` segundos (com commit)
+
+        O registro (com os resultados de OCR) só é apagado se continuar sem
+        referências. O arquivo é movido para tmp/ antes de ser apagado e volta
+        ao lugar se foi gravado há menos de `grace` segundos: um upload do
+        mesmo conteúdo acabou de publicá-lo e ainda vai registrar a referência.
+
+        Args:
+            grace: Padrão DOCUMENT_STORE_GRACE_SECONDS
+            limit: Conteúdos examinados nesta chamada
+
+        Returns:
+            Quantos arquivos foram apagados
+        """
+        if grace is None:
+            grace = DOCUMENT_STORE_GRACE_SECONDS
+        cutoff = datetime.utcnow() - timedelta(seconds=grace)
+        written_before = time.time() - grace
+        table = StoredFile.__table__
+        expired = (table.c.ref_count <= 0) & (table.c.last_referenced_at <= cutoff)
+        removed = 0
+        for sha256 in db.scalars(select(table.c.sha256).where(expired).limit(limit)).all():
+            deleted = db.execute(delete(table).where(table.c.sha256 == sha256, expired)).rowcount
+            if deleted:
+                db.execute(delete(OCRResult.__table__).where(OCRResult.__table__.c.sha256 == sha256))
+            db.commit()
+            if deleted and self._unlink(sha256, written_before):
+                removed += 1
+        return removed
+
+    def _unlink(self, sha256: str, written_before: float) -> bool:
+        path = self.path_for(sha256)
+        trash = self.root / "tmp" / f"{sha256}.{uuid.uuid4().hex}.deleted"
+        trash.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.rename(path, trash)
+        except FileNotFoundError:
+            return False
+        if trash.stat().st_mtime > written_before:
+            # Mesmo conteúdo: devolver é seguro mesmo que outro upload já o tenha gravado de novo
+            os.replace(trash, path)
+            return False
+        trash.unlink()
+        logger.info(f"Conteúdo {sha256} sem referências removido do armazenamento")
+        return True
+
+
+    def upload_dir(self, upload_id: str) -> Path:
+        return self.root / "uploads" / upload_id
+
+    def part_path(self, upload_id: str, part_number: int) -> Path:
+        return self.upload_dir(upload_id) / f"{part_number:06d}"
+
+    def received_parts(self, upload_id: str) -> List[int]:
+        """Partes já gravadas por completo, em ordem"""
+        directory = self.upload_dir(upload_id)
+        if not directory.exists():
+            return []
+        return sorted(int(path.name) for path in directory.iterdir() if path.name.isdigit())
+
+    async def write_part(self, upload_id: str, part_number: int, chunks: AsyncIterator[bytes], max_size: int) -> StoredObject:
+        """
+        Grava uma parte recebida em blocos (ex: request.stream()), sem juntá-la em memória
+
+        A escrita roda no threadpool, sem bloquear o event loop; a parte só
+        aparece em received_parts() depois de completa. Reenviar uma parte a
+        substitui.
+
+        Raises:
+            FileTooLargeError: a parte passou de max_size bytes
+        """
+        path = self.part_path(upload_id, part_number)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.parent / f"{path.name}.{uuid.uuid4().hex}.tmp"
+        digest = hashlib.sha256()
+        size = 0
+        f = await run_in_threadpool(open, tmp_path, "wb")
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > max_size:
+                    raise FileTooLargeError(max_size)
+                digest.update(chunk)
+                await run_in_threadpool(f.write, chunk)
+            await run_in_threadpool(f.close)
+        except BaseException:
+            f.close()
+            tmp_path.unlink()
+            raise
+        return StoredObject(digest.hexdigest(), size, tmp_path)
+
+    def accept_part(self, part: StoredObject, upload_id: str, part_number: int):
+        """Torna visível uma parte gravada por write_part (depois de validada)"""
+        os.replace(part.path, self.part_path(upload_id, part_number))
+
+    def save_parts(self, upload_id: str, parts: int, validate: Optional[Callable[[bytes], None]] = None) -> StoredObject:
+        """Junta as partes 1..parts no armazenamento (hash calculado durante a leitura)"""
+        reader = _PartsReader([self.part_path(upload_id, number) for number in range(1, parts + 1)])
+        try:
+            return self.save(reader, validate=validate)
+        finally:
+            reader.close()
+
+    def discard_upload(self, upload_id: str):
+        shutil.rmtree(self.upload_dir(upload_id), ignore_errors=True)
+
+
+document_store = DocumentStore()
+
+
+def cached_ocr_result(db: Session, sha256: str, language: str) -> Optional[Dict[str, Any]]:
+    """Resultado guardado para o conteúdo, no formato de process_document_file (ou None)"""
+    cached = db.scalars(
+        select(OCRResult).where(
+            OCRResult.sha256 == sha256,
+            OCRResult.engine_version == ocr_engine_version(),
+            OCRResult.language == language,
+        )
+    ).first()
+    if cached is None:
+        return None
+    return {
+        'text': cached.text or '',
+        'confidence': cached.confidence or 0,
+        'method': cached.method or 'none',
+        'classification': {
+            'document_type': cached.document_type or 'other',
+            'confidence': cached.classification_confidence or 0,
+        },
+        'cached': True,
+    }
+
+
+def store_ocr_result(db: Session, sha256: str, language: str, result: Dict[str, Any], replace: bool = False):
+    """Guarda o resultado do OCR do conteúdo (sem commit; se já existe, é ignorado ou, com replace, substituído)"""
+    classification = result.get('classification', {})
+    values = {
+        'sha256': sha256,
+        'engine_version': ocr_engine_version(),
+        'language': language,
+        'text': result.get('text', ''),
+        'confidence': result.get('confidence', 0),
+        'method': result.get('method', 'none'),
+        'document_type': classification.get('document_type', 'other'),
+        'classification_confidence': classification.get('confidence', 0),
+        'created_at': datetime.utcnow(),
+    }
+    table = OCRResult.__table__
+    key = [table.c.sha256, table.c.engine_version, table.c.language]
+    dialect_insert = _upsert_dialect(db)
+    if dialect_insert is not None:
+        statement = dialect_insert(table).values(**values)
+        if replace:
+            db.execute(statement.on_conflict_do_update(
+                index_elements=key,
+                set_={name: value for name, value in values.items() if name not in ('sha256', 'engine_version', 'language')}
+            ))
+        else:
+            db.execute(statement.on_conflict_do_nothing(index_elements=key))
+        return
+
+    # Outros dialetos: DELETE (ao substituir) e INSERT se nenhuma linha existir
+    if replace:
+        db.execute(delete(table).where(
+            table.c.sha256 == sha256, table.c.engine_version == values['engine_version'], table.c.language == language
+        ))
+    if cached_ocr_result(db, sha256, language) is None:
+        db.execute(insert(table).values(**values))
@@ -0,0 +1,295 @@
+"""
+Serviço de rollup de KPIs por empresa e dia
+Mantém a tabela company_kpi_rollups atualizada incrementalmente através de eventos
+after_insert/after_update/before_delete dos modelos de origem, e permite reconstruí-la
+a partir das tabelas brutas
+"""
+
+from typing import Any, Callable, Dict, Optional, Tuple
+from datetime import date, datetime
+from sqlalchemy import event, select, func, case, delete, insert, update
+from sqlalchemy.orm import Session, attributes
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from loguru import logger
+from app.models import (
+    ImportProcess, ImportStatus, ExportProcess, ExportStatus,
+    ComplianceCheck, ComplianceStatus, Payment, PaymentStatus
+)
+from app.models.company_kpi_rollup import CompanyKPIRollup
+
+# Status considerados "ativos" para cada tipo de processo
+ACTIVE_IMPORT_STATUSES = [ImportStatus.pending, ImportStatus.in_progress]
+ACTIVE_EXPORT_STATUSES = [ExportStatus.pending, ExportStatus.in_progress, ExportStatus.shipped]
+
+ROLLUP_METRICS = [
+    "imports_total", "imports_active", "imports_completed",
+    "exports_total", "exports_active",
+    "checks_total", "checks_compliant", "checks_non_compliant", "checks_pending", "checks_critical",
+    "payments_total", "payments_pending", "payments_amount",
+]
+
+
+def count_if(condition):
+    """COALESCE(SUM(CASE WHEN condition THEN 1 ELSE 0 END), 0)"""
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def _coerce_enum(value, enum_cls):
+    """Normaliza um status (enum, valor ou nome) para o membro do enum"""
+    if value is None or isinstance(value, enum_cls):
+        return value
+    try:
+        return enum_cls(value)
+    except ValueError:
+        return enum_cls.__members__.get(value)
+
+
+# Contribuição de cada registro para o rollup, a partir dos valores de seus atributos
+
+def _import_metrics(values: Dict[str, Any]) -> Dict[str, float]:
+    status = _coerce_enum(values["status"], ImportStatus)
+    return {
+        "imports_total": 1,
+        "imports_active": int(status in ACTIVE_IMPORT_STATUSES),
+        "imports_completed": int(status == ImportStatus.completed),
+    }
+
+
+def _export_metrics(values: Dict[str, Any]) -> Dict[str, float]:
+    status = _coerce_enum(values["status"], ExportStatus)
+    return {
+        "exports_total": 1,
+        "exports_active": int(status in ACTIVE_EXPORT_STATUSES),
+    }
+
+
+def _compliance_metrics(values: Dict[str, Any]) -> Dict[str, float]:
+    status = _coerce_enum(values["status"], ComplianceStatus)
+    return {
+        "checks_total": 1,
+        "checks_compliant": int(status == ComplianceStatus.compliant),
+        "checks_non_compliant": int(status == ComplianceStatus.non_compliant),
+        "checks_pending": int(status == ComplianceStatus.pending),
+        "checks_critical": int(status == ComplianceStatus.non_compliant and bool(values["required"])),
+    }
+
+
+def _payment_metrics(values: Dict[str, Any]) -> Dict[str, float]:
+    status = _coerce_enum(values["status"], PaymentStatus)
+    return {
+        "payments_total": 1,
+        "payments_pending": int(status == PaymentStatus.pending),
+        "payments_amount": float(values["amount"] or 0),
+    }
+
+
+# modelo -> (atributos lidos, função de contribuição)
+TRACKED_MODELS: Dict[type, Tuple[Tuple[str, ...], Callable[[Dict[str, Any]], Dict[str, float]]]] = {
+    ImportProcess: (("status",), _import_metrics),
+    ExportProcess: (("status",), _export_metrics),
+    ComplianceCheck: (("status", "required"), _compliance_metrics),
+    Payment: (("status", "amount"), _payment_metrics),
+}
+
+
+def _rollup_day(created_at: Optional[datetime]) -> date:
+    return created_at.date() if created_at else datetime.utcnow().date()
+
+
+def _snapshot(target, names, previous: bool = False) -> Dict[str, Any]:
+    """Valores atuais (ou anteriores ao flush) dos atributos do registro"""
+    values = {}
+    for name in names:
+        value = getattr(target, name)
+        if previous:
+            history = attributes.get_history(target, name)
+            if history.deleted:
+                value = history.deleted[0]
+        values[name] = value
+    return values
+
+
+def apply_delta(connection, company_id: int, day: date, delta: Dict[str, float]) -> None:
+    """
+    Soma um delta aos contadores de (empresa, dia), criando a linha se necessário
+
+    Usa INSERT ... ON CONFLICT DO UPDATE no SQLite e PostgreSQL.
+    """
+    delta = {name: value for name, value in delta.items() if value}
+    if not delta:
+        return
+
+    table = CompanyKPIRollup.__table__
+    values = {"company_id": company_id, "day": day, "updated_at": datetime.utcnow()}
+    values.update({name: delta.get(name, 0) for name in ROLLUP_METRICS})
+
+    dialect = connection.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        dialect_insert = sqlite_insert if dialect == "sqlite" else postgresql_insert
+        statement = dialect_insert(table).values(**values)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.company_id, table.c.day],
+            set_={
+                "updated_at": statement.excluded.updated_at,
+                **{name: table.c[name] + statement.excluded[name] for name in delta},
+            }
+        )
+        connection.execute(statement)
+        return
+
+    # Outros dialetos: UPDATE e, se nenhuma linha existir, INSERT
+    result = connection.execute(
+        update(table)
+        .where(table.c.company_id == company_id, table.c.day == day)
+        .values(updated_at=values["updated_at"], **{name: table.c[name] + value for name, value in delta.items()})
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(table).values(**values))
+
+
+def _on_insert(mapper, connection, target):
+    names, metrics = TRACKED_MODELS[mapper.class_]
+    apply_delta(connection, target.company_id, _rollup_day(target.created_at), metrics(_snapshot(target, names)))
+
+
+def _on_delete(mapper, connection, target):
+    names, metrics = TRACKED_MODELS[mapper.class_]
+    old = metrics(_snapshot(target, names, previous=True))
+    apply_delta(connection, target.company_id, _rollup_day(target.created_at), {k: -v for k, v in old.items()})
+
+
+def _on_update(mapper, connection, target):
+    names, metrics = TRACKED_MODELS[mapper.class_]
+    key_names = ("company_id", "created_at")
+    old_key = _snapshot(target, key_names, previous=True)
+    new_key = _snapshot(target, key_names)
+    old = metrics(_snapshot(target, names, previous=True))
+    new = metrics(_snapshot(target, names))
+
+    old_rollup_key = (old_key["company_id"], _rollup_day(old_key["created_at"]))
+    new_rollup_key = (new_key["company_id"], _rollup_day(new_key["created_at"]))
+    if old_rollup_key == new_rollup_key:
+        apply_delta(connection, *new_rollup_key, {k: new[k] - old[k] for k in new})
+    else:
+        apply_delta(connection, *old_rollup_key, {k: -v for k, v in old.items()})
+        apply_delta(connection, *new_rollup_key, new)
+
+
+def _keep_previous_value(target, value, oldvalue, initiator):
+    return value
+
+
+def register_listeners() -> None:
+    """
+    Registra os eventos que mantêm company_kpi_rollups atualizado
+
+    Chamado pela aplicação (main.py) ao ser importada; processos que gravam nas
+    tabelas de origem fora da API devem chamá-lo antes. Pode ser chamado mais
+    de uma vez.
+    """
+    for model, (names, _) in TRACKED_MODELS.items():
+        if event.contains(model, "after_insert", _on_insert):
+            continue
+        event.listen(model, "after_insert", _on_insert)
+        event.listen(model, "after_update", _on_update)
+        event.listen(model, "before_delete", _on_delete)
+        # active_history: carrega o valor anterior mesmo quando o atributo está expirado
+        # (ex: após um commit), para que o delta do update seja calculado corretamente
+        for name in (*names, "company_id", "created_at"):
+            event.listen(getattr(model, name), "set", _keep_previous_value, retval=True, active_history=True)
+
+
+def _source_queries(company_id: Optional[int] = None):
+    """Consultas GROUP BY (empresa, dia) sobre as tabelas de origem"""
+    sources = [
+        (ImportProcess, {
+            "imports_total": func.count(ImportProcess.id),
+            "imports_active": count_if(ImportProcess.status.in_(ACTIVE_IMPORT_STATUSES)),
+            "imports_completed": count_if(ImportProcess.status == ImportStatus.completed),
+        }),
+        (ExportProcess, {
+            "exports_total": func.count(ExportProcess.id),
+            "exports_active": count_if(ExportProcess.status.in_(ACTIVE_EXPORT_STATUSES)),
+        }),
+        (ComplianceCheck, {
+            "checks_total": func.count(ComplianceCheck.id),
+            "checks_compliant": count_if(ComplianceCheck.status == ComplianceStatus.compliant),
+            "checks_non_compliant": count_if(ComplianceCheck.status == ComplianceStatus.non_compliant),
+            "checks_pending": count_if(ComplianceCheck.status == ComplianceStatus.pending),
+            "checks_critical": count_if(
+                (ComplianceCheck.status == ComplianceStatus.non_compliant) & (ComplianceCheck.required == True)
+            ),
+        }),
+        (Payment, {
+            "payments_total": func.count(Payment.id),
+            "payments_pending": count_if(Payment.status == PaymentStatus.pending),
+            "payments_amount": func.coalesce(func.sum(Payment.amount), 0),
+        }),
+    ]
+    for model, aggregates in sources:
+        day = func.date(model.created_at).label("day")
+        query = select(
+            model.company_id.label("company_id"),
+            day,
+            *[expression.label(name) for name, expression in aggregates.items()]
+        ).group_by(model.company_id, day)
+        if company_id is not None:
+            query = query.where(model.company_id == company_id)
+        yield query
+
+
+def rebuild_rollups(db: Session, company_id: Optional[int] = None) -> int:
+    """
+    Reconstrói o rollup a partir das tabelas de origem
+
+    Args:
+        db: Sessão do banco
+        company_id: Restringe a reconstrução a uma empresa (padrão: todas)
+
+    Returns:
+        Número de linhas (empresa, dia) gravadas
+    """
+    rows: Dict[Tuple[int, date], Dict[str, Any]] = {}
+    for query in _source_queries(company_id):
+        for row in db.execute(query).mappings():
+            day = row["day"]
+            if isinstance(day, str):
+                day = date.fromisoformat(day)
+            key = (row["company_id"], day or datetime.utcnow().date())
+            entry = rows.setdefault(key, {
+                "company_id": key[0],
+                "day": key[1],
+                "updated_at": datetime.utcnow(),
+                **dict.fromkeys(ROLLUP_METRICS, 0),
+            })
+            for name in ROLLUP_METRICS:
+                if name in row:
+                    entry[name] += row[name] or 0
+
+    clear = delete(CompanyKPIRollup)
+    if company_id is not None:
+        clear = clear.where(CompanyKPIRollup.company_id == company_id)
+    db.execute(clear)
+    if rows:
+        db.execute(insert(CompanyKPIRollup), list(rows.values()))
+    db.commit()
+
+    logger.info(f"Rollup de KPIs reconstruído: {len(rows)} linhas")
+    return len(rows)
+
+
+def rollup_totals(company_id: int, start: Optional[date] = None):
+    """
+    Subconsulta de linha única com a soma de todos os contadores da empresa
+
+    Args:
+        company_id: ID da empresa
+        start: Considera apenas dias a partir desta data
+    """
+    query = select(
+        *[func.coalesce(func.sum(CompanyKPIRollup.__table__.c[name]), 0).label(name) for name in ROLLUP_METRICS]
+    ).where(CompanyKPIRollup.company_id == company_id)
+    if start is not None:
+        query = query.where(CompanyKPIRollup.day >= start)
+    return query.subquery()
@@ -0,0 +1,98 @@
+"""
+Serviço de cálculo de KPIs no banco de dados
+Médias, percentis e contagens são calculados via SQL, sem materializar objetos ORM
+"""
+
+import math
+from typing import Any, Dict, List, Optional
+from sqlalchemy import select, func, cast, case, extract, Integer
+from sqlalchemy.orm import Session
+
+MS_PER_DAY = 86400000
+
+
+def duration_days_expression(start_column, end_column, dialect: str):
+    """
+    Expressão SQL com o número de dias inteiros entre duas colunas DateTime
+
+    Equivale a `(end - start).days` em Python: arredonda para baixo (floor),
+    inclusive para intervalos negativos ou fracionários.
+
+    Args:
+        start_column: Coluna de início
+        end_column: Coluna de fim
+        dialect: Nome do dialeto do banco (sqlite, postgresql)
+    """
+    if dialect == "postgresql":
+        return func.floor(extract("epoch", end_column - start_column) / 86400)
+    # SQLite não tem floor() garantido e CAST trunca em direção a zero: converte
+    # a diferença para milissegundos inteiros e faz a divisão inteira com floor
+    millis = cast(func.round((func.julianday(end_column) - func.julianday(start_column)) * MS_PER_DAY), Integer)
+    return case(
+        (millis >= 0, millis // MS_PER_DAY),
+        else_=-((MS_PER_DAY - 1 - millis) // MS_PER_DAY)
+    )
+
+
+class KPIEngine:
+    """
+    Motor de KPIs
+
+    Usa percentile_disc no PostgreSQL. No SQLite, que não possui funções de
+    percentil, busca o valor de ordem correspondente com ORDER BY/LIMIT/OFFSET.
+    Ambos seguem o método nearest-rank, então os resultados coincidem.
+    """
+
+    PERCENTILES = (0.5, 0.9)
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.dialect = db.get_bind().dialect.name
+
+    def duration_stats(self, start_column, end_column, filters: List[Any]) -> Dict[str, Optional[float]]:
+        """
+        Estatísticas de duração (em dias) entre duas colunas
+
+        Args:
+            start_column: Coluna de início (ex: created_at)
+            end_column: Coluna de fim (ex: customs_clearance_date)
+            filters: Filtros da consulta
+
+        Returns:
+            Dict com count, avg, p50 e p90 (None quando não há registros)
+        """
+        days = duration_days_expression(start_column, end_column, self.dialect)
+        filters = [end_column.isnot(None), *filters]
+
+        if self.dialect == "postgresql":
+            row = self.db.execute(
+                select(
+                    func.count().label("count"),
+                    func.avg(days).label("avg"),
+                    *[
+                        func.percentile_disc(p).within_group(days).label(f"p{int(p * 100)}")
+                        for p in self.PERCENTILES
+                    ]
+                ).where(*filters)
+            ).mappings().one()
+            stats = {key: (float(value) if value is not None else None) for key, value in row.items()}
+            stats["count"] = int(row["count"])
+            return stats
+
+        row = self.db.execute(
+            select(func.count().label("count"), func.avg(days).label("avg")).where(*filters)
+        ).mappings().one()
+        count = int(row["count"])
+        stats = {"count": count, "avg": float(row["avg"]) if row["avg"] is not None else None}
+
+        for p in self.PERCENTILES:
+            key = f"p{int(p * 100)}"
+            if count == 0:
+                stats[key] = None
+                continue
+            offset = max(0, math.ceil(p * count) - 1)
+            value = self.db.execute(
+                select(days).where(*filters).order_by(days).limit(1).offset(offset)
+            ).scalar()
+            stats[key] = float(value) if value is not None else None
+        return stats
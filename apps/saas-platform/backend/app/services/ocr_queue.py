@@ -0,0 +1,456 @@
+"""
+Fila de jobs de OCR em segundo plano
+O upload apenas salva o arquivo e cria um OCRJob; despachantes (threads) reservam
+os jobs na tabela ocr_jobs e executam o OCR em um pool de processos, gravando o
+resultado no ImportDocument. Documentos cujo conteúdo (SHA-256) já passou pelo
+OCR com os mesmos engines e idioma reaproveitam o resultado guardado: o job já
+nasce concluído (ver app/services/document_store.py).
+
+A tabela ocr_jobs é a fila (funciona com SQLite ou PostgreSQL, sem Redis). Com
+Redis disponível, cada job novo também é publicado em uma lista que acorda os
+despachantes na hora, inclusive os de outros processos (scripts/ocr_worker.py);
+sem Redis, os despachantes do próprio processo são acordados por um Event e os
+demais consultam a tabela a cada OCR_POLL_INTERVAL segundos.
+
+Em produção use OCR_WORKER_MODE=external na API e rode scripts/ocr_worker.py:
+no modo embedded (padrão, para desenvolvimento) cada worker do uvicorn cria o
+próprio pool de processos de OCR.
+"""
+
+import multiprocessing
+import threading
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+import os
+from loguru import logger
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from app.core import cache
+from app.models import ImportDocument, DocumentType, OCRJob, OCRJobStatus
+from app.services.document_store import cached_ocr_result, store_ocr_result
+from app.services.ocr_service import (
+    OCR_MIME_TYPES, init_ocr_job_process, not_processed_result, process_document_file, process_document_in_pool,
+    warm_up_ocr
+)
+
+# embedded: a API inicia os despachantes no startup; external: apenas scripts/ocr_worker.py (produção)
+OCR_WORKER_MODE = os.getenv("OCR_WORKER_MODE", "embedded")
+# Processos de OCR (e despachantes); 0 executa o OCR na própria thread do despachante
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", 2))
+OCR_POLL_INTERVAL = float(os.getenv("OCR_POLL_INTERVAL", 2))
+# Jobs em processamento há mais tempo que isso são considerados perdidos (segundos)
+OCR_JOB_TIMEOUT = float(os.getenv("OCR_JOB_TIMEOUT", 600))
+OCR_MAX_ATTEMPTS = int(os.getenv("OCR_MAX_ATTEMPTS", 3))
+# Intervalo mínimo entre as buscas por jobs presos (segundos; feitas só com a fila vazia)
+OCR_STALE_CHECK_INTERVAL = float(os.getenv("OCR_STALE_CHECK_INTERVAL", 60))
+# Carregar os engines de OCR nos processos assim que o pool é criado (e não no primeiro documento).
+# Por padrão só fora da API: no modo embedded cada worker do uvicorn aqueceria os próprios processos
+OCR_PREWARM = os.getenv("OCR_PREWARM", "true" if OCR_WORKER_MODE == "external" else "false").lower() == "true"
+
+OCR_QUEUE_KEY = "ocr:jobs"
+# Limite da lista no Redis (é só um aviso; a tabela é a fonte da verdade)
+OCR_QUEUE_MAX_LENGTH = 1000
+
+# Tipos retornados por OCRService.classify_document que não existem em DocumentType
+CLASSIFICATION_TYPES = {
+    'invoice': DocumentType.commercial_invoice,
+    'insurance': DocumentType.insurance_certificate,
+    'license': DocumentType.import_license,
+}
+
+_wakeup = threading.Event()
+_stale_check_lock = threading.Lock()
+_next_stale_check = 0.0
+
+
+def enqueue_ocr_job(db: Session, document: ImportDocument, language: str = 'pt', force: bool = False) -> OCRJob:
+    """
+    Cria o job de OCR de um documento e avisa os despachantes
+
+    Se o conteúdo do documento já tem resultado guardado, o job é criado
+    concluído, sem passar pela fila; com force (reprocessamento) o OCR roda
+    de novo e substitui o resultado guardado. Faz commit da sessão (incluindo
+    o documento, se ainda não gravado).
+    """
+    return enqueue_ocr_jobs(db, [document], language=language, force=force)[0]
+
+
+def enqueue_ocr_jobs(
+    db: Session, documents: List[ImportDocument], language: str = 'pt', batch_id: Optional[str] = None,
+    force: bool = False
+) -> List[OCRJob]:
+    """
+    Cria os jobs de OCR de vários documentos em um único commit
+
+    Os jobs de um upload múltiplo compartilham o batch_id, usado para
+    acompanhar o lote. Jobs de conteúdos com resultado guardado já são
+    criados concluídos, exceto com force.
+    """
+    db.flush()
+    jobs, queued = [], []
+    for document in documents:
+        job = OCRJob(
+            document_id=document.id, company_id=document.company_id, language=language, batch_id=batch_id, force=force
+        )
+        db.add(job)
+        cached = None
+        if document.content_sha256 and not force:
+            cached = cached_ocr_result(db, document.content_sha256, language)
+        if cached is not None:
+            job.started_at = datetime.utcnow()
+            _apply_result(job, document, cached)
+        else:
+            queued.append(job)
+        jobs.append(job)
+    db.commit()
+    for job in jobs:
+        db.refresh(job)
+        if job in queued:
+            logger.info(f"Job de OCR {job.id} enfileirado para o documento {job.document_id}")
+        else:
+            logger.info(f"Job de OCR {job.id} do documento {job.document_id} concluído com o resultado guardado do conteúdo")
+    if queued:
+        notify_workers(*[job.id for job in queued])
+    return jobs
+
+
+def notify_workers(*job_ids: str):
+    """Acorda os despachantes locais e, com Redis, os de outros processos"""
+    _wakeup.set()
+    client = cache.get_redis()
+    if client is None:
+        return
+    try:
+        pipe = client.pipeline()
+        pipe.rpush(OCR_QUEUE_KEY, *job_ids)
+        pipe.ltrim(OCR_QUEUE_KEY, -OCR_QUEUE_MAX_LENGTH, -1)
+        pipe.execute()
+        cache.redis_breaker.record_success()
+    except Exception as e:
+        logger.warning(f"Erro ao publicar job de OCR no Redis: {e}")
+        cache.redis_breaker.record_failure()
+
+
+def requeue_stale_jobs(db: Session) -> int:
+    """Devolve à fila jobs presos em processamento (worker encerrado no meio)"""
+    deadline = datetime.utcnow() - timedelta(seconds=OCR_JOB_TIMEOUT)
+    stale = (OCRJob.status == OCRJobStatus.processing) & (OCRJob.started_at < deadline)
+    requeued = db.execute(
+        update(OCRJob)
+        .where(stale, OCRJob.attempts < OCR_MAX_ATTEMPTS)
+        .values(status=OCRJobStatus.queued)
+    ).rowcount
+    db.execute(
+        update(OCRJob)
+        .where(stale)
+        .values(status=OCRJobStatus.failed, finished_at=datetime.utcnow(), error="Tempo limite excedido")
+    )
+    db.commit()
+    if requeued:
+        logger.warning(f"{requeued} jobs de OCR devolvidos à fila")
+    return requeued
+
+
+def _stale_check_due() -> bool:
+    """Se já passou OCR_STALE_CHECK_INTERVAL desde a última busca por jobs presos (no processo)"""
+    global _next_stale_check
+    with _stale_check_lock:
+        now = time.monotonic()
+        if now < _next_stale_check:
+            return False
+        _next_stale_check = now + OCR_STALE_CHECK_INTERVAL
+        return True
+
+
+def _queued_candidates(db: Session) -> List[str]:
+    return db.scalars(
+        select(OCRJob.id)
+        .where(OCRJob.status == OCRJobStatus.queued)
+        .order_by(OCRJob.created_at)
+        .limit(10)
+    ).all()
+
+
+def claim_next_job(db: Session) -> Optional[OCRJob]:
+    """
+    Reserva o job mais antigo da fila
+
+    A reserva é um UPDATE condicionado ao status 'queued': se outro despachante
+    (de qualquer processo) reservou o mesmo job antes, nenhuma linha é alterada
+    e o próximo candidato é tentado. Jobs presos só são procurados com a fila
+    vazia, no máximo a cada OCR_STALE_CHECK_INTERVAL segundos.
+    """
+    candidates = _queued_candidates(db)
+    if not candidates and _stale_check_due() and requeue_stale_jobs(db):
+        candidates = _queued_candidates(db)
+    for job_id in candidates:
+        claimed = db.execute(
+            update(OCRJob)
+            .where(OCRJob.id == job_id, OCRJob.status == OCRJobStatus.queued)
+            .values(status=OCRJobStatus.processing, started_at=datetime.utcnow(), attempts=OCRJob.attempts + 1)
+        ).rowcount
+        db.commit()
+        if claimed:
+            return db.get(OCRJob, job_id)
+    return None
+
+
+def _document_type(classification: dict) -> DocumentType:
+    value = classification.get('document_type', 'other')
+    if value in CLASSIFICATION_TYPES:
+        return CLASSIFICATION_TYPES[value]
+    try:
+        return DocumentType(value)
+    except ValueError:
+        return DocumentType.other
+
+
+def _apply_result(job: OCRJob, document: ImportDocument, result: dict):
+    """Grava o resultado no documento e conclui o job (sem commit)"""
+    classification = result.get('classification', {})
+    document.extracted_text = result.get('text', '')
+    document.ocr_confidence = result.get('confidence', 0)
+    document.ocr_method = result.get('method', 'none')
+    document.classification_confidence = classification.get('confidence', 0)
+    # O tipo informado no upload prevalece sobre a classificação automática
+    if document.document_type in (None, DocumentType.other):
+        document.document_type = _document_type(classification)
+
+    job.status = OCRJobStatus.completed
+    job.error = None
+    job.finished_at = datetime.utcnow()
+
+
+def run_job(db: Session, job: OCRJob, ocr: Callable[[str, str], dict] = None) -> OCRJob:
+    """
+    Executa o OCR de um job reservado e grava o resultado
+
+    O resultado de conteúdos já processados (ex: enviados de novo enquanto o
+    primeiro estava na fila) é reaproveitado; o de conteúdos novos é guardado.
+    Jobs de reprocessamento (force) sempre executam o OCR e substituem o
+    resultado guardado.
+
+    Args:
+        db: Sessão do banco
+        job: Job em processamento
+        ocr: Função (caminho, idioma) -> resultado; padrão: OCR na thread atual
+    """
+    document = job.document
+    language = job.language or 'pt'
+    sha256 = document.content_sha256
+    try:
+        result = cached_ocr_result(db, sha256, language) if sha256 and not job.force else None
+        if result is None:
+            if not document.file_path or not os.path.exists(document.file_path):
+                raise FileNotFoundError(f"Arquivo não encontrado: {document.file_path}")
+            if document.mime_type and document.mime_type not in OCR_MIME_TYPES:
+                result = not_processed_result()
+            else:
+                result = (ocr or process_document_file)(document.file_path, language)
+            if result.get('error') and not result.get('text'):
+                raise RuntimeError(result['error'])
+            if sha256:
+                store_ocr_result(db, sha256, language, result, replace=job.force)
+    except Exception as e:
+        logger.error(f"Job de OCR {job.id} falhou: {e}")
+        job.status = OCRJobStatus.failed
+        job.error = str(e)
+        job.finished_at = datetime.utcnow()
+        db.commit()
+        return job
+
+    _apply_result(job, document, result)
+    db.commit()
+    logger.info(
+        f"Job de OCR {job.id} concluído{' (resultado guardado)' if result.get('cached') else ''}: "
+        f"{len(document.extracted_text)} caracteres, documento classificado como {document.document_type.value}"
+    )
+    return job
+
+
+class OCRDispatcher:
+    """
+    Despachantes de jobs de OCR
+
+    Cada thread reserva um job por vez e o executa no pool de processos
+    compartilhado, então até `workers` documentos são processados em paralelo
+    sem bloquear o event loop nem o threadpool da API. As páginas de um PDF
+    também são distribuídas entre os processos livres do pool.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session] = None, workers: int = OCR_WORKERS):
+        if session_factory is None:
+            from app.core.database import SessionLocal
+            session_factory = SessionLocal
+        self.session_factory = session_factory
+        self.workers = workers
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        # Pools encerrados por timeout: os outros jobs que estavam neles são refeitos
+        self._terminated = weakref.WeakSet()
+        self._threads = []
+        self._stop = threading.Event()
+        self._redis = None
+
+    def start(self):
+        if self.workers > 0:
+            self.executor = self._new_executor()
+        for i in range(max(self.workers, 1)):
+            thread = threading.Thread(target=self._loop, name=f"ocr-dispatcher-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Despachantes de OCR iniciados ({self.workers} processos)")
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        _wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # spawn: não herdar threads e conexões do processo da API
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_ocr_job_process
+        )
+        if OCR_PREWARM:
+            # Com spawn os processos são criados sob demanda: um aquecimento por
+            # processo os cria já com os engines e modelos carregados
+            for _ in range(self.workers):
+                executor.submit(warm_up_ocr)
+        return executor
+
+    def _replace_executor(self, executor: ProcessPoolExecutor, terminate: bool = False):
+        """Troca o pool pelo de um novo para os próximos jobs"""
+        with self._executor_lock:
+            if self.executor is executor and not self._stop.is_set():
+                self.executor = self._new_executor()
+        if terminate:
+            # shutdown não interrompe o que já está rodando: sem isso o processo
+            # travado continuaria ocupando CPU e memória
+            self._terminated.add(executor)
+            for process in list((executor._processes or {}).values()):
+                process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _ocr(self, file_path: str, language: str) -> dict:
+        """Executa o OCR no pool de processos (ou na thread atual, sem pool)"""
+        while True:
+            executor = self.executor
+            if executor is None:
+                return process_document_file(file_path, language)
+            try:
+                # As páginas de um PDF são distribuídas entre os processos livres do pool
+                return process_document_in_pool(file_path, language, executor, timeout=OCR_JOB_TIMEOUT)
+            except FutureTimeoutError:
+                # OCR travado (ex: PDF malformado): encerra os processos e recria o
+                # pool; este job é marcado como falho
+                logger.error(f"OCR excedeu {OCR_JOB_TIMEOUT}s; encerrando o pool de processos")
+                self._replace_executor(executor, terminate=True)
+                raise
+            except BrokenProcessPool:
+                if executor in self._terminated and not self._stop.is_set():
+                    # Pool encerrado pelo timeout de outro job: refaz este no pool novo
+                    continue
+                # Um processo morreu (ex: falta de memória em um PDF enorme): recria o pool
+                # para os próximos jobs; este é marcado como falho
+                logger.error("Pool de processos de OCR quebrado; recriando")
+                self._replace_executor(executor)
+                raise
+
+    def run_pending(self) -> int:
+        """Processa jobs até a fila esvaziar; retorna quantos foram processados"""
+        processed = 0
+        db = self.session_factory()
+        try:
+            while not self._stop.is_set():
+                job = claim_next_job(db)
+                if job is None:
+                    break
+                run_job(db, job, self._ocr)
+                processed += 1
+        finally:
+            db.close()
+        return processed
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                processed = self.run_pending()
+            except Exception as e:
+                logger.error(f"Erro no despachante de OCR: {e}")
+                processed = 0
+            if not processed:
+                self._wait_for_jobs()
+
+    def _wait_for_jobs(self):
+        """Espera um aviso de job novo (Redis ou Event local) ou o intervalo de consulta"""
+        client = self._blocking_redis()
+        if client is not None:
+            try:
+                client.blpop(OCR_QUEUE_KEY, timeout=max(1, int(OCR_POLL_INTERVAL)))
+                return
+            except Exception as e:
+                logger.warning(f"Erro ao aguardar jobs de OCR no Redis: {e}")
+                cache.redis_breaker.record_failure()
+                self._redis = None
+        _wakeup.wait(OCR_POLL_INTERVAL)
+        _wakeup.clear()
+
+    def _blocking_redis(self):
+        """
+        Cliente próprio para o BLPOP (que bloqueia além do socket_timeout do compartilhado)
+
+        Respeita o circuit breaker do Redis síncrono e sempre registra o resultado:
+        no estado meio-aberto, o PING abaixo é a tentativa que fecha ou reabre o
+        circuito (sem isso a vaga de tentativa ficaria presa).
+        """
+        if not cache.REDIS_AVAILABLE or not cache.redis_breaker.allow_request():
+            return None
+        try:
+            if self._redis is None:
+                self._redis = cache.Redis(
+                    host=cache.REDIS_HOST,
+                    port=cache.REDIS_PORT,
+                    db=cache.REDIS_DB,
+                    password=cache.REDIS_PASSWORD,
+                    decode_responses=True,
+                    socket_connect_timeout=2,
+                    socket_timeout=OCR_POLL_INTERVAL + 5
+                )
+            self._redis.ping()
+        except Exception as e:
+            logger.warning(f"Redis indisponível para a fila de OCR: {e}")
+            cache.redis_breaker.record_failure(trip=True)
+            self._redis = None
+            return None
+        cache.redis_breaker.record_success()
+        return self._redis
+
+
+ocr_dispatcher: Optional[OCRDispatcher] = None
+
+
+def start_ocr_workers():
+    """Inicia os despachantes no processo da API (OCR_WORKER_MODE=embedded)"""
+    global ocr_dispatcher
+    if OCR_WORKER_MODE != "embedded" or ocr_dispatcher is not None:
+        return
+    ocr_dispatcher = OCRDispatcher()
+    ocr_dispatcher.start()
+
+
+def stop_ocr_workers():
+    global ocr_dispatcher
+    if ocr_dispatcher is not None:
+        ocr_dispatcher.stop()
+        ocr_dispatcher = None
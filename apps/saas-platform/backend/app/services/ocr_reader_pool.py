@@ -0,0 +1,164 @@
+"""
+Pool de readers do EasyOCR por conjunto de idiomas
+
+Cada reader do EasyOCR carrega o modelo de detecção e um modelo de
+reconhecimento por escrita dos idiomas pedidos; um reader único com todos os
+idiomas ocupa muita memória e é mais lento (e o EasyOCR não combina chinês,
+japonês e coreano com outras escritas além do inglês).
+
+O pool mantém readers pequenos (OCR_READER_LANGUAGE_SETS, ex: "pt,en;es,en"),
+criados sob demanda; cada documento vai para o menor conjunto que cobre o seu
+idioma. Os readers menos usados recentemente são descartados quando a memória
+estimada passa de OCR_READER_MEMORY_MB. OCR_READER_PRELOAD define os idiomas
+carregados no aquecimento dos processos de OCR.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Sequence
+from loguru import logger
+import os
+
+# Conjuntos de idiomas (códigos do EasyOCR), separados por ';'
+OCR_READER_LANGUAGE_SETS = os.getenv(
+    "OCR_READER_LANGUAGE_SETS",
+    "pt,en;es,en;fr,en;de,en;it,en;ch_sim,en;ja,en;ko,en"
+)
+# Memória estimada máxima dos readers carregados por processo (MB)
+OCR_READER_MEMORY_MB = float(os.getenv("OCR_READER_MEMORY_MB", 1024))
+# Estimativa por reader: modelo de detecção + um modelo de reconhecimento por idioma (MB)
+OCR_READER_BASE_MB = float(os.getenv("OCR_READER_BASE_MB", 250))
+OCR_READER_LANGUAGE_MB = float(os.getenv("OCR_READER_LANGUAGE_MB", 40))
+# Idiomas cujos readers são carregados no aquecimento (warm_up_ocr)
+OCR_READER_PRELOAD = os.getenv("OCR_READER_PRELOAD", "pt,en")
+# Idioma usado quando o pedido não é coberto por nenhum conjunto
+OCR_DEFAULT_LANGUAGE = os.getenv("OCR_DEFAULT_LANGUAGE", "pt")
+
+# Códigos aceitos na API que diferem dos do EasyOCR
+LANGUAGE_ALIASES = {
+    "zh": "ch_sim",
+    "por": "pt",
+    "eng": "en",
+    "spa": "es",
+}
+
+
+def parse_language_sets(value: str) -> List[FrozenSet[str]]:
+    """ "pt,en;es,en" -> [{pt, en}, {es, en}] (na ordem, sem repetidos)"""
+    sets = []
+    for group in value.split(";"):
+        languages = frozenset(code.strip() for code in group.split(",") if code.strip())
+        if languages and languages not in sets:
+            sets.append(languages)
+    return sets
+
+
+def normalize_language(language: Optional[str]) -> str:
+    """Código do EasyOCR para o idioma pedido ("pt-BR" -> "pt", "zh" -> "ch_sim")"""
+    code = (language or "").strip().lower().replace("-", "_")
+    if code in LANGUAGE_ALIASES:
+        return LANGUAGE_ALIASES[code]
+    if code.startswith("ch_"):
+        return code
+    base = code.split("_")[0]
+    return LANGUAGE_ALIASES.get(base, base)
+
+
+class ReaderPool:
+    """
+    Readers por conjunto de idiomas, com LRU sob um orçamento de memória (thread-safe)
+
+    Args:
+        factory: Cria o reader de uma lista de idiomas (ex: easyocr.Reader)
+        language_sets: Conjuntos disponíveis, em ordem de preferência
+        memory_mb: Orçamento de memória estimada dos readers carregados
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[List[str]], Any],
+        language_sets: Sequence[FrozenSet[str]] = None,
+        memory_mb: float = None,
+    ):
+        self.factory = factory
+        self.language_sets = list(language_sets if language_sets is not None else parse_language_sets(OCR_READER_LANGUAGE_SETS))
+        self.memory_mb = OCR_READER_MEMORY_MB if memory_mb is None else memory_mb
+        self._lock = threading.Lock()
+        self._readers: "OrderedDict[FrozenSet[str], Any]" = OrderedDict()
+        # Um lock por conjunto: dois documentos do mesmo idioma não criam o reader duas vezes
+        self._loading: Dict[FrozenSet[str], threading.Lock] = {}
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    @property
+    def languages(self) -> List[str]:
+        return sorted({code for languages in self.language_sets for code in languages})
+
+    @staticmethod
+    def estimated_mb(languages: FrozenSet[str]) -> float:
+        return OCR_READER_BASE_MB + OCR_READER_LANGUAGE_MB * len(languages)
+
+    def language_set_for(self, language: Optional[str]) -> FrozenSet[str]:
+        """Menor conjunto configurado que cobre o idioma (o primeiro, em caso de empate)"""
+        code = normalize_language(language)
+        candidates = [languages for languages in self.language_sets if code in languages]
+        if not candidates and code != normalize_language(OCR_DEFAULT_LANGUAGE):
+            logger.warning(f"Idioma de OCR sem reader configurado: {language}; usando {OCR_DEFAULT_LANGUAGE}")
+            return self.language_set_for(OCR_DEFAULT_LANGUAGE)
+        if not candidates:
+            return frozenset({code, "en"})
+        return min(candidates, key=len)
+
+    def get(self, language: Optional[str]):
+        """Reader para o idioma, criado na primeira vez que é pedido"""
+        languages = self.language_set_for(language)
+        with self._lock:
+            reader = self._readers.get(languages)
+            if reader is not None:
+                self._readers.move_to_end(languages)
+                self.hits += 1
+                return reader
+            loading = self._loading.setdefault(languages, threading.Lock())
+
+        with loading:
+            with self._lock:
+                reader = self._readers.get(languages)
+                if reader is not None:
+                    self._readers.move_to_end(languages)
+                    self.hits += 1
+                    return reader
+            logger.info(f"Carregando reader do EasyOCR para {sorted(languages)}...")
+            reader = self.factory(sorted(languages))
+            with self._lock:
+                self._readers[languages] = reader
+                self.loads += 1
+                self._evict(keep=languages)
+            logger.info(f"Reader do EasyOCR para {sorted(languages)} carregado ({self.estimated_mb(languages):.0f}MB estimados)")
+            return reader
+
+    def _evict(self, keep: FrozenSet[str]):
+        """Descarta os readers menos usados até caber no orçamento (nunca o recém-criado)"""
+        while self._loaded_mb() > self.memory_mb and len(self._readers) > 1:
+            oldest = next(languages for languages in self._readers if languages != keep)
+            del self._readers[oldest]
+            self.evictions += 1
+            logger.info(f"Reader do EasyOCR para {sorted(oldest)} descartado (orçamento de {self.memory_mb:.0f}MB)")
+
+    def _loaded_mb(self) -> float:
+        return sum(self.estimated_mb(languages) for languages in self._readers)
+
+    def preload(self, languages: Sequence[str]):
+        for language in languages:
+            self.get(language)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "loaded": [sorted(languages) for languages in self._readers],
+                "estimated_mb": self._loaded_mb(),
+                "memory_mb": self.memory_mb,
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
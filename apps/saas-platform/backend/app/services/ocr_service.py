@@ -3,40 +3,97 @@ Serviço de OCR para processamento de documentos
 Implementa OCR com alta precisão para documentos de comércio exterior
 """
 
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from pathlib import Path
+from concurrent.futures import Executor, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from importlib import import_module, metadata
+from importlib.util import find_spec
 import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
 from loguru import logger
+from app.services.ocr_reader_pool import OCR_READER_PRELOAD, ReaderPool, normalize_language
 
-try:
-    from PIL import Image
-    PIL_AVAILABLE = True
-except ImportError:
-    PIL_AVAILABLE = False
-    Image = None
+# Os engines de OCR só são importados no primeiro uso (ou em warm_up_ocr, nos
+# processos de OCR): o EasyOCR importa o torch, que leva segundos e centenas de
+# MB, e a API só enfileira os documentos. Aqui apenas se verifica a instalação.
+PIL_AVAILABLE = find_spec("PIL") is not None
+if not PIL_AVAILABLE:
     logger.warning("Pillow não instalado. Execute: pip install Pillow")
 
-try:
-    import pdf2image
-    PDF2IMAGE_AVAILABLE = True
-except ImportError:
-    PDF2IMAGE_AVAILABLE = False
+PDF2IMAGE_AVAILABLE = find_spec("pdf2image") is not None
+if not PDF2IMAGE_AVAILABLE:
     logger.warning("pdf2image não instalado. Execute: pip install pdf2image")
 
-try:
-    import easyocr
-    EASYOCR_AVAILABLE = True
-except ImportError:
-    EASYOCR_AVAILABLE = False
+EASYOCR_AVAILABLE = find_spec("easyocr") is not None
+if not EASYOCR_AVAILABLE:
     logger.warning("EasyOCR não instalado. Execute: pip install easyocr")
 
-try:
-    import pytesseract
-    TESSERACT_AVAILABLE = True
-except ImportError:
-    TESSERACT_AVAILABLE = False
+TESSERACT_AVAILABLE = find_spec("pytesseract") is not None
+if not TESSERACT_AVAILABLE:
     logger.warning("Tesseract não instalado. Execute: pip install pytesseract")
 
+# Leitura da camada de texto de PDFs digitais, sem OCR (Python puro)
+PYPDF_AVAILABLE = find_spec("pypdf") is not None
+if not PYPDF_AVAILABLE:
+    logger.warning("pypdf não instalado; PDFs digitais passarão pelo OCR. Execute: pip install pypdf")
+
+
+# PDFs: resolução da rasterização, páginas por janela e processos de OCR de páginas
+# (0: páginas no próprio processo). Cada processo de páginas carrega os seus
+# readers: a memória de OCR por documento é OCR_PDF_WORKERS vezes a de um reader.
+# Nos jobs de OCR (app/services/ocr_queue.py) não há pool de páginas: o
+# despachante distribui as páginas entre os processos de jobs livres (ver
+# process_document_in_pool), com os readers já aquecidos.
+OCR_PDF_DPI = int(os.getenv("OCR_PDF_DPI", 200))
+OCR_PDF_WINDOW = max(int(os.getenv("OCR_PDF_WINDOW", 4)), 1)
+OCR_PDF_WORKERS = int(os.getenv("OCR_PDF_WORKERS", 2))
+
+# Página com menos caracteres alfanuméricos na camada de texto passa pelo OCR
+OCR_TEXT_LAYER_MIN_CHARS = int(os.getenv("OCR_TEXT_LAYER_MIN_CHARS", 32))
+# Fração máxima de caracteres ilegíveis (fonte sem mapeamento Unicode)
+OCR_TEXT_LAYER_MAX_GARBAGE = 0.1
+
+# Códigos do Tesseract (traineddata) para os idiomas do EasyOCR
+TESSERACT_LANGUAGES = {
+    'pt': 'por', 'en': 'eng', 'es': 'spa', 'fr': 'fra', 'de': 'deu', 'it': 'ita',
+    'ch_sim': 'chi_sim', 'ja': 'jpn', 'ko': 'kor',
+}
+
+
+def _usable_text(text: str) -> bool:
+    """Se a camada de texto de uma página dispensa o OCR"""
+    alphanumeric = sum(1 for char in text if char.isalnum())
+    if alphanumeric < OCR_TEXT_LAYER_MIN_CHARS:
+        return False
+    garbage = sum(1 for char in text if char == '\ufffd' or (not char.isprintable() and not char.isspace()))
+    return garbage <= len(text) * OCR_TEXT_LAYER_MAX_GARBAGE
+
+
+def _page_windows(page_numbers: List[int], size: int) -> List[Tuple[int, int]]:
+    """Páginas agrupadas em intervalos consecutivos de até `size` páginas: [2,3,4,9] -> [(2,4), (9,9)]"""
+    windows = []
+    for number in page_numbers:
+        if windows and number == windows[-1][1] + 1 and number - windows[-1][0] < size:
+            windows[-1] = (windows[-1][0], number)
+        else:
+            windows.append((number, number))
+    return windows
+
+
+@lru_cache(maxsize=None)
+def _engine(module_name: str):
+    """Importa um engine de OCR (PIL.Image, pdf2image, easyocr, pytesseract) no primeiro uso"""
+    started = time.perf_counter()
+    module = import_module(module_name)
+    logger.info(f"{module_name} importado em {time.perf_counter() - started:.2f}s")
+    return module
+
 
 class OCRService:
     """
@@ -45,18 +102,45 @@ class OCRService:
     """
     
     def __init__(self):
-        self.easyocr_reader = None
-        self.supported_languages = ['en', 'pt', 'es', 'fr', 'de', 'it', 'zh', 'ja', 'ko']
-        
-        if EASYOCR_AVAILABLE:
-            try:
-                # Inicializar EasyOCR (pode demorar na primeira vez)
-                logger.info("Inicializando EasyOCR...")
-                self.easyocr_reader = easyocr.Reader(self.supported_languages, gpu=False)
-                logger.info("EasyOCR inicializado com sucesso")
-            except Exception as e:
-                logger.error(f"Erro ao inicializar EasyOCR: {e}")
-                self.easyocr_reader = None
+        # Readers do EasyOCR por conjunto de idiomas, criados no primeiro documento de cada idioma
+        self.readers = ReaderPool(self._create_easyocr_reader)
+        self.supported_languages = self.readers.languages
+
+    @staticmethod
+    def _create_easyocr_reader(languages: List[str]):
+        return _engine("easyocr").Reader(languages, gpu=False)
+
+    def easyocr_reader(self, language: str = 'pt'):
+        """Reader do EasyOCR que cobre o idioma (None se o EasyOCR não puder ser carregado)"""
+        if not EASYOCR_AVAILABLE:
+            return None
+        try:
+            return self.readers.get(language)
+        except Exception as e:
+            logger.error(f"Erro ao inicializar EasyOCR para '{language}': {e}")
+            return None
+
+    def warm_up(self, languages: Optional[List[str]] = None):
+        """
+        Importa os engines disponíveis e carrega os readers do EasyOCR antes do primeiro documento
+
+        Args:
+            languages: Idiomas pré-carregados (padrão: OCR_READER_PRELOAD)
+        """
+        for available, module_name in (
+            (PIL_AVAILABLE, "PIL.Image"),
+            (PDF2IMAGE_AVAILABLE, "pdf2image"),
+            (TESSERACT_AVAILABLE, "pytesseract"),
+        ):
+            if available:
+                try:
+                    _engine(module_name)
+                except Exception as e:
+                    logger.error(f"Erro ao importar {module_name}: {e}")
+        if languages is None:
+            languages = [code.strip() for code in OCR_READER_PRELOAD.split(",") if code.strip()]
+        for language in languages:
+            self.easyocr_reader(language)
     
     def extract_text_from_image(self, image_path: str, language: str = 'pt') -> Dict[str, Any]:
         """
@@ -72,44 +156,157 @@ class OCRService:
         if not PIL_AVAILABLE:
             raise Exception("Pillow não está instalado. Execute: pip install Pillow")
         try:
-            image = Image.open(image_path)
-            return self._process_image(image, language)
+            with _engine("PIL.Image").open(image_path) as image:
+                return self._process_image(image, language)
         except Exception as e:
             logger.error(f"Erro ao processar imagem {image_path}: {e}")
             raise
     
-    def extract_text_from_pdf(self, pdf_path: str, language: str = 'pt') -> Dict[str, Any]:
+    def extract_text_from_pdf(
+        self, pdf_path: str, language: str = 'pt', executor: Optional[Executor] = None, timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
         """
         Extrai texto de um PDF
         
+        PDFs gerados digitalmente já trazem a camada de texto: com pypdf, cada
+        página com texto utilizável é lida diretamente (method 'text_layer') e
+        só as demais (digitalizadas) passam pelo OCR.
+        
+        As páginas do OCR são rasterizadas em janelas de até OCR_PDF_WINDOW
+        páginas consecutivas, em arquivos temporários, e distribuídas entre os
+        processos do pool (ou processadas no próprio processo, sem pool). A
+        janela seguinte é rasterizada enquanto a atual está no OCR: no máximo
+        duas janelas existem ao mesmo tempo, qualquer que seja o número de
+        páginas.
+        
         Args:
             pdf_path: Caminho para o PDF
             language: Idioma do documento
+            executor: Pool onde rodam a leitura da camada de texto e o OCR das
+                páginas (padrão: leitura no processo atual, páginas no pool de páginas)
+            timeout: Tempo máximo de espera pelo pool no documento (segundos)
         
         Returns:
-            Dict com texto extraído de todas as páginas
+            Dict com texto extraído de todas as páginas (na ordem), cada uma
+            com o seu 'method'
         """
-        if not PDF2IMAGE_AVAILABLE or not PIL_AVAILABLE:
-            raise Exception("pdf2image e Pillow não estão instalados. Execute: pip install pdf2image Pillow")
+        deadline = time.monotonic() + timeout if timeout is not None else None
         try:
-            # Converter PDF para imagens
-            images = pdf2image.convert_from_path(pdf_path)
-            
-            all_text = []
-            for i, image in enumerate(images):
-                page_result = self._process_image(image, language)
-                page_result['page'] = i + 1
-                all_text.append(page_result)
+            if executor is not None:
+                pages = executor.submit(_pdf_text_layer, pdf_path).result(timeout=_remaining(deadline))
+            else:
+                pages = self._text_layer_pages(pdf_path)
+            if pages is None:
+                total_pages = int(_engine("pdf2image").pdfinfo_from_path(pdf_path)["Pages"]) if PDF2IMAGE_AVAILABLE else 0
+                pages = [None] * total_pages
+            ocr_pages = [number for number, page in enumerate(pages, start=1) if page is None]
+            if ocr_pages:
+                if not PDF2IMAGE_AVAILABLE or not PIL_AVAILABLE:
+                    raise Exception("pdf2image e Pillow não estão instalados. Execute: pip install pdf2image Pillow")
+                for page in self._ocr_pdf_pages(pdf_path, ocr_pages, language, executor, deadline):
+                    pages[page['page'] - 1] = page
+            elif not pages:
+                raise Exception("pdf2image ou pypdf não estão instalados. Execute: pip install pypdf")
             
+            methods = {page['method'] for page in pages}
             return {
-                'text': '\n\n'.join(page['text'] for page in all_text),
-                'pages': all_text,
-                'total_pages': len(images),
-                'language': language
+                'text': '\n\n'.join(page['text'] for page in pages),
+                'pages': pages,
+                'total_pages': len(pages),
+                'confidence': sum(page.get('confidence', 0) for page in pages) / len(pages),
+                'method': methods.pop() if len(methods) == 1 else 'mixed',
+                'ocr_pages': len(ocr_pages),
+                'language': language,
+                'dpi': OCR_PDF_DPI
             }
         except Exception as e:
             logger.error(f"Erro ao processar PDF {pdf_path}: {e}")
             raise
+
+    @staticmethod
+    def _text_layer_pages(pdf_path: str) -> Optional[List[Optional[Dict[str, Any]]]]:
+        """
+        Texto embutido de cada página (None nas páginas que precisam de OCR)
+
+        Retorna None sem pypdf ou se o PDF não puder ser lido por ele.
+        """
+        if not PYPDF_AVAILABLE:
+            return None
+        try:
+            reader = _engine("pypdf").PdfReader(pdf_path)
+            page_objects = list(reader.pages)
+        except Exception as e:
+            logger.warning(f"pypdf não conseguiu ler {pdf_path}; usando OCR em todas as páginas: {e}")
+            return None
+        pages = []
+        for number, page_object in enumerate(page_objects, start=1):
+            try:
+                text = page_object.extract_text() or ''
+            except Exception as e:
+                logger.warning(f"Erro ao ler o texto da página {number} de {pdf_path}: {e}")
+                text = ''
+            if _usable_text(text):
+                pages.append({
+                    'text': text.strip(),
+                    'confidence': 1.0,
+                    'method': 'text_layer',
+                    'page': number,
+                    'lines': len(text.strip().split('\n'))
+                })
+            else:
+                pages.append(None)
+        return pages
+
+    def _ocr_pdf_pages(
+        self, pdf_path: str, page_numbers: List[int], language: str,
+        executor: Optional[Executor] = None, deadline: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """OCR das páginas indicadas, por janelas de páginas consecutivas"""
+        if executor is None:
+            executor = _get_page_executor()
+        results = []
+        with tempfile.TemporaryDirectory(prefix="ocr-pdf-") as workdir:
+            in_flight = []
+            for first, last in _page_windows(page_numbers, OCR_PDF_WINDOW):
+                paths = self._render_pages(pdf_path, first, last, workdir)
+                submitted = [
+                    (first + i, path, executor.submit(_ocr_pdf_page, path, language) if executor else None)
+                    for i, path in enumerate(paths)
+                ]
+                results.extend(self._collect_pages(in_flight, language, executor, deadline))
+                in_flight = submitted
+            results.extend(self._collect_pages(in_flight, language, executor, deadline))
+        return results
+
+    @staticmethod
+    def _render_pages(pdf_path: str, first: int, last: int, output_folder: str) -> List[str]:
+        """Rasteriza as páginas first..last em arquivos PNG; retorna os caminhos em ordem"""
+        return _engine("pdf2image").convert_from_path(
+            pdf_path,
+            dpi=OCR_PDF_DPI,
+            first_page=first,
+            last_page=last,
+            output_folder=output_folder,
+            fmt="png",
+            paths_only=True
+        )
+
+    def _collect_pages(self, in_flight, language: str, executor, deadline: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Resultados de uma janela, na ordem das páginas; apaga as imagens já processadas"""
+        pages = []
+        try:
+            for page, path, future in in_flight:
+                if future is not None:
+                    result = future.result(timeout=_remaining(deadline))
+                else:
+                    result = self.extract_text_from_image(path, language)
+                result['page'] = page
+                pages.append(result)
+                os.unlink(path)
+        except BrokenProcessPool:
+            _discard_page_executor(executor)
+            raise
+        return pages
     
     def extract_text_from_bytes(self, file_bytes: bytes, file_type: str, language: str = 'pt') -> Dict[str, Any]:
         """
@@ -123,25 +320,11 @@ class OCRService:
         Returns:
             Dict com texto extraído
         """
-        if not PIL_AVAILABLE:
-            # Retornar resultado vazio se OCR não estiver disponível
-            return {
-                'text': '',
-                'confidence': 0,
-                'method': 'none',
-                'error': 'Pillow não está instalado'
-            }
         try:
             if file_type.lower() == 'pdf':
-                if not PDF2IMAGE_AVAILABLE:
-                    return {
-                        'text': '',
-                        'confidence': 0,
-                        'method': 'none',
-                        'error': 'pdf2image não está instalado'
-                    }
+                if not PYPDF_AVAILABLE and not (PDF2IMAGE_AVAILABLE and PIL_AVAILABLE):
+                    return _error_result('pypdf ou pdf2image não está instalado')
                 # Para PDF, salvar temporariamente e processar
-                import tempfile
                 with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp:
                     tmp.write(file_bytes)
                     tmp_path = tmp.name
@@ -150,17 +333,43 @@ class OCRService:
                     return result
             else:
                 # Para imagens
-                image = Image.open(io.BytesIO(file_bytes))
+                if not PIL_AVAILABLE:
+                    # Retornar resultado vazio se OCR não estiver disponível
+                    return _error_result('Pillow não está instalado')
+                image = _engine("PIL.Image").open(io.BytesIO(file_bytes))
                 return self._process_image(image, language)
         except Exception as e:
             logger.error(f"Erro ao processar bytes: {e}")
             # Retornar resultado vazio em caso de erro
-            return {
-                'text': '',
-                'confidence': 0,
-                'method': 'none',
-                'error': str(e)
-            }
+            return _error_result(str(e))
+
+    def extract_text_from_file(self, file_path: str, file_type: str, language: str = 'pt') -> Dict[str, Any]:
+        """
+        Extrai texto de um arquivo salvo, sem carregá-lo inteiro na memória
+        
+        Como extract_text_from_bytes, mas o PDF é lido direto do caminho: a
+        memória fica limitada às janelas de páginas, qualquer que seja o
+        tamanho do arquivo.
+        
+        Args:
+            file_path: Caminho do arquivo
+            file_type: Tipo do arquivo (pdf, png, jpg, etc.)
+            language: Idioma do documento
+        
+        Returns:
+            Dict com texto extraído
+        """
+        try:
+            if file_type.lower() == 'pdf':
+                if not PYPDF_AVAILABLE and not (PDF2IMAGE_AVAILABLE and PIL_AVAILABLE):
+                    return _error_result('pypdf ou pdf2image não está instalado')
+                return self.extract_text_from_pdf(file_path, language)
+            if not PIL_AVAILABLE:
+                return _error_result('Pillow não está instalado')
+            return self.extract_text_from_image(file_path, language)
+        except Exception as e:
+            logger.error(f"Erro ao processar {file_path}: {e}")
+            return _error_result(str(e))
     
     def _process_image(self, image, language: str = 'pt') -> Dict[str, Any]:
         """
@@ -173,11 +382,12 @@ class OCRService:
         Returns:
             Dict com texto e metadados
         """
-        # Tentar EasyOCR primeiro (mais preciso)
-        if self.easyocr_reader and EASYOCR_AVAILABLE:
+        # Tentar EasyOCR primeiro (mais preciso), com o menor reader que cobre o idioma
+        reader = self.easyocr_reader(language)
+        if reader is not None:
             try:
-                lang_code = language[:2] if language in self.supported_languages else 'en'
-                result = self.easyocr_reader.readtext(image)
+                # O EasyOCR recebe arrays (numpy), bytes ou caminhos, não objetos PIL
+                result = reader.readtext(_engine("numpy").asarray(image.convert("RGB")))
                 
                 text_lines = [item[1] for item in result]
                 confidence_scores = [item[2] for item in result]
@@ -186,7 +396,7 @@ class OCRService:
                     'text': '\n'.join(text_lines),
                     'confidence': sum(confidence_scores) / len(confidence_scores) if confidence_scores else 0,
                     'method': 'easyocr',
-                    'language': lang_code,
+                    'language': normalize_language(language),
                     'lines': len(text_lines)
                 }
             except Exception as e:
@@ -195,7 +405,8 @@ class OCRService:
         # Fallback para Tesseract
         if TESSERACT_AVAILABLE:
             try:
-                lang_code = language[:2] if language in ['pt', 'en', 'es'] else 'eng'
+                pytesseract = _engine("pytesseract")
+                lang_code = TESSERACT_LANGUAGES.get(normalize_language(language), 'eng')
                 text = pytesseract.image_to_string(image, lang=lang_code)
                 
                 # Obter dados de confiança
@@ -270,3 +481,193 @@ def get_ocr_service() -> OCRService:
         _ocr_service = OCRService()
     return _ocr_service
 
+
+def _error_result(message: str) -> Dict[str, Any]:
+    """Resultado vazio de um arquivo que não pôde passar pelo OCR"""
+    return {
+        'text': '',
+        'confidence': 0,
+        'method': 'none',
+        'error': message
+    }
+
+
+_page_executor: Optional[ProcessPoolExecutor] = None
+_page_executor_lock = threading.Lock()
+# Se o processo atual é um processo de jobs de OCR (ver init_ocr_job_process)
+_in_job_process = False
+
+
+def init_ocr_job_process():
+    """
+    Inicializador dos processos de jobs de OCR
+
+    Os jobs já ocupam OCR_WORKERS processos: um pool de páginas em cada um
+    multiplicaria os processos (e os readers carregados). As páginas de PDF
+    são distribuídas pelo despachante entre os próprios processos de jobs
+    (ver process_document_in_pool).
+    """
+    global _in_job_process
+    _in_job_process = True
+
+
+def _get_page_executor() -> Optional[ProcessPoolExecutor]:
+    """Pool de processos das páginas de PDF (persistente: os readers ficam carregados)"""
+    global _page_executor
+    if OCR_PDF_WORKERS <= 0 or _in_job_process:
+        return None
+    with _page_executor_lock:
+        if _page_executor is None:
+            # spawn: não herdar threads e conexões do processo atual
+            _page_executor = ProcessPoolExecutor(
+                max_workers=OCR_PDF_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _page_executor
+
+
+def _discard_page_executor(executor: Executor):
+    """Descarta um pool quebrado (ex: processo morto por falta de memória); o próximo PDF cria outro"""
+    global _page_executor
+    with _page_executor_lock:
+        if _page_executor is not executor:
+            # Já descartado, ou um pool de outro dono (o dos jobs de OCR é recriado pelo despachante)
+            return
+        logger.error("Pool de processos de páginas de PDF quebrado; recriando no próximo documento")
+        _page_executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _remaining(deadline: Optional[float]) -> Optional[float]:
+    return None if deadline is None else max(deadline - time.monotonic(), 0)
+
+
+def _ocr_pdf_page(image_path: str, language: str) -> Dict[str, Any]:
+    """OCR de uma página já rasterizada (executado nos processos de páginas ou de jobs)"""
+    return get_ocr_service().extract_text_from_image(image_path, language)
+
+
+def _pdf_text_layer(pdf_path: str) -> Optional[List[Optional[Dict[str, Any]]]]:
+    """Camada de texto de um PDF (executada em um processo do pool)"""
+    return OCRService._text_layer_pages(pdf_path)
+
+
+def warm_up_ocr():
+    """
+    Aquece o OCR do processo atual (imports e reader do EasyOCR)
+
+    Executado nos processos de OCR logo que são criados (OCR_PREWARM), para que
+    o primeiro documento não pague o carregamento dos modelos.
+    """
+    started = time.perf_counter()
+    get_ocr_service().warm_up()
+    logger.info(f"OCR aquecido em {time.perf_counter() - started:.2f}s")
+
+
+
+# Extensões processadas pelo OCR; os demais tipos (DOC, XLS...) são apenas armazenados
+OCR_EXTENSIONS = {'.pdf', '.png', '.jpg', '.jpeg'}
+# Os mesmos tipos, para arquivos sem extensão (armazenamento por SHA-256)
+OCR_MIME_TYPES = {'application/pdf', 'image/png', 'image/jpeg', 'image/jpg'}
+
+# Versão do pipeline de OCR: incrementar quando uma mudança no código altera o
+# resultado (os resultados guardados em ocr_results deixam de ser usados)
+OCR_PIPELINE_VERSION = 1
+
+
+@lru_cache(maxsize=None)
+def ocr_engine_version() -> str:
+    """
+    Identifica os engines e a configuração que produzem o resultado do OCR
+
+    Chave do cache de resultados por conteúdo (app/services/document_store.py):
+    atualizar um engine ou mudar o DPI invalida os resultados guardados.
+    """
+    parts = [f"v{OCR_PIPELINE_VERSION}"]
+    engines = (("easyocr", EASYOCR_AVAILABLE), ("pytesseract", TESSERACT_AVAILABLE), ("pypdf", PYPDF_AVAILABLE))
+    for package, available in engines:
+        if available:
+            try:
+                parts.append(f"{package}={metadata.version(package)}")
+            except metadata.PackageNotFoundError:
+                parts.append(package)
+    parts.append(f"dpi={OCR_PDF_DPI}")
+    if PYPDF_AVAILABLE:
+        parts.append(f"text_layer={OCR_TEXT_LAYER_MIN_CHARS}")
+    return ";".join(parts)
+
+
+def not_processed_result() -> Dict[str, Any]:
+    """Resultado dos tipos que não passam pelo OCR"""
+    return {
+        'text': '',
+        'confidence': 0,
+        'method': 'none',
+        'classification': {'document_type': 'other', 'confidence': 0.0}
+    }
+
+
+def _file_type(file_path: str) -> Optional[str]:
+    """'pdf', 'image' ou None (tipo sem OCR); sem extensão, pelo conteúdo"""
+    extension = Path(file_path).suffix.lower()
+    if not extension:
+        with open(file_path, 'rb') as f:
+            return 'pdf' if f.read(5) == b'%PDF-' else 'image'
+    if extension not in OCR_EXTENSIONS:
+        return None
+    return 'pdf' if extension == '.pdf' else 'image'
+
+
+def process_document_file(file_path: str, language: str = 'pt') -> Dict[str, Any]:
+    """
+    Executa OCR e classificação de um arquivo já salvo
+
+    Ponto de entrada dos processos de OCR (app/services/ocr_queue.py): recebe
+    apenas o caminho e devolve um dict serializável. Arquivos sem extensão (do
+    armazenamento por SHA-256) são tratados como PDF ou imagem pelo conteúdo;
+    os demais tipos são filtrados antes, pelo mime type do documento.
+
+    Args:
+        file_path: Caminho do arquivo
+        language: Idioma do documento
+
+    Returns:
+        Dict com texto, confiança, método e classificação ('classification')
+    """
+    file_type = _file_type(file_path)
+    if file_type is None:
+        return not_processed_result()
+
+    ocr_service = get_ocr_service()
+    result = ocr_service.extract_text_from_file(file_path, file_type, language)
+    result['classification'] = ocr_service.classify_document(result.get('text', ''))
+    return result
+
+
+def process_document_in_pool(
+    file_path: str, language: str, executor: Executor, timeout: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Como process_document_file, com o OCR em um pool de processos de jobs
+
+    Ponto de entrada dos despachantes (app/services/ocr_queue.py). Imagens são
+    processadas inteiras em um processo do pool. Um PDF é conduzido pela thread
+    atual (a rasterização é um subprocesso do poppler) e as páginas de cada
+    janela vão para os processos livres do pool: um PDF grande com a fila
+    vazia usa todos eles, e com a fila cheia as suas páginas (no máximo duas
+    janelas por vez) se intercalam com as dos outros jobs.
+
+    Erros do pool (timeout, processo morto) são propagados para o despachante
+    encerrar ou recriar o pool; os demais viram um resultado com 'error'.
+    """
+    if _file_type(file_path) != 'pdf':
+        return executor.submit(process_document_file, file_path, language).result(timeout=timeout)
+
+    ocr_service = get_ocr_service()
+    try:
+        result = ocr_service.extract_text_from_pdf(file_path, language, executor=executor, timeout=timeout)
+    except (FutureTimeoutError, BrokenProcessPool):
+        raise
+    except Exception as e:
+        result = _error_result(str(e))
+    result['classification'] = ocr_service.classify_document(result.get('text', ''))
+    return result
@@ -0,0 +1,118 @@
+"""
+Serviço de séries temporais agregadas
+Agrupa registros por semana, mês ou trimestre com um GROUP BY por tabela
+e preenche com zero os períodos sem dados
+"""
+
+from typing import Any, Dict, List, Union
+from datetime import date, datetime, timedelta
+from sqlalchemy import select, func, cast, Integer, String
+from sqlalchemy.orm import Session
+
+GRANULARITIES = ("week", "month", "quarter")
+
+
+def add_months(day: date, months: int) -> date:
+    """Soma (ou subtrai) meses a uma data posicionada no dia 1"""
+    month_index = day.year * 12 + (day.month - 1) + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def bucket_start(day: date, granularity: str) -> date:
+    """Retorna o início do período (segunda-feira, dia 1 do mês ou do trimestre) que contém a data"""
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "quarter":
+        return date(day.year, (day.month - 1) // 3 * 3 + 1, 1)
+    return date(day.year, day.month, 1)
+
+
+def bucket_expression(column, granularity: str, dialect: str):
+    """
+    Expressão SQL que reduz uma coluna de data ao início do período, no formato YYYY-MM-DD
+
+    Args:
+        column: Coluna DateTime
+        granularity: week, month ou quarter
+        dialect: Nome do dialeto do banco (sqlite, postgresql)
+    """
+    if dialect == "postgresql":
+        return func.to_char(func.date_trunc(granularity, column), "YYYY-MM-DD")
+
+    # SQLite: sem date_trunc, usar funções de data nativas
+    if granularity == "week":
+        return func.date(column, "-6 days", "weekday 1")
+    if granularity == "quarter":
+        month = cast(func.strftime("%m", column), Integer)
+        first_month = (month - 1) // 3 * 3 + 1
+        return (
+            func.strftime("%Y-", column, type_=String)
+            + func.printf("%02d", first_month, type_=String)
+            + "-01"
+        )
+    return func.strftime("%Y-%m-01", column)
+
+
+class TimeSeriesAggregator:
+    """
+    Agregador de séries temporais
+
+    O número de consultas é constante (uma por tabela) independente do tamanho da janela.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.dialect = db.get_bind().dialect.name
+
+    def buckets(self, start: date, end: date, granularity: str) -> List[date]:
+        """Lista os inícios de período entre start e end (inclusive)"""
+        current = bucket_start(start, granularity)
+        result = []
+        while current <= end:
+            result.append(current)
+            if granularity == "week":
+                current = current + timedelta(days=7)
+            elif granularity == "quarter":
+                current = add_months(current, 3)
+            else:
+                current = add_months(current, 1)
+        return result
+
+    def aggregate(
+        self,
+        date_column,
+        aggregates: Dict[str, Any],
+        filters: List[Any],
+        start: Union[date, datetime],
+        granularity: str = "month"
+    ) -> Dict[date, Dict[str, float]]:
+        """
+        Executa um único GROUP BY por período
+
+        Args:
+            date_column: Coluna usada para o agrupamento
+            aggregates: Mapa nome -> expressão agregada (func.count, func.sum, ...)
+            filters: Filtros adicionais (ex: company_id)
+            start: Início da janela (date para colunas Date, datetime para DateTime)
+            granularity: week, month ou quarter
+
+        Returns:
+            Dict {início do período: {nome: valor}} apenas para períodos com dados
+        """
+        bucket = cast(bucket_expression(date_column, granularity, self.dialect), String).label("bucket")
+        query = select(
+            bucket,
+            *[expression.label(name) for name, expression in aggregates.items()]
+        ).where(date_column >= start, *filters).group_by(bucket)
+
+        result = {}
+        for row in self.db.execute(query).mappings():
+            result[date.fromisoformat(row["bucket"])] = {
+                name: row[name] or 0 for name in aggregates
+            }
+        return result
+
+    @staticmethod
+    def zero_fill(buckets: List[date], data: Dict[date, Dict[str, float]], names: List[str]) -> List[Dict[str, float]]:
+        """Alinha os resultados aos períodos esperados, preenchendo lacunas com zero"""
+        return [data.get(bucket, dict.fromkeys(names, 0)) for bucket in buckets]
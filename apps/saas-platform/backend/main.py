@@ -1,7 +1,11 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.database import engine
+from app.core.metrics import RequestMetricsMiddleware, require_metrics_access
+from app.core.security import require_admin_role
+from app.core.profiling import RequestProfilingMiddleware
 from app.models import Base
+from app.services import kpi_rollup_service
 from app.core.middleware import (
     exception_handler,
     dasfabri_exception_handler,
@@ -36,6 +40,9 @@ from app.api.v1.auth import router as auth_router
 # Criar tabelas (temporariamente comentado - usar migrations)
 # Base.metadata.create_all(bind=engine)
 
+# Eventos que mantêm company_kpi_rollups atualizado a cada gravação nas tabelas de origem
+kpi_rollup_service.register_listeners()
+
 app = FastAPI(
     title="Dasfabri API",
     description="API completa para sistema de comércio exterior SaaS",
@@ -61,6 +68,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Profiling sob demanda (header X-Profile de administradores); dentro do middleware de métricas
+app.add_middleware(RequestProfilingMiddleware)
+
+# Latência, status e tempo de banco por rota (/metrics, /health/db e header Server-Timing)
+app.add_middleware(RequestMetricsMiddleware)
+
+# Workers de OCR em segundo plano (em produção OCR_WORKER_MODE=external e scripts/ocr_worker.py)
+# e monitor de bloqueios do event loop (/api/v1/admin/event-loop)
+@app.on_event("startup")
+def start_background_workers():
+    from app.services.ocr_queue import start_ocr_workers
+    from app.core.loop_monitor import start_loop_monitor
+    start_ocr_workers()
+    start_loop_monitor()
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    from app.services.ocr_queue import stop_ocr_workers
+    from app.core.password_hashing import shutdown_hash_executor
+    from app.core.loop_monitor import stop_loop_monitor
+    stop_ocr_workers()
+    shutdown_hash_executor()
+    stop_loop_monitor()
+
 # Rotas de Autenticação e Usuários
 app.include_router(auth_router, prefix="/api/v1/auth", tags=["Autenticação"])
 # Temporariamente comentado - corrigir importações depois
@@ -158,6 +189,10 @@ app.include_router(dashboard_config_router, prefix="/api/v1/user/dashboard-confi
 from app.api.v1.import_processes import router as import_processes_router
 app.include_router(import_processes_router, prefix="/api/v1/import-processes", tags=["Processos de Importação"])
 
+# Rotas administrativas de diagnóstico (consultas lentas, bloqueios do event loop, perfis)
+from app.api.v1.admin import router as admin_router
+app.include_router(admin_router, prefix="/api/v1/admin", tags=["Administração"])
+
 @app.get("/", response_model=dict)
 async def root():
     """
@@ -216,4 +251,53 @@ async def health_check():
         "status": "healthy",
         "service": "Dasfabri API",
         "version": "1.0.0"
-    } 
\ No newline at end of file
+    }
+
+@app.get("/health/cache", dependencies=[Depends(require_admin_role)])
+async def cache_health_check():
+    """
+    Estatísticas do cache de respostas (backend ativo, hits e misses)
+
+    Apenas administradores.
+    """
+    from app.core.cache import get_cache_stats
+
+    return get_cache_stats()
+
+@app.get("/health/db", dependencies=[Depends(require_admin_role)])
+async def db_health_check():
+    """
+    Situação dos pools de conexão, espera no checkout e consultas por rota
+
+    Apenas administradores.
+    """
+    from app.core import database
+    from app.core.db_metrics import db_metrics, get_pool_status
+
+    pools = {"sync": get_pool_status(database.engine)}
+    if database.async_engine is not None:
+        pools["async"] = get_pool_status(database.async_engine.sync_engine)
+    return {"pools": pools, **db_metrics.snapshot()}
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_metrics_access)])
+async def prometheus_metrics():
+    """
+    Métricas HTTP no formato de exposição do Prometheus
+
+    Acesso interno: token METRICS_TOKEN (Bearer) ou, sem token configurado, só loopback.
+    """
+    from fastapi.responses import Response
+    from app.core.metrics import PROMETHEUS_CONTENT_TYPE, metrics_registry
+
+    return Response(metrics_registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.get("/health/auth", dependencies=[Depends(require_admin_role)])
+async def auth_health_check():
+    """
+    Executor de verificação de senhas (fila, tempo de hash) e limite de logins
+
+    Apenas administradores.
+    """
+    from app.core.password_hashing import password_hash_metrics
+
+    return password_hash_metrics.snapshot()
@@ -0,0 +1,169 @@
+"""
+Benchmark de throughput das rotas com acesso ao banco sob concorrência
+
+Sobe a aplicação em processo (ASGI, sem rede) sobre um banco SQLite temporário
+com dados de exemplo e dispara requisições concorrentes contra rotas do Control
+Tower, produtos, armazéns e tasks (AsyncSession). O cache de respostas é
+desativado para medir o banco.
+
+Para comparar antes/depois, execute o mesmo script em cada revisão:
+    git stash; python scripts/benchmark_async_db.py; git stash pop
+
+Uso:
+    python scripts/benchmark_async_db.py
+    python scripts/benchmark_async_db.py --concurrency 50 100 200 --requests 1000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Banco temporário e cache desativado antes de importar a aplicação
+_db_file = tempfile.NamedTemporaryFile(delete=False, suffix=".db")
+_db_file.close()
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_file.name}"
+os.environ["CACHE_ENABLED"] = "false"
+
+# Adicionar o diretório raiz do backend ao path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+
+from main import app
+from app.core.database import SessionLocal, engine, get_async_engine
+from app.core.security import create_access_token
+from app.models import (
+    Base, Company, User, UserStatus, ImportProcess, ImportStatus,
+    Product, Warehouse, Task, TaskStatus, TaskPriority, TaskType
+)
+
+ENDPOINTS = [
+    "/api/v1/control-tower/summary",
+    "/api/v1/control-tower/dashboard",
+    "/api/v1/products/",
+    "/api/v1/warehouses/",
+    "/api/v1/tasks/",
+]
+
+
+def seed(rows: int) -> str:
+    """Cria tabelas e dados de exemplo; retorna o token de um usuário"""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        company = Company(name="Benchmark", cnpj="00000000000100", email="bench@example.com", country="Brasil")
+        db.add(company)
+        db.commit()
+        user = User(
+            name="Benchmark", email="bench@example.com", hashed_password="x",
+            company_id=company.id, status=UserStatus.active
+        )
+        db.add(user)
+        db.commit()
+        statuses = list(ImportStatus)
+        for i in range(rows):
+            db.add(ImportProcess(
+                reference_number=f"IMP-BENCH-{i}", client="Cliente", product="Produto",
+                origin="China", destination="Brasil", supplier="Fornecedor",
+                status=statuses[i % len(statuses)], company_id=company.id, created_by=user.id
+            ))
+            db.add(Product(code=f"P{i}", name=f"Produto {i}", company_id=company.id))
+            db.add(Task(
+                title=f"Task {i}", status=TaskStatus.pending, priority=TaskPriority.medium,
+                task_type=TaskType.other, due_date=datetime.utcnow() + timedelta(days=7),
+                company_id=company.id, created_by=user.id
+            ))
+        db.add(Warehouse(name="Armazém", code="WH-1", company_id=company.id))
+        db.commit()
+        return create_access_token({"sub": str(user.id)})
+    finally:
+        db.close()
+
+
+async def run_level(client: httpx.AsyncClient, path: str, concurrency: int, total: int, headers: dict):
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    async def worker():
+        nonlocal errors
+        while True:
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    # Sonda: latência de /health (sem banco) durante a carga mostra se o
+    # event loop está sendo bloqueado pelas rotas com banco
+    probe_latencies = []
+    done = asyncio.Event()
+
+    async def probe():
+        interval = 0.01
+        while not done.is_set():
+            # Atraso do sleep (event loop ocupado) + tempo da requisição
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            await client.get("/health")
+            probe_latencies.append(time.perf_counter() - started - interval)
+
+    probe_task = asyncio.create_task(probe())
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    done.set()
+    await probe_task
+    latencies.sort()
+    probe_latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": percentile(latencies, 0.95) * 1000,
+        "health_p95": percentile(probe_latencies, 0.95) * 1000,
+        "errors": errors,
+    }
+
+
+def percentile(values, p: float) -> float:
+    return values[max(0, int(len(values) * p) - 1)] if values else 0.0
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark de throughput das rotas com banco")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[50, 100, 200])
+    parser.add_argument("--requests", type=int, default=500, help="Requisições por nível e rota")
+    parser.add_argument("--rows", type=int, default=200, help="Registros de exemplo por tabela")
+    args = parser.parse_args()
+
+    token = seed(args.rows)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        print(f"{'rota':<36} {'conc':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'health p95':>11} {'erros':>6}")
+        for path in ENDPOINTS:
+            for concurrency in args.concurrency:
+                result = await run_level(client, path, concurrency, args.requests, headers)
+                print(
+                    f"{path:<36} {concurrency:>5} {result['rps']:>9.1f} "
+                    f"{result['p50']:>9.1f} {result['p95']:>9.1f} {result['health_p95']:>11.1f} {result['errors']:>6}"
+                )
+    await get_async_engine().dispose()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    finally:
+        os.unlink(_db_file.name)
@@ -0,0 +1,144 @@
+"""
+Benchmark do OCR de PDFs por janelas de páginas
+
+Processa o mesmo PDF com diferentes números de processos e mostra páginas/s e
+o pico de memória (RSS do processo e dos filhos). Cada configuração roda em um
+processo Python novo; a primeira passada (carregamento dos readers em cada
+processo) não entra na medição.
+
+Modos:
+    jobs   caminho dos jobs de OCR (padrão): o PDF passa pelo despachante, que
+           distribui as páginas entre os OCR_WORKERS processos de jobs
+    pages  OCR fora da fila (OCRService.extract_text_from_pdf), com as páginas
+           no pool de OCR_PDF_WORKERS processos de páginas
+
+Sem --pdf, gera um PDF sintético com texto (requer Pillow). Requer pdf2image
+(poppler) e EasyOCR ou Tesseract.
+
+Uso:
+    python scripts/benchmark_pdf_ocr.py
+    python scripts/benchmark_pdf_ocr.py --pages 60 --workers 0,1,2,4 --dpi 150 --window 4
+    python scripts/benchmark_pdf_ocr.py --mode pages
+    python scripts/benchmark_pdf_ocr.py --pdf documentos/bl_bundle.pdf --language en
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+# Adicionar o diretório raiz do backend ao path
+sys.path.insert(0, BACKEND_DIR)
+
+
+def synthetic_pdf(pages: int, path: str):
+    """PDF com linhas de texto de um conhecimento de embarque fictício em cada página"""
+    from PIL import Image, ImageDraw
+
+    images = []
+    for page in range(1, pages + 1):
+        image = Image.new("RGB", (1240, 1754), "white")
+        draw = ImageDraw.Draw(image)
+        for line in range(40):
+            draw.text(
+                (80, 80 + line * 40),
+                f"BILL OF LADING {page:03d}-{line:02d}  CONTAINER MSCU{page * 100 + line:07d}  SANTOS / SHANGHAI",
+                fill="black"
+            )
+        images.append(image)
+    images[0].save(path, save_all=True, append_images=images[1:], resolution=150)
+
+
+def run(pdf: str, workers: int, language: str, mode: str) -> dict:
+    """Executado no processo filho: aquece e mede uma passada com `workers` processos"""
+    from app.services import ocr_queue, ocr_service
+
+    if mode == "jobs":
+        ocr_queue.OCR_PREWARM = True
+        dispatcher = ocr_queue.OCRDispatcher(session_factory=lambda: None, workers=workers)
+        dispatcher.executor = dispatcher._new_executor() if workers > 0 else None
+        extract = lambda: dispatcher._ocr(pdf, language)
+    else:
+        ocr_service.OCR_PDF_WORKERS = workers
+        extract = lambda: ocr_service.get_ocr_service().extract_text_from_pdf(pdf, language)
+    extract()
+
+    started = time.perf_counter()
+    result = extract()
+    elapsed = time.perf_counter() - started
+    if result.get("error"):
+        # O caminho dos jobs devolve o erro no resultado em vez de levantar
+        raise RuntimeError(result["error"])
+
+    # Os filhos só entram em RUSAGE_CHILDREN depois de encerrados
+    if mode == "jobs":
+        dispatcher.stop()
+    elif ocr_service._page_executor is not None:
+        ocr_service._page_executor.shutdown()
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {
+        "pages": result["total_pages"],
+        "seconds": elapsed,
+        "characters": len(result["text"]),
+        # ru_maxrss em KB no Linux; para os filhos é o maior pico entre eles
+        "rss_mb": own / 1024,
+        "child_rss_mb": children / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Páginas/s do OCR de PDF por número de processos")
+    parser.add_argument("--pdf", default=None, help="PDF a processar (padrão: sintético)")
+    parser.add_argument("--pages", type=int, default=24, help="Páginas do PDF sintético")
+    parser.add_argument("--mode", choices=("jobs", "pages"), default="jobs", help="Processos de jobs ou de páginas")
+    parser.add_argument("--workers", default="0,1,2,4", help="Números de processos")
+    parser.add_argument("--dpi", type=int, default=None, help="OCR_PDF_DPI")
+    parser.add_argument("--window", type=int, default=None, help="OCR_PDF_WINDOW")
+    parser.add_argument("--language", default="en")
+    parser.add_argument("--child", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(run(args.pdf, args.child, args.language, args.mode)))
+        return
+
+    pdf = args.pdf
+    if pdf is None:
+        pdf = os.path.join(tempfile.gettempdir(), f"benchmark_pdf_ocr_{args.pages}.pdf")
+        synthetic_pdf(args.pages, pdf)
+
+    env = dict(os.environ)
+    if args.dpi:
+        env["OCR_PDF_DPI"] = str(args.dpi)
+    if args.window:
+        env["OCR_PDF_WINDOW"] = str(args.window)
+
+    print(f"{'processos':>9} {'páginas':>8} {'segundos':>9} {'páginas/s':>10} {'RSS MB':>8} {'RSS filho MB':>13}")
+    baseline = None
+    for workers in [int(value) for value in args.workers.split(",")]:
+        result = subprocess.run(
+            [
+                sys.executable, os.path.abspath(__file__), "--pdf", pdf, "--language", args.language,
+                "--mode", args.mode, "--child", str(workers)
+            ],
+            cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            print(f"{workers:>9} ERRO: {result.stderr.strip().splitlines()[-1]}")
+            continue
+        data = json.loads(result.stdout.strip().splitlines()[-1])
+        rate = data["pages"] / data["seconds"]
+        baseline = baseline or rate
+        print(
+            f"{workers:>9} {data['pages']:>8} {data['seconds']:>9.2f} {rate:>10.2f} "
+            f"{data['rss_mb']:>8.0f} {data['child_rss_mb']:>13.0f}   {rate / baseline:.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
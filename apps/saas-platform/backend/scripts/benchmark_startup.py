@@ -0,0 +1,148 @@
+"""
+Benchmark do tempo de import da API (cold start)
+
+Mede, cada um em um processo Python novo:
+- a base comum a todas as rotas (fastapi, SQLAlchemy, modelos, core);
+- o custo adicional de cada módulo de rotas de app/api/v1 sobre essa base;
+- o import completo de main (o que um worker do gunicorn paga ao subir).
+
+Também lista os pacotes mais pesados do import de main (python -X importtime)
+e avisa se algum engine de OCR (torch, easyocr...) foi importado no startup.
+Com --max-seconds, sai com erro se o import de main passar do limite (CI).
+
+Uso:
+    python scripts/benchmark_startup.py
+    python scripts/benchmark_startup.py --repeat 5 --max-seconds 3
+"""
+import argparse
+import json
+import os
+import pkgutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Imports comuns a todas as rotas, medidos à parte
+BASE_MODULES = ["fastapi", "sqlalchemy", "app.core.database", "app.models", "app.core.security"]
+# Módulos que não devem ser importados no startup da API
+HEAVY_MODULES = ["torch", "easyocr", "cv2", "pytesseract", "pdf2image", "PIL"]
+
+# Executado no processo filho: importa a base e depois o módulo alvo, medindo os dois
+PROBE = """
+import json, sys, time
+from importlib import import_module
+started = time.perf_counter()
+for name in {base!r}:
+    import_module(name)
+base = time.perf_counter() - started
+error = None
+started = time.perf_counter()
+try:
+    import_module({target!r})
+except Exception as e:
+    error = f"{{type(e).__name__}}: {{e}}"
+print(json.dumps({{
+    "base": base,
+    "target": time.perf_counter() - started,
+    "error": error,
+    "heavy": [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def _env() -> dict:
+    return {
+        **os.environ,
+        "OCR_WORKER_MODE": "external",
+        "DATABASE_URL": os.environ.get("DATABASE_URL", f"sqlite:///{tempfile.gettempdir()}/benchmark_startup.db"),
+    }
+
+
+def probe(target: str, base=BASE_MODULES) -> dict:
+    code = PROBE.format(base=list(base), target=target, heavy=HEAVY_MODULES)
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, env=_env(), capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return {"base": 0.0, "target": 0.0, "error": result.stderr.strip().splitlines()[-1], "heavy": []}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure(target: str, repeat: int, base=BASE_MODULES) -> dict:
+    runs = [probe(target, base) for _ in range(repeat)]
+    return {
+        "base": statistics.median(run["base"] for run in runs),
+        "target": statistics.median(run["target"] for run in runs),
+        "error": runs[-1]["error"],
+        "heavy": runs[-1]["heavy"],
+    }
+
+
+def heaviest_imports(limit: int):
+    """Pacotes com maior tempo de import em main (-X importtime, tempo próprio somado por pacote)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=_env(), capture_output=True, text=True
+    )
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        own, _, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        if not own.isdigit():
+            continue
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + int(own)
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+def router_modules():
+    sys.path.insert(0, BACKEND_DIR)
+    path = os.path.join(BACKEND_DIR, "app", "api", "v1")
+    return sorted(f"app.api.v1.{module.name}" for module in pkgutil.iter_modules([path]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo de import da API e de cada módulo de rotas")
+    parser.add_argument("--repeat", type=int, default=3, help="Medições por módulo (mediana)")
+    parser.add_argument("--top", type=int, default=10, help="Pacotes mais pesados listados")
+    parser.add_argument("--max-seconds", type=float, default=None, help="Falha se o import de main passar disso")
+    args = parser.parse_args()
+
+    print(f"{'módulo':<36} {'import (ms)':>12}")
+    results = {}
+    for module in router_modules():
+        result = measure(module, args.repeat)
+        results[module] = result
+        status = f"  ERRO: {result['error']}" if result["error"] else ""
+        heavy = f"  importa {', '.join(result['heavy'])}" if result["heavy"] else ""
+        print(f"{module:<36} {result['target'] * 1000:>12.1f}{heavy}{status}")
+
+    base = statistics.median(result["base"] for result in results.values())
+    app = measure("main", args.repeat, base=[])
+    print()
+    print(f"{'base comum (' + ', '.join(BASE_MODULES[:2]) + ', ...)':<36} {base * 1000:>12.1f}")
+    print(f"{'main (total)':<36} {app['target'] * 1000:>12.1f}")
+    if app["error"]:
+        print(f"ERRO ao importar main: {app['error']}")
+
+    print()
+    print("Pacotes mais pesados no import de main:")
+    for package, microseconds in heaviest_imports(args.top):
+        print(f"  {package:<32} {microseconds / 1000:>10.1f}ms")
+
+    if app["heavy"]:
+        print(f"\nATENÇÃO: engines de OCR importados no startup: {', '.join(app['heavy'])}")
+    else:
+        print("\nNenhum engine de OCR importado no startup")
+
+    if args.max_seconds is not None and app["target"] > args.max_seconds:
+        print(f"Import de main levou {app['target']:.2f}s (limite {args.max_seconds:.2f}s)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
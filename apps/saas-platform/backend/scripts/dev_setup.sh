@@ -50,6 +50,12 @@ case "$1" in
         echo "✅ Dados de teste inseridos"
         ;;
     
+    "rebuild-rollups")
+        echo "📊 Reconstruindo rollup de KPIs..."
+        python scripts/rebuild_kpi_rollups.py "${@:2}"
+        echo "✅ Rollup reconstruído"
+        ;;
+    
     "test")
         echo "🧪 Rodando testes..."
         pytest "$2" -v
@@ -90,6 +96,7 @@ case "$1" in
         echo "  migrate-down          - Reverter última migration"
         echo "  reset-db              - Resetar banco de dados"
         echo "  seed                  - Popular com dados de teste"
+        echo "  rebuild-rollups       - Reconstruir rollup de KPIs (company_kpi_rollups)"
         echo "  test [path]           - Rodar testes"
         echo "  test-cov              - Testes com cobertura"
         echo "  lint                  - Verificar código"
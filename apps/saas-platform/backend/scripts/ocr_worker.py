@@ -0,0 +1,54 @@
+"""
+Worker de OCR fora do processo da API
+
+Reserva jobs da tabela ocr_jobs (acordado pela lista no Redis, quando
+disponível) e executa o OCR em um pool de processos já aquecido
+(OCR_PREWARM). É o modo de produção: use com OCR_WORKER_MODE=external na
+API para que ela apenas enfileire os jobs, sem um pool de OCR por worker do
+uvicorn.
+
+Uso:
+    python scripts/ocr_worker.py                # OCR_WORKERS processos
+    python scripts/ocr_worker.py --workers 4
+    python scripts/ocr_worker.py --once         # processa a fila e sai
+"""
+import argparse
+import os
+import signal
+import sys
+import threading
+
+# Adicionar o diretório raiz do backend ao path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# Este é o worker externo: OCR_PREWARM fica ligado por padrão
+os.environ.setdefault("OCR_WORKER_MODE", "external")
+
+from app.services.ocr_queue import OCR_PREWARM, OCR_WORKERS, OCRDispatcher
+from app.services.ocr_service import warm_up_ocr
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Processa a fila de jobs de OCR")
+    parser.add_argument("--workers", type=int, default=OCR_WORKERS, help="Processos de OCR")
+    parser.add_argument("--once", action="store_true", help="Processar os jobs pendentes e sair")
+    args = parser.parse_args()
+
+    dispatcher = OCRDispatcher(workers=args.workers)
+    if args.workers == 0 and OCR_PREWARM:
+        # Sem pool o OCR roda neste processo (com pool, cada processo se aquece)
+        warm_up_ocr()
+    if args.once:
+        processed = dispatcher.run_pending()
+        print(f"Jobs de OCR processados: {processed}")
+        return
+
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    signal.signal(signal.SIGINT, lambda *_: stopped.set())
+    dispatcher.start()
+    stopped.wait()
+    dispatcher.stop()
+
+
+if __name__ == "__main__":
+    main()
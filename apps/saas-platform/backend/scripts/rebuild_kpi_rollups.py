@@ -0,0 +1,33 @@
+"""
+Reconstrói a tabela company_kpi_rollups a partir das tabelas de origem
+
+Uso:
+    python scripts/rebuild_kpi_rollups.py                 # todas as empresas
+    python scripts/rebuild_kpi_rollups.py --company-id 3  # apenas uma empresa
+"""
+import argparse
+import os
+import sys
+
+# Adicionar o diretório raiz do backend ao path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.core.database import SessionLocal
+from app.services.kpi_rollup_service import rebuild_rollups
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstrói o rollup diário de KPIs por empresa")
+    parser.add_argument("--company-id", type=int, default=None, help="Reconstruir apenas esta empresa")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        rows = rebuild_rollups(db, company_id=args.company_id)
+        print(f"Rollup reconstruído: {rows} linhas (empresa, dia)")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,11 @@
 Configuração global para testes pytest
 """
 import pytest
+from contextlib import contextmanager
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
 # Importar Base dos modelos (não do core.database) para garantir que seja o mesmo usado pelos modelos
 from app.models import (
     Base,  # Base dos modelos
@@ -15,11 +18,14 @@ from app.models import (
     Task, TaskStatus, TaskPriority, TaskType
 )
 from app.core.security import get_password_hash
+from app.core.db_metrics import instrument_engine
+from app.core.slow_queries import install_slow_query_log
 
 # Database de teste - usar arquivo temporário para garantir que todas as sessões compartilhem o mesmo banco
 # Com :memory:, cada conexão cria um banco separado, então usamos um arquivo temporário
 import tempfile
 import os
+from pathlib import Path
 
 # Criar arquivo temporário para o banco de teste
 test_db_file = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
@@ -30,6 +36,21 @@ SQLALCHEMY_DATABASE_URL = f"sqlite:///{test_db_path}"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Engine assíncrono (aiosqlite) sobre o mesmo arquivo, para as rotas que usam get_async_db
+# NullPool: o TestClient pode usar um event loop diferente a cada requisição
+async_engine = create_async_engine(f"sqlite+aiosqlite:///{test_db_path}", poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# Métricas de consultas por rota (/health/db) também nos engines de teste
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+install_slow_query_log(engine)
+install_slow_query_log(async_engine.sync_engine, engine)
+
+# Arquivos enviados nos testes ficam em um diretório temporário
+from app.services.document_store import document_store
+document_store.root = Path(tempfile.mkdtemp(prefix="document-store-"))
+
 # Limpar arquivo temporário ao final dos testes
 def cleanup_test_db():
     """Remove o arquivo de banco de teste após os testes"""
@@ -69,6 +90,55 @@ def db():
         session.rollback()
         session.close()
 
+@pytest.fixture(scope="function", autouse=True)
+def reset_process_state():
+    """
+    Zera o estado global do processo entre testes
+
+    Cache em memória (os IDs de empresa se repetem entre testes), estatísticas
+    do cache, métricas de banco e HTTP, log de consultas lentas e perfis.
+    """
+    from app.core.cache import local_cache, cache_stats
+    from app.core.db_metrics import db_metrics
+    from app.core.metrics import metrics_registry
+    from app.core.slow_queries import slow_query_log
+    from app.core.profiling import profile_store
+    local_cache.clear()
+    cache_stats.reset()
+    db_metrics.reset()
+    metrics_registry.reset()
+    slow_query_log.reset()
+    profile_store.clear()
+    yield
+
+@pytest.fixture
+def query_budget():
+    """
+    Verifica o orçamento de consultas de um bloco (ex: uma requisição)
+
+    Falha se o bloco executar mais de `max_queries` consultas ou repetir o mesmo
+    SQL mais de `max_repeated` vezes (N+1); a mensagem lista os SQLs executados.
+
+    Uso:
+        with query_budget(5, max_repeated=1):
+            client.get("/api/v1/comments/processes/1/comments", headers=auth_headers)
+    """
+    from app.core.db_metrics import capture_queries
+
+    @contextmanager
+    def budget(max_queries: int, max_repeated: int = None):
+        with capture_queries() as captured:
+            yield captured
+        assert captured.queries <= max_queries, (
+            f"Orçamento de {max_queries} consultas excedido:\n{captured.report()}"
+        )
+        if max_repeated is not None:
+            assert captured.max_repeated <= max_repeated, (
+                f"SQL repetido mais de {max_repeated}x (N+1):\n{captured.report()}"
+            )
+
+    return budget
+
 @pytest.fixture(scope="session", autouse=True)
 def cleanup():
     """Limpa o banco de teste após todos os testes"""
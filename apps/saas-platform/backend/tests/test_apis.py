@@ -18,11 +18,11 @@ from sqlalchemy.orm import sessionmaker
 # O main.py está em apps/saas-platform/backend/main.py
 from main import app
 
-from app.core.database import get_db
+from app.core.database import get_db, get_async_db
 # Importar Base dos modelos (não do core.database) para garantir que seja o mesmo usado pelos modelos
 from app.models import (
     Base,  # Base dos modelos
-    User, UserStatus, Company, Supplier, Product, ProductCategory,
+    User, UserRole, UserStatus, Company, CompanyTier, Supplier, Product, ProductCategory,
     ImportProcess, ExportProcess, ImportDocument, ImportStatus,
     Payment, Container, PurchaseOrder, POItem,
     TrackingEvent, ComplianceCheck, Comment, CommentAttachment,
@@ -33,7 +33,7 @@ from app.models.import_document import DocumentStatus
 from app.core.security import get_password_hash
 
 # Importar engine e sessionmaker do conftest para usar o mesmo banco
-from tests.conftest import engine, TestingSessionLocal
+from tests.conftest import engine, TestingSessionLocal, TestingAsyncSessionLocal
 
 # Variável global para armazenar a sessão atual do teste
 _current_db_session = None
@@ -52,7 +52,13 @@ def override_get_db():
         finally:
             db.close()
 
+async def override_get_async_db():
+    """Override para get_async_db usando o mesmo arquivo de banco de teste"""
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
 
 client = TestClient(app)
 
@@ -112,6 +118,32 @@ def auth_headers(auth_token):
     """Headers de autenticação"""
     return {"Authorization": f"Bearer {auth_token}"}
 
+@pytest.fixture
+def admin_headers(test_user, db):
+    """Headers de um administrador da mesma empresa (para /health/* e /api/v1/admin)"""
+    from app.core.security import create_access_token
+
+    admin = User(
+        name="Admin User",
+        email="admin@example.com",
+        hashed_password=get_password_hash("adminpassword123"),
+        company_id=test_user.company_id,
+        role=UserRole.admin,
+        status=UserStatus.active
+    )
+    db.add(admin)
+    db.commit()
+    db.refresh(admin)
+    token = create_access_token({"sub": str(admin.id), "role": admin.role.value, "ver": admin.token_version})
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture
+def metrics_headers(monkeypatch):
+    """Headers do coletor de métricas (METRICS_TOKEN)"""
+    from app.core import metrics
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "token-coletor")
+    return {"Authorization": "Bearer token-coletor"}
+
 
 class TestProductsAPI:
     """Testes para a API de Produtos"""
@@ -545,7 +577,54 @@ class TestControlTowerAPI:
         assert response.status_code == 200
         data = response.json()
         assert "summary" in data
-    
+
+    def test_dashboard_aggregated_counters(self, auth_headers, test_user, db):
+        """Testa contadores agregados do dashboard com dados reais"""
+        for i, status in enumerate([ImportStatus.pending, ImportStatus.in_progress, ImportStatus.completed]):
+            db.add(ImportProcess(
+                reference_number=f"IMP-CT-{i}",
+                client="Cliente",
+                product="Produto",
+                origin="China",
+                destination="Brasil",
+                supplier="Fornecedor",
+                status=status,
+                company_id=test_user.company_id,
+                created_by=test_user.id
+            ))
+        db.add(ComplianceCheck(
+            name="Licença",
+            description="Licença de importação",
+            category="license",
+            status="non-compliant",
+            required=True,
+            company_id=test_user.company_id
+        ))
+        db.add(ComplianceCheck(
+            name="Fatura",
+            description="Fatura comercial",
+            category="document",
+            status="compliant",
+            company_id=test_user.company_id
+        ))
+        db.commit()
+
+        response = client.get("/api/v1/control-tower/dashboard", headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["summary"]["total_processes"] == 3
+        assert data["summary"]["active_processes"] == 2
+        assert data["summary"]["critical_alerts"] == 1
+        assert data["summary"]["compliance_rate"] == 50.0
+        assert data["compliance_overview"] == {"total": 2, "compliant": 1, "non_compliant": 1, "pending": 0}
+        assert {s["status"] for s in data["import_statuses"]} == {"pending", "in_progress", "completed"}
+        assert data["export_statuses"] == []
+
+    def test_async_auth_rejects_invalid_token(self, test_user):
+        """Testa que as rotas com sessão assíncrona exigem token válido"""
+        response = client.get("/api/v1/control-tower/summary", headers={"Authorization": "Bearer invalido"})
+        assert response.status_code == 401
+
     def test_list_all_processes(self, auth_headers):
         """Testa listagem de todos os processos"""
         response = client.get("/api/v1/control-tower/processes/all", headers=auth_headers)
@@ -565,7 +644,73 @@ class TestDashboardAPI:
         response = client.get("/api/v1/dashboard/predictive-kpis", headers=auth_headers)
         assert response.status_code == 200
         assert isinstance(response.json(), list)
-    
+
+    def test_predictive_kpis_clearance_time(self, auth_headers, test_user, db):
+        """Testa média e percentis do tempo de desembaraço calculados no banco"""
+        from datetime import datetime, timedelta
+
+        created_at = datetime.utcnow() - timedelta(days=25)
+        for i, days in enumerate([4, 10, 20]):
+            db.add(ImportProcess(
+                reference_number=f"IMP-KPI-{i}",
+                client="Cliente",
+                product="Produto",
+                origin="China",
+                destination="Brasil",
+                supplier="Fornecedor",
+                company_id=test_user.company_id,
+                created_by=test_user.id,
+                created_at=created_at,
+                customs_clearance_date=created_at + timedelta(days=days, hours=5)
+            ))
+        db.commit()
+
+        response = client.get("/api/v1/dashboard/predictive-kpis?timeframe=30days", headers=auth_headers)
+        assert response.status_code == 200
+        kpi = next(k for k in response.json() if k["id"] == "kpi-2")
+        assert round(kpi["current_value"], 2) == round(34 / 3, 2)
+        assert kpi["predicted_value"] == int(34 / 3 * 0.85)
+        assert "Mediana de 10 dia(s) e p90 de 20 dia(s) em 3 processo(s)" in kpi["insight"]
+
+    def test_duration_stats_floor_matches_timedelta_days(self, test_user, db):
+        """Testa que durações negativas/fracionárias arredondam como timedelta.days"""
+        from datetime import datetime, timedelta
+        from app.services.kpi_service import KPIEngine
+
+        created_at = datetime(2024, 3, 10, 12, 0, 0)
+        deltas = [
+            timedelta(days=-1, hours=-12),
+            timedelta(hours=-1),
+            timedelta(days=2, hours=18),
+            timedelta(days=3)
+        ]
+        for i, delta in enumerate(deltas):
+            db.add(ImportProcess(
+                reference_number=f"IMP-FLOOR-{i}",
+                client="Cliente",
+                product="Produto",
+                origin="China",
+                destination="Brasil",
+                supplier="Fornecedor",
+                company_id=test_user.company_id,
+                created_by=test_user.id,
+                created_at=created_at,
+                customs_clearance_date=created_at + delta
+            ))
+        db.commit()
+
+        stats = KPIEngine(db).duration_stats(
+            ImportProcess.created_at,
+            ImportProcess.customs_clearance_date,
+            [ImportProcess.reference_number.like("IMP-FLOOR-%")]
+        )
+        expected = sorted(delta.days for delta in deltas)
+        assert expected == [-2, -1, 2, 3]
+        assert stats["count"] == 4
+        assert stats["avg"] == sum(expected) / 4
+        assert stats["p50"] == -1
+        assert stats["p90"] == 3
+
     def test_get_proactive_alerts(self, auth_headers):
         """Testa obtenção de alertas proativos"""
         response = client.get("/api/v1/dashboard/proactive-alerts", headers=auth_headers)
@@ -579,6 +724,422 @@ class TestDashboardAPI:
         assert response.status_code == 200
         assert isinstance(response.json(), list)
 
+    def test_get_performance_data_buckets(self, auth_headers, test_user, db):
+        """Testa agrupamento por período com preenchimento de zeros"""
+        from datetime import datetime
+        
+        for i in range(3):
+            db.add(ImportProcess(
+                reference_number=f"IMP-PERF-{i}",
+                client="Cliente",
+                product="Produto",
+                origin="China",
+                destination="Brasil",
+                supplier="Fornecedor",
+                company_id=test_user.company_id,
+                created_by=test_user.id
+            ))
+        db.add(Payment(
+            payment_number="PAY-PERF-1",
+            description="Frete",
+            amount=250.0,
+            payment_type="freight",
+            due_date=datetime.utcnow(),
+            company_id=test_user.company_id,
+            created_by=test_user.id
+        ))
+        db.commit()
+
+        response = client.get("/api/v1/dashboard/performance-data?months=12", headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data) == 12
+        assert data[-1]["processos"] == 3
+        assert data[-1]["custos"] == 250.0
+        assert sum(point["processos"] for point in data[:-1]) == 0
+
+        for granularity in ("week", "quarter"):
+            response = client.get(
+                f"/api/v1/dashboard/performance-data?months=6&granularity={granularity}",
+                headers=auth_headers
+            )
+            assert response.status_code == 200
+            data = response.json()
+            assert data[-1]["processos"] == 3
+            assert sum(point["processos"] for point in data) == 3
+
+        response = client.get("/api/v1/dashboard/performance-data?granularity=day", headers=auth_headers)
+        assert response.status_code == 422
+
+
+class TestKPIRollups:
+    """Testes para o rollup diário de KPIs (company_kpi_rollups)"""
+
+    def _totals(self, db, company_id):
+        from sqlalchemy import select
+        from app.services.kpi_rollup_service import rollup_totals
+        return dict(db.execute(select(rollup_totals(company_id))).mappings().one())
+
+    def _new_process(self, test_user, reference, status=ImportStatus.pending):
+        return ImportProcess(
+            reference_number=reference,
+            client="Cliente",
+            product="Produto",
+            origin="China",
+            destination="Brasil",
+            supplier="Fornecedor",
+            status=status,
+            company_id=test_user.company_id,
+            created_by=test_user.id
+        )
+
+    def test_incremental_insert_update_delete(self, test_user, db):
+        """Testa atualização incremental por eventos de insert/update/delete"""
+        from datetime import datetime
+
+        process = self._new_process(test_user, "IMP-ROLLUP-1")
+        payment = Payment(
+            payment_number="PAY-ROLLUP-1",
+            description="Frete",
+            amount=100.0,
+            payment_type="freight",
+            due_date=datetime.utcnow(),
+            company_id=test_user.company_id,
+            created_by=test_user.id
+        )
+        db.add_all([process, payment])
+        db.commit()
+
+        totals = self._totals(db, test_user.company_id)
+        assert totals["imports_total"] == 1
+        assert totals["imports_active"] == 1
+        assert totals["payments_pending"] == 1
+        assert totals["payments_amount"] == 100.0
+
+        process.status = ImportStatus.completed
+        payment.amount = 150.0
+        payment.status = "paid"
+        db.commit()
+
+        totals = self._totals(db, test_user.company_id)
+        assert totals["imports_total"] == 1
+        assert totals["imports_active"] == 0
+        assert totals["imports_completed"] == 1
+        assert totals["payments_pending"] == 0
+        assert totals["payments_amount"] == 150.0
+
+        db.delete(process)
+        db.commit()
+        assert self._totals(db, test_user.company_id)["imports_total"] == 0
+
+    def test_rebuild_matches_incremental(self, test_user, db):
+        """Testa que a reconstrução produz os mesmos totais que a atualização incremental"""
+        from app.services.kpi_rollup_service import rebuild_rollups
+
+        for i, status in enumerate([ImportStatus.pending, ImportStatus.completed, ImportStatus.draft]):
+            db.add(self._new_process(test_user, f"IMP-REBUILD-{i}", status))
+        db.add(ComplianceCheck(
+            name="Licença",
+            description="Licença de importação",
+            category="license",
+            status="non-compliant",
+            required=True,
+            company_id=test_user.company_id
+        ))
+        db.commit()
+
+        incremental = self._totals(db, test_user.company_id)
+        assert rebuild_rollups(db) == 1
+        assert self._totals(db, test_user.company_id) == incremental
+        assert incremental["checks_critical"] == 1
+
+    def test_migration_backfills_existing_rows(self, test_user, db):
+        """A migração popula o rollup a partir das tabelas de origem, como a reconstrução"""
+        import importlib.util
+        from datetime import datetime, timedelta
+        from pathlib import Path
+        from sqlalchemy import delete, select
+        from app.models import CompanyKPIRollup
+
+        spec = importlib.util.spec_from_file_location(
+            "add_company_kpi_rollups",
+            Path(__file__).resolve().parents[1] / "alembic" / "versions" / "add_company_kpi_rollups.py"
+        )
+        migration = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(migration)
+
+        yesterday = datetime.utcnow() - timedelta(days=1)
+        for i, status in enumerate([ImportStatus.pending, ImportStatus.completed, ImportStatus.in_progress]):
+            process = self._new_process(test_user, f"IMP-BACKFILL-{i}", status)
+            process.created_at = yesterday if i else None
+            db.add(process)
+        db.add(ComplianceCheck(
+            name="Licença",
+            description="Licença de importação",
+            category="license",
+            status="non-compliant",
+            required=True,
+            company_id=test_user.company_id
+        ))
+        db.add(Payment(
+            payment_number="PAY-BACKFILL-1",
+            description="Frete",
+            amount=80.5,
+            payment_type="freight",
+            due_date=datetime.utcnow(),
+            company_id=test_user.company_id,
+            created_by=test_user.id
+        ))
+        db.commit()
+
+        def rows():
+            query = select(CompanyKPIRollup).order_by(CompanyKPIRollup.day)
+            return [
+                {name: getattr(row, name) for name in ("company_id", "day", *migration.ROLLUP_METRICS)}
+                for row in db.scalars(query)
+            ]
+
+        incremental = rows()
+        assert len(incremental) == 2
+        db.execute(delete(CompanyKPIRollup))
+        migration.backfill_rollups(db.connection())
+        db.commit()
+        db.expire_all()
+        assert rows() == incremental
+        assert self._totals(db, test_user.company_id)["checks_critical"] == 1
+
+
+class TestResponseCache:
+    """Testes para o cache de respostas por empresa"""
+
+    @pytest.fixture(autouse=True)
+    def disable_principal_cache(self, monkeypatch):
+        # As contagens de hits/misses abaixo são só das respostas
+        from app.core import security
+        monkeypatch.setattr(security, "PRINCIPAL_CACHE_TTL", 0)
+
+    def _new_process(self, test_user, reference):
+        return ImportProcess(
+            reference_number=reference,
+            client="Cliente",
+            product="Produto",
+            origin="China",
+            destination="Brasil",
+            supplier="Fornecedor",
+            status=ImportStatus.pending,
+            company_id=test_user.company_id,
+            created_by=test_user.id
+        )
+
+    def test_summary_hit_and_invalidation_on_write(self, auth_headers, test_user, db, admin_headers):
+        """Testa hit na segunda leitura e invalidação após gravação de processo"""
+        db.add(self._new_process(test_user, "IMP-CACHE-1"))
+        db.commit()
+
+        response = client.get("/api/v1/control-tower/summary", headers=auth_headers)
+        assert response.status_code == 200
+        assert response.json()["total_processes"] == 1
+
+        response = client.get("/api/v1/control-tower/summary", headers=auth_headers)
+        assert response.json()["total_processes"] == 1
+        stats = client.get("/health/cache", headers=admin_headers).json()
+        assert stats["totals"]["hits"] == 1
+        assert stats["totals"]["misses"] == 1
+
+        db.add(self._new_process(test_user, "IMP-CACHE-2"))
+        db.commit()
+
+        response = client.get("/api/v1/control-tower/summary", headers=auth_headers)
+        assert response.json()["total_processes"] == 2
+        stats = client.get("/health/cache", headers=admin_headers).json()
+        assert stats["totals"]["misses"] == 2
+        assert stats["totals"]["invalidations"] >= 1
+
+    def test_query_params_are_part_of_key(self, auth_headers, admin_headers):
+        """Testa que parâmetros diferentes geram entradas diferentes"""
+        client.get("/api/v1/dashboard/performance-data?months=3", headers=auth_headers)
+        client.get("/api/v1/dashboard/performance-data?months=6", headers=auth_headers)
+        client.get("/api/v1/dashboard/performance-data?months=3", headers=auth_headers)
+
+        stats = client.get("/health/cache", headers=admin_headers).json()
+        assert stats["totals"]["misses"] == 2
+        assert stats["totals"]["hits"] == 1
+
+    def test_local_backend_tags_and_ttl(self):
+        """Testa invalidação por tag e expiração no backend em memória"""
+        from app.core.cache import LocalCacheBackend
+
+        backend = LocalCacheBackend(max_entries=2)
+        backend.set("a", "1", ttl=60, tags=["company:1:dashboard"])
+        backend.set("b", "2", ttl=60, tags=["company:2:dashboard"])
+        assert backend.invalidate_tags(["company:1:dashboard"]) == 1
+        assert backend.get("a") is None
+        assert backend.get("b") == "2"
+
+        backend.set("c", "3", ttl=0)
+        assert backend.get("c") is None
+
+        backend.set("d", "4", ttl=60)
+        backend.set("e", "5", ttl=60)
+        assert len(backend._entries) <= 2
+
+    def test_circuit_breaker_backoff(self):
+        """Testa abertura, backoff e tentativa única no estado meio-aberto"""
+        import time
+        from app.core.cache import CircuitBreaker
+
+        breaker = CircuitBreaker("test", failure_threshold=2, base_backoff=0.05, max_backoff=0.2)
+        assert breaker.allow_request()
+        breaker.record_failure()
+        assert breaker.state == "closed"
+        breaker.record_failure()
+        assert breaker.state == "open"
+        assert not breaker.allow_request()
+
+        time.sleep(0.06)
+        assert breaker.state == "half-open"
+        assert breaker.allow_request()
+        assert not breaker.allow_request()
+        breaker.record_failure()
+        assert breaker.state == "open"
+        assert breaker.snapshot()["retry_in"] <= 0.1
+
+        time.sleep(0.11)
+        assert breaker.allow_request()
+        breaker.record_success()
+        assert breaker.state == "closed"
+
+        breaker.record_failure(trip=True)
+        assert breaker.state == "open"
+
+    def test_l1_hit_does_not_hold_half_open_trial(self, monkeypatch):
+        """Um hit no L1 com o breaker meio-aberto não prende a tentativa: o Redis volta a ser usado"""
+        import time
+        from app.core import cache
+
+        class FakeRedis:
+            def __init__(self):
+                self.values, self.reads = {}, []
+
+            def get(self, key):
+                self.reads.append(key)
+                return self.values.get(key)
+
+            def pipeline(self):
+                return self
+
+            def set(self, key, value, ex=None):
+                self.values[key] = value
+
+            def sadd(self, *args):
+                pass
+
+            def expire(self, *args):
+                pass
+
+            def execute(self):
+                return []
+
+        breaker = cache.CircuitBreaker("redis-test", failure_threshold=1, base_backoff=0.05)
+        breaker.record_failure(trip=True)
+        redis = FakeRedis()
+        monkeypatch.setattr(cache, "REDIS_AVAILABLE", True)
+        monkeypatch.setattr(cache, "redis_client", redis)
+        monkeypatch.setattr(cache, "redis_breaker", breaker)
+        monkeypatch.setattr(cache.RedisCacheBackend, "breaker", breaker)
+        cache.local_cache.set("cache:test:l1", cache._build_entry({"v": 1}, 0, 60).encode(), 60, [])
+
+        time.sleep(0.06)
+        assert breaker.state == "half-open"
+        assert cache.get_or_compute("cache:test:l1", 60, [], lambda: {"v": 2}) == {"v": 1}
+        assert redis.reads == []
+
+        assert cache.get_or_compute("cache:test:l2", 60, [], lambda: {"v": 3}) == {"v": 3}
+        assert redis.reads == ["cache:test:l2"] and "cache:test:l2" in redis.values
+        assert breaker.state == "closed"
+
+        # A tentativa obtida e não usada é devolvida só por quem a recebeu
+        breaker.record_failure(trip=True)
+        time.sleep(0.11)
+        assert breaker.allow_request() and not breaker.allow_request()
+        breaker.release_trial()
+        assert breaker.allow_request()
+
+    def test_local_backend_lru_eviction(self):
+        """Testa que o L1 remove a entrada menos usada recentemente"""
+        from app.core.cache import LocalCacheBackend
+
+        backend = LocalCacheBackend(max_entries=2)
+        backend.set("a", "1", ttl=60)
+        backend.set("b", "2", ttl=60)
+        assert backend.get("a") == "1"
+        backend.set("c", "3", ttl=60)
+        assert backend.get("b") is None
+        assert backend.get("a") == "1"
+        assert backend.get("c") == "3"
+
+    def test_concurrent_misses_are_coalesced(self, admin_headers):
+        """Testa que misses simultâneos na mesma chave calculam o valor uma única vez"""
+        import threading
+        import time
+        from app.core.cache import get_or_compute
+
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return {"total": 42}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(get_or_compute("cache:test:hot", 30, ["t"], compute)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert results == [{"total": 42}] * 8
+        assert client.get("/health/cache", headers=admin_headers).json()["totals"]["coalesced"] == 7
+
+    def test_commit_on_event_loop_uses_async_invalidation(self, monkeypatch):
+        """Commit dentro do event loop não chama o cliente Redis síncrono"""
+        import asyncio
+        from app.core import cache
+
+        def blocking_invalidate(tags):
+            raise AssertionError("invalidate_tags síncrono chamado no event loop")
+
+        monkeypatch.setattr(cache, "invalidate_tags", blocking_invalidate)
+        cache.local_cache.set("cache:test:loop", "1", ttl=60, tags=["t-loop"])
+
+        async def commit_hook():
+            cache.invalidate_tags_after_commit(["t-loop"])
+            assert cache.local_cache.get("cache:test:loop") is None
+            await asyncio.gather(*cache._pending_invalidations)
+
+        asyncio.run(commit_hook())
+        assert cache.cache_stats.snapshot()["totals"]["invalidations"] == 1
+
+    def test_early_refresh_probability(self):
+        """Testa o refresh antecipado (XFetch) perto da expiração"""
+        import time
+        from app.core.cache import CacheEntry
+
+        fresh = CacheEntry({"v": 1}, delta=0.01, expires_at=time.time() + 60)
+        assert not any(fresh.should_refresh() for _ in range(100))
+
+        expired = CacheEntry({"v": 1}, delta=0.01, expires_at=time.time() - 1)
+        assert expired.should_refresh()
+
+        # Valor caro (delta alto) perto de expirar: quase sempre recalculado antes
+        expensive = CacheEntry({"v": 1}, delta=30, expires_at=time.time() + 1)
+        assert sum(expensive.should_refresh() for _ in range(100)) > 50
+        assert not expensive.should_refresh(beta=0)
+
 
 class TestTrackingAPI:
     """Testes para a API de Tracking"""
@@ -643,6 +1204,44 @@ class TestCommentsAPI:
         assert response.status_code in [200, 404]
 
 
+    def test_list_process_comments_query_budget(self, auth_headers, test_user, db, query_budget):
+        """Anexos, respostas e autores são carregados em lote, não por comentário"""
+        process = ImportProcess(
+            reference_number="IMP-COMMENTS-1", client="Cliente", product="Produto",
+            origin="China", destination="Brasil", supplier="Fornecedor",
+            status=ImportStatus.pending, company_id=test_user.company_id, created_by=test_user.id
+        )
+        db.add(process)
+        db.commit()
+        for i in range(5):
+            comment = Comment(
+                text=f"Comentário {i}", company_id=test_user.company_id,
+                import_process_id=process.id, created_by=test_user.id
+            )
+            db.add(comment)
+            db.flush()
+            db.add(CommentAttachment(
+                file_name=f"anexo{i}.pdf", file_path=f"/tmp/anexo{i}.pdf", file_size=10, comment_id=comment.id
+            ))
+            for j in range(2):
+                db.add(Comment(
+                    text=f"Resposta {i}.{j}", company_id=test_user.company_id, import_process_id=process.id,
+                    created_by=test_user.id, parent_comment_id=comment.id
+                ))
+        db.commit()
+
+        url = f"/api/v1/comments/processes/{process.id}/comments"
+        # usuário, processo, comentários, autores, respostas, autores das respostas, anexos:
+        # constante, independente do número de comentários
+        with query_budget(7, max_repeated=2):
+            response = client.get(url, headers=auth_headers)
+        assert response.status_code == 200
+        comments = response.json()
+        assert len(comments) == 5
+        assert all(len(comment["replies"]) == 2 for comment in comments)
+        assert all(len(comment["attachments"]) == 1 for comment in comments)
+        assert comments[0]["created_by_name"] == "Test User"
+
 class TestClassificationAPI:
     """Testes para a API de Classificação"""
     
@@ -1037,6 +1636,795 @@ class TestCSVUploadAPI:
             os.unlink(temp_path)
 
 
+class TestOCRJobs:
+    """Testes da fila de OCR em segundo plano"""
+
+    def _upload(self, auth_headers, test_user, db, filename="fatura.png"):
+        import_process = ImportProcess(
+            reference_number="IMP-OCR-001",
+            client="Cliente",
+            product="Produto",
+            origin="China",
+            destination="Brasil",
+            supplier="Fornecedor",
+            status=ImportStatus.draft,
+            company_id=test_user.company_id,
+            created_by=test_user.id
+        )
+        db.add(import_process)
+        db.commit()
+        response = client.post(
+            f"/api/v1/documents/upload?import_process_id={import_process.id}",
+            files={"file": (filename, b"\x89PNG\r\n\x1a\nnot really a png", "image/png")},
+            headers=auth_headers
+        )
+        assert response.status_code == 202
+        return response.json()
+
+    def test_upload_returns_job_and_worker_completes_it(self, auth_headers, test_user, db, monkeypatch):
+        """Upload responde 202 com o job; o despachante grava o resultado no documento"""
+        from app.services import ocr_queue
+
+        data = self._upload(auth_headers, test_user, db)
+        assert data["status"] == "queued"
+        assert data["status_url"] == f"/api/v1/documents/jobs/{data['job_id']}"
+        try:
+            response = client.get(data["status_url"], headers=auth_headers)
+            assert response.status_code == 200
+            assert response.json()["status"] == "queued"
+
+            monkeypatch.setattr(ocr_queue, "process_document_file", lambda path, language: {
+                "text": "COMMERCIAL INVOICE nº 123",
+                "confidence": 0.9,
+                "method": "easyocr",
+                "classification": {"document_type": "invoice", "confidence": 0.4},
+            })
+            dispatcher = ocr_queue.OCRDispatcher(session_factory=TestingSessionLocal, workers=0)
+            assert dispatcher.run_pending() == 1
+            assert dispatcher.run_pending() == 0
+
+            db.expire_all()
+            job = client.get(data["status_url"], headers=auth_headers).json()
+            assert job["status"] == "completed"
+            assert job["attempts"] == 1
+            assert job["result"]["document_type"] == "commercial_invoice"
+            document = db.get(ImportDocument, data["document_id"])
+            assert document.extracted_text == "COMMERCIAL INVOICE nº 123"
+            assert document.ocr_confidence == 0.9
+        finally:
+            os.unlink(db.get(ImportDocument, data["document_id"]).file_path)
+
+    def test_failed_ocr_marks_job_failed(self, auth_headers, test_user, db):
+        """Erro no OCR (arquivo inválido ou engine ausente) marca o job como falho"""
+        from app.services.ocr_queue import OCRDispatcher
+
+        data = self._upload(auth_headers, test_user, db)
+        try:
+            assert OCRDispatcher(session_factory=TestingSessionLocal, workers=0).run_pending() == 1
+            db.expire_all()
+            job = client.get(data["status_url"], headers=auth_headers).json()
+            assert job["status"] == "failed"
+            assert job["error"]
+        finally:
+            os.unlink(db.get(ImportDocument, data["document_id"]).file_path)
+
+    def test_stale_jobs_are_checked_only_when_queue_is_empty(self, auth_headers, test_user, db, monkeypatch):
+        """Jobs presos só são procurados com a fila vazia, no máximo a cada OCR_STALE_CHECK_INTERVAL"""
+        from datetime import datetime, timedelta
+        from app.services import ocr_queue
+
+        data = self._upload(auth_headers, test_user, db)
+        try:
+            sweeps = []
+            requeue_stale_jobs = ocr_queue.requeue_stale_jobs
+            monkeypatch.setattr(ocr_queue, "requeue_stale_jobs", lambda session: sweeps.append(1) or requeue_stale_jobs(session))
+            monkeypatch.setattr(ocr_queue, "_next_stale_check", 0.0)
+            monkeypatch.setattr(ocr_queue, "OCR_STALE_CHECK_INTERVAL", 3600)
+
+            job = ocr_queue.claim_next_job(db)
+            assert job.id == data["job_id"]
+            assert sweeps == []
+
+            # Despachante encerrado no meio do job
+            stale_since = datetime.utcnow() - timedelta(seconds=ocr_queue.OCR_JOB_TIMEOUT + 1)
+            job.started_at = stale_since
+            db.commit()
+            job = ocr_queue.claim_next_job(db)
+            assert job.id == data["job_id"] and job.attempts == 2
+            assert sweeps == [1]
+
+            job.started_at = stale_since
+            db.commit()
+            assert ocr_queue.claim_next_job(db) is None
+            assert sweeps == [1]
+        finally:
+            os.unlink(db.get(ImportDocument, data["document_id"]).file_path)
+
+    def test_job_of_other_company_not_found(self, auth_headers):
+        """Job inexistente (ou de outra empresa) retorna 404"""
+        response = client.get("/api/v1/documents/jobs/naoexiste", headers=auth_headers)
+        assert response.status_code == 404
+
+    def test_blocking_redis_closes_half_open_breaker(self, monkeypatch):
+        """O cliente do BLPOP usa a tentativa do breaker meio-aberto e registra o resultado"""
+        from app.core import cache
+        from app.services import ocr_queue
+
+        class FakeRedis:
+            def __init__(self, **kwargs):
+                self.popped = []
+
+            def ping(self):
+                return True
+
+            def blpop(self, key, timeout):
+                self.popped.append(key)
+
+        breaker = cache.CircuitBreaker("redis-test", failure_threshold=1, base_backoff=0)
+        breaker.record_failure(trip=True)
+        assert breaker.state == "half-open"
+        monkeypatch.setattr(cache, "redis_breaker", breaker)
+        monkeypatch.setattr(cache, "REDIS_AVAILABLE", True)
+        monkeypatch.setattr(cache, "Redis", FakeRedis)
+
+        dispatcher = ocr_queue.OCRDispatcher(session_factory=TestingSessionLocal, workers=0)
+        dispatcher._wait_for_jobs()
+        assert dispatcher._redis.popped == [ocr_queue.OCR_QUEUE_KEY]
+        assert breaker.state == "closed"
+        assert breaker.allow_request() and breaker.allow_request()
+
+    def test_easyocr_readers_are_created_lazily_per_language(self, monkeypatch):
+        """Os readers não são criados com o serviço; o aquecimento carrega só pt/en"""
+        from types import SimpleNamespace
+        from app.services import ocr_service
+
+        readers = []
+        fake_easyocr = SimpleNamespace(Reader=lambda languages, gpu: readers.append(languages) or object())
+        monkeypatch.setattr(ocr_service, "EASYOCR_AVAILABLE", True)
+        monkeypatch.setattr(ocr_service, "PIL_AVAILABLE", False)
+        monkeypatch.setattr(ocr_service, "PDF2IMAGE_AVAILABLE", False)
+        monkeypatch.setattr(ocr_service, "TESSERACT_AVAILABLE", False)
+        monkeypatch.setattr(ocr_service, "_engine", lambda name: fake_easyocr)
+
+        service = ocr_service.OCRService()
+        assert readers == []
+        service.warm_up()
+        assert readers == [["en", "pt"]]
+        assert service.easyocr_reader("pt-BR") is service.easyocr_reader("en")
+        service.easyocr_reader("ja")
+        assert readers == [["en", "pt"], ["en", "ja"]]
+
+    def test_reader_pool_routes_to_smallest_set_and_evicts_lru(self, monkeypatch):
+        """Cada idioma usa o menor conjunto que o cobre; o menos usado sai ao estourar o orçamento"""
+        from app.services import ocr_reader_pool
+        from app.services.ocr_reader_pool import ReaderPool, parse_language_sets
+
+        monkeypatch.setattr(ocr_reader_pool, "OCR_READER_BASE_MB", 100)
+        monkeypatch.setattr(ocr_reader_pool, "OCR_READER_LANGUAGE_MB", 10)
+        created = []
+        pool = ReaderPool(
+            lambda languages: created.append(languages) or tuple(languages),
+            parse_language_sets("pt,es,en;pt,en;es,en;ch_sim,en"),
+            memory_mb=250
+        )
+
+        assert pool.get("pt") == ("en", "pt")
+        assert pool.get("es") == ("en", "es")
+        assert pool.get("pt") == ("en", "pt")
+        assert pool.get("zh") == ("ch_sim", "en")
+        # 3 readers de 120MB não cabem em 250MB: sai o menos usado recentemente (es, en)
+        assert pool.snapshot()["loaded"] == [["en", "pt"], ["ch_sim", "en"]]
+        assert pool.get("xx") == ("en", "pt")
+        assert created == [["en", "pt"], ["en", "es"], ["ch_sim", "en"]]
+        assert pool.snapshot()["evictions"] == 1
+
+    @pytest.mark.parametrize("parallel", [False, True])
+    def test_pdf_pages_are_streamed_in_windows_and_kept_in_order(self, monkeypatch, tmp_path, parallel):
+        """O PDF é rasterizado em janelas (no máximo duas em disco) e as páginas voltam em ordem"""
+        import random
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        from types import SimpleNamespace
+        from app.services import ocr_service
+
+        rendered, on_disk = [], []
+
+        def convert_from_path(pdf_path, dpi, first_page, last_page, output_folder, fmt, paths_only):
+            rendered.append((first_page, last_page, dpi))
+            paths = []
+            for page in range(first_page, last_page + 1):
+                path = os.path.join(output_folder, f"page-{page}.{fmt}")
+                with open(path, "w") as f:
+                    f.write(f"texto da página {page}")
+                paths.append(path)
+            on_disk.append(len(os.listdir(output_folder)))
+            return paths
+
+        def extract_text_from_image(self, image_path, language="pt"):
+            time.sleep(random.random() / 100)
+            with open(image_path) as f:
+                return {"text": f.read(), "confidence": 0.9, "method": "fake", "language": language}
+
+        fake_pdf2image = SimpleNamespace(pdfinfo_from_path=lambda path: {"Pages": 7}, convert_from_path=convert_from_path)
+        monkeypatch.setattr(ocr_service, "PIL_AVAILABLE", True)
+        monkeypatch.setattr(ocr_service, "PDF2IMAGE_AVAILABLE", True)
+        monkeypatch.setattr(ocr_service, "PYPDF_AVAILABLE", False)
+        monkeypatch.setattr(ocr_service, "_engine", lambda name: fake_pdf2image)
+        monkeypatch.setattr(ocr_service, "OCR_PDF_WINDOW", 3)
+        monkeypatch.setattr(ocr_service, "OCR_PDF_DPI", 150)
+        monkeypatch.setattr(ocr_service.OCRService, "extract_text_from_image", extract_text_from_image)
+        service = ocr_service.OCRService()
+        executor = None
+        if parallel:
+            executor = ThreadPoolExecutor(max_workers=3)
+            monkeypatch.setattr(ocr_service, "_get_page_executor", lambda: executor)
+            monkeypatch.setattr(ocr_service, "_ocr_pdf_page", lambda path, language: extract_text_from_image(service, path, language))
+        else:
+            monkeypatch.setattr(ocr_service, "OCR_PDF_WORKERS", 0)
+
+        try:
+            result = service.extract_text_from_pdf(str(tmp_path / "bundle.pdf"), "en")
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        assert rendered == [(1, 3, 150), (4, 6, 150), (7, 7, 150)]
+        assert max(on_disk) <= 6
+        assert [page["page"] for page in result["pages"]] == list(range(1, 8))
+        assert result["text"].split("\n\n") == [f"texto da página {page}" for page in range(1, 8)]
+        assert result["total_pages"] == 7 and result["dpi"] == 150
+
+    def test_pdf_text_layer_skips_ocr_of_digital_pages(self, monkeypatch, tmp_path):
+        """Páginas com camada de texto não são rasterizadas; só as digitalizadas passam pelo OCR"""
+        from types import SimpleNamespace
+        from app.services import ocr_service
+
+        layers = {
+            1: "BILL OF LADING MSCU1234567 Santos / Shanghai 40HC",
+            2: "",
+            3: "   \n ",
+            4: "\ufffd" * 60,
+            5: "COMMERCIAL INVOICE 2024-0042 total USD 18.400,00",
+            6: "",
+        }
+        rendered = []
+
+        def convert_from_path(pdf_path, dpi, first_page, last_page, output_folder, fmt, paths_only):
+            rendered.append((first_page, last_page))
+            paths = [os.path.join(output_folder, f"page-{page}.{fmt}") for page in range(first_page, last_page + 1)]
+            for path in paths:
+                open(path, "w").close()
+            return paths
+
+        def extract_text_from_image(self, image_path, language="pt"):
+            return {"text": f"ocr {os.path.basename(image_path)}", "confidence": 0.5, "method": "easyocr"}
+
+        engines = {
+            "pypdf": SimpleNamespace(PdfReader=lambda path: SimpleNamespace(
+                pages=[SimpleNamespace(extract_text=lambda text=text: text) for text in layers.values()]
+            )),
+            "pdf2image": SimpleNamespace(convert_from_path=convert_from_path),
+        }
+        monkeypatch.setattr(ocr_service, "PIL_AVAILABLE", True)
+        monkeypatch.setattr(ocr_service, "PDF2IMAGE_AVAILABLE", True)
+        monkeypatch.setattr(ocr_service, "PYPDF_AVAILABLE", True)
+        monkeypatch.setattr(ocr_service, "OCR_PDF_WORKERS", 0)
+        monkeypatch.setattr(ocr_service, "_engine", engines.__getitem__)
+        monkeypatch.setattr(ocr_service.OCRService, "extract_text_from_image", extract_text_from_image)
+
+        result = ocr_service.OCRService().extract_text_from_pdf(str(tmp_path / "bundle.pdf"), "en")
+
+        assert rendered == [(2, 4), (6, 6)]
+        assert [page["method"] for page in result["pages"]] == [
+            "text_layer", "easyocr", "easyocr", "easyocr", "text_layer", "easyocr"
+        ]
+        assert [page["page"] for page in result["pages"]] == list(range(1, 7))
+        assert result["text"].split("\n\n")[:2] == [layers[1], "ocr page-2.png"]
+        assert result["method"] == "mixed" and result["ocr_pages"] == 4
+        assert result["confidence"] == pytest.approx((1.0 * 2 + 0.5 * 4) / 6)
+
+    def test_job_processes_ocr_pdf_pages_in_process(self, monkeypatch):
+        """Os processos de jobs de OCR não criam um pool de páginas próprio"""
+        from app.services import ocr_queue, ocr_service
+
+        monkeypatch.setattr(ocr_queue, "OCR_PREWARM", False)
+        executor = ocr_queue.OCRDispatcher(session_factory=lambda: None, workers=1)._new_executor()
+        try:
+            assert executor.submit(ocr_service._get_page_executor).result(timeout=60) is None
+        finally:
+            executor.shutdown()
+
+    def test_pdf_pages_fan_out_to_the_job_pool(self, monkeypatch, tmp_path):
+        """O despachante distribui as páginas de um PDF entre os processos livres do pool de jobs"""
+        import threading
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        from types import SimpleNamespace
+        from app.services import ocr_queue, ocr_service
+
+        def convert_from_path(pdf_path, dpi, first_page, last_page, output_folder, fmt, paths_only):
+            paths = [os.path.join(output_folder, f"page-{page}.{fmt}") for page in range(first_page, last_page + 1)]
+            for path in paths:
+                with open(path, "w") as f:
+                    f.write(f"texto da página {os.path.basename(path)[len('page-'):-len('.png')]}")
+            return paths
+
+        threads = set()
+
+        def ocr_pdf_page(path, language):
+            threads.add(threading.current_thread().name)
+            time.sleep(0.02)
+            with open(path) as f:
+                return {"text": f.read(), "confidence": 0.9, "method": "fake"}
+
+        def text_layer(path):
+            threads.add(threading.current_thread().name)
+            return [None] * 6
+
+        fake_pdf2image = SimpleNamespace(convert_from_path=convert_from_path)
+        monkeypatch.setattr(ocr_service, "PIL_AVAILABLE", True)
+        monkeypatch.setattr(ocr_service, "PDF2IMAGE_AVAILABLE", True)
+        monkeypatch.setattr(ocr_service, "_engine", lambda name: fake_pdf2image)
+        monkeypatch.setattr(ocr_service, "_pdf_text_layer", text_layer)
+        monkeypatch.setattr(ocr_service, "_ocr_pdf_page", ocr_pdf_page)
+        monkeypatch.setattr(ocr_service, "_get_page_executor", lambda: pytest.fail("pool de páginas não deve ser usado"))
+        monkeypatch.setattr(ocr_service, "OCR_PDF_WINDOW", 3)
+
+        dispatcher = ocr_queue.OCRDispatcher(session_factory=lambda: None, workers=3)
+        dispatcher.executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="job")
+        try:
+            result = dispatcher._ocr(str(tmp_path / "bundle.pdf"), "en")
+        finally:
+            dispatcher.executor.shutdown()
+
+        assert result["text"].split("\n\n") == [f"texto da página {page}" for page in range(1, 7)]
+        assert result["ocr_pages"] == 6 and "classification" in result
+        assert len(threads) == 3 and all(name.startswith("job") for name in threads)
+
+    def test_stuck_ocr_terminates_and_replaces_pool(self, monkeypatch, tmp_path):
+        """Um OCR que excede OCR_JOB_TIMEOUT tem o processo encerrado e o pool recriado"""
+        from concurrent.futures import TimeoutError as FutureTimeoutError
+        from app.services import ocr_queue
+
+        # Ler um FIFO sem escritor bloqueia: simula um OCR travado (a camada de texto, no pool)
+        fifo = tmp_path / "travado.pdf"
+        os.mkfifo(fifo)
+        monkeypatch.setattr(ocr_queue, "OCR_PREWARM", False)
+        monkeypatch.setattr(ocr_queue, "OCR_JOB_TIMEOUT", 2)
+        dispatcher = ocr_queue.OCRDispatcher(session_factory=lambda: None, workers=1)
+        dispatcher.executor = executor = dispatcher._new_executor()
+        try:
+            executor.submit(os.getpid).result(timeout=60)
+            stuck = list(executor._processes.values())
+            with pytest.raises(FutureTimeoutError):
+                dispatcher._ocr(str(fifo), "pt")
+            for process in stuck:
+                process.join(10)
+                assert not process.is_alive()
+            assert dispatcher.executor is not executor
+            assert dispatcher.executor.submit(os.getpid).result(timeout=60) not in [p.pid for p in stuck]
+        finally:
+            dispatcher.stop()
+
+    def test_pdf_is_read_from_its_path(self, monkeypatch, tmp_path):
+        """O PDF do job vai direto para o OCR por janelas, sem ser lido inteiro nem copiado"""
+        from pathlib import Path
+        from app.services import ocr_service
+
+        pdf = tmp_path / ("a" * 64)
+        pdf.write_bytes(b"%PDF-1.7\n")
+        calls = []
+
+        def extract_text_from_pdf(self, pdf_path, language="pt"):
+            calls.append((pdf_path, language))
+            return {"text": "BILL OF LADING", "confidence": 1.0, "method": "text_layer"}
+
+        def read_bytes(self):
+            raise AssertionError("o PDF não deve ser carregado na memória")
+
+        monkeypatch.setattr(ocr_service, "PYPDF_AVAILABLE", True)
+        monkeypatch.setattr(ocr_service.OCRService, "extract_text_from_pdf", extract_text_from_pdf)
+        monkeypatch.setattr(Path, "read_bytes", read_bytes)
+
+        result = ocr_service.process_document_file(str(pdf), "en")
+
+        assert calls == [(str(pdf), "en")]
+        assert result["classification"]["document_type"] == "bill_of_lading"
+
+
+class TestDocumentStore:
+    """Testes do armazenamento por SHA-256 e do reaproveitamento do OCR"""
+
+    @pytest.fixture
+    def import_process(self, test_user, db):
+        import_process = ImportProcess(
+            reference_number="IMP-STORE-001",
+            client="Cliente",
+            product="Produto",
+            origin="China",
+            destination="Brasil",
+            supplier="Fornecedor",
+            status=ImportStatus.draft,
+            company_id=test_user.company_id,
+            created_by=test_user.id
+        )
+        db.add(import_process)
+        db.commit()
+        return import_process
+
+    def _upload(self, auth_headers, import_process, content, filename="fatura.pdf", language="pt"):
+        response = client.post(
+            f"/api/v1/documents/upload?import_process_id={import_process.id}&language={language}",
+            files={"file": (filename, content, "application/pdf")},
+            headers=auth_headers
+        )
+        assert response.status_code == 202
+        return response.json()
+
+    def test_same_content_is_stored_once_until_last_document_is_deleted(self, auth_headers, import_process, db):
+        """Uploads iguais compartilham o arquivo; ele só é apagado com o último documento"""
+        import hashlib
+        from app.models import StoredFile
+        from app.services.document_store import document_store
+
+        content = b"%PDF-1.4 fatura comercial"
+        sha256 = hashlib.sha256(content).hexdigest()
+        first = self._upload(auth_headers, import_process, content)
+        second = self._upload(auth_headers, import_process, content, filename="copia.pdf")
+
+        documents = [db.get(ImportDocument, data["document_id"]) for data in (first, second)]
+        path = document_store.path_for(sha256)
+        assert [document.content_sha256 for document in documents] == [sha256, sha256]
+        assert [document.file_path for document in documents] == [str(path), str(path)]
+        assert path.read_bytes() == content
+        assert path.relative_to(document_store.root).parts == (sha256[:2], sha256[2:4], sha256)
+        assert db.get(StoredFile, sha256).ref_count == 2
+
+        response = client.get(f"/api/v1/documents/{second['document_id']}/download", headers=auth_headers)
+        assert response.status_code == 200 and response.content == content
+
+        assert client.delete(f"/api/v1/documents/{first['document_id']}", headers=auth_headers).status_code == 200
+        db.expire_all()
+        assert path.exists() and db.get(StoredFile, sha256).ref_count == 1
+
+        assert client.delete(f"/api/v1/documents/{second['document_id']}", headers=auth_headers).status_code == 200
+        db.expire_all()
+        assert path.exists() and db.get(StoredFile, sha256).ref_count == 0
+
+        # Sem referências, o arquivo só é apagado pela varredura, depois do período de carência
+        assert document_store.sweep(db, grace=0) == 1
+        db.expire_all()
+        assert not path.exists() and db.get(StoredFile, sha256) is None
+
+    def test_sweep_keeps_content_published_by_upload_in_flight(self, auth_headers, import_process, db):
+        """Um upload que já gravou o arquivo, mas ainda não registrou a referência, não o perde"""
+        import hashlib
+        import io
+        import time
+        from datetime import datetime, timedelta
+        from app.models import StoredFile
+        from app.services.document_store import document_store
+
+        content = b"%PDF-1.4 conhecimento de embarque"
+        sha256 = hashlib.sha256(content).hexdigest()
+        uploaded = self._upload(auth_headers, import_process, content)
+        assert client.delete(f"/api/v1/documents/{uploaded['document_id']}", headers=auth_headers).status_code == 200
+        path = document_store.path_for(sha256)
+
+        def expire():
+            db.query(StoredFile).filter(StoredFile.sha256 == sha256).update(
+                {"last_referenced_at": datetime.utcnow() - timedelta(hours=2)}
+            )
+            db.commit()
+
+        # Outro upload do mesmo conteúdo grava o arquivo; a varredura roda antes do seu commit
+        expire()
+        stored = document_store.save(io.BytesIO(content))
+        assert document_store.sweep(db, grace=3600) == 0
+        db.expire_all()
+        assert db.get(StoredFile, sha256) is None and path.read_bytes() == content
+        document_store.acquire(db, stored)
+        db.commit()
+        db.expire_all()
+        assert db.get(StoredFile, sha256).ref_count == 1
+
+        # Sem referências e gravado há mais tempo que a carência: apagado
+        document_store.release(db, sha256)
+        db.commit()
+        expire()
+        old = time.time() - 7200
+        os.utime(path, (old, old))
+        assert document_store.sweep(db, grace=3600) == 1
+        db.expire_all()
+        assert not path.exists() and db.get(StoredFile, sha256) is None
+
+    def test_duplicate_content_reuses_ocr_result(self, auth_headers, import_process, db, monkeypatch):
+        """O OCR roda uma vez por conteúdo e idioma; reenvios concluem sem passar pela fila"""
+        from app.services import ocr_queue
+
+        calls = []
+
+        def process_document_file(path, language):
+            calls.append((path, language))
+            return {
+                "text": "COMMERCIAL INVOICE nº 123",
+                "confidence": 0.8,
+                "method": "text_layer",
+                "classification": {"document_type": "invoice", "confidence": 0.5},
+            }
+
+        monkeypatch.setattr(ocr_queue, "process_document_file", process_document_file)
+        dispatcher = ocr_queue.OCRDispatcher(session_factory=TestingSessionLocal, workers=0)
+        content = b"%PDF-1.4 invoice"
+
+        # Enviados antes do OCR: os dois vão para a fila, o segundo reaproveita o primeiro
+        queued = [self._upload(auth_headers, import_process, content) for _ in range(2)]
+        assert [data["status"] for data in queued] == ["queued", "queued"]
+        assert dispatcher.run_pending() == 2
+        assert len(calls) == 1
+
+        again = self._upload(auth_headers, import_process, content, filename="reenvio.pdf")
+        assert again["status"] == "completed"
+        job = client.get(again["status_url"], headers=auth_headers).json()
+        assert job["result"]["document_type"] == "commercial_invoice"
+        assert job["result"]["ocr_confidence"] == 0.8
+        document = db.get(ImportDocument, again["document_id"])
+        assert document.extracted_text == "COMMERCIAL INVOICE nº 123"
+        assert document.ocr_method == "text_layer"
+
+        # Outro idioma é outra chave do cache
+        assert self._upload(auth_headers, import_process, content, language="en")["status"] == "queued"
+        assert dispatcher.run_pending() == 1
+        assert [language for _, language in calls] == ["pt", "en"]
+
+    def test_reprocess_reruns_ocr_and_replaces_stored_result(self, auth_headers, import_process, db, monkeypatch):
+        """O reprocessamento ignora o resultado guardado e o substitui pelo novo"""
+        from app.services import ocr_queue
+
+        results = iter([
+            {"text": "texto ilegível", "confidence": 0.2, "method": "easyocr", "classification": {}},
+            {"text": "BILL OF LADING MSCU1234567", "confidence": 0.9, "method": "easyocr",
+             "classification": {"document_type": "bill_of_lading", "confidence": 0.7}},
+        ])
+        calls = []
+        monkeypatch.setattr(ocr_queue, "process_document_file", lambda path, language: calls.append(path) or next(results))
+        dispatcher = ocr_queue.OCRDispatcher(session_factory=TestingSessionLocal, workers=0)
+        content = b"%PDF-1.4 bl digitalizado"
+
+        data = self._upload(auth_headers, import_process, content)
+        assert dispatcher.run_pending() == 1
+
+        response = client.post(f"/api/v1/documents/{data['document_id']}/reprocess-ocr", headers=auth_headers)
+        assert response.status_code == 202
+        job = response.json()
+        assert job["status"] == "queued" and job["job_id"] != data["job_id"]
+        assert dispatcher.run_pending() == 1
+        assert len(calls) == 2
+
+        status = client.get(job["status_url"], headers=auth_headers).json()
+        assert status["status"] == "completed"
+        assert status["result"]["ocr_confidence"] == 0.9
+        db.expire_all()
+        assert db.get(ImportDocument, data["document_id"]).extracted_text == "BILL OF LADING MSCU1234567"
+
+        # Reenvios do mesmo conteúdo usam o resultado novo
+        again = self._upload(auth_headers, import_process, content, filename="reenvio.pdf")
+        assert again["status"] == "completed"
+        assert db.get(ImportDocument, again["document_id"]).extracted_text == "BILL OF LADING MSCU1234567"
+        assert len(calls) == 2
+        assert client.post("/api/v1/documents/999999/reprocess-ocr", headers=auth_headers).status_code == 404
+
+
+class TestChunkedUploads:
+    """Testes dos uploads em blocos e em partes (retomáveis)"""
+
+    @pytest.fixture
+    def import_process(self, test_user, db):
+        import_process = ImportProcess(
+            reference_number="IMP-CHUNK-001",
+            client="Cliente",
+            product="Produto",
+            origin="China",
+            destination="Brasil",
+            supplier="Fornecedor",
+            status=ImportStatus.draft,
+            company_id=test_user.company_id,
+            created_by=test_user.id
+        )
+        db.add(import_process)
+        db.commit()
+        return import_process
+
+    def test_upload_is_validated_while_streaming(self, auth_headers, monkeypatch):
+        """Conteúdo que não é do tipo declarado ou grande demais é recusado sem ficar no armazenamento"""
+        from app.api.v1 import documents
+        from app.services.document_store import document_store
+
+        def stored_files():
+            return {path for path in document_store.root.rglob("*") if path.is_file()}
+
+        before = stored_files()
+        response = client.post(
+            "/api/v1/documents/upload",
+            files={"file": ("fatura.pdf", b"MZ\x90\x00 executavel", "application/pdf")},
+            headers=auth_headers
+        )
+        assert response.status_code == 400
+        assert "não corresponde" in response.json()["detail"]
+
+        monkeypatch.setattr(documents, "MAX_FILE_SIZE", 64)
+        monkeypatch.setattr("app.services.document_store.DOCUMENT_STORE_CHUNK_SIZE", 16)
+        response = client.post(
+            "/api/v1/documents/upload",
+            files={"file": ("grande.pdf", b"%PDF-1.4" + b"x" * 100, "application/pdf")},
+            headers=auth_headers
+        )
+        assert response.status_code == 400
+        assert "muito grande" in response.json()["detail"]
+        assert stored_files() == before
+
+    def test_parts_can_be_sent_in_any_order_resumed_and_completed(self, auth_headers, import_process, db, monkeypatch):
+        """Partes fora de ordem, reenvio após falha, status para retomar e conclusão idempotente"""
+        import asyncio
+        import hashlib
+        from app.api.v1 import documents
+        from app.services.document_store import document_store
+
+        # As operações no disco da rota assíncrona não podem rodar no event loop
+        on_loop = []
+
+        def off_loop(function):
+            def wrapper(*args):
+                try:
+                    asyncio.get_running_loop()
+                    on_loop.append(function.__name__)
+                except RuntimeError:
+                    pass
+                return function(*args)
+            return wrapper
+
+        monkeypatch.setattr(document_store, "accept_part", off_loop(document_store.accept_part))
+        monkeypatch.setattr(document_store, "received_parts", off_loop(document_store.received_parts))
+        monkeypatch.setattr(documents, "CHUNKED_UPLOAD_PART_SIZE", 10)
+        content = b"%PDF-1.4 " + bytes(range(65, 91))
+        parts = [content[i:i + 10] for i in range(0, len(content), 10)]
+
+        response = client.post("/api/v1/documents/uploads", json={
+            "file_name": "bundle.pdf", "content_type": "application/pdf", "size": len(content),
+            "import_process_id": import_process.id
+        }, headers=auth_headers)
+        assert response.status_code == 201
+        upload = response.json()
+        assert upload["parts"] == 4 and upload["missing_parts"] == [1, 2, 3, 4]
+        part_url = upload["part_url"]
+
+        def put(number, body):
+            return client.put(part_url.format(part_number=number), content=body, headers=auth_headers)
+
+        response = put(4, parts[3])
+        assert response.status_code == 200
+        assert response.json()["sha256"] == hashlib.sha256(parts[3]).hexdigest()
+        assert put(1, parts[0]).status_code == 200
+        # Parte interrompida: recusada e não contada como recebida
+        assert put(2, parts[1][:4]).status_code == 400
+        assert put(3, parts[2] + b"extra").status_code == 400
+        assert put(5, b"x").status_code == 400
+
+        status = client.get(f"/api/v1/documents/uploads/{upload['upload_id']}", headers=auth_headers).json()
+        assert status["received_parts"] == [1, 4] and status["missing_parts"] == [2, 3]
+        assert client.post(upload["complete_url"], headers=auth_headers).status_code == 400
+
+        assert put(2, parts[1]).status_code == 200
+        assert put(3, parts[2]).status_code == 200
+        response = client.post(upload["complete_url"], headers=auth_headers)
+        assert response.status_code == 202
+        job = response.json()
+        assert job["status"] == "queued"
+
+        document = db.get(ImportDocument, job["document_id"])
+        assert document.file_name == "bundle.pdf" and document.file_size == len(content)
+        assert document.content_sha256 == hashlib.sha256(content).hexdigest()
+        with open(document.file_path, "rb") as f:
+            assert f.read() == content
+        assert not document_store.upload_dir(upload["upload_id"]).exists()
+
+        # Retentativa da conclusão (ex: resposta perdida) devolve o mesmo job
+        again = client.post(upload["complete_url"], headers=auth_headers)
+        assert again.status_code == 202 and again.json()["job_id"] == job["job_id"]
+        assert put(1, parts[0]).status_code == 409
+        assert on_loop == []
+
+    def test_first_part_must_match_declared_type(self, auth_headers, import_process):
+        """A assinatura é conferida na primeira parte, antes do resto do arquivo"""
+        upload = client.post("/api/v1/documents/uploads", json={
+            "file_name": "foto.png", "content_type": "image/png", "size": 1024,
+            "import_process_id": import_process.id
+        }, headers=auth_headers).json()
+        response = client.put(
+            upload["part_url"].format(part_number=1), content=b"%PDF-" + b"x" * 1019, headers=auth_headers
+        )
+        assert response.status_code == 400
+        assert "não corresponde" in response.json()["detail"]
+        assert client.delete(f"/api/v1/documents/uploads/{upload['upload_id']}", headers=auth_headers).status_code == 200
+        assert client.get(f"/api/v1/documents/uploads/{upload['upload_id']}", headers=auth_headers).status_code == 404
+
+
+class TestUploadBatches:
+    """Testes do upload múltiplo em lote"""
+
+    def test_batch_is_stored_concurrently_and_progress_is_reported(self, auth_headers, test_user, db, monkeypatch, query_budget):
+        """Arquivos gravados em paralelo, jobs do lote e progresso por arquivo"""
+        import threading
+        from app.api.v1 import documents
+        from app.services import ocr_queue
+
+        import_process = ImportProcess(
+            reference_number="IMP-BATCH-001",
+            client="Cliente",
+            product="Produto",
+            origin="China",
+            destination="Brasil",
+            supplier="Fornecedor",
+            status=ImportStatus.draft,
+            company_id=test_user.company_id,
+            created_by=test_user.id
+        )
+        db.add(import_process)
+        db.commit()
+
+        # Os três arquivos válidos só terminam de gravar se estiverem em paralelo
+        barrier = threading.Barrier(3, timeout=5)
+        save = documents.document_store.save
+
+        def save_together(stream, **kwargs):
+            barrier.wait()
+            return save(stream, **kwargs)
+
+        monkeypatch.setattr(documents.document_store, "save", save_together)
+        files = [
+            ("files", ("fatura.pdf", b"%PDF-1.4 invoice", "application/pdf")),
+            ("files", ("packing.pdf", b"%PDF-1.4 packing list", "application/pdf")),
+            ("files", ("bl.pdf", b"%PDF-1.4 bill of lading", "application/pdf")),
+            ("files", ("planilha.csv", b"a,b", "text/csv")),
+        ]
+        response = client.post(
+            f"/api/v1/documents/upload/multiple?import_process_id={import_process.id}",
+            files=files, headers=auth_headers
+        )
+        assert response.status_code == 202
+        data = response.json()
+        assert data["uploaded"] == 3 and data["errors"] == 1
+        assert data["errors_details"][0]["file"] == "planilha.csv"
+        assert [job["status"] for job in data["jobs"]] == ["queued"] * 3
+
+        batch = client.get(data["status_url"], headers=auth_headers).json()
+        assert batch["status"] == "processing" and batch["progress"] == 0 and batch["queued"] == 3
+        assert [item["file_name"] for item in batch["files"]] == ["fatura.pdf", "packing.pdf", "bl.pdf"]
+
+        def process_document_file(path, language):
+            with open(path, "rb") as f:
+                content = f.read()
+            if b"packing" in content:
+                return {"text": "", "error": "OCR falhou"}
+            return {"text": content.decode(), "confidence": 0.7, "method": "text_layer", "classification": {}}
+
+        monkeypatch.setattr(ocr_queue, "process_document_file", process_document_file)
+        assert ocr_queue.OCRDispatcher(session_factory=TestingSessionLocal, workers=0).run_pending() == 3
+
+        db.expire_all()
+        with query_budget(8, max_repeated=1):
+            batch = client.get(data["status_url"], headers=auth_headers).json()
+        assert batch["status"] == "completed_with_errors" and batch["progress"] == 1
+        assert batch["completed"] == 2 and batch["failed"] == 1
+        assert [item["status"] for item in batch["files"]] == ["completed", "failed", "completed"]
+        assert batch["files"][0]["result"]["text_length"] == len("%PDF-1.4 invoice")
+        assert batch["files"][1]["error"] == "OCR falhou"
+
+    def test_batch_of_other_company_not_found(self, auth_headers):
+        """Lote inexistente (ou de outra empresa) retorna 404"""
+        assert client.get("/api/v1/documents/batches/naoexiste", headers=auth_headers).status_code == 404
+
+
 class TestTasksAPI:
     """Testes para a API de Tasks"""
     
@@ -1352,6 +2740,581 @@ class TestDashboardConfigAPI:
         assert "widgets_config" in data
 
 
+class TestDatabaseSessions:
+    """Testes do get_db real (sem override) e do limite de sessões simultâneas"""
+
+    def test_get_db_admits_at_most_max_sessions(self, monkeypatch):
+        """Requisições além de DB_MAX_CONCURRENT_SESSIONS esperam no loop; o close roda fora dele"""
+        import asyncio
+        import threading
+        import time
+        import httpx
+        from fastapi import Depends, FastAPI
+        from sqlalchemy import text
+        from sqlalchemy.orm import Session
+        from app.core import database
+
+        closed_on = []
+
+        def session_factory():
+            session = TestingSessionLocal()
+            close = session.close
+
+            def close_and_record():
+                closed_on.append(threading.get_ident())
+                close()
+
+            session.close = close_and_record
+            return session
+
+        monkeypatch.setattr(database, "SessionLocal", session_factory)
+        monkeypatch.setattr(database, "DB_MAX_CONCURRENT_SESSIONS", 2)
+        monkeypatch.setattr(database, "_session_slots", None)
+
+        lock = threading.Lock()
+        state = {"open": 0, "max_open": 0}
+        session_app = FastAPI()
+
+        @session_app.get("/sessions")
+        def use_session(db: Session = Depends(database.get_db)):
+            with lock:
+                state["open"] += 1
+                state["max_open"] = max(state["max_open"], state["open"])
+            try:
+                time.sleep(0.05)
+                return {"value": db.execute(text("SELECT 1")).scalar()}
+            finally:
+                with lock:
+                    state["open"] -= 1
+
+        async def run():
+            state["loop_thread"] = threading.get_ident()
+            transport = httpx.ASGITransport(app=session_app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+                return await asyncio.gather(*[http.get("/sessions") for _ in range(8)])
+
+        responses = asyncio.run(run())
+        assert [response.json()["value"] for response in responses] == [1] * 8
+        assert state["max_open"] == 2
+        assert len(closed_on) == 8 and state["loop_thread"] not in closed_on
+        assert database._session_slots._value == 2
+
+    def test_max_sessions_defaults_to_pool_capacity(self):
+        """Sem configuração, o limite é pool_size + max_overflow do engine síncrono"""
+        from sqlalchemy import create_engine
+        from sqlalchemy.pool import NullPool, QueuePool
+        from app.core.database import pool_capacity
+
+        pooled = create_engine("sqlite://", poolclass=QueuePool, pool_size=3, max_overflow=4)
+        unbounded = create_engine("sqlite://", poolclass=QueuePool, pool_size=3, max_overflow=-1)
+        assert pool_capacity(pooled.pool) == 7
+        assert pool_capacity(unbounded.pool) == 0
+        assert pool_capacity(create_engine("sqlite://", poolclass=NullPool).pool) == 0
+
+
+class TestDBMetrics:
+    """Testes das métricas de pool e de consultas por rota"""
+
+    def test_queries_recorded_per_route_template(self, auth_headers, test_user, db, admin_headers):
+        """Consultas são agregadas pelo template da rota, não pelo caminho"""
+        product = Product(code="MET-1", name="Produto Métricas", company_id=test_user.company_id)
+        db.add(product)
+        db.commit()
+
+        assert client.get("/api/v1/products/", headers=auth_headers).status_code == 200
+        assert client.get(f"/api/v1/products/{product.id}", headers=auth_headers).status_code == 200
+        assert client.get("/api/v1/control-tower/summary", headers=auth_headers).status_code == 200
+
+        response = client.get("/health/db", headers=admin_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert "sync" in data["pools"]
+        routes = data["routes"]
+        assert routes["GET /api/v1/products/"]["requests"] == 1
+        assert routes["GET /api/v1/products/"]["queries"] >= 2  # usuário + produtos
+        assert "GET /api/v1/products/{product_id}" in routes
+        # Rota com AsyncSession também é medida
+        assert routes["GET /api/v1/control-tower/summary"]["queries"] >= 1
+
+    def test_health_endpoints_require_admin(self, auth_headers, admin_headers):
+        """Estatísticas internas em /health/* só para administradores"""
+        for path in ("/health/cache", "/health/db", "/health/auth"):
+            assert client.get(path).status_code == 401
+            assert client.get(path, headers=auth_headers).status_code == 403
+            assert client.get(path, headers=admin_headers).status_code == 200
+
+    def test_instrumented_pool_records_checkout_wait(self):
+        """O pool instrumentado mede a espera e conta os checkouts"""
+        from sqlalchemy import create_engine, text
+        from app.core.db_metrics import InstrumentedQueuePool, db_metrics, get_pool_status, instrument_engine
+
+        metrics_engine = create_engine(
+            "sqlite://", poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=0
+        )
+        instrument_engine(metrics_engine)
+        before = db_metrics.snapshot()
+        with metrics_engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            assert get_pool_status(metrics_engine)["checked_out"] == 1
+
+        after = db_metrics.snapshot()
+        assert after["checkouts"] == before["checkouts"] + 1
+        assert after["checkout_wait"]["count"] == before["checkout_wait"]["count"] + 1
+        assert get_pool_status(metrics_engine)["checked_in"] == 1
+        metrics_engine.dispose()
+
+
+class TestRequestMetrics:
+    """Testes das métricas Prometheus e do header Server-Timing"""
+
+    def test_labels_use_route_template_and_tier(self, auth_headers, test_user, db, metrics_headers):
+        """Rótulos usam o template da rota e o plano da empresa do usuário"""
+        product = Product(code="PROM-1", name="Produto Prometheus", company_id=test_user.company_id)
+        db.add(product)
+        db.commit()
+
+        response = client.get(f"/api/v1/products/{product.id}", headers=auth_headers)
+        assert response.status_code == 200
+        timing = response.headers["Server-Timing"]
+        assert "db;dur=" in timing and "total;dur=" in timing
+
+        test_user.company.tier = CompanyTier.enterprise
+        db.commit()
+        assert client.get(f"/api/v1/products/{product.id}", headers=auth_headers).status_code == 200
+
+        response = client.get("/metrics", headers=metrics_headers)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        body = response.text
+        route = 'route="/api/v1/products/{product_id}"'
+        assert f'http_requests_total{{method="GET",{route},status="200",tier="standard"}} 1' in body
+        assert f'http_requests_total{{method="GET",{route},status="200",tier="enterprise"}} 1' in body
+        assert f'http_request_duration_seconds_bucket{{method="GET",{route},tier="standard",le="+Inf"}} 1' in body
+        assert f'http_request_db_duration_seconds_count{{method="GET",{route},tier="standard"}} 1' in body
+        assert f"/api/v1/products/{product.id}" not in body
+
+    def test_unmatched_and_anonymous_requests(self, metrics_headers):
+        """404 sem rota e requisições sem autenticação têm rótulos fixos"""
+        assert client.get("/api/v1/nao-existe/123").status_code == 404
+        assert client.get("/api/v1/products/").status_code == 401
+
+        body = client.get("/metrics", headers=metrics_headers).text
+        assert 'http_requests_total{method="GET",route="unmatched",status="404",tier="anonymous"} 1' in body
+        assert 'http_requests_total{method="GET",route="/api/v1/products/",status="401",tier="anonymous"} 1' in body
+        assert "nao-existe" not in body
+        assert "# TYPE http_requests_in_flight gauge" in body
+
+    def test_metrics_require_collector_access(self, monkeypatch):
+        """Sem token, /metrics só responde a loopback; com token, exige o Bearer"""
+        from app.core import metrics
+
+        assert client.get("/metrics").status_code == 403
+        assert metrics._is_loopback("127.0.0.1")
+        assert not metrics._is_loopback("10.0.0.5") and not metrics._is_loopback("testclient")
+
+        monkeypatch.setattr(metrics, "METRICS_TOKEN", "token-coletor")
+        assert client.get("/metrics", headers={"Authorization": "Bearer outro"}).status_code == 403
+        assert client.get("/metrics", headers={"Authorization": "Bearer token-coletor"}).status_code == 200
+
+
+class TestQueryInstrumentation:
+    """Testes da contagem de consultas por requisição e da detecção de N+1"""
+
+    def test_repeated_statements_are_flagged(self, db):
+        """O mesmo SQL executado várias vezes aparece como N+1 na captura"""
+        from app.core.db_metrics import capture_queries
+
+        with capture_queries() as captured:
+            for i in range(6):
+                db.query(Product).filter(Product.id == i).first()
+            db.query(Company).first()
+
+        assert captured.queries == 7
+        assert captured.max_repeated == 6
+        repeated = captured.repeated(threshold=5)
+        assert len(repeated) == 1 and repeated[0][1] == 6
+        assert "products" in repeated[0][0]
+        assert "6x" in captured.report()
+
+    def test_debug_headers_and_route_flag(self, auth_headers, monkeypatch, admin_headers):
+        """Com DB_DEBUG_HEADERS a resposta traz as contagens; rotas com N+1 são marcadas"""
+        from app.core import db_metrics as db_metrics_module, metrics
+
+        monkeypatch.setattr(metrics, "DB_DEBUG_HEADERS", True)
+        monkeypatch.setattr(db_metrics_module, "DB_N_PLUS_ONE_THRESHOLD", 1)
+
+        response = client.get("/api/v1/products/", headers=auth_headers)
+        assert response.status_code == 200
+        assert int(response.headers["X-DB-Queries"]) >= 2
+        assert float(response.headers["X-DB-Time-Ms"]) >= 0
+        assert response.headers["X-DB-Max-Repeated"] == "1"
+
+        routes = client.get("/health/db", headers=admin_headers).json()["routes"]
+        assert routes["GET /api/v1/products/"]["n_plus_one_requests"] == 1
+
+
+class TestSlowQueryLog:
+    """Testes do log de consultas lentas com plano de execução"""
+
+    def test_normalized_sql_and_parameter_shapes(self):
+        """Literais e listas IN são colapsados; parâmetros guardam só o tipo"""
+        from app.core.slow_queries import normalize_sql, parameter_shapes
+
+        sql = "SELECT *  FROM products\n WHERE code = 'X-1' AND id IN (?, ?, ?) LIMIT 10"
+        assert normalize_sql(sql) == "SELECT * FROM products WHERE code = ? AND id IN (...) LIMIT ?"
+        assert parameter_shapes((1, "segredo", None)) == ["int", "str(7)", "None"]
+        assert parameter_shapes([(1,), (2,)], executemany=True) == {"rows": 2, "row": ["int"]}
+
+    def test_admin_endpoint_lists_route_and_plan(self, auth_headers, test_user, db, monkeypatch):
+        """Consultas acima do limite aparecem com rota e EXPLAIN; só administradores acessam"""
+        from app.core import slow_queries
+        from app.core.security import create_access_token
+
+        assert client.get("/api/v1/admin/slow-queries", headers=auth_headers).status_code == 403
+
+        monkeypatch.setattr(slow_queries, "DB_SLOW_QUERY_MS", 0.0001)
+        assert client.get("/api/v1/products/", headers=auth_headers).status_code == 200
+        assert slow_queries.slow_query_log.flush()
+
+        test_user.role = UserRole.admin
+        db.commit()
+        token = create_access_token({"sub": str(test_user.id), "role": "admin", "ver": test_user.token_version})
+        monkeypatch.setattr(slow_queries, "DB_SLOW_QUERY_MS", 0)
+        response = client.get("/api/v1/admin/slow-queries", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200
+        data = response.json()
+
+        products = [s for s in data["statements"] if "FROM products" in s["sql"]]
+        assert products and products[0]["routes"] == ["GET /api/v1/products/"]
+        assert products[0]["plan"] and products[0]["plan_error"] is None
+        recent = [e for e in data["recent"] if e["fingerprint"] == products[0]["fingerprint"]]
+        assert recent and recent[0]["duration_ms"] >= 0
+        assert "Test Company" not in response.text
+
+    def test_first_explain_right_after_boot(self, monkeypatch):
+        """O primeiro EXPLAIN não espera o intervalo, mesmo com o relógio monotônico perto de zero"""
+        from types import SimpleNamespace
+        from app.core import slow_queries
+
+        clock = {"now": 5.0}
+        monkeypatch.setattr(slow_queries, "time", SimpleNamespace(monotonic=lambda: clock["now"]))
+        log = slow_queries.SlowQueryLog()
+        requested = []
+        monkeypatch.setattr(log, "_submit_explain", lambda key, *args: requested.append(key))
+
+        sql = "SELECT * FROM products WHERE id = ?"
+        log.record(sql, (1,), False, 1.0, explain_engine=object())
+        log.record(sql, (2,), False, 1.0, explain_engine=object())
+        assert len(requested) == 1
+
+        clock["now"] += slow_queries.DB_SLOW_QUERY_EXPLAIN_INTERVAL
+        log.record(sql, (3,), False, 1.0, explain_engine=object())
+        assert len(requested) == 2
+
+
+class TestEventLoopMonitor:
+    """Testes do monitor de bloqueios do event loop"""
+
+    def test_blocking_route_is_reported_with_stack(self, monkeypatch):
+        """Código síncrono em rota async aparece na rota, com a linha culpada e no /metrics"""
+        import asyncio
+        import time
+        import httpx
+        from fastapi import FastAPI
+        from app.core import loop_monitor as loop_monitor_module
+        from app.core.loop_monitor import loop_monitor
+        from app.core.metrics import RequestMetricsMiddleware, metrics_registry
+
+        monkeypatch.setattr(loop_monitor_module, "EVENT_LOOP_LAG_INTERVAL", 0.01)
+        monkeypatch.setattr(loop_monitor_module, "EVENT_LOOP_BLOCK_MS", 50)
+        blocking_app = FastAPI()
+        blocking_app.add_middleware(RequestMetricsMiddleware)
+
+        @blocking_app.get("/blocking/{item_id}")
+        async def blocking_route(item_id: int):
+            time.sleep(0.3)
+            return {"item_id": item_id}
+
+        async def run():
+            loop_monitor.reset()
+            loop_monitor.start()
+            try:
+                await asyncio.sleep(0.05)
+                transport = httpx.ASGITransport(app=blocking_app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+                    assert (await http.get("/blocking/1")).status_code == 200
+                await asyncio.sleep(0.05)
+                return loop_monitor.snapshot()
+            finally:
+                loop_monitor.stop()
+
+        snapshot = asyncio.run(run())
+        route = snapshot["routes"]["GET /blocking/{item_id}"]
+        assert route["blocks"] == 1
+        assert route["max_ms"] >= 200
+        assert snapshot["max_lag_ms"] >= 200
+        assert "blocking_route" in route["stacks"][0]["culprit"]
+        assert 'event_loop_blocks_total{route="GET /blocking/{item_id}"} 1' in metrics_registry.render()
+
+
+class TestRequestProfiling:
+    """Testes do profiling sob demanda (X-Profile) para administradores"""
+
+    def test_sync_and_async_endpoints_are_sampled(self, monkeypatch):
+        """O endpoint síncrono é amostrado no threadpool e o assíncrono no event loop"""
+        import asyncio
+        import time
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from app.core import profiling
+        from app.core.metrics import RequestMetricsMiddleware, set_request_principal
+        from app.core.security import create_access_token
+
+        monkeypatch.setattr(profiling, "REQUEST_PROFILING_INTERVAL", 0.001)
+        # A thread de amostragem é esperada fora do event loop
+        joined_on_loop = []
+        join = profiling.RequestProfile.join
+
+        def recording_join(profile):
+            try:
+                asyncio.get_running_loop()
+                joined_on_loop.append(True)
+            except RuntimeError:
+                joined_on_loop.append(False)
+            join(profile)
+
+        monkeypatch.setattr(profiling.RequestProfile, "join", recording_join)
+        profiled_app = FastAPI()
+        profiled_app.add_middleware(profiling.RequestProfilingMiddleware)
+        profiled_app.add_middleware(RequestMetricsMiddleware)
+
+        def busy_wait(seconds):
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                pass
+
+        @profiled_app.get("/sync-report")
+        def sync_report():
+            set_request_principal(1, "admin", None)
+            busy_wait(0.1)
+            return {}
+
+        @profiled_app.get("/async-report")
+        async def async_report():
+            set_request_principal(1, "admin", None)
+            busy_wait(0.1)
+            await asyncio.sleep(0.05)
+            return {}
+
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': '1', 'role': 'admin'})}", "X-Profile": "1"}
+        profiled = TestClient(profiled_app)
+        for path in ("/sync-report", "/async-report"):
+            response = profiled.get(path, headers=headers)
+            profile = profiling.profile_store.get(response.headers["X-Profile-Id"])
+            assert profile.route == path and profile.status_code == 200
+            own = profile.functions()["own"]
+            assert own[0]["function"].startswith("busy_wait") and own[0]["percent"] >= 40
+            assert f"{path.strip('/').replace('-', '_')} (" in profile.folded()
+        assert profile.samples[(profiling.WAITING_FRAME,)] >= 0.03
+        assert joined_on_loop == [False, False]
+
+        # Sem X-Profile (ou sem token válido) nada é amostrado
+        assert "X-Profile-Id" not in profiled.get("/sync-report").headers
+        assert "X-Profile-Id" not in profiled.get("/sync-report", headers={"X-Profile": "1"}).headers
+
+    def test_non_admin_token_is_not_sampled(self, auth_headers, monkeypatch):
+        """Token válido sem papel de administrador não inicia a amostragem nem ocupa vaga"""
+        from app.core import profiling
+
+        started = []
+        monkeypatch.setattr(profiling.RequestProfile, "start", lambda profile: started.append(profile))
+        monkeypatch.setattr(profiling, "REQUEST_PROFILING_MAX_CONCURRENT", 0)
+        warnings = []
+        monkeypatch.setattr(profiling.logger, "warning", warnings.append)
+
+        response = client.get("/api/v1/products/", headers={**auth_headers, "X-Profile": "1"})
+        assert response.status_code == 200
+        assert "X-Profile-Id" not in response.headers
+        assert started == [] and warnings == []
+
+    def test_only_admin_profiles_are_kept_and_downloaded(self, auth_headers, test_user, db):
+        """Perfis de não administradores são descartados; admins baixam texto e folded"""
+        from app.core.security import create_access_token
+
+        response = client.get("/api/v1/products/", headers={**auth_headers, "X-Profile": "1"})
+        assert response.status_code == 200
+        assert "X-Profile-Id" not in response.headers
+        assert client.get("/api/v1/admin/profiles", headers=auth_headers).status_code == 403
+
+        test_user.role = UserRole.admin
+        db.commit()
+        token = create_access_token({"sub": str(test_user.id), "role": "admin", "ver": test_user.token_version})
+        admin_headers = {"Authorization": f"Bearer {token}"}
+        response = client.get("/api/v1/products/", headers={**admin_headers, "X-Profile": "1"})
+        profile_id = response.headers["X-Profile-Id"]
+
+        profiles = client.get("/api/v1/admin/profiles", headers=admin_headers).json()
+        assert [p["id"] for p in profiles] == [profile_id]
+        assert profiles[0]["route"] == "/api/v1/products/" and profiles[0]["user_id"] == test_user.id
+        text = client.get(f"/api/v1/admin/profiles/{profile_id}?format=text", headers=admin_headers)
+        assert text.status_code == 200 and "Tempo próprio" in text.text
+        folded = client.get(f"/api/v1/admin/profiles/{profile_id}?format=folded", headers=admin_headers)
+        assert folded.status_code == 200 and "attachment" in folded.headers["Content-Disposition"]
+        assert client.get("/api/v1/admin/profiles/inexistente", headers=admin_headers).status_code == 404
+
+
+class TestPrincipalCache:
+    """Testes do cache do usuário autenticado"""
+
+    def _route_queries(self, route, admin_headers):
+        return client.get("/health/db", headers=admin_headers).json()["routes"][route]["queries"]
+
+    def test_second_request_skips_user_query(self, auth_headers, admin_headers):
+        """A segunda requisição com o mesmo token não consulta o usuário"""
+        route = "GET /api/v1/products/"
+        assert client.get("/api/v1/products/", headers=auth_headers).status_code == 200
+        first = self._route_queries(route, admin_headers)
+        assert client.get("/api/v1/products/", headers=auth_headers).status_code == 200
+        assert self._route_queries(route, admin_headers) - first == first - 1
+
+    def test_profile_update_refreshes_cache(self, auth_token, test_user, db):
+        """Alterar o nome invalida o cache sem revogar o token"""
+        from app.core.security import get_current_user
+
+        assert get_current_user(db=db, token=auth_token).name == "Test User"
+        test_user.name = "Nome Novo"
+        db.commit()
+
+        principal = get_current_user(db=db, token=auth_token)
+        assert principal.name == "Nome Novo"
+        assert principal.id == test_user.id
+        assert principal.status == UserStatus.active
+
+    def test_role_change_revokes_tokens(self, auth_headers, test_user, db):
+        """Mudança de role incrementa token_version e invalida os tokens anteriores"""
+        from app.core.security import get_current_user
+
+        assert client.get("/api/v1/products/", headers=auth_headers).status_code == 200
+        test_user.role = UserRole.admin
+        db.commit()
+        assert test_user.token_version == 1
+
+        assert client.get("/api/v1/products/", headers=auth_headers).status_code == 401
+        login = client.post(
+            "/api/v1/auth/login",
+            data={"username": "test@example.com", "password": "testpassword123"}
+        )
+        token = login.json()["access_token"]
+        assert client.get("/api/v1/products/", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+        assert get_current_user(db=db, token=token).role == UserRole.admin
+
+    def test_deactivated_user_is_rejected(self, auth_headers, test_user, db):
+        """Usuário desativado perde o acesso, mesmo com token da versão atual"""
+        from app.core.security import create_access_token
+
+        assert client.get("/api/v1/products/", headers=auth_headers).status_code == 200
+        test_user.status = UserStatus.inactive
+        db.commit()
+
+        token = create_access_token({"sub": str(test_user.id), "ver": test_user.token_version})
+        assert client.get("/api/v1/products/", headers=auth_headers).status_code == 401
+        assert client.get("/api/v1/products/", headers={"Authorization": f"Bearer {token}"}).status_code == 401
+
+
+class TestLoginHashing:
+    """Testes da verificação de senhas no executor dedicado e do limite de logins"""
+
+    def _login(self, password="testpassword123"):
+        return client.post("/api/v1/auth/login", data={"username": "test@example.com", "password": password})
+
+    def test_login_rehashes_on_scheme_change(self, test_user, db, monkeypatch, admin_headers):
+        """Hash de esquema antigo é refeito no login sem revogar os tokens"""
+        from app.core import password_hashing
+
+        password_hash_metrics = password_hashing.password_hash_metrics
+        password_hash_metrics.reset()
+        monkeypatch.setattr(
+            password_hashing, "pwd_context", password_hashing.build_password_context("pbkdf2_sha256", 1000)
+        )
+
+        assert self._login("senha-errada").status_code == 401
+        response = self._login()
+        assert response.status_code == 200
+        assert response.json()["user"]["email"] == "test@example.com"
+        assert "hashed_password" not in response.json()["user"]
+
+        db.refresh(test_user)
+        assert test_user.hashed_password.startswith("$pbkdf2-sha256$1000$")
+        assert test_user.token_version == 0
+        assert self._login().status_code == 200
+
+        stats = client.get("/health/auth", headers=admin_headers).json()
+        assert stats["executor"]["submitted"] == 3
+        assert stats["login"]["rehashed"] == 1
+        assert stats["login"]["requests"] == 3
+
+    def test_cost_change_requires_rehash(self):
+        """Hash do mesmo esquema com outro custo também é refeito"""
+        from app.core.password_hashing import build_password_context
+
+        cheap = build_password_context("bcrypt", 4).hash("senha")
+        assert build_password_context("bcrypt", 5).needs_update(cheap)
+        assert not build_password_context("bcrypt", 4).needs_update(cheap)
+
+    def test_default_cost_is_per_scheme(self):
+        """Sem PASSWORD_HASH_ROUNDS, cada esquema usa o próprio custo padrão"""
+        from app.core.password_hashing import build_password_context
+
+        assert build_password_context("bcrypt", None).to_dict()["bcrypt__default_rounds"] == 12
+        pbkdf2 = build_password_context("pbkdf2_sha256", None)
+        assert pbkdf2.to_dict()["pbkdf2_sha256__default_rounds"] >= 29000
+        assert pbkdf2.hash("senha").startswith("$pbkdf2-sha256$29000$")
+        assert build_password_context("argon2", None).to_dict()["argon2__default_rounds"] < 12
+
+    def test_limits_reject_with_503(self, monkeypatch):
+        """Logins além do limite e verificações além da fila recebem 503"""
+        import asyncio
+        import threading
+        from app.core import password_hashing
+        from app.core.exceptions import ServiceUnavailableError
+
+        monkeypatch.setattr(password_hashing, "LOGIN_MAX_CONCURRENCY", 1)
+        monkeypatch.setattr(password_hashing, "LOGIN_QUEUE_TIMEOUT", 0.01)
+        monkeypatch.setattr(password_hashing, "PASSWORD_HASH_WORKERS", 1)
+        monkeypatch.setattr(password_hashing, "PASSWORD_HASH_MAX_QUEUE", 0)
+        monkeypatch.setattr(password_hashing, "_slots_loop", None)
+
+        async def scenario():
+            started = asyncio.Event()
+            release = asyncio.Event()
+
+            async def hold_login():
+                async with password_hashing.login_slot():
+                    started.set()
+                    await release.wait()
+
+            holder = asyncio.create_task(hold_login())
+            await started.wait()
+            with pytest.raises(ServiceUnavailableError) as login_error:
+                async with password_hashing.login_slot():
+                    pass
+            release.set()
+            await holder
+
+            blocker = threading.Event()
+            busy = asyncio.create_task(password_hashing.run_in_hash_executor(blocker.wait, 5))
+            await asyncio.sleep(0.01)
+            with pytest.raises(ServiceUnavailableError) as hash_error:
+                await password_hashing.verify_password_async("senha", "hash")
+            blocker.set()
+            await busy
+            return login_error.value, hash_error.value
+
+        login_error, hash_error = asyncio.run(scenario())
+        assert login_error.status_code == 503
+        assert login_error.headers["Retry-After"] == str(password_hashing.LOGIN_RETRY_AFTER)
+        assert hash_error.status_code == 503
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
-